@@ -18,12 +18,16 @@ __version__ = '0.4.1'
 __license__ = 'LGPLv3+'
 
 DEFAULT_LOCAL_DIRECTORY = PosixPath(os.sep + os.path.join('var', 'backup'))
+DEFAULT_STATE_DIRECTORY = PosixPath(os.path.expanduser(os.path.join('~', '.ftp-backup')))
 
 DEFAULT_COPIES_YEARLY = 2
 DEFAULT_COPIES_MONTHLY = 2
 DEFAULT_COPIES_WEEKLY = 2
 DEFAULT_COPIES_DAILY = 2
 
+# Suffix of remote files during their upload, they are renamed afterwards
+UPLOAD_PARTIAL_SUFFIX = '.partial'
+
 # =============================================================================
 
 if __name__ == "__main__":
@@ -0,0 +1,514 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Module for an asyncio FTP and FTPS client based only on the
+          standard library, for many concurrent operations in one event loop
+"""
+
+# Standard modules
+import logging
+import re
+import ssl
+import asyncio
+
+# Third party modules
+
+# Own modules
+from pb_base.errors import PbError
+
+from ftp_backup import UPLOAD_PARTIAL_SUFFIX
+
+from ftp_backup.aio_pool import AsyncSessionPool, DEFAULT_POOL_SIZE
+
+__version__ = '0.1.0'
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_FTP_PORT = 21
+DEFAULT_FTP_USER = 'anonymous'
+DEFAULT_TIMEOUT = 60
+DEFAULT_BLOCKSIZE = 64 * 1024
+
+RE_EPSV = re.compile(r'\(([^\d\s])\1\1(\d+)\1\)')
+RE_PASV = re.compile(r'(\d+),(\d+),(\d+),(\d+),(\d+),(\d+)')
+
+
+# =============================================================================
+class AsyncFTPError(PbError):
+    """
+    Base exception class for all exceptions belonging to issues
+    in this module
+    """
+    pass
+
+
+# =============================================================================
+class AsyncFTPReplyError(AsyncFTPError):
+    """Exception class for an unexpected reply of the FTP server."""
+
+    # -------------------------------------------------------------------------
+    def __init__(self, code, text):
+
+        self.code = code
+        self.text = text
+
+    # -------------------------------------------------------------------------
+    def __str__(self):
+
+        return "%d %s" % (self.code, self.text)
+
+
+# =============================================================================
+class AsyncFTPTempError(AsyncFTPReplyError):
+    """Exception class for a transient negative reply (4xx) of the FTP server."""
+    pass
+
+
+# =============================================================================
+class AsyncFTPPermError(AsyncFTPReplyError):
+    """Exception class for a permanent negative reply (5xx) of the FTP server."""
+    pass
+
+
+# =============================================================================
+async def _start_tls(reader, writer, context, server_hostname):
+    """Upgrades an established stream connection to TLS."""
+
+    if hasattr(writer, 'start_tls'):
+        await writer.start_tls(context, server_hostname=server_hostname)
+        return
+    # Before Python 3.11 the writer has to be patched like in start_tls() of 3.11
+    loop = asyncio.get_event_loop()
+    protocol = writer.transport.get_protocol()
+    transport = await loop.start_tls(
+        writer.transport, protocol, context, server_hostname=server_hostname)
+    writer._transport = transport
+    protocol._replace_writer(writer)
+
+
+# =============================================================================
+class AsyncFTPClient(object):
+    """
+    asyncio FTP client with explicit TLS (FTPS), passive data connections
+    and binary transfers. The commands of one client are serialized, so
+    concurrency is achieved by several clients, e.g. in an AsyncSessionPool.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(
+            self, host, port=DEFAULT_FTP_PORT, user=DEFAULT_FTP_USER, password='',
+            remote_dir=None, tls=False, tls_verify_mode=ssl.CERT_NONE,
+            timeout=DEFAULT_TIMEOUT, encoding='utf-8'):
+
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.remote_dir = remote_dir
+        self.tls = bool(tls)
+        self.tls_verify_mode = tls_verify_mode
+        self.timeout = timeout
+        self.encoding = encoding
+
+        self.welcome = None
+        self.broken = False
+        self.reader = None
+        self.writer = None
+        self._lock = None
+        self._ssl_context = None
+
+    # -------------------------------------------------------------------------
+    def __repr__(self):
+
+        return "<%s %s@%s:%d>" % (self.__class__.__name__, self.user, self.host, self.port)
+
+    # -------------------------------------------------------------------------
+    @property
+    def connected(self):
+        """Flag showing, that the control connection is established."""
+        return self.writer is not None and not self.broken
+
+    # -------------------------------------------------------------------------
+    def _context(self):
+
+        if self._ssl_context is None:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+            if self.tls_verify_mode == ssl.CERT_NONE:
+                context.check_hostname = False
+            context.verify_mode = self.tls_verify_mode
+            if self.tls_verify_mode != ssl.CERT_NONE:
+                context.load_default_certs()
+            self._ssl_context = context
+        return self._ssl_context
+
+    # -------------------------------------------------------------------------
+    async def _wait(self, coro):
+
+        try:
+            return await asyncio.wait_for(coro, self.timeout)
+        except (asyncio.TimeoutError, ConnectionError, EOFError, OSError):
+            self.broken = True
+            raise
+
+    # -------------------------------------------------------------------------
+    async def connect(self):
+        """Connects to the server, logs in and changes into the remote directory."""
+
+        self._lock = asyncio.Lock()
+        self.broken = False
+        LOG.debug("Connecting to FTP server %r (port %d) ...", self.host, self.port)
+        (self.reader, self.writer) = await self._wait(
+            asyncio.open_connection(self.host, self.port))
+        (code, self.welcome) = await self._read_reply(expected='2')
+
+        if self.tls:
+            await self._command('AUTH TLS', expected='2')
+            await self._wait(_start_tls(
+                self.reader, self.writer, self._context(), self.host))
+
+        (code, text) = await self._command('USER %s' % (self.user), expected='23')
+        if code == 331:
+            await self._command('PASS %s' % (self.password), expected='2')
+        if self.tls:
+            await self._command('PBSZ 0', expected='2')
+            await self._command('PROT P', expected='2')
+        await self._command('TYPE I', expected='2')
+        if self.remote_dir:
+            await self._command('CWD %s' % (self.remote_dir), expected='2')
+        return self
+
+    # -------------------------------------------------------------------------
+    async def close(self):
+        """Logs out and closes the control connection."""
+
+        if self.writer is None:
+            return
+        try:
+            if not self.broken:
+                await self.command('QUIT')
+        except Exception as e:
+            LOG.debug("Error on QUIT: %s", str(e))
+        finally:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except Exception:
+                pass
+            self.writer = None
+            self.reader = None
+
+    # -------------------------------------------------------------------------
+    async def __aenter__(self):
+        return await self.connect()
+
+    # -------------------------------------------------------------------------
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    # -------------------------------------------------------------------------
+    async def _read_reply(self, expected=None):
+
+        lines = []
+        code = None
+        while True:
+            line = await self._wait(self.reader.readline())
+            if not line:
+                self.broken = True
+                raise EOFError("Connection closed by the FTP server %r." % (self.host))
+            line = line.decode(self.encoding, 'replace').rstrip('\r\n')
+            lines.append(line)
+            if code is None:
+                code = line[:3]
+                if line[3:4] != '-':
+                    break
+            elif line[:3] == code and line[3:4] == ' ':
+                break
+
+        text = '\n'.join(lines)[4:]
+        try:
+            code = int(code)
+        except ValueError:
+            self.broken = True
+            raise AsyncFTPError("Invalid reply of the FTP server: %r" % (lines[0]))
+        if expected and str(code)[0] not in expected:
+            if 400 <= code < 500:
+                raise AsyncFTPTempError(code, text)
+            raise AsyncFTPPermError(code, text)
+        return (code, text)
+
+    # -------------------------------------------------------------------------
+    async def _command(self, cmd, expected=None):
+
+        if cmd.startswith('PASS '):
+            LOG.debug("FTP command: 'PASS ****'")
+        else:
+            LOG.debug("FTP command: %r", cmd)
+        self.writer.write((cmd + '\r\n').encode(self.encoding))
+        await self._wait(self.writer.drain())
+        return await self._read_reply(expected)
+
+    # -------------------------------------------------------------------------
+    async def command(self, cmd, expected='123'):
+        """
+        Sends a command and reads the reply.
+
+        @return: the reply code and its text
+        @rtype: tuple
+        """
+
+        async with self._lock:
+            return await self._command(cmd, expected)
+
+    # -------------------------------------------------------------------------
+    async def _open_data(self):
+
+        try:
+            (code, text) = await self._command('EPSV', expected='2')
+            match = RE_EPSV.search(text)
+            if not match:
+                raise AsyncFTPError("Invalid EPSV reply %r." % (text))
+            host = self.host
+            port = int(match.group(2))
+        except AsyncFTPPermError:
+            (code, text) = await self._command('PASV', expected='2')
+            match = RE_PASV.search(text)
+            if not match:
+                raise AsyncFTPError("Invalid PASV reply %r." % (text))
+            host = '.'.join(match.groups()[:4])
+            port = int(match.group(5)) * 256 + int(match.group(6))
+        return await self._wait(asyncio.open_connection(host, port))
+
+    # -------------------------------------------------------------------------
+    async def _transfer(self, cmd, handler, rest=None):
+
+        async with self._lock:
+            (reader, writer) = await self._open_data()
+            try:
+                if rest:
+                    await self._command('REST %d' % (rest), expected='3')
+                await self._command(cmd, expected='1')
+                if self.tls:
+                    await self._wait(_start_tls(reader, writer, self._context(), self.host))
+                result = await handler(reader, writer)
+            finally:
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except Exception:
+                    pass
+            await self._read_reply(expected='2')
+            return result
+
+    # -------------------------------------------------------------------------
+    async def _read_lines(self, cmd):
+
+        async def read_all(reader, writer):
+            data = b''
+            while True:
+                chunk = await self._wait(reader.read(DEFAULT_BLOCKSIZE))
+                if not chunk:
+                    return data
+                data += chunk
+
+        data = await self._transfer(cmd, read_all)
+        return [line for line in data.decode(self.encoding, 'replace').splitlines() if line]
+
+    # -------------------------------------------------------------------------
+    async def nlst(self, path=None):
+        """Returns the names in the given or the current remote directory."""
+
+        cmd = 'NLST'
+        if path:
+            cmd += ' ' + path
+        return await self._read_lines(cmd)
+
+    # -------------------------------------------------------------------------
+    async def list(self, path=None):
+        """Returns the lines of the LIST output of the given or the current directory."""
+
+        cmd = 'LIST'
+        if path:
+            cmd += ' ' + path
+        return await self._read_lines(cmd)
+
+    # -------------------------------------------------------------------------
+    async def store(self, remote_name, data, rest=None, blocksize=DEFAULT_BLOCKSIZE):
+        """
+        Uploads a remote file.
+
+        @param data: the content, either Bytes or a binary file object
+        @param rest: the offset in the remote file to continue an upload
+
+        @return: the number of uploaded Bytes
+        @rtype: int
+        """
+
+        async def send(reader, writer):
+            if isinstance(data, (bytes, bytearray)):
+                writer.write(data)
+                await self._wait(writer.drain())
+                return len(data)
+            total = 0
+            while True:
+                chunk = data.read(blocksize)
+                if not chunk:
+                    break
+                writer.write(chunk)
+                total += len(chunk)
+                await self._wait(writer.drain())
+            return total
+
+        return await self._transfer('STOR %s' % (remote_name), send, rest=rest)
+
+    # -------------------------------------------------------------------------
+    async def upload(self, remote_name, data):
+        """
+        Uploads a remote file under a temporary name and renames it
+        afterwards, like FTPHandler.put_stream().
+
+        @return: the number of uploaded Bytes
+        @rtype: int
+        """
+
+        partial_name = remote_name + UPLOAD_PARTIAL_SUFFIX
+        size = await self.store(partial_name, data)
+        try:
+            await self.rename(partial_name, remote_name)
+        except AsyncFTPPermError:
+            # Not all servers replace an existing file by renaming
+            await self.delete(remote_name)
+            await self.rename(partial_name, remote_name)
+        return size
+
+    # -------------------------------------------------------------------------
+    async def retrieve(self, remote_name, fh, rest=None):
+        """
+        Downloads a remote file into the given binary file object.
+
+        @return: the number of downloaded Bytes
+        @rtype: int
+        """
+
+        async def receive(reader, writer):
+            total = 0
+            while True:
+                chunk = await self._wait(reader.read(DEFAULT_BLOCKSIZE))
+                if not chunk:
+                    return total
+                fh.write(chunk)
+                total += len(chunk)
+
+        return await self._transfer('RETR %s' % (remote_name), receive, rest=rest)
+
+    # -------------------------------------------------------------------------
+    async def cwd(self, path):
+        await self.command('CWD %s' % (path), expected='2')
+
+    # -------------------------------------------------------------------------
+    async def pwd(self):
+        (code, text) = await self.command('PWD', expected='2')
+        match = re.search(r'"((?:[^"]|"")*)"', text)
+        if not match:
+            return text
+        return match.group(1).replace('""', '"')
+
+    # -------------------------------------------------------------------------
+    async def mkd(self, path):
+        await self.command('MKD %s' % (path), expected='2')
+
+    # -------------------------------------------------------------------------
+    async def rmd(self, path):
+        await self.command('RMD %s' % (path), expected='2')
+
+    # -------------------------------------------------------------------------
+    async def delete(self, path):
+        await self.command('DELE %s' % (path), expected='2')
+
+    # -------------------------------------------------------------------------
+    async def size(self, path):
+        (code, text) = await self.command('SIZE %s' % (path), expected='2')
+        return int(text.strip())
+
+    # -------------------------------------------------------------------------
+    async def rename(self, old_path, new_path):
+
+        async with self._lock:
+            await self._command('RNFR %s' % (old_path), expected='3')
+            await self._command('RNTO %s' % (new_path), expected='2')
+
+
+# =============================================================================
+class AsyncFTPPool(AsyncSessionPool):
+    """
+    Pool of AsyncFTPClient connections with operations on many remote
+    files at once, all driven by one event loop.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, factory, size=DEFAULT_POOL_SIZE):
+
+        super(AsyncFTPPool, self).__init__(factory, size)
+
+    # -------------------------------------------------------------------------
+    async def list_many(self, paths):
+        """
+        Lists all given remote directories concurrently.
+
+        @return: the names or the exception for every directory
+        @rtype: dict
+        """
+
+        async def nlst(ftp, path):
+            return await ftp.nlst(path)
+
+        results = await self.map(nlst, paths)
+        return dict(zip(paths, results))
+
+    # -------------------------------------------------------------------------
+    async def delete_many(self, paths):
+        """
+        Deletes all given remote files concurrently.
+
+        @return: the exception for every failed file
+        @rtype: dict
+        """
+
+        async def delete(ftp, path):
+            await ftp.delete(path)
+
+        results = await self.map(delete, paths)
+        return dict((p, r) for (p, r) in zip(paths, results) if r is not None)
+
+    # -------------------------------------------------------------------------
+    async def upload_many(self, files):
+        """
+        Uploads all given small files concurrently.
+
+        @param files: list of tuples of the remote name and the content as Bytes
+        @type files: list
+
+        @return: the exception for every failed file
+        @rtype: dict
+        """
+
+        async def upload(ftp, item):
+            await ftp.upload(item[0], item[1])
+
+        results = await self.map(upload, files)
+        return dict(
+            (item[0], r) for (item, r) in zip(files, results) if isinstance(r, BaseException))
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
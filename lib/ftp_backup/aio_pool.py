@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Module for a pool of asyncio sessions to a FTP or SSH server,
+          which runs many operations concurrently in one event loop
+"""
+
+# Standard modules
+import logging
+import asyncio
+
+# Third party modules
+
+# Own modules
+from pb_base.errors import PbError
+
+__version__ = '0.1.0'
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 8
+MAX_POOL_SIZE = 256
+
+
+# =============================================================================
+class AsyncPoolError(PbError):
+    """
+    Base exception class for all exceptions belonging to issues
+    in this module
+    """
+    pass
+
+
+# =============================================================================
+class _PooledSession(object):
+    """Asynchronous context manager lending a session of the pool."""
+
+    # -------------------------------------------------------------------------
+    def __init__(self, pool):
+
+        self.pool = pool
+        self.session = None
+
+    # -------------------------------------------------------------------------
+    async def __aenter__(self):
+
+        self.session = await self.pool.acquire()
+        return self.session
+
+    # -------------------------------------------------------------------------
+    async def __aexit__(self, exc_type, exc_value, traceback):
+
+        # A session marks itself as broken after losing its connection
+        await self.pool.release(self.session, discard=getattr(self.session, 'broken', False))
+
+
+# =============================================================================
+class AsyncSessionPool(object):
+    """
+    Pool of at most size connected sessions, e.g. AsyncFTPClient or
+    AsyncSFTPClient objects. The sessions are created by the given factory
+    and connected by their coroutine connect() on demand. Any number of
+    operations may be started at once, they wait for a free session.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, factory, size=DEFAULT_POOL_SIZE):
+
+        if size < 1 or size > MAX_POOL_SIZE:
+            raise AsyncPoolError("Invalid pool size %r, must be between 1 and %d." % (
+                size, MAX_POOL_SIZE))
+        self.factory = factory
+        self.size = size
+        self._idle = []
+        self._sessions = set()
+        self._sem = None
+        self._closed = False
+
+    # -------------------------------------------------------------------------
+    def _semaphore(self):
+
+        # Created in the running event loop
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.size)
+        return self._sem
+
+    # -------------------------------------------------------------------------
+    async def acquire(self):
+        """Returns an idle or a new connected session, waits for a free one."""
+
+        if self._closed:
+            raise AsyncPoolError("The pool is already closed.")
+        sem = self._semaphore()
+        await sem.acquire()
+        try:
+            if self._idle:
+                return self._idle.pop()
+            session = self.factory()
+            await session.connect()
+            self._sessions.add(session)
+            return session
+        except BaseException:
+            sem.release()
+            raise
+
+    # -------------------------------------------------------------------------
+    async def release(self, session, discard=False):
+        """Returns a session into the pool, a discarded session is closed."""
+
+        try:
+            if discard or self._closed:
+                await self._close_session(session)
+            else:
+                self._idle.append(session)
+        finally:
+            self._semaphore().release()
+
+    # -------------------------------------------------------------------------
+    async def _close_session(self, session):
+
+        self._sessions.discard(session)
+        try:
+            await session.close()
+        except Exception as e:
+            LOG.debug("Error on closing a session: %s", str(e))
+
+    # -------------------------------------------------------------------------
+    def session(self):
+        """
+        Returns an asynchronous context manager lending a session, e.g.:
+
+            async with pool.session() as ftp:
+                await ftp.delete(name)
+        """
+
+        return _PooledSession(self)
+
+    # -------------------------------------------------------------------------
+    async def run(self, func, *args):
+        """Awaits the coroutine function func with a lent session and the given arguments."""
+
+        async with self.session() as session:
+            return await func(session, *args)
+
+    # -------------------------------------------------------------------------
+    async def map(self, func, items, return_exceptions=True):
+        """
+        Runs the coroutine function func for all items concurrently,
+        each with a lent session.
+
+        @return: the results or the exceptions in the order of the items
+        @rtype: list
+        """
+
+        return await asyncio.gather(
+            *[self.run(func, item) for item in items], return_exceptions=return_exceptions)
+
+    # -------------------------------------------------------------------------
+    async def close(self):
+        """Closes all sessions, lent sessions are closed on their return."""
+
+        self._closed = True
+        idle = self._idle
+        self._idle = []
+        for session in idle:
+            await self._close_session(session)
+
+    # -------------------------------------------------------------------------
+    async def __aenter__(self):
+        return self
+
+    # -------------------------------------------------------------------------
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
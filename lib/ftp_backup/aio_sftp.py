@@ -0,0 +1,390 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Module for an asyncio wrapper around a paramiko SFTP client
+
+paramiko has no asyncio interface, so every session runs its blocking
+calls in its own worker thread. Operations on many remote files are
+pipelined in one SFTP channel: all requests are sent without waiting
+for the answers, which are collected in any order afterwards.
+"""
+
+# Standard modules
+import logging
+import socket
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+
+# Third party modules
+import paramiko
+
+from paramiko.sftp import CMD_STATUS, CMD_ATTRS, CMD_REMOVE, CMD_STAT, CMD_LSTAT
+
+# Own modules
+from pb_base.errors import PbError
+
+from ftp_backup import UPLOAD_PARTIAL_SUFFIX
+
+from ftp_backup.aio_pool import AsyncSessionPool, DEFAULT_POOL_SIZE
+
+__version__ = '0.1.0'
+
+LOG = logging.getLogger(__name__)
+
+# Maximum number of requests waiting for their answers in one channel
+DEFAULT_PIPELINE_DEPTH = 64
+
+# Errors of the connection, in contrast to the IOError of a single file
+CONNECTION_ERRORS = (paramiko.SSHException, EOFError, socket.timeout, ConnectionError)
+
+
+# =============================================================================
+class AsyncSFTPError(PbError):
+    """
+    Base exception class for all exceptions belonging to issues
+    in this module
+    """
+    pass
+
+
+# =============================================================================
+class _Responses(object):
+    """Receives the answers of pipelined requests from paramiko."""
+
+    # -------------------------------------------------------------------------
+    def __init__(self):
+
+        self.answers = {}
+
+    # -------------------------------------------------------------------------
+    def _async_response(self, t, msg, num):
+
+        self.answers[num] = (t, msg)
+
+
+# =============================================================================
+class AsyncSFTPClient(object):
+    """
+    asyncio wrapper around a paramiko SFTP client, which is created
+    by the given factory on connect(), e.g. SSHClient.open_sftp.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, factory, pipeline_depth=DEFAULT_PIPELINE_DEPTH):
+
+        self.factory = factory
+        self.pipeline_depth = pipeline_depth
+        self.sftp = None
+        self.broken = False
+        self._executor = None
+        self._posix_rename = None
+
+    # -------------------------------------------------------------------------
+    def __repr__(self):
+
+        return "<%s %r>" % (self.__class__.__name__, self.sftp)
+
+    # -------------------------------------------------------------------------
+    @property
+    def connected(self):
+        """Flag showing, that the SFTP channel is open."""
+        return self.sftp is not None and not self.broken
+
+    # -------------------------------------------------------------------------
+    async def _call(self, func, *args):
+
+        loop = asyncio.get_event_loop()
+        try:
+            return await loop.run_in_executor(self._executor, func, *args)
+        except CONNECTION_ERRORS:
+            self.broken = True
+            raise
+
+    # -------------------------------------------------------------------------
+    async def connect(self):
+        """Opens the SFTP channel in the worker thread of this session."""
+
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self.broken = False
+        self.sftp = await self._call(self.factory)
+        return self
+
+    # -------------------------------------------------------------------------
+    async def close(self):
+        """Closes the SFTP channel and stops the worker thread."""
+
+        if self.sftp is None:
+            return
+        try:
+            await self._call(self.sftp.close)
+        except Exception as e:
+            LOG.debug("Error on closing the SFTP channel: %s", str(e))
+        finally:
+            self.sftp = None
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    # -------------------------------------------------------------------------
+    async def __aenter__(self):
+        return await self.connect()
+
+    # -------------------------------------------------------------------------
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    # -------------------------------------------------------------------------
+    async def stat(self, path):
+        return await self._call(self.sftp.stat, path)
+
+    # -------------------------------------------------------------------------
+    async def listdir(self, path='.'):
+        return await self._call(self.sftp.listdir, path)
+
+    # -------------------------------------------------------------------------
+    async def listdir_attr(self, path='.'):
+        return await self._call(self.sftp.listdir_attr, path)
+
+    # -------------------------------------------------------------------------
+    async def remove(self, path):
+        await self._call(self.sftp.remove, path)
+
+    # -------------------------------------------------------------------------
+    async def mkdir(self, path, mode=0o755):
+        await self._call(self.sftp.mkdir, path, mode)
+
+    # -------------------------------------------------------------------------
+    async def rmdir(self, path):
+        await self._call(self.sftp.rmdir, path)
+
+    # -------------------------------------------------------------------------
+    async def rename(self, old_path, new_path):
+        """Renames a remote file, an existing target is replaced if supported."""
+
+        await self._call(self._rename, old_path, new_path)
+
+    # -------------------------------------------------------------------------
+    def _rename(self, old_path, new_path):
+
+        if self._posix_rename is not False:
+            try:
+                self.sftp.posix_rename(old_path, new_path)
+                self._posix_rename = True
+                return
+            except (AttributeError, IOError) as e:
+                if self._posix_rename:
+                    raise
+                LOG.debug("POSIX rename not available: %s", str(e))
+                self._posix_rename = False
+        try:
+            self.sftp.remove(new_path)
+        except IOError:
+            pass
+        self.sftp.rename(old_path, new_path)
+
+    # -------------------------------------------------------------------------
+    async def upload(self, remote_file, data):
+        """
+        Uploads a remote file from Bytes or a binary file object under a
+        temporary name and renames it afterwards.
+
+        @return: the number of uploaded Bytes
+        @rtype: int
+        """
+
+        return await self._call(self._upload, remote_file, data)
+
+    # -------------------------------------------------------------------------
+    def _upload(self, remote_file, data):
+
+        partial_file = remote_file + UPLOAD_PARTIAL_SUFFIX
+        with self.sftp.open(partial_file, 'wb') as fh:
+            fh.set_pipelined(True)
+            if isinstance(data, (bytes, bytearray)):
+                fh.write(data)
+                size = len(data)
+            else:
+                size = 0
+                while True:
+                    chunk = data.read(32768)
+                    if not chunk:
+                        break
+                    fh.write(chunk)
+                    size += len(chunk)
+        self._rename(partial_file, remote_file)
+        return size
+
+    # -------------------------------------------------------------------------
+    async def download(self, remote_file, fh):
+        """Downloads a remote file into the given binary file object."""
+
+        await self._call(self.sftp.getfo, remote_file, fh)
+
+    # -------------------------------------------------------------------------
+    def _pipelined(self, cmd, paths):
+
+        sftp = self.sftp
+        responses = _Responses()
+        numbers = []
+        waiting = set()
+        todo = list(paths)
+        todo.reverse()
+
+        while todo or waiting:
+            while todo and len(waiting) < self.pipeline_depth:
+                path = sftp._adjust_cwd(todo.pop())
+                num = sftp._async_request(responses, cmd, path)
+                numbers.append(num)
+                waiting.add(num)
+            sftp._read_response()
+            waiting.difference_update(responses.answers.keys())
+
+        results = []
+        for num in numbers:
+            (t, msg) = responses.answers[num]
+            try:
+                if t == CMD_STATUS:
+                    sftp._convert_status(msg)
+                    results.append(None)
+                elif t == CMD_ATTRS:
+                    results.append(paramiko.SFTPAttributes._from_msg(msg))
+                else:
+                    results.append(AsyncSFTPError("Unexpected answer type %r." % (t)))
+            except (IOError, EOFError) as e:
+                results.append(e)
+        return results
+
+    # -------------------------------------------------------------------------
+    async def remove_many(self, paths):
+        """
+        Removes all given remote files with pipelined requests.
+
+        @return: None or the exception for every file in the given order
+        @rtype: list
+        """
+
+        return await self._call(self._pipelined, CMD_REMOVE, paths)
+
+    # -------------------------------------------------------------------------
+    async def stat_many(self, paths, follow_links=True):
+        """
+        Returns the attributes of all given remote files with pipelined requests.
+
+        @return: the SFTPAttributes or the exception for every file in the given order
+        @rtype: list
+        """
+
+        cmd = CMD_STAT
+        if not follow_links:
+            cmd = CMD_LSTAT
+        return await self._call(self._pipelined, cmd, paths)
+
+
+# =============================================================================
+class AsyncSFTPPool(AsyncSessionPool):
+    """
+    Pool of AsyncSFTPClient channels with operations on many remote files
+    at once, all driven by one event loop.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, factory, size=DEFAULT_POOL_SIZE):
+
+        super(AsyncSFTPPool, self).__init__(factory, size)
+
+    # -------------------------------------------------------------------------
+    def _chunks(self, items):
+
+        nr = min(self.size, len(items))
+        return [items[i::nr] for i in range(nr)]
+
+    # -------------------------------------------------------------------------
+    async def list_many(self, paths):
+        """
+        Lists all given remote directories concurrently.
+
+        @return: the names or the exception for every directory
+        @rtype: dict
+        """
+
+        async def listdir(sftp, path):
+            return await sftp.listdir(path)
+
+        results = await self.map(listdir, paths)
+        return dict(zip(paths, results))
+
+    # -------------------------------------------------------------------------
+    async def _many(self, method, paths):
+
+        paths = list(paths)
+        if not paths:
+            return {}
+
+        async def run(sftp, chunk):
+            return await getattr(sftp, method)(chunk)
+
+        chunks = self._chunks(paths)
+        results = {}
+        for (chunk, answers) in zip(chunks, await self.map(run, chunks)):
+            if isinstance(answers, BaseException):
+                answers = [answers] * len(chunk)
+            results.update(zip(chunk, answers))
+        return results
+
+    # -------------------------------------------------------------------------
+    async def delete_many(self, paths):
+        """
+        Removes all given remote files, pipelined in all channels of the pool.
+
+        @return: the exception for every failed file
+        @rtype: dict
+        """
+
+        results = await self._many('remove_many', paths)
+        return dict((p, r) for (p, r) in results.items() if r is not None)
+
+    # -------------------------------------------------------------------------
+    async def stat_many(self, paths):
+        """
+        Returns the attributes of all given remote files, pipelined in all
+        channels of the pool.
+
+        @return: the SFTPAttributes or the exception for every file
+        @rtype: dict
+        """
+
+        return await self._many('stat_many', paths)
+
+    # -------------------------------------------------------------------------
+    async def upload_many(self, files):
+        """
+        Uploads all given small files concurrently.
+
+        @param files: list of tuples of the remote name and the content as Bytes
+        @type files: list
+
+        @return: the exception for every failed file
+        @rtype: dict
+        """
+
+        async def upload(sftp, item):
+            await sftp.upload(item[0], item[1])
+
+        results = await self.map(upload, files)
+        return dict(
+            (item[0], r) for (item, r) in zip(files, results) if isinstance(r, BaseException))
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,412 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Module for the parts of a backup run common to the FTP and the
+          SFTP handler: manifest, journal, index, verification and packing
+"""
+
+# Standard modules
+import logging
+import io
+import socket
+
+# Third party modules
+
+# Own modules
+from pb_base.common import bytes2human
+
+from ftp_backup.compress import COMPRESS_MODE_LEVELS
+
+from ftp_backup.pipeline import UploadPipeline
+
+from ftp_backup.cache_io import open_local_file, DEFAULT_IO_BUFSIZE
+
+from ftp_backup.checksum import local_digest
+
+from ftp_backup.manifest import BackupManifest, save_run_report, MANIFEST_NAME
+
+from ftp_backup.index import BackupIndex, BackupIndexError
+
+from ftp_backup.journal import RunJournal, RunJournalError, journal_file
+
+from ftp_backup.packer import TarStreamReader, PackIndex, plan_archives, PACK_INDEX_NAME
+
+__version__ = '0.1.1'
+
+LOG = logging.getLogger(__name__)
+
+
+# =============================================================================
+class BackupRunMixin(object):
+    """
+    Mixin class for the FTPHandler and the SFTPHandler with the methods of
+    a backup run, which don't depend on the protocol. The handler provides
+    the settings as properties and the upload of a stream by put_stream().
+    """
+
+    # -------------------------------------------------------------------------
+    def put_stream(self, stream, remote_file):
+        """
+        Uploads the stream as the given file into the current remote directory.
+        Must be implemented by the handler.
+        """
+
+        raise NotImplementedError()
+
+    # -------------------------------------------------------------------------
+    def get_compress_mode(self, local_file):
+        """
+        Returns a tuple of the compression mode and the gzip level for the
+        given local file. The mode is None, if the compression is not adaptive,
+        the level is None for uploading the file uncompressed.
+        """
+
+        if not self.compress:
+            return (None, None)
+        if not self.compress_adaptive:
+            return (None, self.compress_level)
+        mode = self.compress_history.get_mode(local_file)
+        return (mode, COMPRESS_MODE_LEVELS[mode])
+
+    # -------------------------------------------------------------------------
+    def open_upload_pipeline(
+            self, fileobj, compress_level=None, read_ahead=False, digest_algorithm=None):
+        """
+        Returns the chain of all configured processing stages for the given file.
+        With read_ahead the file is read ahead in a separate thread, with
+        digest_algorithm the checksum of the uploaded data is computed.
+        """
+
+        read_ahead_depth = 0
+        if read_ahead:
+            read_ahead_depth = self.read_ahead_depth
+        return UploadPipeline(
+            fileobj, compress_level=compress_level, compress_workers=self.compress_workers,
+            encrypt_key=self.encrypt_key, encrypt_workers=self.encrypt_workers,
+            read_ahead_depth=read_ahead_depth, read_ahead_size=self.read_ahead_size,
+            digest_algorithm=digest_algorithm)
+
+    # -------------------------------------------------------------------------
+    def open_local_file(self, local_file):
+        """
+        Opens the given local file for reading in the configured I/O mode,
+        computing its checksum on the way.
+        """
+
+        return open_local_file(
+            local_file, self.io_mode, stats=self.cache_stats, algorithm=self.checksum)
+
+    # -------------------------------------------------------------------------
+    def start_manifest(self, backup_dir):
+        """Starts a new manifest for the given remote backup directory."""
+
+        self.manifest = BackupManifest(str(backup_dir), self.checksum)
+        return self.manifest
+
+    # -------------------------------------------------------------------------
+    def save_run_report(self, **info):
+
+        if self.manifest is None or self.simulate:
+            return None
+        return save_run_report(
+            self.manifest, self.report_dir, io_mode=self.io_mode, host=self.host, **info)
+
+    # -------------------------------------------------------------------------
+    def _open_index(self):
+
+        if not self.index_file or self.simulate:
+            return None
+        try:
+            return BackupIndex(self.index_file)
+        except BackupIndexError as e:
+            LOG.error(str(e))
+            return None
+
+    # -------------------------------------------------------------------------
+    def update_index(self):
+        """Records all files of the manifest of the new backup directory in the local index."""
+
+        if self.manifest is None:
+            return
+        index = self._open_index()
+        if index is None:
+            return
+        with index:
+            try:
+                index.add_manifest(socket.gethostname(), self.host, self.manifest)
+            except BackupIndexError as e:
+                LOG.error(str(e))
+
+    # -------------------------------------------------------------------------
+    def prune_index(self, *backup_dirs):
+        """Removes the given deleted backup directories from the local index."""
+
+        if not backup_dirs:
+            return
+        index = self._open_index()
+        if index is None:
+            return
+        with index:
+            for backup_dir in backup_dirs:
+                try:
+                    index.remove_backup_dir(socket.gethostname(), self.host, str(backup_dir))
+                except BackupIndexError as e:
+                    LOG.error(str(e))
+
+    # -------------------------------------------------------------------------
+    def _journal_file(self):
+
+        return journal_file(self.journal_dir, self.host, self.remote_dir, self.local_dir)
+
+    # -------------------------------------------------------------------------
+    def find_resumable_backup_dir(self, cur_backup_dirs):
+        """
+        Returns the backup directory of an interrupted run into the same
+        remote directory within the resume window, which should be continued,
+        or None.
+        """
+
+        if not self.resume_window or self.local_dir is None or self.simulate:
+            return None
+        filename = self._journal_file()
+        try:
+            journal = RunJournal.load(filename)
+        except (IOError, OSError, ValueError, KeyError) as e:
+            LOG.warning("Could not read journal %r: %s", filename, e)
+            return None
+        if journal is None:
+            return None
+        if journal.backup_dir not in cur_backup_dirs or not journal.resumable(
+                self.host, self.remote_dir, self.local_dir, self.resume_window):
+            LOG.debug("Not continuing backup directory %r of the journal.", journal.backup_dir)
+            return None
+        self.journal = journal
+        return journal.backup_dir
+
+    # -------------------------------------------------------------------------
+    def start_journal(self, backup_dir):
+        """
+        Opens the journal of the current run, the journal of a continued run
+        is appended.
+        """
+
+        if not self.resume_window or self.local_dir is None or self.simulate:
+            self.journal = None
+            return None
+        resume = self.journal is not None
+        if not resume:
+            self.journal = RunJournal(
+                self._journal_file(), self.host, self.remote_dir, self.local_dir, backup_dir)
+        try:
+            self.journal.open(resume=resume)
+        except RunJournalError as e:
+            LOG.warning("Running without a journal: %s", str(e))
+            self.journal = None
+        return self.journal
+
+    # -------------------------------------------------------------------------
+    def finish_journal(self):
+
+        if self.journal is not None:
+            self.journal.finish()
+            self.journal = None
+
+    # -------------------------------------------------------------------------
+    def take_completed(self, name, size, mtime):
+        """
+        Takes the manifest entry of a file from the journal of a continued
+        run, if it was already uploaded completely and not changed since.
+
+        @return: the entry from the journal or None
+        @rtype: dict
+        """
+
+        if self.journal is None:
+            return None
+        entry = self.journal.completed_entry(name, size, mtime)
+        if entry is None:
+            return None
+        if self.verbose > 1:
+            LOG.debug("File %r was already uploaded by the interrupted run.", name)
+        if self.manifest is not None:
+            self.manifest.add(
+                name, entry['remote'], size, mtime, entry.get('digest'),
+                archive=entry.get('archive'))
+        return entry
+
+    # -------------------------------------------------------------------------
+    def verify_algorithm(self, level=None, encrypt=None):
+        """
+        Returns the algorithm for the checksum of the uploaded data needed
+        for its verification, or None, if the checksum of the local content
+        is sufficient or the uploads are not verified.
+        """
+
+        if self.verify_queue is None:
+            return None
+        if encrypt is None:
+            encrypt = self.encrypt
+        if level is None and not encrypt and self.verify_queue.algorithm == self.checksum:
+            return None
+        return self.verify_queue.algorithm
+
+    # -------------------------------------------------------------------------
+    def resumed_digest(self, local_file, digest):
+        """
+        Returns the checksum for verifying a file, whose interrupted upload
+        was continued, or None, if the uploads are not verified. The upload
+        has seen only the rest of the file, so the whole local file is read
+        once more, if the server computes another algorithm than the
+        checksum digest of the local content.
+        """
+
+        if self.verify_queue is None:
+            return None
+        algorithm = self.verify_queue.algorithm
+        if algorithm == self.checksum:
+            return digest
+        LOG.debug(
+            "Computing the %s checksum of %r for verifying the continued upload ...",
+            algorithm, str(local_file))
+        with open_local_file(
+                local_file, self.io_mode, stats=self.cache_stats, algorithm=algorithm) as fh:
+            while fh.read(DEFAULT_IO_BUFSIZE):
+                pass
+            return local_digest(fh)
+
+    # -------------------------------------------------------------------------
+    def finish_verify(self):
+        """
+        Waits for all pending verifications of uploads.
+
+        @return: the list of remote files with mismatching checksums
+        @rtype: list
+        """
+
+        if self.verify_queue is None:
+            return []
+        try:
+            mismatches = self.verify_queue.finish()
+        finally:
+            self.verify_queue.close()
+            self.verify_queue = None
+        for remote_file in mismatches:
+            LOG.error("Uploaded file %r is corrupt on the server.", remote_file)
+        return mismatches
+
+    # -------------------------------------------------------------------------
+    def log_cache_stats(self):
+
+        self.cache_stats.log(self.io_mode)
+
+    # -------------------------------------------------------------------------
+    def save_compress_history(self):
+
+        if self._compress_history is not None:
+            self._compress_history.save()
+
+    # -------------------------------------------------------------------------
+    def put_packed(self, files, done=None):
+        """
+        Packs the given small files into one or more tar archives, which are
+        streamed directly into the current remote directory, followed by an
+        index recording which archive holds which file.
+
+        @param files: list of tuples of the local path, the name in the archive,
+                      the size and the modification time of the files
+        @type files: list
+        @param done: list of tuples of the archive, the name in the archive, the size
+                     and the modification time of the files already packed
+                     by the interrupted run
+        @type done: list
+
+        @return: the index of the packed files
+        @rtype: PackIndex
+        """
+
+        if not files and not done:
+            return None
+
+        level = None
+        if self.compress:
+            level = self.compress_level
+        suffix = UploadPipeline.suffix(level, self.encrypt)
+
+        index = PackIndex()
+        first = 1
+        if done:
+            for entry in done:
+                index.add(*entry)
+            first = len(self.journal.archives()) + 1
+        for (archive, archive_files) in plan_archives(files, self.pack_archive_size, first):
+            remote_file = archive + suffix
+            total = 0
+            for entry in archive_files:
+                index.add(remote_file, entry[1], entry[2], entry[3])
+                total += entry[2]
+            LOG.info(
+                "Packing %d files with %d Bytes (%s) into %r ...",
+                len(archive_files), total, bytes2human(total, precision=1), remote_file)
+            if self.simulate:
+                continue
+            tar_files = [(entry[0], entry[1]) for entry in archive_files]
+            # The archive has no local checksum, it is always computed on the way
+            digest_algorithm = None
+            if self.verify_queue is not None:
+                digest_algorithm = self.verify_queue.algorithm
+            with TarStreamReader(tar_files, algorithm=self.checksum) as tar:
+                with self.open_upload_pipeline(
+                        tar, level, digest_algorithm=digest_algorithm) as stream:
+                    self.put_stream(stream, remote_file)
+            stream.log_stats()
+            self.submit_verify(remote_file, stream.upload_digest())
+            for entry in archive_files:
+                digest = tar.digests.get(entry[1])
+                if self.manifest is not None:
+                    self.manifest.add(
+                        entry[1], entry[1], entry[2], entry[3], digest=digest,
+                        archive=remote_file)
+                if self.journal is not None:
+                    self.journal.done(
+                        entry[1], entry[1], entry[2], entry[3], digest=digest,
+                        archive=remote_file)
+
+        index_file = PACK_INDEX_NAME + UploadPipeline.suffix(None, self.encrypt)
+        LOG.info("Writing index of %d packed files to %r ...", len(index.files), index_file)
+        if not self.simulate:
+            with self.open_upload_pipeline(io.BytesIO(index.to_json().encode('utf-8'))) as stream:
+                self.put_stream(stream, index_file)
+
+        return index
+
+    # -------------------------------------------------------------------------
+    def put_manifest(self):
+        """
+        Uploads the manifest of all uploaded files with their checksums
+        into the current remote directory.
+        """
+
+        if self.manifest is None:
+            return
+        manifest_file = MANIFEST_NAME + UploadPipeline.suffix(None, self.encrypt)
+        LOG.info(
+            "Writing manifest of %d files to %r ...", len(self.manifest.files), manifest_file)
+        if not self.simulate:
+            data = self.manifest.to_json().encode('utf-8')
+            with self.open_upload_pipeline(io.BytesIO(data)) as stream:
+                self.put_stream(stream, manifest_file)
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
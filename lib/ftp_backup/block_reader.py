@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Module for a base class of file like objects, which are processing
+          the blocks of another file object in a thread pool
+"""
+
+# Standard modules
+import logging
+
+from collections import deque
+
+from concurrent.futures import ThreadPoolExecutor
+
+# Third party modules
+
+# Own modules
+from pb_base.errors import PbError
+
+__version__ = '0.1.0'
+
+LOG = logging.getLogger(__name__)
+
+MAX_BLOCK_WORKERS = 256
+
+
+# =============================================================================
+class BlockReaderError(PbError):
+    """
+    Base exception class for all exceptions belonging to issues
+    in this module
+    """
+    pass
+
+
+# =============================================================================
+class ParallelBlockReader(object):
+    """
+    Base class of a file like object for reading the processed content of
+    another file object. The blocks of the underlying file object are processed
+    independently in a thread pool and delivered in their original order.
+
+    The number of blocks in flight is limited, so the memory consumption
+    is bounded by roughly max_pending * blocksize.
+
+    Descendant classes have to implement process_block().
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, fileobj, workers=1, blocksize=1024 * 1024, max_pending=None):
+
+        workers = int(workers)
+        if workers < 1 or workers > MAX_BLOCK_WORKERS:
+            msg = "Invalid number %r of workers, must be between 1 and %d." % (
+                workers, MAX_BLOCK_WORKERS)
+            raise ValueError(msg)
+
+        blocksize = int(blocksize)
+        if blocksize < 1:
+            msg = "Invalid block size %r." % (blocksize)
+            raise ValueError(msg)
+
+        if max_pending is None:
+            max_pending = 2 * workers
+        max_pending = int(max_pending)
+        if max_pending < 1:
+            msg = "Invalid number %r of maximum pending blocks." % (max_pending)
+            raise ValueError(msg)
+
+        self.fileobj = fileobj
+        self.workers = workers
+        self.blocksize = blocksize
+        self.max_pending = max_pending
+
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.blocks = 0
+
+        self._pending = deque()
+        self._buffer = b''
+        self._pos = 0
+        self._next_data = None
+        self._eof = False
+        self._closed = False
+        self._header_sent = False
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    # -----------------------------------------------------------
+    @property
+    def closed(self):
+        """Flag, that the reader was closed."""
+        return self._closed
+
+    # -------------------------------------------------------------------------
+    def header(self):
+        """Data to deliver before the first processed block."""
+        return b''
+
+    # -------------------------------------------------------------------------
+    def read_block(self):
+        """Reads the next raw block from the underlying file object."""
+        return self.fileobj.read(self.blocksize)
+
+    # -------------------------------------------------------------------------
+    def process_block(self, data, index, last):
+        """
+        Processes a single block, executed in the thread pool.
+
+        @param data: the raw data of the block
+        @type data: bytes
+        @param index: the number of the block, starting with 0
+        @type index: int
+        @param last: flag, that this is the last block
+        @type last: bool
+
+        @return: the processed data
+        @rtype: bytes
+        """
+        raise NotImplementedError()
+
+    # -------------------------------------------------------------------------
+    def _fill(self):
+
+        # One block is read ahead to know, whether the current block is the last one.
+        # An empty input is processed as one single empty block.
+        while not self._eof and len(self._pending) < self.max_pending:
+            if self._next_data is None:
+                self._next_data = self.read_block()
+            data = self._next_data
+            self._next_data = b''
+            if data:
+                self._next_data = self.read_block()
+            last = not self._next_data
+            self._pending.append(self._executor.submit(
+                self.process_block, data, self.blocks, last))
+            self.bytes_in += len(data)
+            self.blocks += 1
+            if last:
+                self._eof = True
+
+    # -------------------------------------------------------------------------
+    def _next_block(self):
+
+        self._fill()
+        if not self._pending:
+            return False
+        self._buffer = self._pending.popleft().result()
+        self._pos = 0
+        return True
+
+    # -------------------------------------------------------------------------
+    def read(self, size=-1):
+
+        if self._closed:
+            raise BlockReaderError("I/O operation on a closed %s." % (self.__class__.__name__))
+
+        chunks = []
+        if not self._header_sent:
+            self._header_sent = True
+            self._buffer = self.header()
+            self._pos = 0
+
+        if size is None or size < 0:
+            chunks.append(self._buffer[self._pos:])
+            while self._next_block():
+                chunks.append(self._buffer)
+            self._buffer = b''
+            self._pos = 0
+        else:
+            wanted = size
+            while wanted > 0:
+                if self._pos >= len(self._buffer):
+                    if not self._next_block():
+                        break
+                    continue
+                chunk = self._buffer[self._pos:self._pos + wanted]
+                self._pos += len(chunk)
+                wanted -= len(chunk)
+                chunks.append(chunk)
+
+        data = b''.join(chunks)
+        self.bytes_out += len(data)
+        return data
+
+    # -------------------------------------------------------------------------
+    def close(self):
+
+        if self._closed:
+            return
+        self._closed = True
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self._buffer = b''
+        self._executor.shutdown(wait=True)
+
+    # -------------------------------------------------------------------------
+    def __enter__(self):
+        return self
+
+    # -------------------------------------------------------------------------
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
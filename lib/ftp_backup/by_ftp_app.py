@@ -13,12 +13,6 @@ import sys
 import logging
 import textwrap
 import os
-import ftplib
-import ssl
-import re
-import glob
-import time
-from datetime import datetime
 
 # Third party modules
 import six
@@ -26,7 +20,7 @@ import six
 # Own modules
 from pb_logging.colored import ColoredFormatter
 
-from pb_base.common import to_bool, pp, bytes2human
+from pb_base.common import to_bool, pp, bytes2human, human2bytes
 
 from pb_base.handler import PbBaseHandlerError
 
@@ -37,9 +31,28 @@ from ftp_backup import DEFAULT_LOCAL_DIRECTORY
 from ftp_backup import DEFAULT_COPIES_YEARLY, DEFAULT_COPIES_MONTHLY
 from ftp_backup import DEFAULT_COPIES_WEEKLY, DEFAULT_COPIES_DAILY
 
-from ftp_backup.ftp_dir import DirEntry
+from ftp_backup.ftp_handler import FTPHandler
 
-__version__ = '0.4.2'
+from ftp_backup.compress import DEFAULT_COMPRESS_WORKERS, DEFAULT_COMPRESS_LEVEL
+
+from ftp_backup.packer import DEFAULT_PACK_THRESHOLD, DEFAULT_PACK_ARCHIVE_SIZE
+
+from ftp_backup.read_ahead import DEFAULT_READ_AHEAD_DEPTH, DEFAULT_READ_AHEAD_SIZE
+
+from ftp_backup.cache_io import IO_MODES, DEFAULT_IO_MODE
+
+from ftp_backup.checksum import CHECKSUM_ALGORITHMS, DEFAULT_CHECKSUM_ALGORITHM
+
+from ftp_backup.manifest import DEFAULT_REPORT_DIR
+
+from ftp_backup.index import DEFAULT_INDEX_FILE
+
+from ftp_backup.journal import DEFAULT_JOURNAL_DIR, DEFAULT_RESUME_WINDOW
+from ftp_backup.compress import DEFAULT_COMPRESS_HISTORY_FILE
+
+from ftp_backup.local_scan import ScanQueue, DEFAULT_STAT_WORKERS
+
+__version__ = '0.15.0'
 
 LOG = logging.getLogger(__name__)
 DEFAULT_FTP_PORT = 21
@@ -90,12 +103,35 @@ class BackupByFtpApp(PbCfgApp):
 
         self.simulate = False
 
-        self.connected = False
-        self.logged_in = False
+        self.compress = False
+        self.compress_workers = DEFAULT_COMPRESS_WORKERS
+        self.compress_level = DEFAULT_COMPRESS_LEVEL
+        self.compress_adaptive = False
+        self.compress_history_file = DEFAULT_COMPRESS_HISTORY_FILE
+
+        self.encrypt = False
+        self.encrypt_key_file = None
+        self.encrypt_workers = None
+
+        self.pack = False
+        self.pack_threshold = DEFAULT_PACK_THRESHOLD
+        self.pack_archive_size = DEFAULT_PACK_ARCHIVE_SIZE
+
+        self.read_ahead_depth = DEFAULT_READ_AHEAD_DEPTH
+        self.read_ahead_size = DEFAULT_READ_AHEAD_SIZE
+        self.io_mode = DEFAULT_IO_MODE
+        self.checksum = DEFAULT_CHECKSUM_ALGORITHM
+        self.report_dir = DEFAULT_REPORT_DIR
+        self.index_file = DEFAULT_INDEX_FILE
+        self.journal_dir = DEFAULT_JOURNAL_DIR
+        self.resume_window = DEFAULT_RESUME_WINDOW
+        self.verify = False
 
-        self.ftp = None
+        self.handler = None
 
         self.local_directory = DEFAULT_LOCAL_DIRECTORY
+        self.recursive = False
+        self.scan_workers = None
 
         self.copies = {
             'yearly': DEFAULT_COPIES_YEARLY,
@@ -115,17 +151,15 @@ class BackupByFtpApp(PbCfgApp):
         )
         self.post_init()
 
-        self.init_ftp()
-
         self.initialized = True
 
     # -------------------------------------------------------------------------
     def __del__(self):
 
-        if self.ftp and self.connected:
-            self.ftp.quit()
+        if self.handler:
+            self.handler.disconnect()
 
-        self.ftp = None
+        self.handler = None
 
     # -------------------------------------------------------------------------
     def init_arg_parser(self):
@@ -136,6 +170,23 @@ class BackupByFtpApp(PbCfgApp):
         self.arg_parser.add_argument(
             '-D', '--dir', '--local-dir', metavar='DIR', dest='local_dir', help=h)
 
+        h = "Backup also all files in the subdirectories of the local directory."
+        self.arg_parser.add_argument('-R', '--recursive', action='store_true', help=h)
+
+        h = (
+            "Number of threads for collecting the stat results of the local files, "
+            "0 for sequential scanning (default: %d on network filesystems, else 0).") % (
+            DEFAULT_STAT_WORKERS)
+        self.arg_parser.add_argument(
+            '--scan-workers', metavar='NR', type=int, dest='scan_workers', help=h)
+
+        h = (
+            "Continue the backup directory of an interrupted run, if it was started "
+            "not more than this number of hours ago, 0 for always starting a new "
+            "backup directory (default: %d).") % (DEFAULT_RESUME_WINDOW)
+        self.arg_parser.add_argument(
+            '--resume-window', metavar='HOURS', type=float, dest='resume_window', help=h)
+
         h = "Simulation mode, no modifying actions are done."
         self.arg_parser.add_argument('-t', '--test', action='store_true', help=h)
 
@@ -166,6 +217,92 @@ class BackupByFtpApp(PbCfgApp):
         h = 'The timezone on the FTP server (default: %r).' % (DEFAULT_FTP_TZ)
         ftp_group.add_argument('--tz', help=h)
 
+        compress_group = self.arg_parser.add_argument_group('Compression')
+
+        h = "Compress the files with gzip during the upload (default: False)."
+        compress_group.add_argument('-z', '--compress', action='store_true', help=h)
+
+        h = "The number of parallel threads for compressing (default: %d)." % (
+            DEFAULT_COMPRESS_WORKERS)
+        compress_group.add_argument(
+            '--compress-workers', metavar='NR', type=int, dest='compress_workers', help=h)
+
+        h = "The gzip compression level (default: %d)." % (DEFAULT_COMPRESS_LEVEL)
+        compress_group.add_argument(
+            '--compress-level', metavar='LEVEL', type=int, choices=range(10),
+            dest='compress_level', help=h)
+
+        h = (
+            "Choose per file between storing, fast and strong compression by probing "
+            "its compressibility, the decisions are cached in a local history.")
+        compress_group.add_argument(
+            '--compress-adaptive', action='store_true', dest='compress_adaptive', help=h)
+
+        crypt_group = self.arg_parser.add_argument_group('Encryption')
+
+        h = (
+            "Encrypt the files before uploading with the master key from the given file "
+            "(32 Bytes raw or hex encoded).")
+        crypt_group.add_argument(
+            '--encrypt-key', metavar='FILE', dest='encrypt_key_file', help=h)
+
+        h = "The number of parallel threads for encrypting (default: number of CPUs)."
+        crypt_group.add_argument(
+            '--encrypt-workers', metavar='NR', type=int, dest='encrypt_workers', help=h)
+
+        pack_group = self.arg_parser.add_argument_group('Packing of small files')
+
+        h = "Pack small files into tar archives, which are streamed to the server."
+        pack_group.add_argument('--pack', action='store_true', help=h)
+
+        h = "Files smaller than this size are packed (default: %s)." % (
+            bytes2human(DEFAULT_PACK_THRESHOLD))
+        pack_group.add_argument(
+            '--pack-threshold', metavar='SIZE', dest='pack_threshold', help=h)
+
+        h = "The maximum size of the packed files in one tar archive (default: %s)." % (
+            bytes2human(DEFAULT_PACK_ARCHIVE_SIZE))
+        pack_group.add_argument(
+            '--pack-archive-size', metavar='SIZE', dest='pack_archive_size', help=h)
+
+        read_group = self.arg_parser.add_argument_group('Reading of local files')
+
+        h = (
+            "Number of buffers for reading the local files ahead in a separate thread, "
+            "0 for no read ahead (default: %d).") % (DEFAULT_READ_AHEAD_DEPTH)
+        read_group.add_argument(
+            '--read-ahead', metavar='NR', type=int, dest='read_ahead_depth', help=h)
+
+        h = "The size of a single read ahead buffer (default: %s)." % (
+            bytes2human(DEFAULT_READ_AHEAD_SIZE))
+        read_group.add_argument(
+            '--read-ahead-size', metavar='SIZE', dest='read_ahead_size', help=h)
+
+        h = (
+            "I/O mode for reading the local files: 'buffered' reads through the page cache, "
+            "'nocache' drops the read pages from the page cache, 'direct' reads additionally "
+            "with O_DIRECT (default: %r).") % (DEFAULT_IO_MODE)
+        read_group.add_argument(
+            '--io-mode', metavar='MODE', choices=IO_MODES, dest='io_mode', help=h)
+
+        h = (
+            "The algorithm for the checksums of the local files, which are computed "
+            "during the upload and stored in the manifest, 'none' for no checksums "
+            "(default: %r).") % (DEFAULT_CHECKSUM_ALGORITHM)
+        read_group.add_argument(
+            '--checksum', metavar='ALGO', choices=CHECKSUM_ALGORITHMS + ('none', ),
+            dest='checksum', help=h)
+
+        h = (
+            "Verify the uploaded files by checksums computed by the FTP server "
+            "with HASH, XSHA256 or XMD5 over a second connection.")
+        read_group.add_argument('--verify', action='store_true', dest='verify', help=h)
+
+        h = (
+            "The local SQLite file of the index of all backed up files, "
+            "'none' for maintaining no index (default: %r).") % (str(DEFAULT_INDEX_FILE))
+        read_group.add_argument('--index-file', metavar='FILE', dest='index_file', help=h)
+
         copies_group = self.arg_parser.add_argument_group('Backup copies to store')
 
         copies_group.add_argument(
@@ -209,9 +346,62 @@ class BackupByFtpApp(PbCfgApp):
         if self.args.tz:
             self.ftp_tz = self.args.tz
 
+        if self.args.recursive:
+            self.recursive = True
+
+        if self.args.scan_workers is not None:
+            if self.args.scan_workers < 0:
+                LOG.error("Invalid number %d of scan workers.", self.args.scan_workers)
+            else:
+                self.scan_workers = self.args.scan_workers
+
+        if self.args.resume_window is not None:
+            if self.args.resume_window < 0:
+                LOG.error("Invalid resume window %r.", self.args.resume_window)
+            else:
+                self.resume_window = self.args.resume_window
+
         if self.args.test:
             self.simulate = True
 
+        if self.args.compress:
+            self.compress = True
+        if self.args.compress_workers and self.args.compress_workers > 0:
+            self.compress_workers = self.args.compress_workers
+        if self.args.compress_level is not None:
+            self.compress_level = self.args.compress_level
+        if self.args.compress_adaptive:
+            self.compress = True
+            self.compress_adaptive = True
+
+        if self.args.encrypt_key_file:
+            self.encrypt = True
+            self.encrypt_key_file = self.args.encrypt_key_file
+        if self.args.encrypt_workers and self.args.encrypt_workers > 0:
+            self.encrypt_workers = self.args.encrypt_workers
+
+        if self.args.pack:
+            self.pack = True
+        if self.args.pack_threshold:
+            self.pack_threshold = human2bytes(self.args.pack_threshold)
+        if self.args.pack_archive_size:
+            self.pack_archive_size = human2bytes(self.args.pack_archive_size)
+
+        if self.args.read_ahead_depth is not None:
+            self.read_ahead_depth = self.args.read_ahead_depth
+        if self.args.read_ahead_size:
+            self.read_ahead_size = human2bytes(self.args.read_ahead_size)
+        if self.args.io_mode:
+            self.io_mode = self.args.io_mode
+        if self.args.checksum:
+            self.checksum = self.args.checksum
+            if self.checksum == 'none':
+                self.checksum = None
+        if self.args.verify:
+            self.verify = True
+        if self.args.index_file:
+            self.index_file = self.args.index_file
+
         if self.args.copies_yearly and self.args.copies_yearly > 0:
             self.copies['yearly'] = self.args.copies_yearly
         if self.args.copies_monthly and self.args.copies_monthly > 0:
@@ -231,6 +421,41 @@ class BackupByFtpApp(PbCfgApp):
         for section in self.cfg:
 
             if section.lower() == 'global':
+                if 'recursive' in self.cfg[section] and not self.args.recursive:
+                    self.recursive = to_bool(self.cfg[section]['recursive'])
+                if 'checksum' in self.cfg[section] and not self.args.checksum:
+                    checksum = self.cfg[section]['checksum'].strip().lower()
+                    if checksum == 'none':
+                        self.checksum = None
+                    elif checksum in CHECKSUM_ALGORITHMS:
+                        self.checksum = checksum
+                    else:
+                        LOG.error(
+                            "Error in configuration: [%s]/checksum %r is not one of %s.",
+                            section, self.cfg[section]['checksum'], ', '.join(CHECKSUM_ALGORITHMS))
+                if 'report_dir' in self.cfg[section]:
+                    self.report_dir = os.path.expanduser(self.cfg[section]['report_dir'])
+                if 'verify' in self.cfg[section] and not self.args.verify:
+                    self.verify = to_bool(self.cfg[section]['verify'])
+                if 'index_file' in self.cfg[section] and not self.args.index_file:
+                    self.index_file = self.cfg[section]['index_file']
+                if 'resume_window' in self.cfg[section] and self.args.resume_window is None:
+                    try:
+                        self.resume_window = float(self.cfg[section]['resume_window'])
+                    except ValueError as e:
+                        LOG.error(
+                            "Error in configuration: [%s]/resume_window %r is not a "
+                            "valid number: %s", section, self.cfg[section]['resume_window'],
+                            str(e))
+                if 'journal_dir' in self.cfg[section]:
+                    self.journal_dir = os.path.expanduser(self.cfg[section]['journal_dir'])
+                if 'scan_workers' in self.cfg[section] and self.args.scan_workers is None:
+                    try:
+                        self.scan_workers = int(self.cfg[section]['scan_workers'])
+                    except ValueError as e:
+                        msg = int_msg_tpl % (
+                            section, 'scan_workers', self.cfg[section]['scan_workers'], str(e))
+                        LOG.error(msg)
                 if 'backup_dir' in self.cfg[section] and not self.args.local_dir:
                     self.local_directory = self.cfg[section]['backup_dir']
 
@@ -260,6 +485,97 @@ class BackupByFtpApp(PbCfgApp):
                 if 'timezone' in self.cfg[section] and not self.args.tz:
                     self.ftp_tz = self.cfg[section]['timezone']
 
+            if section.lower() == 'compression':
+
+                if 'compress' in self.cfg[section] and not self.args.compress:
+                    self.compress = to_bool(self.cfg[section]['compress'])
+
+                if 'workers' in self.cfg[section] and not self.args.compress_workers:
+                    try:
+                        self.compress_workers = int(self.cfg[section]['workers'])
+                    except ValueError as e:
+                        msg = int_msg_tpl % (
+                            'Compression', 'workers', self.cfg[section]['workers'], str(e))
+                        LOG.error(msg)
+
+                if 'adaptive' in self.cfg[section] and not self.args.compress_adaptive:
+                    self.compress_adaptive = to_bool(self.cfg[section]['adaptive'])
+
+                if 'history_file' in self.cfg[section]:
+                    self.compress_history_file = self.cfg[section]['history_file']
+
+                if 'level' in self.cfg[section] and self.args.compress_level is None:
+                    try:
+                        self.compress_level = int(self.cfg[section]['level'])
+                    except ValueError as e:
+                        msg = int_msg_tpl % (
+                            'Compression', 'level', self.cfg[section]['level'], str(e))
+                        LOG.error(msg)
+
+            if section.lower() == 'encryption':
+
+                if 'key_file' in self.cfg[section] and not self.args.encrypt_key_file:
+                    self.encrypt_key_file = self.cfg[section]['key_file']
+                    self.encrypt = True
+                    if 'encrypt' in self.cfg[section]:
+                        self.encrypt = to_bool(self.cfg[section]['encrypt'])
+
+                if 'workers' in self.cfg[section] and not self.args.encrypt_workers:
+                    try:
+                        self.encrypt_workers = int(self.cfg[section]['workers'])
+                    except ValueError as e:
+                        msg = int_msg_tpl % (
+                            'Encryption', 'workers', self.cfg[section]['workers'], str(e))
+                        LOG.error(msg)
+
+            if section.lower() == 'packing':
+
+                if 'pack' in self.cfg[section] and not self.args.pack:
+                    self.pack = to_bool(self.cfg[section]['pack'])
+
+                if 'threshold' in self.cfg[section] and not self.args.pack_threshold:
+                    try:
+                        self.pack_threshold = human2bytes(self.cfg[section]['threshold'])
+                    except ValueError as e:
+                        msg = "Error in configuration: [Packing]/threshold %r: %s" % (
+                            self.cfg[section]['threshold'], str(e))
+                        LOG.error(msg)
+
+                if 'archive_size' in self.cfg[section] and not self.args.pack_archive_size:
+                    try:
+                        self.pack_archive_size = human2bytes(self.cfg[section]['archive_size'])
+                    except ValueError as e:
+                        msg = "Error in configuration: [Packing]/archive_size %r: %s" % (
+                            self.cfg[section]['archive_size'], str(e))
+                        LOG.error(msg)
+
+            if section.lower() == 'reading':
+
+                if 'read_ahead' in self.cfg[section] and self.args.read_ahead_depth is None:
+                    try:
+                        self.read_ahead_depth = int(self.cfg[section]['read_ahead'])
+                    except ValueError as e:
+                        msg = int_msg_tpl % (
+                            section, 'read_ahead', self.cfg[section]['read_ahead'], str(e))
+                        LOG.error(msg)
+
+                if 'read_ahead_size' in self.cfg[section] and not self.args.read_ahead_size:
+                    try:
+                        self.read_ahead_size = human2bytes(self.cfg[section]['read_ahead_size'])
+                    except ValueError as e:
+                        msg = "Error in configuration: [%s]/read_ahead_size %r: %s" % (
+                            section, self.cfg[section]['read_ahead_size'], str(e))
+                        LOG.error(msg)
+
+                if 'io_mode' in self.cfg[section] and not self.args.io_mode:
+                    io_mode = self.cfg[section]['io_mode'].strip().lower()
+                    if io_mode in IO_MODES:
+                        self.io_mode = io_mode
+                    else:
+                        LOG.error(
+                            "Error in configuration: [%s]/io_mode %r is not one of %s.",
+                            section, self.cfg[section]['io_mode'], ', '.join(IO_MODES))
+
             if section.lower() == 'copies':
 
                 if 'yearly' in self.cfg[section] and not self.args.copies_yearly:
@@ -343,36 +659,27 @@ class BackupByFtpApp(PbCfgApp):
         return
 
     # -------------------------------------------------------------------------
-    def init_ftp(self):
-
-        LOG.debug("Initializing FTP object ...")
-        if not self.ftp_tls:
-            self.ftp = ftplib.FTP(timeout=self.ftp_timeout)
-        else:
-            context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
-            context.verify_mode = ssl.CERT_NONE
-            self.ftp = ftplib.FTP_TLS(context=context, timeout=self.ftp_timeout)
-
-        if self.verbose > 1:
-            if self.verbose > 2:
-                self.ftp.set_debuglevel(2)
-            else:
-                self.ftp.set_debuglevel(1)
-
-    # -------------------------------------------------------------------------
-    def login_ftp(self):
-
-        LOG.info("Connecting to FTP server %r (port %d) ...", self.ftp_host, self.ftp_port)
-        self.ftp.connect(host=self.ftp_host, port=self.ftp_port)
-        self.connected = True
-
-        msg = self.ftp.getwelcome()
-        if msg:
-            LOG.info("Welcome message: %s", msg)
-
-        LOG.info("Logging in as %r ...", self.ftp_user)
-        self.ftp.login(user=self.ftp_user, passwd=self.ftp_password)
-        self.logged_in = True
+    def create_handler(self):
+        """Returns a new FTP handler with the settings of the application."""
+
+        handler = FTPHandler(
+            host=self.ftp_host, port=self.ftp_port, user=self.ftp_user,
+            password=self.ftp_password, passive=self.ftp_passive,
+            remote_dir=self.ftp_remote_dir, tls=self.ftp_tls, tz=self.ftp_tz,
+            timeout=self.ftp_timeout, compress=self.compress,
+            compress_workers=self.compress_workers, compress_level=self.compress_level,
+            compress_adaptive=self.compress_adaptive,
+            compress_history_file=self.compress_history_file, encrypt=self.encrypt,
+            encrypt_key_file=self.encrypt_key_file, encrypt_workers=self.encrypt_workers,
+            pack=self.pack, pack_threshold=self.pack_threshold,
+            pack_archive_size=self.pack_archive_size, read_ahead_depth=self.read_ahead_depth,
+            read_ahead_size=self.read_ahead_size, io_mode=self.io_mode,
+            checksum=self.checksum, report_dir=self.report_dir, index_file=self.index_file,
+            journal_dir=self.journal_dir, resume_window=self.resume_window,
+            local_dir=self.local_directory, verify=self.verify,
+            appname=self.appname, verbose=self.verbose, simulate=self.simulate)
+        handler.copies.update(self.copies)
+        return handler
 
     # -------------------------------------------------------------------------
     def _run(self):
@@ -382,160 +689,52 @@ class BackupByFtpApp(PbCfgApp):
             LOG.error("Local directory %r does not exists.", self.local_directory)
             sys.exit(5)
 
-        re_backup_dirs = re.compile(r'^\s*\d{4}[-_]+\d\d[-_]+\d\d[-_]+\d+\s*$')
-        re_whitespace = re.compile(r'\s+')
-
-        self.login_ftp()
-
-        self.ftp.cwd(self.ftp_remote_dir)
+        if self.encrypt and not self.simulate and not self.encrypt_key_file:
+            LOG.error("Encryption requested, but no key file given.")
+            sys.exit(5)
 
-        cur_backup_dirs = []
+        self.handler = self.create_handler()
 
-        dlist = self.dir_list()
+        # The local directory is scanned in the background during
+        # connecting and cleaning up the FTP server.
+        scanner = ScanQueue(
+            self.local_directory, recursive=self.recursive, verbose=self.verbose,
+            stat_workers=self.scan_workers)
+        scanner.start()
+        try:
+            self.do_backup(scanner)
+        finally:
+            scanner.close()
 
-        for entry in dlist:
-            if self.verbose > 3:
-                LOG.debug("Entry in FTP dir:\n%s", pp(entry.as_dict(short=True)))
-            if re_backup_dirs.search(entry.name):
-                cur_backup_dirs.append(entry.name)
-            else:
-                LOG.debug("FTP-Entry %r is not a valid backup directory.", entry.name)
-        cur_backup_dirs.sort(key=str.lower)
-        if self.verbose > 1:
-            LOG.debug("Found backup directories:\n%s", pp(cur_backup_dirs))
-
-        cur_date = datetime.utcnow()
-        backup_dir_tpl = cur_date.strftime('%Y-%m-%d_%%02d')
-        LOG.debug("Backup directory template: %r", backup_dir_tpl)
-        cur_weekday = cur_date.timetuple().tm_wday
-
-        # Retrieving new backup directory
-        new_backup_dir = None
-        i = 0
-        found = False
-        while not found:
-            new_backup_dir = backup_dir_tpl % (i)
-            if not new_backup_dir in cur_backup_dirs:
-                found = True
-            i += 1
-        LOG.info("New backup directory: %r", new_backup_dir)
-        cur_backup_dirs.append(new_backup_dir)
-
-        type_mapping = {
-            'yearly': [],
-            'monthly': [],
-            'weekly': [],
-            'daily': [],
-            'other': [],
-        }
+    # -------------------------------------------------------------------------
+    def do_backup(self, scanner):
+        """
+        Performs the backup on the FTP server with the entries of the
+        already running scan of the local directory.
+        """
 
-        if cur_date.month == 1 and cur_date.day == 1:
-            if not new_backup_dir in type_mapping['yearly']:
-                type_mapping['yearly'].append(new_backup_dir)
-        if cur_date.day == 1:
-            if not new_backup_dir in type_mapping['monthly']:
-                type_mapping['monthly'].append(new_backup_dir)
-        if cur_weekday == 6:
-            # Sunday
-            if not new_backup_dir in type_mapping['weekly']:
-                type_mapping['weekly'].append(new_backup_dir)
-        if not new_backup_dir in type_mapping['daily']:
-            type_mapping['daily'].append(new_backup_dir)
-
-        self.map_dirs2types(type_mapping, cur_backup_dirs)
-        for key in type_mapping:
-            type_mapping[key].sort(key=str.lower)
-        if self.verbose > 2:
-            LOG.debug("Mapping of found directories to backup types:\n%s", pp(type_mapping))
-
-        for key in self.copies:
-            max_copies = self.copies[key]
-            cur_copies = len(type_mapping[key])
-            while cur_copies > max_copies:
-                type_mapping[key].pop(0)
-                cur_copies = len(type_mapping[key])
-        if self.verbose > 2:
-            LOG.debug("Directories to keep:\n%s", pp(type_mapping))
-
-        dirs_delete = []
-        for backup_dir in cur_backup_dirs:
-            keep = False
-            for key in type_mapping:
-                if backup_dir in type_mapping[key]:
-                    if self.verbose > 2:
-                        LOG.debug("Directory %r has to be kept.", backup_dir)
-                    keep = True
-                    continue
-            if not keep:
-                dirs_delete.append(backup_dir)
-        LOG.debug("Directories to remove:\n%s", pp(dirs_delete))
-
-        # Removing recursive unnecessary stuff
-        for item in dirs_delete:
-            self.remove_recursive(item)
-
-        # Creating date formatted directory
-        LOG.info("Creating directory %r ...", new_backup_dir)
-        if not self.simulate:
-            self.ftp.mkd(new_backup_dir)
-
-        local_pattern = os.path.join(self.local_directory, '*')
+        handler = self.handler
+        handler.connect()
+        base_dir = handler.remote_dir
 
+        # The backup directories are kept directly in the remote directory
+        handler.cleanup_old_backupdirs()
         try:
-            LOG.debug("Changing into %r ...", new_backup_dir)
-            if not self.simulate:
-                self.ftp.cwd(new_backup_dir)
-
-            # Backing up stuff
-            LOG.debug("Searching for stuff to backup in %r.", local_pattern)
-            local_files = glob.glob(local_pattern)
-            for local_file in sorted(local_files, key=str.lower):
-
-                if not os.path.isfile(local_file):
-                    if self.verbose > 1:
-                        LOG.debug("%r is not a file, don't backup it.", local_file)
-                    continue
-
-                statinfo = os.stat(local_file)
-                size = statinfo.st_size
-                s = ''
-                if size != 1:
-                    s = 's'
-                size_human = bytes2human(size, precision=1)
-                remote_file = re_whitespace.sub('_', os.path.basename(local_file))
-                LOG.info(
-                    "Transfering file %r -> %r, size %d Byte%s (%s).",
-                    local_file, remote_file, size, s, size_human)
-                if not self.simulate:
-                    cmd = 'STOR %s' % (remote_file)
-                    with open(local_file, 'rb') as f:
-                        try_nr = 0
-                        while try_nr < 10:
-                            try_nr += 1
-                            if try_nr > 2:
-                                LOG.info("Try %d transferring file %r ...", try_nr, local_file)
-                            try:
-                                self.ftp.storbinary(cmd, f)
-                                break
-                            except ftplib.error_temp as e:
-                                if try_nr >= 10:
-                                    msg = "Giving up trying to upload %r after %d tries: %s"
-                                    LOG.error(msg, local_file, try_nr, str(e))
-                                    raise
-                                self.handle_error(str(e), e.__class__.__name__, False)
-                                time.sleep(2)
-
+            handler.start_backup()
+            for entry in scanner:
+                if handler.queue_entry(entry):
+                    handler.put_entry(entry)
+            scanner.log_stats()
+            handler.finish_backup(local_dir=str(self.local_directory))
         finally:
-            LOG.debug("Changing cwd up.")
-            if not self.simulate:
-                self.ftp.cwd('..')
+            handler.cwd(base_dir)
 
         # Detect and display current disk usages
         total_bytes = 0
         if six.PY2:
             total_bytes = long(0)
 
-        dlist = self.dir_list()
+        dlist = handler.dir_list()
         total_s = 'Total'
         max_len = len(total_s)
 
@@ -568,109 +767,6 @@ class BackupByFtpApp(PbCfgApp):
         b_h_s = "%6s %s" % (val, unit)
         LOG.info("%-*s %13d Byte%s (%s)", max_len, total_s + ':', total_bytes, s, b_h_s)
 
-    # -------------------------------------------------------------------------
-    def map_dirs2types(self, type_mapping, backup_dirs):
-
-        re_backup_date = re.compile(r'^\s*(\d+)[_\-](\d+)[_\-](\d+)')
-
-        for backup_dir in backup_dirs:
-
-            match = re_backup_date.search(backup_dir)
-            if not match:
-                if not backup_dir in type_mapping['other']:
-                    type_mapping['other'].append(backup_dir)
-                continue
-
-            year = int(match.group(1))
-            month = int(match.group(2))
-            day = int(match.group(3))
-
-            dt = None
-            try:
-                dt = datetime(year, month, day)
-            except ValueError as e:
-                LOG.debug("Invalid date in backup directory %r: %s", backup_dir, str(e))
-                if not backup_dir in type_mapping['other']:
-                    type_mapping['other'].append(backup_dir)
-                continue
-            weekday = dt.timetuple().tm_wday
-            if dt.month == 1 and dt.day == 1:
-                if not backup_dir in type_mapping['yearly']:
-                    type_mapping['yearly'].append(backup_dir)
-            if dt.day == 1:
-                if not backup_dir in type_mapping['monthly']:
-                    type_mapping['monthly'].append(backup_dir)
-            if weekday == 6:
-                # Sunday
-                if not backup_dir in type_mapping['weekly']:
-                    type_mapping['weekly'].append(backup_dir)
-            if not backup_dir in type_mapping['daily']:
-                type_mapping['daily'].append(backup_dir)
-
-        if self.verbose > 3:
-            LOG.debug("Mapping of found directories to backup types:\n%s", pp(type_mapping))
-
-    # -------------------------------------------------------------------------
-    def remove_recursive(self, *items):
-
-        if not items:
-            LOG.warning("Called remove_recursive() without items to remove.")
-            return
-
-        for item in items:
-            LOG.info("Removing recursive %r ...", item)
-
-            try:
-                LOG.debug("Trying to change into directory %r ...", item)
-                self.ftp.cwd(item)
-                LOG.debug("Cwd successful.")
-                dlist = self.dir_list()
-                for entry in dlist:
-                    if entry.name == '.' or entry.name == '..':
-                        continue
-                    if entry.is_dir():
-                        self.remove_recursive(entry.name)
-                    else:
-                        LOG.info("Removing %r ...", entry.name)
-                        if not self.simulate:
-                            self.ftp.delete(entry.name)
-                LOG.debug("Changing cwd up.")
-                self.ftp.cwd('..')
-                LOG.info("Removing %r ...", item)
-                if not self.simulate:
-                    self.ftp.rmd(item)
-            except ftplib.error_perm:
-                LOG.info("Object %r was not a directory, removing it.", item)
-                if not self.simulate:
-                    self.ftp.delete(item)
-            except Exception as e:
-                msg = "Cwd to %r not successful: %s" % (item, str(e))
-                self.handle_error(msg, e.__class__.__name__, True)
-
-    # -------------------------------------------------------------------------
-    def dir_list(self, item_name=None):
-
-        dlist = []
-
-        def perform_dir_output(line):
-            if self.verbose > 2:
-                LOG.debug("Performing line %r ...", line)
-
-            line = line.strip()
-            if not line:
-                return
-            entry = DirEntry.from_dir_line(
-                line, appname=self.appname, verbose=self.verbose)
-            if entry:
-                dlist.append(entry)
-
-        if item_name:
-            self.ftp.dir(item_name, perform_dir_output)
-        else:
-            self.ftp.dir(perform_dir_output)
-
-        return dlist
-
     # -------------------------------------------------------------------------
     def disk_usage(self, item):
         """
@@ -679,7 +775,7 @@ class BackupByFtpApp(PbCfgApp):
         This item must be located in the current remote directory.
         """
 
-        if not self.logged_in:
+        if not self.handler or not self.handler.logged_in:
             msg = "Could not detect disk usage of item %r, not loggen in."
             raise FTPHandlerError(msg)
 
@@ -701,7 +797,7 @@ class BackupByFtpApp(PbCfgApp):
             msg = "Trying to detect disk usage of remote directory %r ..."
             LOG.debug(msg, item.name)
 
-        item_dir_list = self.dir_list(item.name)
+        item_dir_list = self.handler.dir_list(item.name)
         for list_item in item_dir_list:
             if list_item.name == '.' or list_item.name == '..':
                 continue
@@ -721,11 +817,11 @@ class BackupByFtpApp(PbCfgApp):
 
         """
 
-        if self.ftp and self.connected:
+        if self.handler and self.handler.connected:
             LOG.info("Disconnecting from %r ...", self.ftp_host)
-            self.ftp.quit()
+            self.handler.disconnect()
 
-        self.ftp = None
+        self.handler = None
 
 
 # vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
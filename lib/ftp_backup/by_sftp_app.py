@@ -18,6 +18,7 @@ import re
 import glob
 import time
 import socket
+import signal
 
 from datetime import datetime
 
@@ -29,7 +30,7 @@ import six
 # Own modules
 from pb_logging.colored import ColoredFormatter
 
-from pb_base.common import to_bool, pp, bytes2human
+from pb_base.common import to_bool, pp, bytes2human, human2bytes
 
 from pb_base.handler import PbBaseHandlerError
 
@@ -41,12 +42,39 @@ from ftp_backup import DEFAULT_COPIES_YEARLY, DEFAULT_COPIES_MONTHLY
 from ftp_backup import DEFAULT_COPIES_WEEKLY, DEFAULT_COPIES_DAILY
 
 from ftp_backup.sftp_handler import SFTPHandlerError, SFTPLocalPathError
+from ftp_backup.sftp_handler import SFTPRemotePathError
 from ftp_backup.sftp_handler import SFTPHandler
 from ftp_backup.sftp_handler import DEFAULT_SSH_SERVER, DEFAULT_SSH_PORT
 from ftp_backup.sftp_handler import DEFAULT_SSH_USER, DEFAULT_REMOTE_DIR
 from ftp_backup.sftp_handler import DEFAULT_SSH_TIMEOUT, DEFAULT_SSH_KEY
+from ftp_backup.sftp_handler import DEFAULT_SSH_KEEPALIVE
 
-__version__ = '0.4.6'
+from ftp_backup.compress import DEFAULT_COMPRESS_WORKERS, DEFAULT_COMPRESS_LEVEL
+
+from ftp_backup.packer import DEFAULT_PACK_THRESHOLD, DEFAULT_PACK_ARCHIVE_SIZE
+
+from ftp_backup.read_ahead import DEFAULT_READ_AHEAD_DEPTH, DEFAULT_READ_AHEAD_SIZE
+
+from ftp_backup.cache_io import IO_MODES, DEFAULT_IO_MODE
+
+from ftp_backup.ranges import DEFAULT_RANGE_THRESHOLD, DEFAULT_RANGE_SIZE
+from ftp_backup.ranges import DEFAULT_RANGE_WORKERS, DEFAULT_RANGE_MIN_WORKERS
+
+from ftp_backup.checksum import CHECKSUM_ALGORITHMS, DEFAULT_CHECKSUM_ALGORITHM
+
+from ftp_backup.index import DEFAULT_INDEX_FILE
+
+from ftp_backup.journal import DEFAULT_RESUME_WINDOW
+
+from ftp_backup.local_scan import ScanQueue, DEFAULT_STAT_WORKERS
+
+from ftp_backup.schedule import CronSchedule, ScheduleRunner, ScheduleError
+from ftp_backup.schedule import DEFAULT_SCHEDULE, DEFAULT_IDLE_INTERVAL
+
+from ftp_backup.watch import DirectoryWatcher, WatchError
+from ftp_backup.watch import DEFAULT_WATCH_DEBOUNCE, DEFAULT_WATCH_QUEUE
+
+__version__ = '0.18.0'
 
 LOG = logging.getLogger(__name__)
 
@@ -81,6 +109,15 @@ class BackupBySftpApp(PbCfgApp):
         self.handler = SFTPHandler(appname=appname, verbose=verbose, initialized=False,
             base_dir=str(DEFAULT_LOCAL_DIRECTORY))
 
+        self.daemon = False
+        self.schedule = CronSchedule(DEFAULT_SCHEDULE)
+        self.runner = None
+        self.watch = False
+        self.watch_debounce = DEFAULT_WATCH_DEBOUNCE
+        self.watch_queue = DEFAULT_WATCH_QUEUE
+        self.watcher = None
+        self._last_check = 0
+
         super(BackupBySftpApp, self).__init__(
             appname=appname,
             base_dir=str(DEFAULT_LOCAL_DIRECTORY),
@@ -110,6 +147,23 @@ class BackupBySftpApp(PbCfgApp):
         self.arg_parser.add_argument(
             '-D', '--dir', '--local-dir', metavar='DIR', dest='local_dir', help=h)
 
+        h = "Backup also all files in the subdirectories of the local directory."
+        self.arg_parser.add_argument('-R', '--recursive', action='store_true', help=h)
+
+        h = (
+            "Number of threads for collecting the stat results of the local files, "
+            "0 for sequential scanning (default: %d on network filesystems, else 0).") % (
+            DEFAULT_STAT_WORKERS)
+        self.arg_parser.add_argument(
+            '--scan-workers', metavar='NR', type=int, dest='scan_workers', help=h)
+
+        h = (
+            "Continue the backup directory of an interrupted run, if it was started "
+            "not more than this number of hours ago, 0 for always starting a new "
+            "backup directory (default: %d).") % (DEFAULT_RESUME_WINDOW)
+        self.arg_parser.add_argument(
+            '--resume-window', metavar='HOURS', type=float, dest='resume_window', help=h)
+
         h = "Simulation mode, no modifying actions are done."
         self.arg_parser.add_argument('-t', '--test', action='store_true', help=h)
 
@@ -133,6 +187,163 @@ class BackupBySftpApp(PbCfgApp):
         h = 'The root directory on the SSH server (default: %r).' % (str(DEFAULT_REMOTE_DIR))
         ssh_group.add_argument('--remote-dir', metavar='DIR', help=h)
 
+        h = (
+            "Set the times of the uploaded files without waiting for the answers and "
+            "confirm all uploads at the end by listing the remote directories, "
+            "uploading the mismatching files again.")
+        ssh_group.add_argument(
+            '--batch-confirm', action='store_true', dest='batch_confirm', help=h)
+
+        h = (
+            "Seconds between two keepalive messages of the SSH connection, "
+            "0 for none (default: %d).") % (DEFAULT_SSH_KEEPALIVE)
+        ssh_group.add_argument('--keepalive', metavar='SECONDS', type=int, help=h)
+
+        daemon_group = self.arg_parser.add_argument_group('Daemon mode')
+
+        h = (
+            "Keep running and perform the backups on the schedule, keeping "
+            "the connection to the SSH server alive between them.")
+        daemon_group.add_argument('--daemon', action='store_true', help=h)
+
+        h = (
+            "The schedule of the backups in daemon mode, five fields like in a "
+            "crontab or an alias like '@hourly' (default: %r).") % (DEFAULT_SCHEDULE)
+        daemon_group.add_argument('--schedule', metavar='CRON', help=h)
+
+        h = (
+            "Watch the local directory with inotify and upload completed files "
+            "immediately into the current backup directory, implies --daemon.")
+        daemon_group.add_argument('--watch', action='store_true', help=h)
+
+        h = (
+            "Seconds without changes of a watched file before its upload "
+            "(default: %s).") % (DEFAULT_WATCH_DEBOUNCE)
+        daemon_group.add_argument(
+            '--watch-debounce', metavar='SECONDS', type=float, dest='watch_debounce', help=h)
+
+        h = (
+            "The maximum number of watched files waiting for their upload, further "
+            "files are left to the next scheduled backup (default: %d).") % (
+            DEFAULT_WATCH_QUEUE)
+        daemon_group.add_argument(
+            '--watch-queue', metavar='NR', type=int, dest='watch_queue', help=h)
+
+        compress_group = self.arg_parser.add_argument_group('Compression')
+
+        h = "Compress the files with gzip during the upload (default: False)."
+        compress_group.add_argument('-z', '--compress', action='store_true', help=h)
+
+        h = "The number of parallel threads for compressing (default: %d)." % (
+            DEFAULT_COMPRESS_WORKERS)
+        compress_group.add_argument(
+            '--compress-workers', metavar='NR', type=int, dest='compress_workers', help=h)
+
+        h = "The gzip compression level (default: %d)." % (DEFAULT_COMPRESS_LEVEL)
+        compress_group.add_argument(
+            '--compress-level', metavar='LEVEL', type=int, choices=range(10),
+            dest='compress_level', help=h)
+
+        h = (
+            "Choose per file between storing, fast and strong compression by probing "
+            "its compressibility, the decisions are cached in a local history.")
+        compress_group.add_argument(
+            '--compress-adaptive', action='store_true', dest='compress_adaptive', help=h)
+
+        crypt_group = self.arg_parser.add_argument_group('Encryption')
+
+        h = (
+            "Encrypt the files before uploading with the master key from the given file "
+            "(32 Bytes raw or hex encoded).")
+        crypt_group.add_argument(
+            '--encrypt-key', metavar='FILE', dest='encrypt_key_file', help=h)
+
+        h = "The number of parallel threads for encrypting (default: number of CPUs)."
+        crypt_group.add_argument(
+            '--encrypt-workers', metavar='NR', type=int, dest='encrypt_workers', help=h)
+
+        pack_group = self.arg_parser.add_argument_group('Packing of small files')
+
+        h = "Pack small files into tar archives, which are streamed to the server."
+        pack_group.add_argument('--pack', action='store_true', help=h)
+
+        h = "Files smaller than this size are packed (default: %s)." % (
+            bytes2human(DEFAULT_PACK_THRESHOLD))
+        pack_group.add_argument(
+            '--pack-threshold', metavar='SIZE', dest='pack_threshold', help=h)
+
+        h = "The maximum size of the packed files in one tar archive (default: %s)." % (
+            bytes2human(DEFAULT_PACK_ARCHIVE_SIZE))
+        pack_group.add_argument(
+            '--pack-archive-size', metavar='SIZE', dest='pack_archive_size', help=h)
+
+        read_group = self.arg_parser.add_argument_group('Reading of local files')
+
+        h = (
+            "Number of buffers for reading the local files ahead in a separate thread, "
+            "0 for no read ahead (default: %d).") % (DEFAULT_READ_AHEAD_DEPTH)
+        read_group.add_argument(
+            '--read-ahead', metavar='NR', type=int, dest='read_ahead_depth', help=h)
+
+        h = "The size of a single read ahead buffer (default: %s)." % (
+            bytes2human(DEFAULT_READ_AHEAD_SIZE))
+        read_group.add_argument(
+            '--read-ahead-size', metavar='SIZE', dest='read_ahead_size', help=h)
+
+        h = (
+            "I/O mode for reading the local files: 'buffered' reads through the page cache, "
+            "'nocache' drops the read pages from the page cache, 'direct' reads additionally "
+            "with O_DIRECT (default: %r).") % (DEFAULT_IO_MODE)
+        read_group.add_argument(
+            '--io-mode', metavar='MODE', choices=IO_MODES, dest='io_mode', help=h)
+
+        h = (
+            "The algorithm for the checksums of the local files, which are computed "
+            "during the upload and stored in the manifest, 'none' for no checksums "
+            "(default: %r).") % (DEFAULT_CHECKSUM_ALGORITHM)
+        read_group.add_argument(
+            '--checksum', metavar='ALGO', choices=CHECKSUM_ALGORITHMS + ('none', ),
+            dest='checksum', help=h)
+
+        h = (
+            "Verify the uploaded files by checksums computed by the SSH server "
+            "with the SFTP extension check-file or with sha256sum.")
+        read_group.add_argument('--verify', action='store_true', dest='verify', help=h)
+
+        h = (
+            "The local SQLite file of the index of all backed up files, "
+            "'none' for maintaining no index (default: %r).") % (str(DEFAULT_INDEX_FILE))
+        read_group.add_argument('--index-file', metavar='FILE', dest='index_file', help=h)
+
+        range_group = self.arg_parser.add_argument_group('Uploads of big files in ranges')
+
+        h = (
+            "Uncompressed and unencrypted files of at least this size are uploaded in "
+            "ranges written concurrently over several SFTP channels (default: %s).") % (
+            bytes2human(DEFAULT_RANGE_THRESHOLD))
+        range_group.add_argument(
+            '--range-threshold', metavar='SIZE', dest='range_threshold', help=h)
+
+        h = "The size of a single range (default: %s)." % (bytes2human(DEFAULT_RANGE_SIZE))
+        range_group.add_argument('--range-size', metavar='SIZE', dest='range_size', help=h)
+
+        h = (
+            "Number of ranges of a file uploaded at the same time, "
+            "1 for no uploads in ranges (default: %d).") % (DEFAULT_RANGE_WORKERS)
+        range_group.add_argument(
+            '--range-workers', metavar='NR', type=int, dest='range_workers', help=h)
+
+        h = (
+            "Adjust the number of ranges uploaded at the same time between --range-min-workers "
+            "and --range-workers by the measured throughput and the failed uploads.")
+        range_group.add_argument(
+            '--range-adaptive', action='store_true', dest='range_adaptive', help=h)
+
+        h = "The minimum number of ranges uploaded at the same time (default: %d)." % (
+            DEFAULT_RANGE_MIN_WORKERS)
+        range_group.add_argument(
+            '--range-min-workers', metavar='NR', type=int, dest='range_min_workers', help=h)
+
         copies_group = self.arg_parser.add_argument_group('Backup copies to store')
 
         copies_group.add_argument(
@@ -177,9 +388,97 @@ class BackupBySftpApp(PbCfgApp):
         if self.args.ssh_key:
             self.handler.key_file = self.args.ssh_key
 
+        if self.args.recursive:
+            self.handler.recursive = True
+
+        if self.args.scan_workers is not None:
+            if self.args.scan_workers < 0:
+                LOG.error("Invalid number %d of scan workers.", self.args.scan_workers)
+            else:
+                self.handler.scan_workers = self.args.scan_workers
+
+        if self.args.resume_window is not None:
+            if self.args.resume_window < 0:
+                LOG.error("Invalid resume window %r.", self.args.resume_window)
+            else:
+                self.handler.resume_window = self.args.resume_window
+
         if self.args.test:
             self.handler.simulate = True
 
+        if self.args.compress:
+            self.handler.compress = True
+        if self.args.compress_workers and self.args.compress_workers > 0:
+            self.handler.compress_workers = self.args.compress_workers
+        if self.args.compress_level is not None:
+            self.handler.compress_level = self.args.compress_level
+        if self.args.compress_adaptive:
+            self.handler.compress = True
+            self.handler.compress_adaptive = True
+
+        if self.args.encrypt_key_file:
+            self.handler.encrypt = True
+            self.handler.encrypt_key_file = self.args.encrypt_key_file
+        if self.args.encrypt_workers and self.args.encrypt_workers > 0:
+            self.handler.encrypt_workers = self.args.encrypt_workers
+
+        if self.args.pack:
+            self.handler.pack = True
+        if self.args.pack_threshold:
+            self.handler.pack_threshold = human2bytes(self.args.pack_threshold)
+        if self.args.pack_archive_size:
+            self.handler.pack_archive_size = human2bytes(self.args.pack_archive_size)
+
+        if self.args.read_ahead_depth is not None:
+            self.handler.read_ahead_depth = self.args.read_ahead_depth
+        if self.args.read_ahead_size:
+            self.handler.read_ahead_size = human2bytes(self.args.read_ahead_size)
+        if self.args.io_mode:
+            self.handler.io_mode = self.args.io_mode
+        if self.args.range_threshold:
+            self.handler.range_threshold = human2bytes(self.args.range_threshold)
+        if self.args.range_size:
+            self.handler.range_size = human2bytes(self.args.range_size)
+        if self.args.range_workers is not None:
+            self.handler.range_workers = self.args.range_workers
+        if self.args.range_adaptive:
+            self.handler.range_adaptive = True
+        if self.args.range_min_workers is not None:
+            self.handler.range_min_workers = self.args.range_min_workers
+        if self.args.checksum:
+            self.handler.checksum = self.args.checksum
+        if self.args.verify:
+            self.handler.verify = True
+        if self.args.index_file:
+            self.handler.index_file = self.args.index_file
+        if self.args.batch_confirm:
+            self.handler.batch_confirm = True
+        if self.args.keepalive is not None:
+            if self.args.keepalive < 0:
+                LOG.error("Invalid keepalive interval %d.", self.args.keepalive)
+            else:
+                self.handler.keepalive = self.args.keepalive
+
+        if self.args.daemon:
+            self.daemon = True
+        if self.args.schedule:
+            try:
+                self.schedule = CronSchedule(self.args.schedule)
+            except ScheduleError as e:
+                LOG.error(str(e))
+        if self.args.watch:
+            self.watch = True
+        if self.args.watch_debounce is not None:
+            if self.args.watch_debounce < 0:
+                LOG.error("Invalid debounce time %r.", self.args.watch_debounce)
+            else:
+                self.watch_debounce = self.args.watch_debounce
+        if self.args.watch_queue is not None:
+            if self.args.watch_queue < 1:
+                LOG.error("Invalid watch queue size %d.", self.args.watch_queue)
+            else:
+                self.watch_queue = self.args.watch_queue
+
         if self.args.copies_yearly and self.args.copies_yearly > 0:
             self.handler.copies['yearly'] = self.args.copies_yearly
         if self.args.copies_monthly and self.args.copies_monthly > 0:
@@ -240,6 +539,36 @@ class BackupBySftpApp(PbCfgApp):
         for section in self.cfg:
 
             if section.lower() == 'global':
+                if 'recursive' in self.cfg[section] and not self.args.recursive:
+                    self.handler.recursive = to_bool(self.cfg[section]['recursive'])
+                if 'checksum' in self.cfg[section] and not self.args.checksum:
+                    try:
+                        self.handler.checksum = self.cfg[section]['checksum']
+                    except ValueError as e:
+                        LOG.error("Error in configuration: [%s]/checksum: %s", section, str(e))
+                if 'report_dir' in self.cfg[section]:
+                    self.handler.report_dir = self.cfg[section]['report_dir']
+                if 'verify' in self.cfg[section] and not self.args.verify:
+                    self.handler.verify = to_bool(self.cfg[section]['verify'])
+                if 'index_file' in self.cfg[section] and not self.args.index_file:
+                    self.handler.index_file = self.cfg[section]['index_file']
+                if 'resume_window' in self.cfg[section] and self.args.resume_window is None:
+                    try:
+                        self.handler.resume_window = float(self.cfg[section]['resume_window'])
+                    except ValueError as e:
+                        LOG.error(
+                            "Error in configuration: [%s]/resume_window %r is not a "
+                            "valid number: %s", section, self.cfg[section]['resume_window'],
+                            str(e))
+                if 'journal_dir' in self.cfg[section]:
+                    self.handler.journal_dir = self.cfg[section]['journal_dir']
+                if 'scan_workers' in self.cfg[section] and self.args.scan_workers is None:
+                    try:
+                        self.handler.scan_workers = int(self.cfg[section]['scan_workers'])
+                    except ValueError as e:
+                        msg = int_msg_tpl % (
+                            section, 'scan_workers', self.cfg[section]['scan_workers'], str(e))
+                        LOG.error(msg)
                 if 'backup_dir' in self.cfg[section] and not self.args.local_dir:
                     self.base_dir = self.cfg[section]['backup_dir']
                     self.handler.local_dir = self.cfg[section]['backup_dir']
@@ -277,6 +606,179 @@ class BackupBySftpApp(PbCfgApp):
                 if 'key_file' in self.cfg[section] and not self.args.ssh_key:
                     self.handler.key_file = self.cfg[section]['key_file']
 
+                if 'batch_confirm' in self.cfg[section] and not self.args.batch_confirm:
+                    self.handler.batch_confirm = to_bool(self.cfg[section]['batch_confirm'])
+
+                if 'keepalive' in self.cfg[section] and self.args.keepalive is None:
+                    try:
+                        self.handler.keepalive = int(self.cfg[section]['keepalive'])
+                    except ValueError as e:
+                        msg = int_msg_tpl % (
+                            'SFTP', 'keepalive', self.cfg[section]['keepalive'], str(e))
+                        LOG.error(msg)
+
+            if section.lower() == 'daemon':
+
+                if 'enabled' in self.cfg[section] and not self.args.daemon:
+                    self.daemon = to_bool(self.cfg[section]['enabled'])
+
+                if 'schedule' in self.cfg[section] and not self.args.schedule:
+                    try:
+                        self.schedule = CronSchedule(self.cfg[section]['schedule'])
+                    except ScheduleError as e:
+                        LOG.error("Error in configuration: [%s]/schedule: %s", section, str(e))
+
+                if 'watch' in self.cfg[section] and not self.args.watch:
+                    self.watch = to_bool(self.cfg[section]['watch'])
+
+                if 'watch_debounce' in self.cfg[section] and self.args.watch_debounce is None:
+                    try:
+                        self.watch_debounce = float(self.cfg[section]['watch_debounce'])
+                    except ValueError as e:
+                        LOG.error(
+                            "Error in configuration: [%s]/watch_debounce %r is not a "
+                            "valid number: %s", section, self.cfg[section]['watch_debounce'],
+                            str(e))
+
+                if 'watch_queue' in self.cfg[section] and self.args.watch_queue is None:
+                    try:
+                        self.watch_queue = int(self.cfg[section]['watch_queue'])
+                    except ValueError as e:
+                        msg = int_msg_tpl % (
+                            section, 'watch_queue', self.cfg[section]['watch_queue'], str(e))
+                        LOG.error(msg)
+
+            if section.lower() == 'compression':
+
+                if 'compress' in self.cfg[section] and not self.args.compress:
+                    self.handler.compress = to_bool(self.cfg[section]['compress'])
+
+                if 'workers' in self.cfg[section] and not self.args.compress_workers:
+                    try:
+                        self.handler.compress_workers = int(self.cfg[section]['workers'])
+                    except ValueError as e:
+                        msg = int_msg_tpl % (
+                            'Compression', 'workers', self.cfg[section]['workers'], str(e))
+                        LOG.error(msg)
+
+                if 'adaptive' in self.cfg[section] and not self.args.compress_adaptive:
+                    self.handler.compress_adaptive = to_bool(self.cfg[section]['adaptive'])
+
+                if 'history_file' in self.cfg[section]:
+                    self.handler.compress_history_file = self.cfg[section]['history_file']
+
+                if 'level' in self.cfg[section] and self.args.compress_level is None:
+                    try:
+                        self.handler.compress_level = int(self.cfg[section]['level'])
+                    except ValueError as e:
+                        msg = int_msg_tpl % (
+                            'Compression', 'level', self.cfg[section]['level'], str(e))
+                        LOG.error(msg)
+
+            if section.lower() == 'encryption':
+
+                if 'key_file' in self.cfg[section] and not self.args.encrypt_key_file:
+                    self.handler.encrypt_key_file = self.cfg[section]['key_file']
+                    self.handler.encrypt = True
+                    if 'encrypt' in self.cfg[section]:
+                        self.handler.encrypt = to_bool(self.cfg[section]['encrypt'])
+
+                if 'workers' in self.cfg[section] and not self.args.encrypt_workers:
+                    try:
+                        self.handler.encrypt_workers = int(self.cfg[section]['workers'])
+                    except ValueError as e:
+                        msg = int_msg_tpl % (
+                            'Encryption', 'workers', self.cfg[section]['workers'], str(e))
+                        LOG.error(msg)
+
+            if section.lower() == 'packing':
+
+                if 'pack' in self.cfg[section] and not self.args.pack:
+                    self.handler.pack = to_bool(self.cfg[section]['pack'])
+
+                if 'threshold' in self.cfg[section] and not self.args.pack_threshold:
+                    try:
+                        self.handler.pack_threshold = human2bytes(self.cfg[section]['threshold'])
+                    except ValueError as e:
+                        msg = "Error in configuration: [Packing]/threshold %r: %s" % (
+                            self.cfg[section]['threshold'], str(e))
+                        LOG.error(msg)
+
+                if 'archive_size' in self.cfg[section] and not self.args.pack_archive_size:
+                    try:
+                        self.handler.pack_archive_size = human2bytes(
+                            self.cfg[section]['archive_size'])
+                    except ValueError as e:
+                        msg = "Error in configuration: [Packing]/archive_size %r: %s" % (
+                            self.cfg[section]['archive_size'], str(e))
+                        LOG.error(msg)
+
+            if section.lower() == 'reading':
+
+                if 'read_ahead' in self.cfg[section] and self.args.read_ahead_depth is None:
+                    try:
+                        self.handler.read_ahead_depth = int(self.cfg[section]['read_ahead'])
+                    except ValueError as e:
+                        msg = int_msg_tpl % (
+                            section, 'read_ahead', self.cfg[section]['read_ahead'], str(e))
+                        LOG.error(msg)
+
+                if 'read_ahead_size' in self.cfg[section] and not self.args.read_ahead_size:
+                    try:
+                        self.handler.read_ahead_size = human2bytes(
+                            self.cfg[section]['read_ahead_size'])
+                    except ValueError as e:
+                        msg = "Error in configuration: [%s]/read_ahead_size %r: %s" % (
+                            section, self.cfg[section]['read_ahead_size'], str(e))
+                        LOG.error(msg)
+
+                if 'io_mode' in self.cfg[section] and not self.args.io_mode:
+                    io_mode = self.cfg[section]['io_mode'].strip().lower()
+                    if io_mode in IO_MODES:
+                        self.handler.io_mode = io_mode
+                    else:
+                        LOG.error(
+                            "Error in configuration: [%s]/io_mode %r is not one of %s.",
+                            section, self.cfg[section]['io_mode'], ', '.join(IO_MODES))
+
+            if section.lower() == 'ranges':
+
+                if 'threshold' in self.cfg[section] and not self.args.range_threshold:
+                    try:
+                        self.handler.range_threshold = human2bytes(
+                            self.cfg[section]['threshold'])
+                    except ValueError as e:
+                        msg = "Error in configuration: [%s]/threshold %r: %s" % (
+                            section, self.cfg[section]['threshold'], str(e))
+                        LOG.error(msg)
+
+                if 'size' in self.cfg[section] and not self.args.range_size:
+                    try:
+                        self.handler.range_size = human2bytes(self.cfg[section]['size'])
+                    except ValueError as e:
+                        msg = "Error in configuration: [%s]/size %r: %s" % (
+                            section, self.cfg[section]['size'], str(e))
+                        LOG.error(msg)
+
+                if 'workers' in self.cfg[section] and self.args.range_workers is None:
+                    try:
+                        self.handler.range_workers = int(self.cfg[section]['workers'])
+                    except ValueError as e:
+                        msg = int_msg_tpl % (
+                            section, 'workers', self.cfg[section]['workers'], str(e))
+                        LOG.error(msg)
+
+                if 'adaptive' in self.cfg[section] and not self.args.range_adaptive:
+                    self.handler.range_adaptive = to_bool(self.cfg[section]['adaptive'])
+
+                if 'min_workers' in self.cfg[section] and self.args.range_min_workers is None:
+                    try:
+                        self.handler.range_min_workers = int(self.cfg[section]['min_workers'])
+                    except ValueError as e:
+                        msg = int_msg_tpl % (
+                            section, 'min_workers', self.cfg[section]['min_workers'], str(e))
+                        LOG.error(msg)
+
             if section.lower() == 'copies':
 
                 if 'yearly' in self.cfg[section] and not self.args.copies_yearly:
@@ -333,40 +835,125 @@ class BackupBySftpApp(PbCfgApp):
     def _run(self):
         """The underlaying startpoint of the application."""
 
-        re_whitespace = re.compile(r'\s+')
+        if self.daemon or self.watch:
+            self.run_daemon()
+            return
+
+        # The local directory is scanned in the background during
+        # connecting and cleaning up the remote side.
+        scanner = self.start_scanner()
 
         try:
             self.handler.connect()
-        except(PermissionError, SFTPLocalPathError) as e:
+        except (PermissionError, SFTPLocalPathError) as e:
+            scanner.close()
             self.exit(1, str(e))
 
-        LOG.info("Starting ...")
+        try:
+            self.backup(scanner)
+        finally:
+            scanner.close()
+            self.handler.disconnect()
 
-        subdir = socket.gethostname()
+    # -------------------------------------------------------------------------
+    def start_scanner(self):
 
+        scanner = ScanQueue(
+            self.handler.local_dir, recursive=self.handler.recursive, verbose=self.verbose,
+            stat_workers=self.handler.scan_workers)
+        scanner.start()
+        return scanner
+
+    # -------------------------------------------------------------------------
+    def run_daemon(self):
+        """
+        Performs the backups on the schedule with one SSH connection, which
+        is kept alive and reestablished, if it was lost.
+        """
+
+        LOG.info("Starting the daemon with schedule %r ...", self.schedule.expression)
+        self.handler.cache_remote = True
         try:
-            if self.handler.exists(subdir):
-                LOG.debug("Remote file %r exists.", subdir)
-                if self.handler.is_dir(subdir):
-                    LOG.debug("Remote file %r is a directory.", subdir)
-                else:
-                    msg = "Remote file %r is NOT a directory." % (subdir)
-                    self.exit(5, msg)
-            else:
-                LOG.warn("Remote file %r does not exists.", subdir)
-                self.handler.mkdir(subdir)
+            self.handler.ensure_connected()
+        except (PermissionError, SFTPLocalPathError) as e:
+            self.exit(1, str(e))
 
-            self.handler.remote_dir = subdir
-            subdir = self.handler.remote_dir
-            LOG.info("Current main remote directory is now %r.", str(self.handler.remote_dir))
+        idle_interval = DEFAULT_IDLE_INTERVAL
+        if self.watch:
+            try:
+                self.watcher = DirectoryWatcher(
+                    self.handler.local_dir, recursive=self.handler.recursive,
+                    debounce=self.watch_debounce, max_queue=self.watch_queue)
+                self.watcher.start()
+            except WatchError as e:
+                self.exit(1, str(e))
+            # New files are picked up every second
+            idle_interval = 1
+
+        # In watch mode the first backup creates the directory for the new files
+        self.runner = ScheduleRunner(
+            self.schedule, self.scheduled_backup, idle=self.daemon_idle,
+            idle_interval=idle_interval, run_at_start=self.watch)
+        signal.signal(signal.SIGTERM, self.runner.stop)
+        try:
+            self.runner.run()
+        except KeyboardInterrupt:
+            LOG.info("Interrupted.")
+        finally:
+            if self.watcher is not None:
+                self.watcher.close()
+            if self.handler.connected:
+                self.handler.disconnect()
+
+    # -------------------------------------------------------------------------
+    def daemon_idle(self):
+        """
+        Uploads the watched files, which are ready, and checks the connection
+        from time to time between the scheduled backups.
+        """
+
+        files = []
+        if self.watcher is not None:
+            files = self.watcher.take()
+        now = time.time()
+        if not files and now - self._last_check < DEFAULT_IDLE_INTERVAL:
+            return
+        self._last_check = now
+        if self.handler.ensure_connected():
+            LOG.info("Reconnected to %r.", self.handler.host)
+        if not files:
+            return
+
+        LOG.info("Uploading %d new files from the watched directory ...", len(files))
+        try:
+            self.handler.put_watched(files)
+        except Exception:
+            # The already uploaded files of this batch are uploaded once more
+            self.watcher.retry(files)
+            raise
 
-            self.handler.cleanup_old_backupdirs()
-            self.handler.do_backup()
-            self.handler.remote_dir = subdir
-            self.handler.show_disk_usage()
+    # -------------------------------------------------------------------------
+    def scheduled_backup(self):
 
+        scanner = self.start_scanner()
+        try:
+            self.handler.start_run()
+            if self.handler.ensure_connected():
+                LOG.info("Reconnected to %r.", self.handler.host)
+            self.backup(scanner)
         finally:
-            self.handler.disconnect()
+            scanner.close()
+
+    # -------------------------------------------------------------------------
+    def backup(self, scanner):
+        """Performs one backup with an established connection."""
+
+        LOG.info("Starting ...")
+
+        try:
+            self.handler.run_backup(socket.gethostname(), scanner)
+        except SFTPRemotePathError as e:
+            self.exit(5, str(e))
 
     # -------------------------------------------------------------------------
     def post_run(self):
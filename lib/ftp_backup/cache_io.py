@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Module for reading local files without polluting the page cache
+
+In the I/O mode 'nocache' the kernel is advised to read the file
+sequentially, and the pages behind the read cursor are dropped from the
+page cache with POSIX_FADV_DONTNEED. In the I/O mode 'direct' the file is
+additionally opened with O_DIRECT and read in aligned blocks.
+
+Before a file is read, its pages already found in the page cache are
+counted with mincore(2), to report cache hits.
+
+In the I/O mode 'mmap' the file is read through a memory mapping.
+"""
+
+# Standard modules
+import logging
+import os
+import io
+import mmap
+import errno
+import ctypes
+import ctypes.util
+import threading
+
+# Third party modules
+
+# Own modules
+from pb_base.errors import PbError
+
+from ftp_backup.checksum import HashingReader, MmapHashReader
+
+__version__ = '0.2.0'
+
+LOG = logging.getLogger(__name__)
+
+IO_MODE_BUFFERED = 'buffered'
+IO_MODE_NOCACHE = 'nocache'
+IO_MODE_DIRECT = 'direct'
+IO_MODE_MMAP = 'mmap'
+IO_MODES = (IO_MODE_BUFFERED, IO_MODE_NOCACHE, IO_MODE_DIRECT, IO_MODE_MMAP)
+DEFAULT_IO_MODE = IO_MODE_BUFFERED
+
+DEFAULT_DROP_WINDOW = 8 * 1024 * 1024
+CACHE_CHECK_WINDOW = 1024 * 1024 * 1024
+DEFAULT_IO_BUFSIZE = 1024 * 1024
+PAGE_SIZE = mmap.PAGESIZE
+DIRECT_ALIGNMENT = 4096
+
+_libc = None
+
+
+# =============================================================================
+class CacheIOError(PbError):
+    """
+    Base exception class for all exceptions belonging to issues
+    in this module
+    """
+    pass
+
+
+# =============================================================================
+def _get_libc():
+
+    global _libc
+    if _libc is not None:
+        return _libc or None
+
+    _libc = False
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        libc.mmap.restype = ctypes.c_void_p
+        libc.mmap.argtypes = [
+            ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int,
+            ctypes.c_int, ctypes.c_long]
+        libc.munmap.restype = ctypes.c_int
+        libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+        libc.mincore.restype = ctypes.c_int
+        libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_char_p]
+        _libc = libc
+    except (OSError, AttributeError) as e:
+        LOG.debug("Could not load mincore() from the C library: %s", str(e))
+
+    return _libc or None
+
+
+# =============================================================================
+def resident_bytes(fd, offset, length):
+    """
+    Returns the number of Bytes of the given range of the file, which are
+    already in the page cache, or None, if it could not be detected.
+    The offset must be aligned to the page size.
+    """
+
+    libc = _get_libc()
+    if not libc or length <= 0:
+        return None
+
+    addr = libc.mmap(None, length, mmap.PROT_READ, mmap.MAP_SHARED, fd, offset)
+    if addr is None or addr == ctypes.c_void_p(-1).value:
+        return None
+    try:
+        pages = (length + PAGE_SIZE - 1) // PAGE_SIZE
+        vec = ctypes.create_string_buffer(pages)
+        if libc.mincore(addr, length, vec) != 0:
+            return None
+        # Only the lowest bit is defined, the others are reserved and zero
+        resident = pages - vec.raw.count(b'\0')
+    finally:
+        libc.munmap(addr, length)
+
+    return min(resident * PAGE_SIZE, length)
+
+
+# =============================================================================
+class CacheStats(object):
+    """Statistics about the page cache usage of all read local files."""
+
+    # -------------------------------------------------------------------------
+    def __init__(self):
+
+        self.files = 0
+        self.bytes_read = 0
+        self.bytes_checked = 0
+        self.bytes_cached = 0
+        self.bytes_dropped = 0
+        self._lock = threading.Lock()
+
+    # -------------------------------------------------------------------------
+    def add(self, bytes_read=0, bytes_checked=0, bytes_cached=0, bytes_dropped=0, files=0):
+
+        with self._lock:
+            self.files += files
+            self.bytes_read += bytes_read
+            self.bytes_checked += bytes_checked
+            self.bytes_cached += bytes_cached
+            self.bytes_dropped += bytes_dropped
+
+    # -------------------------------------------------------------------------
+    def hit_ratio(self):
+        """The ratio of the read Bytes, which were found in the page cache."""
+
+        if not self.bytes_checked:
+            return None
+        return float(self.bytes_cached) / float(self.bytes_checked)
+
+    # -------------------------------------------------------------------------
+    def log(self, io_mode=None):
+
+        if not self.files:
+            return
+        ratio = self.hit_ratio()
+        ratio_out = 'unknown'
+        if ratio is not None:
+            ratio_out = '%.1f%%' % (ratio * 100)
+        LOG.info(
+            "Page cache (I/O mode %s): read %d Bytes of %d files, cache hits %s, "
+            "dropped %d Bytes from the cache.", io_mode or DEFAULT_IO_MODE,
+            self.bytes_read, self.files, ratio_out, self.bytes_dropped)
+
+
+# =============================================================================
+class CacheFriendlyReader(io.RawIOBase):
+    """
+    Raw file object for reading a local file sequentially, dropping all
+    pages behind the read cursor from the page cache.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, filename, direct=False, window=DEFAULT_DROP_WINDOW, stats=None):
+
+        super(CacheFriendlyReader, self).__init__()
+
+        window = int(window)
+        if window < DIRECT_ALIGNMENT or window % DIRECT_ALIGNMENT:
+            msg = "Invalid window size %r, must be a multiple of %d." % (window, DIRECT_ALIGNMENT)
+            raise ValueError(msg)
+
+        self.filename = str(filename)
+        self.window = window
+        self.stats = stats
+        self.direct = False
+
+        self.bytes_read = 0
+        self.bytes_checked = 0
+        self.bytes_cached = 0
+        self.bytes_dropped = 0
+
+        self._fd = None
+        self._pos = 0
+        self._dropped_until = 0
+        self._aligned = None
+        self._direct_pos = 0
+        self._direct_len = 0
+
+        flags = os.O_RDONLY
+        if direct and hasattr(os, 'O_DIRECT'):
+            try:
+                self._fd = os.open(self.filename, flags | os.O_DIRECT)
+                self.direct = True
+            except OSError as e:
+                if e.errno != errno.EINVAL:
+                    raise
+                LOG.debug("O_DIRECT not supported for %r, reading buffered.", self.filename)
+        if self._fd is None:
+            self._fd = os.open(self.filename, flags)
+
+        if self.direct:
+            # Anonymous mappings are always aligned to the page size
+            self._aligned = mmap.mmap(-1, window)
+        self._check_cache()
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(self._fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+    # -------------------------------------------------------------------------
+    def readable(self):
+        return True
+
+    # -------------------------------------------------------------------------
+    def fileno(self):
+        return self._fd
+
+    # -------------------------------------------------------------------------
+    def _check_cache(self):
+
+        # The whole file is checked before reading, because the kernel
+        # read ahead would fill the cache in front of the read cursor.
+        size = os.fstat(self._fd).st_size
+        offset = 0
+        while offset < size:
+            length = min(CACHE_CHECK_WINDOW, size - offset)
+            resident = resident_bytes(self._fd, offset, length)
+            if resident is None:
+                return
+            self.bytes_checked += length
+            self.bytes_cached += resident
+            offset += length
+
+    # -------------------------------------------------------------------------
+    def _drop_behind(self, final=False):
+
+        if not hasattr(os, 'posix_fadvise'):
+            return
+        end = self._pos
+        if not final:
+            end -= end % self.window
+        if end <= self._dropped_until:
+            return
+        os.posix_fadvise(
+            self._fd, self._dropped_until, end - self._dropped_until, os.POSIX_FADV_DONTNEED)
+        self.bytes_dropped += end - self._dropped_until
+        self._dropped_until = end
+
+    # -------------------------------------------------------------------------
+    def _read_direct(self, buf):
+
+        # Reads with O_DIRECT must use aligned buffers, offsets and sizes,
+        # so the file is read window by window into an aligned buffer.
+        if self._direct_pos >= self._direct_len:
+            self._direct_len = os.readv(self._fd, [self._aligned])
+            self._direct_pos = 0
+            if not self._direct_len:
+                return 0
+        length = min(len(buf), self._direct_len - self._direct_pos)
+        end = self._direct_pos + length
+        memoryview(buf)[:length] = memoryview(self._aligned)[self._direct_pos:end]
+        self._direct_pos = end
+        return length
+
+    # -------------------------------------------------------------------------
+    def readinto(self, buf):
+
+        if self.closed:
+            raise ValueError("I/O operation on a closed file.")
+
+        if self.direct:
+            length = self._read_direct(buf)
+        else:
+            length = os.readv(self._fd, [buf])
+
+        self._pos += length
+        self.bytes_read += length
+        self._drop_behind(final=not length)
+        return length
+
+    # -------------------------------------------------------------------------
+    def close(self):
+
+        if self.closed:
+            return
+        try:
+            if self._fd is not None:
+                self._drop_behind(final=True)
+                os.close(self._fd)
+                self._fd = None
+            if self._aligned is not None:
+                self._aligned.close()
+                self._aligned = None
+            if self.stats is not None:
+                self.stats.add(
+                    bytes_read=self.bytes_read, bytes_checked=self.bytes_checked,
+                    bytes_cached=self.bytes_cached, bytes_dropped=self.bytes_dropped, files=1)
+        finally:
+            super(CacheFriendlyReader, self).close()
+
+
+# =============================================================================
+def open_local_file(
+        filename, io_mode=DEFAULT_IO_MODE, stats=None, bufsize=DEFAULT_IO_BUFSIZE,
+        algorithm=None):
+    """
+    Opens the given local file for reading in the given I/O mode.
+
+    With a checksum algorithm the checksum of the read content is computed
+    on the way, it is available by the hexdigest() method of the returned
+    file object.
+
+    @return: a binary file object
+    """
+
+    if io_mode not in IO_MODES:
+        raise CacheIOError("Invalid I/O mode %r." % (io_mode))
+
+    if io_mode == IO_MODE_MMAP:
+        return MmapHashReader(filename, algorithm)
+
+    if io_mode == IO_MODE_BUFFERED:
+        fh = open(str(filename), 'rb')
+    else:
+        raw = CacheFriendlyReader(filename, direct=(io_mode == IO_MODE_DIRECT), stats=stats)
+        fh = io.BufferedReader(raw, buffer_size=bufsize)
+
+    if algorithm:
+        return HashingReader(fh, algorithm)
+    return fh
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Module for computing the checksums of local files while they
+          are read for uploading, so they never have to be read twice
+"""
+
+# Standard modules
+import logging
+import os
+import mmap
+import hashlib
+
+# Third party modules
+
+# Own modules
+from pb_base.errors import PbError
+
+__version__ = '0.1.0'
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_CHECKSUM_ALGORITHM = 'sha256'
+CHECKSUM_ALGORITHMS = ('md5', 'sha1', 'sha256', 'sha512')
+
+
+# =============================================================================
+class ChecksumError(PbError):
+    """
+    Base exception class for all exceptions belonging to issues
+    in this module
+    """
+    pass
+
+
+# =============================================================================
+def new_hash(algorithm):
+
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        msg = "Invalid checksum algorithm %r, must be one of %s." % (
+            algorithm, ', '.join(CHECKSUM_ALGORITHMS))
+        raise ChecksumError(msg)
+    return hashlib.new(algorithm)
+
+
+# =============================================================================
+def local_digest(fileobj):
+    """Returns the hex digest of a hashing reader or None for other file objects."""
+
+    if hasattr(fileobj, 'hexdigest'):
+        return fileobj.hexdigest()
+    return None
+
+
+# =============================================================================
+class HashingReader(object):
+    """
+    File like object for reading another file object, computing the
+    checksum of all read data on the way. The underlying file object is
+    closed together with this object.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, fileobj, algorithm=DEFAULT_CHECKSUM_ALGORITHM):
+
+        self.fileobj = fileobj
+        self.algorithm = algorithm
+        self._hash = new_hash(algorithm)
+
+    # -------------------------------------------------------------------------
+    def read(self, size=-1):
+
+        data = self.fileobj.read(size)
+        self._hash.update(data)
+        return data
+
+    # -------------------------------------------------------------------------
+    def readinto(self, buf):
+
+        length = self.fileobj.readinto(buf)
+        if length:
+            self._hash.update(memoryview(buf)[:length])
+        return length
+
+    # -------------------------------------------------------------------------
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+    # -------------------------------------------------------------------------
+    def close(self):
+        self.fileobj.close()
+
+    # -------------------------------------------------------------------------
+    def __enter__(self):
+        return self
+
+    # -------------------------------------------------------------------------
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# =============================================================================
+class MmapHashReader(object):
+    """
+    File like object for reading a local file through a memory mapping.
+
+    The data are delivered as memoryview slices of the mapping, and the
+    checksum is computed from the same pages, without copying the data.
+
+    The local file must not be truncated during reading.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, filename, algorithm=DEFAULT_CHECKSUM_ALGORITHM):
+
+        self.filename = str(filename)
+        self.algorithm = algorithm
+        self._hash = None
+        if algorithm:
+            self._hash = new_hash(algorithm)
+
+        self._pos = 0
+        self._map = None
+        self._view = None
+        self._closed = False
+
+        with open(self.filename, 'rb') as fh:
+            self.size = os.fstat(fh.fileno()).st_size
+            # Empty files cannot be mapped
+            if self.size:
+                self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map is not None:
+            if hasattr(self._map, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+                self._map.madvise(mmap.MADV_SEQUENTIAL)
+            self._view = memoryview(self._map)
+
+    # -----------------------------------------------------------
+    @property
+    def closed(self):
+        return self._closed
+
+    # -------------------------------------------------------------------------
+    def read(self, size=-1):
+
+        if self._closed:
+            raise ChecksumError("I/O operation on a closed %s." % (self.__class__.__name__))
+        if self._view is None or self._pos >= self.size:
+            return b''
+
+        end = self.size
+        if size is not None and size >= 0:
+            end = min(self.size, self._pos + size)
+        data = self._view[self._pos:end]
+        self._pos = end
+        if self._hash is not None:
+            self._hash.update(data)
+        return data
+
+    # -------------------------------------------------------------------------
+    def readinto(self, buf):
+
+        data = self.read(len(buf))
+        length = len(data)
+        memoryview(buf)[:length] = data
+        return length
+
+    # -------------------------------------------------------------------------
+    def hexdigest(self):
+
+        if self._hash is None:
+            return None
+        return self._hash.hexdigest()
+
+    # -------------------------------------------------------------------------
+    def close(self):
+
+        if self._closed:
+            return
+        self._closed = True
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # Slices are still referenced somewhere, the mapping
+                # is released by the garbage collector.
+                LOG.debug("Memory mapping of %r still in use.", self.filename)
+            self._map = None
+
+    # -------------------------------------------------------------------------
+    def __enter__(self):
+        return self
+
+    # -------------------------------------------------------------------------
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Module for block parallel gzip compression of files to upload
+"""
+
+# Standard modules
+import logging
+import os
+import time
+import zlib
+import json
+import threading
+import multiprocessing
+
+# Third party modules
+
+# Own modules
+from pb_base.errors import PbError
+
+from ftp_backup import DEFAULT_STATE_DIRECTORY
+
+from ftp_backup.block_reader import ParallelBlockReader, MAX_BLOCK_WORKERS
+
+__version__ = '0.3.1'
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_COMPRESS_LEVEL = 6
+DEFAULT_COMPRESS_BLOCKSIZE = 1024 * 1024
+DEFAULT_COMPRESS_WORKERS = multiprocessing.cpu_count()
+MAX_COMPRESS_WORKERS = MAX_BLOCK_WORKERS
+
+COMPRESS_MODE_STORE = 'store'
+COMPRESS_MODE_FAST = 'fast'
+COMPRESS_MODE_STRONG = 'strong'
+
+# The gzip level for every compression mode, None means uncompressed
+COMPRESS_MODE_LEVELS = {
+    COMPRESS_MODE_STORE: None,
+    COMPRESS_MODE_FAST: 1,
+    COMPRESS_MODE_STRONG: 9,
+}
+
+DEFAULT_PROBE_SAMPLE_SIZE = 64 * 1024
+DEFAULT_PROBE_SAMPLES = 3
+
+# Files with an estimated ratio above this are stored uncompressed,
+# files below STRONG_THRESHOLD are compressed strong, all other fast.
+STORE_THRESHOLD = 0.9
+STRONG_THRESHOLD = 0.5
+
+DEFAULT_COMPRESS_HISTORY_FILE = DEFAULT_STATE_DIRECTORY / 'compression-history.json'
+# Entries of the history not used for this number of seconds are dropped
+DEFAULT_COMPRESS_HISTORY_MAX_AGE = 90 * 24 * 3600
+
+# Window bits for zlib to create a complete gzip member (header and trailer)
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+# =============================================================================
+class CompressError(PbError):
+    """
+    Base exception class for all exceptions belonging to issues
+    in this module
+    """
+    pass
+
+
+# =============================================================================
+def compress_block(data, level=DEFAULT_COMPRESS_LEVEL):
+    """
+    Compresses the given data into a complete gzip member.
+
+    Concatenated gzip members are a valid gzip stream (RFC 1952), so
+    independently compressed blocks can be joined in the right order.
+    zlib releases the GIL during compression, so this can be
+    executed in a thread pool.
+    """
+
+    compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+# =============================================================================
+class ParallelGzipReader(ParallelBlockReader):
+    """
+    File like object for reading the gzip compressed content of another
+    file object, which is compressed blockwise in a thread pool in the pigz style.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(
+        self, fileobj, workers=DEFAULT_COMPRESS_WORKERS, level=DEFAULT_COMPRESS_LEVEL,
+            blocksize=DEFAULT_COMPRESS_BLOCKSIZE, max_pending=None):
+
+        level = int(level)
+        if level < 0 or level > 9:
+            msg = "Invalid compression level %r, must be between 0 and 9." % (level)
+            raise ValueError(msg)
+        self.level = level
+        self.start_time = time.time()
+
+        super(ParallelGzipReader, self).__init__(
+            fileobj, workers=workers, blocksize=blocksize, max_pending=max_pending)
+
+    # -------------------------------------------------------------------------
+    def process_block(self, data, index, last):
+        return compress_block(data, self.level)
+
+    # -------------------------------------------------------------------------
+    def ratio(self):
+        """The ratio between compressed and uncompressed size."""
+
+        if not self.bytes_in:
+            return 1.0
+        return float(self.bytes_out) / float(self.bytes_in)
+
+    # -------------------------------------------------------------------------
+    def log_stats(self):
+        """Logs the compression ratio and throughput of this reader."""
+
+        duration = time.time() - self.start_time
+        mb_s = 0.0
+        if duration > 0:
+            mb_s = float(self.bytes_in) / duration / 1024 / 1024
+        LOG.debug(
+            "Compressed %d Bytes to %d Bytes (%.1f %%) in %d blocks with %d workers, "
+            "%.1f MiB/s.", self.bytes_in, self.bytes_out, self.ratio() * 100,
+            self.blocks, self.workers, mb_s)
+
+
+# =============================================================================
+def estimate_ratio(fh, size, sample_size=DEFAULT_PROBE_SAMPLE_SIZE, samples=DEFAULT_PROBE_SAMPLES):
+    """
+    Estimates the compression ratio of an open file by compressing some
+    samples from the beginning, the middle and the end of it with the
+    fastest compression level.
+    """
+
+    offsets = [0]
+    if size > sample_size * samples:
+        step = (size - sample_size) // (samples - 1)
+        offsets = [i * step for i in range(samples)]
+
+    bytes_in = 0
+    bytes_out = 0
+    for offset in offsets:
+        fh.seek(offset)
+        if len(offsets) == 1:
+            data = fh.read()
+        else:
+            data = fh.read(sample_size)
+        if not data:
+            continue
+        compressor = zlib.compressobj(1)
+        bytes_in += len(data)
+        bytes_out += len(compressor.compress(data) + compressor.flush())
+    fh.seek(0)
+
+    if not bytes_in:
+        return 1.0
+    return float(bytes_out) / float(bytes_in)
+
+
+# =============================================================================
+def mode_by_ratio(ratio):
+    """Returns the compression mode for the given (estimated) ratio."""
+
+    if ratio >= STORE_THRESHOLD:
+        return COMPRESS_MODE_STORE
+    if ratio < STRONG_THRESHOLD:
+        return COMPRESS_MODE_STRONG
+    return COMPRESS_MODE_FAST
+
+
+# =============================================================================
+class CompressionHistory(object):
+    """
+    Local history of the compression decisions and the observed compression
+    ratios, keyed by the path of the local file, so that files need to be
+    probed only on their first backup. A file is probed again, if its size
+    or modification time changed. Entries of vanished files and entries not
+    used for max_age seconds are dropped on saving.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(
+            self, filename=DEFAULT_COMPRESS_HISTORY_FILE, sample_size=DEFAULT_PROBE_SAMPLE_SIZE,
+            max_age=DEFAULT_COMPRESS_HISTORY_MAX_AGE):
+
+        self.filename = str(filename)
+        self.sample_size = int(sample_size)
+        self.max_age = max_age
+        self.entries = {}
+        self.probes = 0
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._changed = False
+
+        self.load()
+
+    # -------------------------------------------------------------------------
+    def load(self):
+
+        if not os.path.exists(self.filename):
+            LOG.debug("Compression history %r does not exists yet.", self.filename)
+            return
+
+        try:
+            with open(self.filename, 'r') as fh:
+                entries = json.load(fh)
+        except (IOError, ValueError) as e:
+            LOG.warning("Could not read compression history %r: %s", self.filename, str(e))
+            return
+
+        if isinstance(entries, dict):
+            self.entries = entries
+        LOG.debug(
+            "Loaded %d entries from compression history %r.", len(self.entries), self.filename)
+
+    # -------------------------------------------------------------------------
+    def prune(self, now=None):
+        """
+        Removes the entries of files, which don't exist anymore or were not
+        used for max_age seconds.
+
+        @return: the number of removed entries
+        @rtype: int
+        """
+
+        if now is None:
+            now = time.time()
+        removed = 0
+        with self._lock:
+            for (path, entry) in list(self.entries.items()):
+                updated = entry.get('updated') or 0
+                if (self.max_age and now - updated > self.max_age) or not os.path.exists(path):
+                    del self.entries[path]
+                    removed += 1
+            if removed:
+                self._changed = True
+        if removed:
+            LOG.debug("Removed %d old entries from the compression history.", removed)
+        return removed
+
+    # -------------------------------------------------------------------------
+    def save(self):
+
+        self.prune()
+        with self._lock:
+            if not self._changed:
+                return
+            dirname = os.path.dirname(self.filename)
+            if dirname and not os.path.isdir(dirname):
+                os.makedirs(dirname, 0o700)
+            tmp_file = self.filename + '.new'
+            with open(tmp_file, 'w') as fh:
+                json.dump(self.entries, fh, indent=1, sort_keys=True)
+            os.rename(tmp_file, self.filename)
+            self._changed = False
+
+        LOG.debug(
+            "Saved compression history %r (%d probes, %d hits).",
+            self.filename, self.probes, self.hits)
+
+    # -------------------------------------------------------------------------
+    def get_mode(self, local_file):
+        """
+        Returns the compression mode for the given local file, either from
+        the history, if the file was not changed since, or by probing the file.
+        """
+
+        path = os.path.abspath(str(local_file))
+        st = os.stat(path)
+        with self._lock:
+            entry = self.entries.get(path)
+            if entry and entry.get('mode') in COMPRESS_MODE_LEVELS and (
+                    entry.get('size'), entry.get('mtime')) == (st.st_size, st.st_mtime):
+                self.hits += 1
+                entry['updated'] = int(time.time())
+                self._changed = True
+                return entry['mode']
+
+        with open(path, 'rb') as fh:
+            ratio = estimate_ratio(fh, st.st_size, self.sample_size)
+        mode = mode_by_ratio(ratio)
+        LOG.debug("Estimated compression ratio of %r: %.1f %% -> %r.", path, ratio * 100, mode)
+
+        with self._lock:
+            self.probes += 1
+            self.entries[path] = {
+                'mode': mode,
+                'estimated': round(ratio, 4),
+                'ratio': None,
+                'size': st.st_size,
+                'mtime': st.st_mtime,
+                'updated': int(time.time()),
+            }
+            self._changed = True
+
+        return mode
+
+    # -------------------------------------------------------------------------
+    def record(self, local_file, mode, ratio=None):
+        """
+        Records the observed compression ratio of an uploaded file. If the
+        compression was not worth it, the file is stored uncompressed next time.
+        """
+
+        path = os.path.abspath(str(local_file))
+        if ratio is not None and mode != COMPRESS_MODE_STORE and ratio >= STORE_THRESHOLD:
+            LOG.debug(
+                "Compression of %r gave only %.1f %%, storing it next time uncompressed.",
+                path, ratio * 100)
+            mode = COMPRESS_MODE_STORE
+
+        with self._lock:
+            entry = self.entries.setdefault(path, {})
+            entry['mode'] = mode
+            if ratio is not None:
+                entry['ratio'] = round(ratio, 4)
+            entry['updated'] = int(time.time())
+            self._changed = True
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Module for an adaptive limit of the number of concurrent transfers
+
+The limit is adjusted after every interval by the measured aggregate
+throughput of all transfers (AIMD): it is increased by one, if all allowed
+transfers were running and the throughput didn't drop, it is reduced
+multiplicatively after failed transfers, e.g. by '421 Too many connections',
+or if the throughput dropped compared to the previous interval.
+"""
+
+# Standard modules
+import logging
+import time
+import threading
+
+# Third party modules
+
+# Own modules
+from pb_base.common import bytes2human
+
+from pb_base.errors import PbError
+
+__version__ = '0.1.0'
+
+LOG = logging.getLogger(__name__)
+
+# Length of an interval of measuring the throughput in seconds
+DEFAULT_CONTROL_INTERVAL = 5.0
+# Additive increase of the limit
+DEFAULT_INCREASE = 1
+# Multiplicative decrease of the limit on errors or a slowdown
+DEFAULT_DECREASE = 0.5
+# Throughput relative to the previous interval regarded as a slowdown
+DEFAULT_SLOWDOWN = 0.8
+
+DECISION_INCREASE = 'increase'
+DECISION_DECREASE = 'decrease'
+DECISION_HOLD = 'hold'
+
+
+# =============================================================================
+class ConcurrencyError(PbError):
+    """
+    Base exception class for all exceptions belonging to issues
+    in this module
+    """
+    pass
+
+
+# =============================================================================
+class AdaptiveConcurrency(object):
+    """
+    Thread safe limit of the number of concurrent transfers between
+    min_workers and max_workers, adjusted by the throughput and the errors
+    of the transfers. Every transfer is wrapped by acquire() and release(),
+    its progress is reported by transferred().
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(
+            self, min_workers, max_workers, initial=None, interval=DEFAULT_CONTROL_INTERVAL,
+            increase=DEFAULT_INCREASE, decrease=DEFAULT_DECREASE, slowdown=DEFAULT_SLOWDOWN,
+            name='transfers', clock=time.time):
+
+        if min_workers < 1 or max_workers < min_workers:
+            raise ConcurrencyError("Invalid bounds %r and %r of the concurrency." % (
+                min_workers, max_workers))
+        if not 0 < decrease < 1:
+            raise ConcurrencyError("Invalid decrease factor %r." % (decrease))
+
+        if initial is None:
+            initial = min_workers
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.interval = interval
+        self.increase = increase
+        self.decrease = decrease
+        self.slowdown = slowdown
+        self.name = name
+        self.clock = clock
+        self.limit = max(min_workers, min(max_workers, initial))
+        self.active = 0
+        self.decisions = []
+        self._cond = threading.Condition()
+        self._last_rate = None
+        self._start_window(self.clock())
+
+    # -------------------------------------------------------------------------
+    def _start_window(self, now):
+
+        self._window_start = now
+        self._window_bytes = 0
+        self._window_errors = 0
+        self._window_peak = self.active
+
+    # -------------------------------------------------------------------------
+    def restart(self):
+        """
+        Starts a new interval keeping the limit, e.g. before the next file,
+        so the pause before it isn't regarded as a slowdown.
+        """
+
+        with self._cond:
+            self._last_rate = None
+            self._start_window(self.clock())
+
+    # -------------------------------------------------------------------------
+    def acquire(self):
+        """Waits until one more transfer is allowed."""
+
+        with self._cond:
+            while self.active >= self.limit:
+                self._cond.wait()
+            self.active += 1
+            self._window_peak = max(self._window_peak, self.active)
+
+    # -------------------------------------------------------------------------
+    def release(self, error=False):
+        """Ends a transfer, which failed with error."""
+
+        with self._cond:
+            self.active -= 1
+            if error:
+                self._window_errors += 1
+            self._check_window()
+            self._cond.notify_all()
+
+    # -------------------------------------------------------------------------
+    def transferred(self, nbytes):
+        """Accounts the given number of transferred Bytes."""
+
+        with self._cond:
+            self._window_bytes += nbytes
+            self._check_window()
+
+    # -------------------------------------------------------------------------
+    def _check_window(self):
+
+        now = self.clock()
+        elapsed = now - self._window_start
+        if elapsed <= 0 or elapsed < self.interval:
+            return
+        self._decide(self._window_bytes / elapsed)
+        self._start_window(now)
+        self._cond.notify_all()
+
+    # -------------------------------------------------------------------------
+    def _decide(self, rate):
+
+        old = self.limit
+        last_rate = self._last_rate
+        self._last_rate = rate
+        if self._window_errors:
+            decision = DECISION_DECREASE
+            reason = "%d failed transfers" % (self._window_errors)
+        elif last_rate and rate < last_rate * self.slowdown:
+            decision = DECISION_DECREASE
+            reason = "throughput dropped from %s/s" % (bytes2human(int(last_rate), precision=1))
+        elif self._window_peak >= self.limit:
+            decision = DECISION_INCREASE
+            reason = "all %d transfers busy" % (self.limit)
+        else:
+            decision = DECISION_HOLD
+            reason = "at most %d of %d transfers busy" % (self._window_peak, self.limit)
+
+        if decision == DECISION_DECREASE:
+            self.limit = max(self.min_workers, int(self.limit * self.decrease))
+            # The throughput of a lower limit is no measure for a slowdown
+            self._last_rate = None
+        elif decision == DECISION_INCREASE:
+            self.limit = min(self.max_workers, self.limit + self.increase)
+        if self.limit == old:
+            decision = DECISION_HOLD
+
+        self.decisions.append((decision, old, self.limit, rate))
+        log = LOG.debug
+        if self.limit != old:
+            log = LOG.info
+        log(
+            "Concurrency of %s: %s %d -> %d at %s/s, %s.", self.name, decision, old,
+            self.limit, bytes2human(int(rate), precision=1), reason)
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
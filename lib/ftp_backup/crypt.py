@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Module for chunked authenticated encryption of files to upload
+          and the matching streaming decryption for restores
+
+The format of an encrypted file:
+
+    header: MAGIC (8 Bytes), version (1 Byte), salt (16 Bytes),
+            chunk size (4 Bytes, big endian)
+    chunks: length of the ciphertext (4 Bytes, big endian), ciphertext with tag
+
+Every file is encrypted with its own key, derived from the master key and
+the random salt by HKDF-SHA256. The chunks are encrypted with AES-256-GCM,
+the nonce is built from the chunk number and a flag for the last chunk, so
+reordering and truncation of chunks are detected. The header is used as
+associated data of all chunks.
+"""
+
+# Standard modules
+import logging
+import os
+import struct
+import binascii
+import multiprocessing
+
+# Third party modules
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.exceptions import InvalidTag
+
+# Own modules
+from pb_base.errors import PbError
+
+from ftp_backup.block_reader import ParallelBlockReader
+
+__version__ = '0.1.0'
+
+LOG = logging.getLogger(__name__)
+
+MAGIC = b'FBAKENC\x00'
+FORMAT_VERSION = 1
+KEY_SIZE = 32
+SALT_SIZE = 16
+TAG_SIZE = 16
+HEADER_FORMAT = '>8sB16sI'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+CHUNK_LEN_FORMAT = '>I'
+CHUNK_LEN_SIZE = struct.calcsize(CHUNK_LEN_FORMAT)
+
+DEFAULT_CRYPT_CHUNKSIZE = 1024 * 1024
+MAX_CRYPT_CHUNKSIZE = 64 * 1024 * 1024
+DEFAULT_CRYPT_WORKERS = multiprocessing.cpu_count()
+ENCRYPTED_SUFFIX = '.enc'
+
+
+# =============================================================================
+class CryptError(PbError):
+    """
+    Base exception class for all exceptions belonging to issues
+    in this module
+    """
+    pass
+
+
+# =============================================================================
+class CryptFormatError(CryptError):
+    """Exception class for invalid or manipulated encrypted data."""
+    pass
+
+
+# =============================================================================
+def load_key(key_file):
+    """
+    Reads the master key from the given key file. The key file may contain
+    the 32 Bytes of the key raw or hex encoded.
+    """
+
+    key_file = os.path.expanduser(str(key_file))
+    with open(key_file, 'rb') as fh:
+        content = fh.read()
+
+    if len(content) == KEY_SIZE:
+        return content
+
+    content = content.strip()
+    try:
+        key = binascii.unhexlify(content)
+    except (binascii.Error, TypeError):
+        key = None
+    if key is None or len(key) != KEY_SIZE:
+        msg = "Key file %r must contain %d Bytes raw or hex encoded." % (key_file, KEY_SIZE)
+        raise CryptError(msg)
+
+    return key
+
+
+# =============================================================================
+def generate_key():
+    """Generates a new random master key, returned hex encoded."""
+
+    return binascii.hexlify(os.urandom(KEY_SIZE)).decode('ascii')
+
+
+# =============================================================================
+def derive_file_key(master_key, salt):
+
+    hkdf = HKDF(
+        algorithm=hashes.SHA256(), length=KEY_SIZE, salt=salt,
+        info=b'ftp-backup file encryption', backend=default_backend())
+    return hkdf.derive(master_key)
+
+
+# =============================================================================
+def chunk_nonce(index, last):
+
+    flag = 1 if last else 0
+    return struct.pack('>QBxxx', index, flag)
+
+
+# =============================================================================
+class EncryptingReader(ParallelBlockReader):
+    """
+    File like object for reading the encrypted content of another file object.
+    The chunks are encrypted in a thread pool.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(
+        self, fileobj, key, workers=DEFAULT_CRYPT_WORKERS,
+            chunksize=DEFAULT_CRYPT_CHUNKSIZE, max_pending=None):
+
+        if len(key) != KEY_SIZE:
+            raise CryptError("The encryption key must have %d Bytes." % (KEY_SIZE))
+        chunksize = int(chunksize)
+        if chunksize < 1 or chunksize > MAX_CRYPT_CHUNKSIZE:
+            msg = "Invalid chunk size %r, must be between 1 and %d." % (
+                chunksize, MAX_CRYPT_CHUNKSIZE)
+            raise ValueError(msg)
+
+        salt = os.urandom(SALT_SIZE)
+        self._header = struct.pack(HEADER_FORMAT, MAGIC, FORMAT_VERSION, salt, chunksize)
+        self._aead = AESGCM(derive_file_key(key, salt))
+
+        super(EncryptingReader, self).__init__(
+            fileobj, workers=workers, blocksize=chunksize, max_pending=max_pending)
+
+    # -------------------------------------------------------------------------
+    def header(self):
+        return self._header
+
+    # -------------------------------------------------------------------------
+    def process_block(self, data, index, last):
+
+        ciphertext = self._aead.encrypt(chunk_nonce(index, last), data, self._header)
+        return struct.pack(CHUNK_LEN_FORMAT, len(ciphertext)) + ciphertext
+
+
+# =============================================================================
+class DecryptingReader(ParallelBlockReader):
+    """
+    File like object for reading the decrypted content of an encrypted
+    file object. The chunks are decrypted in a thread pool.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, fileobj, key, workers=DEFAULT_CRYPT_WORKERS, max_pending=None):
+
+        if len(key) != KEY_SIZE:
+            raise CryptError("The encryption key must have %d Bytes." % (KEY_SIZE))
+
+        header = fileobj.read(HEADER_SIZE)
+        if len(header) != HEADER_SIZE:
+            raise CryptFormatError("Encrypted data too short.")
+        (magic, version, salt, chunksize) = struct.unpack(HEADER_FORMAT, header)
+        if magic != MAGIC:
+            raise CryptFormatError("Data is not encrypted by ftp-backup.")
+        if version != FORMAT_VERSION:
+            raise CryptFormatError("Unsupported format version %d." % (version))
+        if chunksize < 1 or chunksize > MAX_CRYPT_CHUNKSIZE:
+            raise CryptFormatError("Invalid chunk size %d in header." % (chunksize))
+
+        self._header = header
+        self._aead = AESGCM(derive_file_key(key, salt))
+
+        super(DecryptingReader, self).__init__(
+            fileobj, workers=workers, blocksize=chunksize + TAG_SIZE, max_pending=max_pending)
+
+    # -------------------------------------------------------------------------
+    def read_block(self):
+
+        len_data = self.fileobj.read(CHUNK_LEN_SIZE)
+        if not len_data:
+            return b''
+        if len(len_data) != CHUNK_LEN_SIZE:
+            raise CryptFormatError("Truncated chunk length.")
+        length = struct.unpack(CHUNK_LEN_FORMAT, len_data)[0]
+        if length < TAG_SIZE or length > self.blocksize:
+            raise CryptFormatError("Invalid chunk length %d." % (length))
+        data = self.fileobj.read(length)
+        if len(data) != length:
+            raise CryptFormatError("Truncated chunk.")
+        return data
+
+    # -------------------------------------------------------------------------
+    def process_block(self, data, index, last):
+
+        if not data:
+            raise CryptFormatError("Encrypted data without any chunk.")
+        try:
+            return self._aead.decrypt(chunk_nonce(index, last), data, self._header)
+        except InvalidTag:
+            msg = "Authentication of chunk %d failed, data is corrupted or truncated." % (index)
+            raise CryptFormatError(msg)
+
+
+# =============================================================================
+def decrypt_stream(src, dst, key, workers=DEFAULT_CRYPT_WORKERS, bufsize=1024 * 1024):
+    """
+    Decrypts the content of the file object src into the file object dst.
+
+    @return: the number of decrypted Bytes
+    @rtype: int
+    """
+
+    total = 0
+    with DecryptingReader(src, key, workers=workers) as reader:
+        while True:
+            data = reader.read(bufsize)
+            if not data:
+                break
+            dst.write(data)
+            total += len(data)
+    return total
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
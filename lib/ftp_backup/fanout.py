@@ -0,0 +1,485 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Module for backing up a local directory to several FTP and SFTP
+          targets at once, reading every local file only once
+"""
+
+# Standard modules
+import logging
+import time
+import queue
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+# Third party modules
+
+# Own modules
+from pb_base.common import bytes2human
+
+from pb_base.errors import PbError
+
+from ftp_backup.cache_io import open_local_file
+
+from ftp_backup.checksum import new_hash
+
+__version__ = '0.1.0'
+
+LOG = logging.getLogger(__name__)
+
+# Size of the buffers read from a local file and shared by all targets
+DEFAULT_FANOUT_BUFSIZE = 1024 * 1024
+# Number of buffers a target may lag behind the fastest one
+DEFAULT_FANOUT_DEPTH = 8
+# Seconds a target may hold back the reading for the other targets
+DEFAULT_STALL_TIMEOUT = 60
+
+STALL_POLICIES = ('wait', 'reread', 'drop')
+DEFAULT_STALL_POLICY = 'reread'
+
+# Seconds between two checks of the state of a blocked reader or upload
+POLL_INTERVAL = 0.2
+
+
+# =============================================================================
+class FanOutError(PbError):
+    """
+    Base exception class for all exceptions belonging to issues
+    in this module
+    """
+    pass
+
+
+# =============================================================================
+class FanOutStalledError(FanOutError):
+    """The upload was detached from the shared reading, because it was too slow."""
+    pass
+
+
+# =============================================================================
+class FanOutBranch(object):
+    """
+    File like object for one upload of a file read by a SharedReader.
+    Closing it tells the reader, that this upload needs no more data.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, source, name, algorithm=None):
+
+        self.source = source
+        self.name = name
+        self.algorithm = algorithm
+        self.queue = queue.Queue(maxsize=source.depth)
+        self.closed = False
+        self.stalled = False
+        # Seconds, the reader waited for this upload
+        self.held_back = 0.0
+        self._current = b''
+        self._offset = 0
+        self._eof = False
+
+    # -------------------------------------------------------------------------
+    def __repr__(self):
+
+        return "<%s %r>" % (self.__class__.__name__, self.name)
+
+    # -------------------------------------------------------------------------
+    def stall(self, waited):
+
+        self.stalled = True
+        LOG.warning(
+            "Target %r held back the reading for %.1f seconds, detaching it.",
+            self.name, waited)
+
+    # -------------------------------------------------------------------------
+    def _next(self):
+
+        while True:
+            if self.stalled:
+                raise FanOutStalledError(
+                    "Target %r was detached from the shared reading." % (self.name))
+            if self.source.error is not None:
+                raise FanOutError("Error reading the local file: %s" % (self.source.error))
+            try:
+                return self.queue.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+
+    # -------------------------------------------------------------------------
+    def read(self, size=-1):
+
+        if size is None:
+            size = -1
+        parts = []
+        while not self._eof and size != 0:
+            if self._offset >= len(self._current):
+                chunk = self._next()
+                if chunk is None:
+                    self._eof = True
+                    break
+                self._current = chunk
+                self._offset = 0
+                continue
+            end = len(self._current)
+            if size > 0:
+                end = min(end, self._offset + size)
+                size -= end - self._offset
+            # A whole buffer is handed over without copying
+            parts.append(self._current[self._offset:end])
+            self._offset = end
+        return b''.join(parts)
+
+    # -------------------------------------------------------------------------
+    def hexdigest(self):
+        """
+        The checksum of the whole local file in the algorithm of this
+        upload, if the file was read completely, else None.
+        """
+
+        if not self.algorithm:
+            return None
+        return self.source.hexdigest(self.algorithm)
+
+    # -------------------------------------------------------------------------
+    def close(self):
+
+        self.closed = True
+
+    # -------------------------------------------------------------------------
+    def __enter__(self):
+        return self
+
+    # -------------------------------------------------------------------------
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# =============================================================================
+class SharedReader(object):
+    """
+    Reads a local file once in buffers of bufsize Bytes in an own thread
+    and hands every buffer to all its branches, one for every upload of the
+    file. The buffers are shared by all branches without copying, a branch
+    may lag at most depth buffers behind the fastest one.
+
+    If a branch holds back the reading for more than stall_timeout seconds
+    and the stall policy is not 'wait', it is detached from the reading,
+    its next read() raises FanOutStalledError.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(
+            self, fileobj, bufsize=DEFAULT_FANOUT_BUFSIZE, depth=DEFAULT_FANOUT_DEPTH,
+            stall_policy=DEFAULT_STALL_POLICY, stall_timeout=DEFAULT_STALL_TIMEOUT):
+
+        self.fileobj = fileobj
+        self.bufsize = bufsize
+        self.depth = depth
+        self.stall_policy = stall_policy
+        self.stall_timeout = stall_timeout
+        self.branches = []
+        self.bytes_read = 0
+        self.eof = False
+        self.error = None
+        self._hashes = {}
+        self._thread = None
+
+    # -------------------------------------------------------------------------
+    def branch(self, name, algorithm=None):
+        """Returns a new branch, must be called before start()."""
+
+        if algorithm and algorithm not in self._hashes:
+            self._hashes[algorithm] = new_hash(algorithm)
+        branch = FanOutBranch(self, name, algorithm)
+        self.branches.append(branch)
+        return branch
+
+    # -------------------------------------------------------------------------
+    def hexdigest(self, algorithm):
+
+        if not self.eof or algorithm not in self._hashes:
+            return None
+        return self._hashes[algorithm].hexdigest()
+
+    # -------------------------------------------------------------------------
+    def _active(self):
+
+        return [b for b in self.branches if not b.closed and not b.stalled]
+
+    # -------------------------------------------------------------------------
+    def _offer(self, branch, item):
+
+        started = time.monotonic()
+        try:
+            while not branch.closed:
+                try:
+                    branch.queue.put(item, timeout=POLL_INTERVAL)
+                    return
+                except queue.Full:
+                    pass
+                # A single upload left holds back nobody
+                if self.stall_policy == 'wait' or len(self._active()) < 2:
+                    continue
+                waited = time.monotonic() - started
+                if waited >= self.stall_timeout:
+                    branch.stall(waited)
+                    return
+        finally:
+            branch.held_back += time.monotonic() - started
+
+    # -------------------------------------------------------------------------
+    def _read(self):
+
+        try:
+            while self._active():
+                data = self.fileobj.read(self.bufsize)
+                if not data:
+                    self.eof = True
+                    break
+                self.bytes_read += len(data)
+                for digest in self._hashes.values():
+                    digest.update(data)
+                for branch in self._active():
+                    self._offer(branch, data)
+            if self.eof:
+                for branch in self._active():
+                    self._offer(branch, None)
+        except Exception as e:
+            LOG.error("Error reading the local file: %s", str(e))
+            self.error = e
+
+    # -------------------------------------------------------------------------
+    def start(self):
+
+        self._thread = threading.Thread(target=self._read, name='fanout-reader')
+        self._thread.daemon = True
+        self._thread.start()
+
+    # -------------------------------------------------------------------------
+    def close(self):
+        """Stops the reading and waits for the end of the reading thread."""
+
+        for branch in self.branches:
+            branch.close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    # -------------------------------------------------------------------------
+    def __enter__(self):
+        self.start()
+        return self
+
+    # -------------------------------------------------------------------------
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# =============================================================================
+class FanOutTarget(object):
+    """A target of a fan-out backup with its own FTP or SFTP handler."""
+
+    # -------------------------------------------------------------------------
+    def __init__(self, name, handler):
+
+        self.name = name
+        self.handler = handler
+        self.failed = False
+        self.error = None
+        self.files = 0
+        self.bytes = 0
+        self.rereads = 0
+        self.held_back = 0.0
+
+    # -------------------------------------------------------------------------
+    def __repr__(self):
+
+        return "<%s %r>" % (self.__class__.__name__, self.name)
+
+    # -------------------------------------------------------------------------
+    def fail(self, error):
+
+        self.failed = True
+        self.error = str(error)
+        LOG.error("Giving up the backup to target %r: %s", self.name, self.error)
+
+
+# =============================================================================
+class FanOutBackup(object):
+    """
+    Backup of one local directory to several targets at once, e.g. an FTP
+    and an SFTP server. Every target has its own handler with its own
+    connection, remote directory and numbers of copies to keep.
+
+    Every local file is read once, its buffers are uploaded to all targets
+    in parallel. A failing upload is repeated for its target alone with
+    an own read of the file, if it fails again, the target is given up
+    for the rest of the run without affecting the other targets.
+
+    If a target holds back the reading for the others for more than
+    stall_timeout seconds, the stall policy decides:
+        - 'wait': all targets wait for the slowest one
+        - 'reread': the slow target is detached from the shared reading
+          and uploads the file afterwards with an own read of it
+        - 'drop': the slow target is given up for the rest of the run
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(
+            self, targets, bufsize=DEFAULT_FANOUT_BUFSIZE, depth=DEFAULT_FANOUT_DEPTH,
+            stall_policy=DEFAULT_STALL_POLICY, stall_timeout=DEFAULT_STALL_TIMEOUT,
+            verbose=0):
+
+        if not targets:
+            raise FanOutError("No targets given for the fan-out backup.")
+        if stall_policy not in STALL_POLICIES:
+            raise FanOutError("Invalid stall policy %r, must be one of %s." % (
+                stall_policy, ', '.join(STALL_POLICIES)))
+        if bufsize < 1 or depth < 1:
+            raise FanOutError("Invalid buffer size %r or depth %r." % (bufsize, depth))
+
+        self.targets = list(targets)
+        self.bufsize = bufsize
+        self.depth = depth
+        self.stall_policy = stall_policy
+        self.stall_timeout = stall_timeout
+        self.verbose = verbose
+        self.bytes_read = 0
+
+    # -------------------------------------------------------------------------
+    @property
+    def active(self):
+        """The targets, which were not given up."""
+        return [t for t in self.targets if not t.failed]
+
+    # -------------------------------------------------------------------------
+    def _call(self, target, method, *args):
+
+        if target.failed:
+            return None
+        try:
+            return getattr(target.handler, method)(*args)
+        except Exception as e:
+            if self.verbose > 1:
+                LOG.exception("Error in %s() of target %r:", method, target.name)
+            target.fail(e)
+            return None
+
+    # -------------------------------------------------------------------------
+    def run(self, local_entries):
+        """
+        Uploads the given local entries into a new backup directory on every
+        target, each handler has to be connected and in its remote directory.
+
+        @return: whether the backup was successful on all targets
+        @rtype: bool
+        """
+
+        for target in self.targets:
+            self._call(target, 'start_backup')
+
+        with ThreadPoolExecutor(max_workers=len(self.targets)) as executor:
+            for entry in local_entries:
+                if not self.active:
+                    break
+                targets = [t for t in self.active if self._call(t, 'queue_entry', entry)]
+                if len(targets) > 1:
+                    self.put_shared(executor, entry, targets)
+                elif targets:
+                    self.put_alone(targets[0], entry)
+
+        for target in self.active:
+            self._call(target, 'finish_backup')
+
+        self.log_stats()
+        return not any(t.failed for t in self.targets)
+
+    # -------------------------------------------------------------------------
+    def put_alone(self, target, entry):
+        """Uploads the file of the entry to one target with an own read of it."""
+
+        self._call(target, 'put_entry', entry)
+        if not target.failed:
+            target.files += 1
+            target.bytes += entry.stat.st_size
+
+    # -------------------------------------------------------------------------
+    def _upload(self, target, entry, branch):
+
+        try:
+            target.handler.put_entry(entry, branch)
+        finally:
+            # The reader must not wait for an upload, which has finished
+            branch.close()
+
+    # -------------------------------------------------------------------------
+    def put_shared(self, executor, entry, targets):
+        """Uploads the file of the entry to all given targets with one read of it."""
+
+        handler = targets[0].handler
+        again = []
+        with open_local_file(entry.path, handler.io_mode, stats=handler.cache_stats) as fh:
+            source = SharedReader(
+                fh, self.bufsize, self.depth, self.stall_policy, self.stall_timeout)
+            uploads = []
+            for target in targets:
+                branch = source.branch(target.name, target.handler.checksum)
+                future = executor.submit(self._upload, target, entry, branch)
+                uploads.append((target, branch, future))
+
+            with source:
+                for (target, branch, future) in uploads:
+                    try:
+                        future.result()
+                    except FanOutStalledError:
+                        if self.stall_policy == 'drop':
+                            target.fail("Too slow for the other targets.")
+                        else:
+                            again.append(target)
+                    except Exception as e:
+                        LOG.warning(
+                            "Upload of %r to target %r failed: %s", entry.path, target.name, e)
+                        again.append(target)
+                    else:
+                        target.files += 1
+                        target.bytes += entry.stat.st_size
+            self.bytes_read += source.bytes_read
+            for (target, branch, future) in uploads:
+                target.held_back += branch.held_back
+
+        for target in again:
+            LOG.info("Uploading %r to target %r with an own read ...", entry.path, target.name)
+            target.rereads += 1
+            self.put_alone(target, entry)
+
+    # -------------------------------------------------------------------------
+    def log_stats(self):
+
+        LOG.info(
+            "Read %s from the local files once for %d targets.",
+            bytes2human(self.bytes_read, precision=1), len(self.targets))
+        for target in self.targets:
+            status = 'ok'
+            if target.failed:
+                status = 'failed: ' + target.error
+            LOG.info(
+                "Target %r: %d files with %s, %d read again, held back the others "
+                "for %.1f seconds, %s.", target.name, target.files,
+                bytes2human(target.bytes, precision=1), target.rereads, target.held_back,
+                status)
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
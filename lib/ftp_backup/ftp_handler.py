@@ -11,13 +11,18 @@
 # Standard modules
 import logging
 import os
+import io
 import ftplib
 import ssl
 import re
 import glob
 import time
+import socket
+import posixpath
 from datetime import datetime
 
+from pathlib import PosixPath
+
 # Third party modules
 import six
 
@@ -27,9 +32,54 @@ from pb_base.common import to_bool, pp, bytes2human
 from pb_base.handler import PbBaseHandlerError
 from pb_base.handler import PbBaseHandler
 
+from ftp_backup import UPLOAD_PARTIAL_SUFFIX
+from ftp_backup import DEFAULT_COPIES_YEARLY, DEFAULT_COPIES_MONTHLY
+from ftp_backup import DEFAULT_COPIES_WEEKLY, DEFAULT_COPIES_DAILY
+
 from ftp_backup.ftp_dir import DirEntry
 
-__version__ = '0.4.2'
+from ftp_backup.compress import DEFAULT_COMPRESS_WORKERS, DEFAULT_COMPRESS_LEVEL
+from ftp_backup.compress import MAX_COMPRESS_WORKERS
+from ftp_backup.compress import CompressionHistory
+from ftp_backup.compress import DEFAULT_COMPRESS_HISTORY_FILE
+
+from ftp_backup.pipeline import UploadPipeline
+
+from ftp_backup.read_ahead import DEFAULT_READ_AHEAD_DEPTH, DEFAULT_READ_AHEAD_SIZE
+from ftp_backup.read_ahead import MAX_READ_AHEAD_DEPTH
+
+from ftp_backup.cache_io import CacheStats, IO_MODES, DEFAULT_IO_MODE
+from ftp_backup.cache_io import IO_MODE_MMAP
+
+from ftp_backup.checksum import local_digest
+from ftp_backup.checksum import DEFAULT_CHECKSUM_ALGORITHM, CHECKSUM_ALGORITHMS
+
+from ftp_backup.verify import FTPVerifier, VerifyQueue, VerifyUnsupportedError
+
+from ftp_backup.manifest import DEFAULT_REPORT_DIR
+
+from ftp_backup.index import DEFAULT_INDEX_FILE
+
+from ftp_backup.packer import DEFAULT_PACK_THRESHOLD, DEFAULT_PACK_ARCHIVE_SIZE
+
+from ftp_backup.aio_ftp import AsyncFTPClient, AsyncFTPPool
+from ftp_backup.aio_pool import DEFAULT_POOL_SIZE
+
+from ftp_backup.ranges import RangeUpload, RangeReader, RangeUploadError
+from ftp_backup.ranges import DEFAULT_RANGE_THRESHOLD, DEFAULT_RANGE_SIZE
+from ftp_backup.ranges import DEFAULT_RANGE_WORKERS, MAX_RANGE_WORKERS, MIN_RANGE_SIZE
+from ftp_backup.ranges import DEFAULT_RANGE_MIN_WORKERS
+
+from ftp_backup.concurrency import AdaptiveConcurrency
+
+from ftp_backup.journal import skip_prefix
+from ftp_backup.journal import DEFAULT_JOURNAL_DIR, DEFAULT_RESUME_WINDOW
+
+from ftp_backup.restore import SessionPool
+
+from ftp_backup.backup_run import BackupRunMixin
+
+__version__ = '0.19.2'
 
 LOG = logging.getLogger(__name__)
 DEFAULT_FTP_HOST = 'ftp'
@@ -40,6 +90,8 @@ DEFAULT_FTP_TZ = 'UTC'
 DEFAULT_FTP_TIMEOUT = 60
 DEFAULT_MAX_STOR_ATTEMPTS = 10
 MAX_FTP_TIMEOUT = 3600
+# Name of the temporary file for probing the support of REST before STOR
+REST_PROBE_FILE = '.rest-probe' + UPLOAD_PARTIAL_SUFFIX
 
 VERIFY_OPTS = {
     None: ssl.CERT_NONE,
@@ -47,6 +99,9 @@ VERIFY_OPTS = {
     'required': ssl.CERT_REQUIRED,
 }
 
+RE_BACKUP_DIRS = re.compile(r'^\s*\d{4}[-_]+\d\d[-_]+\d\d[-_]+\d+\s*$')
+RE_WHITESPACE = re.compile(r'\s+')
+
 
 # =============================================================================
 class FTPHandlerError(PbBaseHandlerError):
@@ -106,7 +161,7 @@ class FTPPutError(FTPHandlerError):
 
 
 # =============================================================================
-class FTPHandler(PbBaseHandler):
+class FTPHandler(BackupRunMixin, PbBaseHandler):
     """
     Handler class with additional properties and methods to handle FTP operations.
     """
@@ -116,9 +171,21 @@ class FTPHandler(PbBaseHandler):
         self, host=DEFAULT_FTP_HOST, port=DEFAULT_FTP_PORT, user=DEFAULT_FTP_USER,
             password=DEFAULT_FTP_PWD, passive=False, remote_dir=None, tls=False,
             tls_verify=None, tz=DEFAULT_FTP_TZ, timeout=DEFAULT_FTP_TIMEOUT,
-            max_stor_attempts=DEFAULT_MAX_STOR_ATTEMPTS,
-            appname=None, verbose=0, version=__version__, base_dir=None,
-            use_stderr=False, simulate=False, sudo=False, quiet=False,
+            max_stor_attempts=DEFAULT_MAX_STOR_ATTEMPTS, compress=False,
+            compress_workers=DEFAULT_COMPRESS_WORKERS, compress_level=DEFAULT_COMPRESS_LEVEL,
+            compress_adaptive=False, compress_history_file=DEFAULT_COMPRESS_HISTORY_FILE,
+            encrypt=False, encrypt_key_file=None, encrypt_workers=None, pack=False,
+            pack_threshold=DEFAULT_PACK_THRESHOLD, pack_archive_size=DEFAULT_PACK_ARCHIVE_SIZE,
+            read_ahead_depth=DEFAULT_READ_AHEAD_DEPTH, read_ahead_size=DEFAULT_READ_AHEAD_SIZE,
+            io_mode=DEFAULT_IO_MODE, range_threshold=DEFAULT_RANGE_THRESHOLD,
+            range_size=DEFAULT_RANGE_SIZE, range_workers=DEFAULT_RANGE_WORKERS,
+            range_adaptive=False, range_min_workers=DEFAULT_RANGE_MIN_WORKERS,
+            checksum=DEFAULT_CHECKSUM_ALGORITHM, report_dir=None,
+            index_file=DEFAULT_INDEX_FILE, journal_dir=DEFAULT_JOURNAL_DIR,
+            resume_window=DEFAULT_RESUME_WINDOW, local_dir=None, verify=False,
+            appname=None, verbose=0,
+            version=__version__, base_dir=None, use_stderr=False, simulate=False,
+            sudo=False, quiet=False,
             *targs, **kwargs):
         """Initialization of the FTPHandler object.
 
@@ -137,6 +204,54 @@ class FTPHandler(PbBaseHandler):
         self._tz = tz
         self._timeout = DEFAULT_FTP_TIMEOUT
         self._max_stor_attempts = DEFAULT_MAX_STOR_ATTEMPTS
+        self._compress = bool(compress)
+        self._compress_workers = DEFAULT_COMPRESS_WORKERS
+        self._compress_level = DEFAULT_COMPRESS_LEVEL
+        self._compress_adaptive = bool(compress_adaptive)
+        self._compress_history_file = DEFAULT_COMPRESS_HISTORY_FILE
+        self._compress_history = None
+        self._encrypt = bool(encrypt)
+        self._encrypt_key_file = None
+        self._encrypt_workers = None
+        self._encrypt_key = None
+        self._pack = bool(pack)
+        self._pack_threshold = DEFAULT_PACK_THRESHOLD
+        self._pack_archive_size = DEFAULT_PACK_ARCHIVE_SIZE
+        self._read_ahead_depth = DEFAULT_READ_AHEAD_DEPTH
+        self._read_ahead_size = DEFAULT_READ_AHEAD_SIZE
+        self._io_mode = DEFAULT_IO_MODE
+        self._cache_stats = CacheStats()
+        self._range_threshold = DEFAULT_RANGE_THRESHOLD
+        self._range_size = DEFAULT_RANGE_SIZE
+        self._range_workers = DEFAULT_RANGE_WORKERS
+        self._range_adaptive = bool(range_adaptive)
+        self._range_min_workers = DEFAULT_RANGE_MIN_WORKERS
+        # The limit of concurrent ranges of the adaptive mode, kept for all files
+        self.range_controller = None
+        # Support of writing at an offset by REST before STOR, None if not yet probed
+        self.rest_stor = None
+        self._checksum = DEFAULT_CHECKSUM_ALGORITHM
+        self._report_dir = DEFAULT_REPORT_DIR
+        self._index_file = DEFAULT_INDEX_FILE
+        self._journal_dir = DEFAULT_JOURNAL_DIR
+        self._resume_window = DEFAULT_RESUME_WINDOW
+        self._local_dir = None
+        self.journal = None
+        self._resume = False
+        self.manifest = None
+        self._verify = bool(verify)
+        self.verify_queue = None
+        self.new_backup_dir = None
+        self.backup_started = None
+        self._packed = []
+        self._packed_done = []
+
+        self.copies = {
+            'yearly': DEFAULT_COPIES_YEARLY,
+            'monthly': DEFAULT_COPIES_MONTHLY,
+            'weekly': DEFAULT_COPIES_WEEKLY,
+            'daily': DEFAULT_COPIES_DAILY,
+        }
 
         self._connected = False
         self._logged_in = False
@@ -160,6 +275,26 @@ class FTPHandler(PbBaseHandler):
         self.tls_verify = tls_verify
         self.timeout = timeout
         self.max_stor_attempts = max_stor_attempts
+        self.compress_workers = compress_workers
+        self.compress_level = compress_level
+        self.compress_history_file = compress_history_file
+        self.encrypt_key_file = encrypt_key_file
+        self.encrypt_workers = encrypt_workers
+        self.pack_threshold = pack_threshold
+        self.pack_archive_size = pack_archive_size
+        self.read_ahead_depth = read_ahead_depth
+        self.read_ahead_size = read_ahead_size
+        self.io_mode = io_mode
+        self.range_threshold = range_threshold
+        self.range_size = range_size
+        self.range_workers = range_workers
+        self.range_min_workers = range_min_workers
+        self.checksum = checksum
+        self.report_dir = report_dir
+        self.index_file = index_file
+        self.journal_dir = journal_dir
+        self.resume_window = resume_window
+        self.local_dir = local_dir
 
         self.init_ftp()
 
@@ -344,6 +479,418 @@ class FTPHandler(PbBaseHandler):
             raise ValueError(msg)
         self._max_stor_attempts = p
 
+    # -----------------------------------------------------------
+    @property
+    def compress(self):
+        """Compress the files with gzip during the upload."""
+        return self._compress
+
+    @compress.setter
+    def compress(self, value):
+        self._compress = bool(value)
+
+    # -----------------------------------------------------------
+    @property
+    def compress_workers(self):
+        """The number of parallel threads for compressing the files."""
+        return self._compress_workers
+
+    @compress_workers.setter
+    def compress_workers(self, value):
+        if not value:
+            self._compress_workers = DEFAULT_COMPRESS_WORKERS
+            return
+        v = int(value)
+        if v < 1 or v > MAX_COMPRESS_WORKERS:
+            msg = "Invalid number %r of compression workers, must be between 1 and %d." % (
+                value, MAX_COMPRESS_WORKERS)
+            raise ValueError(msg)
+        self._compress_workers = v
+
+    # -----------------------------------------------------------
+    @property
+    def compress_level(self):
+        """The gzip compression level (0 - 9)."""
+        return self._compress_level
+
+    @compress_level.setter
+    def compress_level(self, value):
+        if value is None:
+            self._compress_level = DEFAULT_COMPRESS_LEVEL
+            return
+        v = int(value)
+        if v < 0 or v > 9:
+            msg = "Invalid compression level %r, must be between 0 and 9." % (value)
+            raise ValueError(msg)
+        self._compress_level = v
+
+    # -----------------------------------------------------------
+    @property
+    def compress_adaptive(self):
+        """Choose the compression mode of every file by probing its compressibility."""
+        return self._compress_adaptive
+
+    @compress_adaptive.setter
+    def compress_adaptive(self, value):
+        self._compress_adaptive = bool(value)
+
+    # -----------------------------------------------------------
+    @property
+    def compress_history_file(self):
+        """The local file with the history of the compression decisions."""
+        return self._compress_history_file
+
+    @compress_history_file.setter
+    def compress_history_file(self, value):
+        if not value:
+            self._compress_history_file = DEFAULT_COMPRESS_HISTORY_FILE
+            return
+        self._compress_history_file = os.path.expanduser(str(value))
+        self._compress_history = None
+
+    # -----------------------------------------------------------
+    @property
+    def compress_history(self):
+        """The history of the compression decisions in adaptive mode."""
+        if self._compress_history is None and self.compress_adaptive:
+            self._compress_history = CompressionHistory(self.compress_history_file)
+        return self._compress_history
+
+    # -----------------------------------------------------------
+    @property
+    def encrypt(self):
+        """Encrypt the files on the client side before uploading."""
+        return self._encrypt
+
+    @encrypt.setter
+    def encrypt(self, value):
+        self._encrypt = bool(value)
+
+    # -----------------------------------------------------------
+    @property
+    def encrypt_key_file(self):
+        """The local file containing the master key for encryption."""
+        return self._encrypt_key_file
+
+    @encrypt_key_file.setter
+    def encrypt_key_file(self, value):
+        if not value:
+            self._encrypt_key_file = None
+        else:
+            self._encrypt_key_file = os.path.expanduser(str(value))
+        self._encrypt_key = None
+
+    # -----------------------------------------------------------
+    @property
+    def encrypt_workers(self):
+        """The number of parallel threads for encrypting the files."""
+        return self._encrypt_workers
+
+    @encrypt_workers.setter
+    def encrypt_workers(self, value):
+        if not value:
+            self._encrypt_workers = None
+            return
+        v = int(value)
+        if v < 1 or v > MAX_COMPRESS_WORKERS:
+            msg = "Invalid number %r of encryption workers, must be between 1 and %d." % (
+                value, MAX_COMPRESS_WORKERS)
+            raise ValueError(msg)
+        self._encrypt_workers = v
+
+    # -----------------------------------------------------------
+    @property
+    def encrypt_key(self):
+        """The master key for encryption, loaded from the key file."""
+        if not self.encrypt:
+            return None
+        if self._encrypt_key is None:
+            if not self.encrypt_key_file:
+                raise FTPHandlerError("Encryption requested, but no key file given.")
+            from ftp_backup.crypt import load_key
+            self._encrypt_key = load_key(self.encrypt_key_file)
+        return self._encrypt_key
+
+    # -----------------------------------------------------------
+    @property
+    def pack(self):
+        """Pack small files into tar archives instead of uploading them one by one."""
+        return self._pack
+
+    @pack.setter
+    def pack(self, value):
+        self._pack = bool(value)
+
+    # -----------------------------------------------------------
+    @property
+    def pack_threshold(self):
+        """Files smaller than this size in Bytes are packed into tar archives."""
+        return self._pack_threshold
+
+    @pack_threshold.setter
+    def pack_threshold(self, value):
+        if not value:
+            self._pack_threshold = DEFAULT_PACK_THRESHOLD
+            return
+        v = int(value)
+        if v < 1:
+            msg = "Invalid size threshold %r for packing files." % (value)
+            raise ValueError(msg)
+        self._pack_threshold = v
+
+    # -----------------------------------------------------------
+    @property
+    def pack_archive_size(self):
+        """The maximum sum of the file sizes in one tar archive."""
+        return self._pack_archive_size
+
+    @pack_archive_size.setter
+    def pack_archive_size(self, value):
+        if not value:
+            self._pack_archive_size = DEFAULT_PACK_ARCHIVE_SIZE
+            return
+        v = int(value)
+        if v < 1:
+            msg = "Invalid maximum archive size %r for packing files." % (value)
+            raise ValueError(msg)
+        self._pack_archive_size = v
+
+    # -----------------------------------------------------------
+    @property
+    def read_ahead_depth(self):
+        """The number of buffers for reading local files ahead, 0 for no read ahead."""
+        return self._read_ahead_depth
+
+    @read_ahead_depth.setter
+    def read_ahead_depth(self, value):
+        v = int(value)
+        if v < 0 or v > MAX_READ_AHEAD_DEPTH:
+            msg = "Invalid read ahead depth %r, must be between 0 and %d." % (
+                value, MAX_READ_AHEAD_DEPTH)
+            raise ValueError(msg)
+        self._read_ahead_depth = v
+
+    # -----------------------------------------------------------
+    @property
+    def read_ahead_size(self):
+        """The size of a single read ahead buffer."""
+        return self._read_ahead_size
+
+    @read_ahead_size.setter
+    def read_ahead_size(self, value):
+        if not value:
+            self._read_ahead_size = DEFAULT_READ_AHEAD_SIZE
+            return
+        v = int(value)
+        if v < 1:
+            msg = "Invalid read ahead buffer size %r." % (value)
+            raise ValueError(msg)
+        self._read_ahead_size = v
+
+    # -----------------------------------------------------------
+    @property
+    def io_mode(self):
+        """The I/O mode for reading local files (buffered, nocache or direct)."""
+        return self._io_mode
+
+    @io_mode.setter
+    def io_mode(self, value):
+        if not value:
+            self._io_mode = DEFAULT_IO_MODE
+            return
+        v = str(value).strip().lower()
+        if v not in IO_MODES:
+            msg = "Invalid I/O mode %r, must be one of %s." % (value, ', '.join(IO_MODES))
+            raise ValueError(msg)
+        self._io_mode = v
+
+    # -----------------------------------------------------------
+    @property
+    def cache_stats(self):
+        """The statistics about the page cache usage of all read local files."""
+        return self._cache_stats
+
+    # -----------------------------------------------------------
+    @property
+    def range_threshold(self):
+        """The minimum size of a file uploaded in ranges over several connections."""
+        return self._range_threshold
+
+    @range_threshold.setter
+    def range_threshold(self, value):
+        if not value:
+            self._range_threshold = DEFAULT_RANGE_THRESHOLD
+            return
+        v = int(value)
+        if v < 1:
+            msg = "Invalid range upload threshold %r." % (value)
+            raise ValueError(msg)
+        self._range_threshold = v
+
+    # -----------------------------------------------------------
+    @property
+    def range_size(self):
+        """The size of a single range of a file uploaded in ranges."""
+        return self._range_size
+
+    @range_size.setter
+    def range_size(self, value):
+        if not value:
+            self._range_size = DEFAULT_RANGE_SIZE
+            return
+        v = int(value)
+        if v < MIN_RANGE_SIZE:
+            msg = "Invalid range size %r, must be at least %d." % (value, MIN_RANGE_SIZE)
+            raise ValueError(msg)
+        self._range_size = v
+
+    # -----------------------------------------------------------
+    @property
+    def range_workers(self):
+        """The number of ranges of a file uploaded at the same time, 1 for no range uploads."""
+        return self._range_workers
+
+    @range_workers.setter
+    def range_workers(self, value):
+        v = int(value)
+        if v < 1 or v > MAX_RANGE_WORKERS:
+            msg = "Invalid number of range upload workers %r, must be between 1 and %d." % (
+                value, MAX_RANGE_WORKERS)
+            raise ValueError(msg)
+        self._range_workers = v
+
+    # -----------------------------------------------------------
+    @property
+    def range_adaptive(self):
+        """
+        Adjust the number of ranges written at the same time between
+        range_min_workers and range_workers by the throughput and the errors.
+        """
+        return self._range_adaptive
+
+    @range_adaptive.setter
+    def range_adaptive(self, value):
+        self._range_adaptive = bool(value)
+
+    # -----------------------------------------------------------
+    @property
+    def range_min_workers(self):
+        """The minimum number of ranges written at the same time in adaptive mode."""
+        return self._range_min_workers
+
+    @range_min_workers.setter
+    def range_min_workers(self, value):
+        v = int(value)
+        if v < 1 or v > MAX_RANGE_WORKERS:
+            msg = (
+                "Invalid minimum number of range upload workers %r, "
+                "must be between 1 and %d.") % (value, MAX_RANGE_WORKERS)
+            raise ValueError(msg)
+        self._range_min_workers = v
+
+    # -----------------------------------------------------------
+    @property
+    def checksum(self):
+        """The algorithm for the checksums of the uploaded files, None for no checksums."""
+        return self._checksum
+
+    @checksum.setter
+    def checksum(self, value):
+        if not value or str(value).strip().lower() == 'none':
+            self._checksum = None
+            return
+        v = str(value).strip().lower()
+        if v not in CHECKSUM_ALGORITHMS:
+            msg = "Invalid checksum algorithm %r, must be one of %s." % (
+                value, ', '.join(CHECKSUM_ALGORITHMS))
+            raise ValueError(msg)
+        self._checksum = v
+
+    # -----------------------------------------------------------
+    @property
+    def report_dir(self):
+        """The local directory for the reports of the backup runs."""
+        return self._report_dir
+
+    @report_dir.setter
+    def report_dir(self, value):
+        if not value:
+            self._report_dir = DEFAULT_REPORT_DIR
+            return
+        self._report_dir = PosixPath(os.path.expanduser(str(value)))
+
+    # -----------------------------------------------------------
+    @property
+    def index_file(self):
+        """
+        The local SQLite file of the index of all backed up files,
+        None, if no index should be maintained.
+        """
+        return self._index_file
+
+    @index_file.setter
+    def index_file(self, value):
+        if not value or str(value).strip().lower() == 'none':
+            self._index_file = None
+            return
+        self._index_file = PosixPath(os.path.expanduser(str(value)))
+
+    # -----------------------------------------------------------
+    @property
+    def journal_dir(self):
+        """The local directory for the journals of the backup runs."""
+        return self._journal_dir
+
+    @journal_dir.setter
+    def journal_dir(self, value):
+        if not value:
+            self._journal_dir = DEFAULT_JOURNAL_DIR
+            return
+        self._journal_dir = PosixPath(os.path.expanduser(str(value)))
+
+    # -----------------------------------------------------------
+    @property
+    def resume_window(self):
+        """
+        The number of hours after the start of an interrupted backup run,
+        in which the next run continues its backup directory, 0 for never.
+        """
+        return self._resume_window
+
+    @resume_window.setter
+    def resume_window(self, value):
+        v = float(value)
+        if v < 0:
+            raise ValueError("Invalid resume window %r, must not be negative." % (value))
+        self._resume_window = v
+
+    # -----------------------------------------------------------
+    @property
+    def local_dir(self):
+        """
+        The local directory of the backup, which identifies the journal
+        of its runs together with the host and the remote directory.
+        Interrupted runs are only continued, if it is given.
+        """
+        return self._local_dir
+
+    @local_dir.setter
+    def local_dir(self, value):
+        if not value:
+            self._local_dir = None
+            return
+        self._local_dir = PosixPath(os.path.abspath(os.path.expanduser(str(value))))
+
+    # -----------------------------------------------------------
+    @property
+    def verify(self):
+        """Verify the uploaded files by checksums computed by the server."""
+        return self._verify
+
+    @verify.setter
+    def verify(self, value):
+        self._verify = bool(value)
+
     # -------------------------------------------------------------------------
     def as_dict(self, short=False):
         """
@@ -370,6 +917,35 @@ class FTPHandler(PbBaseHandler):
         res['tls_verify'] = self.tls_verify
         res['timeout'] = self.timeout
         res['max_stor_attempts'] = self.max_stor_attempts
+        res['compress'] = self.compress
+        res['compress_workers'] = self.compress_workers
+        res['compress_level'] = self.compress_level
+        res['compress_adaptive'] = self.compress_adaptive
+        res['compress_history_file'] = self.compress_history_file
+        res['encrypt'] = self.encrypt
+        res['encrypt_key_file'] = self.encrypt_key_file
+        res['encrypt_workers'] = self.encrypt_workers
+        res['pack'] = self.pack
+        res['pack_threshold'] = self.pack_threshold
+        res['pack_archive_size'] = self.pack_archive_size
+        res['read_ahead_depth'] = self.read_ahead_depth
+        res['read_ahead_size'] = self.read_ahead_size
+        res['io_mode'] = self.io_mode
+        res['range_threshold'] = self.range_threshold
+        res['range_size'] = self.range_size
+        res['range_workers'] = self.range_workers
+        res['range_adaptive'] = self.range_adaptive
+        res['range_min_workers'] = self.range_min_workers
+        res['rest_stor'] = self.rest_stor
+        res['checksum'] = self.checksum
+        res['report_dir'] = self.report_dir
+        res['index_file'] = self.index_file
+        res['journal_dir'] = self.journal_dir
+        res['resume_window'] = self.resume_window
+        res['local_dir'] = self.local_dir
+        res['verify'] = self.verify
+        res['copies'] = self.copies
+        res['new_backup_dir'] = self.new_backup_dir
 
         return res
 
@@ -382,28 +958,35 @@ class FTPHandler(PbBaseHandler):
         self.ftp = None
 
     # -------------------------------------------------------------------------
-    def init_ftp(self):
+    def _create_ftp(self):
 
         if self.tls:
             LOG.debug("Initializing FTP_TLS object ...")
             context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
             context.verify_mode = VERIFY_OPTS[self.tls_verify]
-            self.ftp = ftplib.FTP_TLS(context=context, timeout=self.timeout)
+            ftp = ftplib.FTP_TLS(context=context, timeout=self.timeout)
         else:
             LOG.debug("Initializing FTP object ...")
-            self.ftp = ftplib.FTP(timeout=self.timeout)
+            ftp = ftplib.FTP(timeout=self.timeout)
 
         if self.verbose > 1:
             if self.verbose > 2:
-                self.ftp.set_debuglevel(2)
+                ftp.set_debuglevel(2)
             else:
-                self.ftp.set_debuglevel(1)
+                ftp.set_debuglevel(1)
 
         LOG.debug("Set FTP passive mode to %r.", self.passive)
         if self.passive:
-            self.ftp.set_pasv(True)
+            ftp.set_pasv(True)
         else:
-            self.ftp.set_pasv(False)
+            ftp.set_pasv(False)
+
+        return ftp
+
+    # -------------------------------------------------------------------------
+    def init_ftp(self):
+
+        self.ftp = self._create_ftp()
 
     # -------------------------------------------------------------------------
     def login_ftp(self):
@@ -421,6 +1004,33 @@ class FTPHandler(PbBaseHandler):
         self._logged_in = True
         self.cwd(self.remote_dir)
 
+    # -------------------------------------------------------------------------
+    def connect(self):
+        """Connects and logs in to the FTP server like login_ftp(), also after disconnect()."""
+
+        if self.ftp is None:
+            self.init_ftp()
+        self.login_ftp()
+
+    # -------------------------------------------------------------------------
+    def disconnect(self):
+
+        if self.ftp and self.connected:
+            try:
+                self.ftp.quit()
+            except ftplib.all_errors as e:
+                LOG.debug("Error on closing the FTP connection: %s", str(e))
+                self.ftp.close()
+        if self.verify_queue is not None:
+            self.verify_queue.close()
+        self.verify_queue = None
+        if self.journal is not None:
+            self.journal.close()
+        self.journal = None
+        self._connected = False
+        self._logged_in = False
+        self.ftp = None
+
     # -------------------------------------------------------------------------
     def cwd(self, pathname):
         """Wrapper for ftplib.FTP.cwd()."""
@@ -495,15 +1105,15 @@ class FTPHandler(PbBaseHandler):
                     if entry.name == '.' or entry.name == '..':
                         continue
                     if entry.is_dir():
-                        self.remove(entry.name, recursive=True)
+                        self.remove(True, entry.name)
                     else:
-                        self.remove(entry.name)
+                        self.remove(False, entry.name)
                 self.cwd('..')
                 LOG.info("Removing directory %r ...", item)
                 if not self.simulate:
                     self.ftp.rmd(item)
-            except ftplib.error_perm:
-                self.remove(item)
+            except FTPCwdError:
+                self.remove(False, item)
             except Exception as e:
                 self.handle_error(str(e), e.__class__.__name__, True)
 
@@ -526,10 +1136,565 @@ class FTPHandler(PbBaseHandler):
 
         LOG.info("Creating directory %r ...", directory)
         if not self.simulate:
-            self.ftp.mkd(new_backup_dir)
+            self.ftp.mkd(directory)
+
+    # -------------------------------------------------------------------------
+    def remote_name(self, relpath):
+        """The name of the remote file for the given relative local path."""
+
+        return RE_WHITESPACE.sub('_', relpath)
+
+    # -------------------------------------------------------------------------
+    def _get_new_backup_dir(self, cur_backup_dirs=None):
+
+        if cur_backup_dirs is None:
+            cur_backup_dirs = [entry.name for entry in self.dir_list()]
+
+        resumed_dir = self.find_resumable_backup_dir(cur_backup_dirs)
+        if resumed_dir:
+            self.new_backup_dir = resumed_dir
+            LOG.info("Continuing the interrupted backup in %r.", resumed_dir)
+            return
+
+        backup_dir_tpl = datetime.utcnow().strftime('%Y-%m-%d_%%02d')
+        i = 0
+        new_backup_dir = backup_dir_tpl % (i)
+        while new_backup_dir in cur_backup_dirs:
+            i += 1
+            new_backup_dir = backup_dir_tpl % (i)
+        self.new_backup_dir = new_backup_dir
+        LOG.info("New backup directory: %r", new_backup_dir)
+
+    # -------------------------------------------------------------------------
+    def cleanup_old_backupdirs(self):
+        """
+        Determines the name of the new backup directory in the current remote
+        directory and removes all backup directories there, which are not
+        kept by the configured numbers of copies.
+        """
+
+        LOG.info("Cleaning up old backup directories ...")
+
+        cur_backup_dirs = []
+        for entry in self.dir_list():
+            if entry.is_dir() and RE_BACKUP_DIRS.search(entry.name):
+                cur_backup_dirs.append(entry.name)
+        cur_backup_dirs.sort(key=str.lower)
+        if self.verbose > 1:
+            LOG.debug("Found backup directories to check:\n%s", pp(cur_backup_dirs))
+
+        cur_date = datetime.utcnow()
+        cur_weekday = cur_date.timetuple().tm_wday
+
+        self._get_new_backup_dir(cur_backup_dirs)
+        new_backup_dir = self.new_backup_dir
+        if new_backup_dir not in cur_backup_dirs:
+            cur_backup_dirs.append(new_backup_dir)
+
+        type_mapping = {
+            'yearly': [],
+            'monthly': [],
+            'weekly': [],
+            'daily': [],
+            'other': [],
+        }
+
+        if cur_date.month == 1 and cur_date.day == 1:
+            type_mapping['yearly'].append(new_backup_dir)
+        if cur_date.day == 1:
+            type_mapping['monthly'].append(new_backup_dir)
+        if cur_weekday == 6:
+            # Sunday
+            type_mapping['weekly'].append(new_backup_dir)
+        type_mapping['daily'].append(new_backup_dir)
+
+        self._map_dirs2types(type_mapping, cur_backup_dirs)
+        for key in type_mapping:
+            type_mapping[key].sort(key=str.lower)
+
+        for key in self.copies:
+            max_copies = self.copies[key]
+            while len(type_mapping[key]) > max_copies:
+                type_mapping[key].pop(0)
+        if self.verbose > 2:
+            LOG.debug("Directories to keep:\n%s", pp(type_mapping))
+
+        dirs_delete = []
+        for backup_dir in cur_backup_dirs:
+            keep = False
+            for key in type_mapping:
+                if backup_dir in type_mapping[key]:
+                    keep = True
+            if not keep:
+                dirs_delete.append(backup_dir)
+        LOG.debug("Directories to remove:\n%s", pp(dirs_delete))
+
+        if dirs_delete:
+            self.remove(True, *dirs_delete)
+            self.prune_index(*dirs_delete)
 
     # -------------------------------------------------------------------------
-    def put_file(self, local_file, remote_file=None):
+    def _map_dirs2types(self, type_mapping, backup_dirs):
+
+        re_backup_date = re.compile(r'^\s*(\d+)[_\-](\d+)[_\-](\d+)')
+
+        for backup_dir in backup_dirs:
+
+            match = re_backup_date.search(backup_dir)
+            dt = None
+            if match:
+                try:
+                    dt = datetime(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+                except ValueError as e:
+                    LOG.debug("Invalid date in backup directory %r: %s", backup_dir, str(e))
+            if dt is None:
+                if backup_dir not in type_mapping['other']:
+                    type_mapping['other'].append(backup_dir)
+                continue
+
+            keys = ['daily']
+            if dt.month == 1 and dt.day == 1:
+                keys.append('yearly')
+            if dt.day == 1:
+                keys.append('monthly')
+            if dt.timetuple().tm_wday == 6:
+                # Sunday
+                keys.append('weekly')
+            for key in keys:
+                if backup_dir not in type_mapping[key]:
+                    type_mapping[key].append(backup_dir)
+
+    # -------------------------------------------------------------------------
+    def run_backup(self, subdir=None, local_entries=None):
+        """
+        Performs a complete backup run with an established connection: removes
+        the old backup directories in the given subdirectory of the remote
+        directory and uploads the given local entries into a new one.
+
+        @param subdir: the remote subdirectory for the backup directories,
+                       by default the name of the local host
+        @type subdir: str
+        @param local_entries: the entries of the local directory, e.g. a ScanQueue
+        @type local_entries: iterable of LocalEntry
+        """
+
+        if local_entries is None:
+            raise FTPHandlerError("No local entries given for the backup.")
+
+        base_dir = self.remote_dir
+        try:
+            self.prepare_backup(subdir)
+            self.start_backup()
+            for entry in local_entries:
+                if self.queue_entry(entry):
+                    self.put_entry(entry)
+            self.finish_backup()
+        finally:
+            self.cwd(base_dir)
+
+    # -------------------------------------------------------------------------
+    def prepare_backup(self, subdir=None):
+        """
+        Changes into the given subdirectory of the current remote directory,
+        which is created if necessary, and removes the old backup directories
+        there. Call start_backup() afterwards.
+
+        @param subdir: the remote subdirectory for the backup directories,
+                       by default the name of the local host
+        @type subdir: str
+        """
+
+        if subdir is None:
+            subdir = socket.gethostname()
+
+        entries = dict((entry.name, entry) for entry in self.dir_list())
+        if subdir in entries:
+            if not entries[subdir].is_dir():
+                raise FTPHandlerError("Remote file %r is NOT a directory." % (subdir))
+        else:
+            LOG.warning("Remote directory %r does not exists.", subdir)
+            self.mkdir(subdir)
+            if self.simulate:
+                self._get_new_backup_dir([])
+                return
+
+        self.cwd(subdir)
+        self.cleanup_old_backupdirs()
+
+    # -------------------------------------------------------------------------
+    def start_backup(self):
+        """
+        Starts a backup run in the current remote directory: creates the new
+        backup directory or continues an interrupted one and changes into it.
+        Call queue_entry() and put_entry() for all local entries and
+        finish_backup() afterwards.
+        """
+
+        self.backup_started = time.time()
+        self._packed = []
+        self._packed_done = []
+        if not self.new_backup_dir:
+            self._get_new_backup_dir()
+        self.start_manifest(self.new_backup_dir)
+        self._resume = self.journal is not None
+        self.start_journal(self.new_backup_dir)
+
+        if self._resume:
+            LOG.info(
+                "Continuing backup directory %r, %d files were already uploaded.",
+                self.new_backup_dir, len(self.journal.completed))
+        else:
+            LOG.info("Creating directory %r ...", self.new_backup_dir)
+        if not self.simulate:
+            if not self._resume:
+                self.ftp.mkd(self.new_backup_dir)
+            self.cwd(self.new_backup_dir)
+            self.start_verify()
+
+    # -------------------------------------------------------------------------
+    def queue_entry(self, entry):
+        """
+        Creates the remote directory of a local directory, skips files already
+        uploaded by an interrupted run and collects small files for packing
+        them at the end of the backup.
+
+        @return: whether the local file has to be uploaded by put_entry()
+        @rtype: bool
+        """
+
+        remote_file = self.remote_name(entry.relpath)
+        if entry.is_dir:
+            LOG.info("Creating directory %r ...", remote_file)
+            if not self.simulate:
+                try:
+                    self.ftp.mkd(remote_file)
+                except ftplib.error_perm:
+                    # Created by the interrupted run
+                    if not self._resume:
+                        raise
+            return False
+
+        size = entry.stat.st_size
+        done = self.take_completed(remote_file, size, entry.stat.st_mtime)
+        if done is not None:
+            if done.get('archive'):
+                self._packed_done.append(
+                    (done['archive'], remote_file, size, entry.stat.st_mtime))
+            return False
+
+        if self.pack and entry.stat.st_size < self.pack_threshold:
+            if self.verbose > 1:
+                LOG.debug("Packing %r into a tar archive.", entry.path)
+            self._packed.append(
+                (entry.path, remote_file, entry.stat.st_size, entry.stat.st_mtime))
+            return False
+        return True
+
+    # -------------------------------------------------------------------------
+    def put_entry(self, entry, fileobj=None):
+        """Uploads the file of the given local entry, see put_file()."""
+
+        self.put_file(entry.path, self.remote_name(entry.relpath), entry.stat, fileobj=fileobj)
+
+    # -------------------------------------------------------------------------
+    def finish_backup(self, **info):
+        """
+        Uploads the packed files and the manifest of the backup directory
+        started by start_backup() and changes back into its parent.
+
+        @return: the list of remote files with mismatching checksums
+        @rtype: list
+        """
+
+        if self._packed or self._packed_done:
+            self.put_packed(self._packed, self._packed_done)
+        self._packed = []
+        self._packed_done = []
+        if not self.simulate:
+            self.remove_partial_uploads()
+        self.put_manifest()
+        mismatches = self.finish_verify()
+        if not self.simulate:
+            self.save_compress_history()
+        self.update_index()
+        self.log_cache_stats()
+        self.save_run_report(
+            started=self.backup_started, verify_mismatches=mismatches, **info)
+        self.finish_journal()
+        if not self.simulate:
+            self.cwd('..')
+        self.new_backup_dir = None
+        return mismatches
+
+    # -------------------------------------------------------------------------
+    def resume_offset(self, name, remote_file, size, mtime, level=None):
+        """
+        Returns the size of the already uploaded part of a file, whose upload
+        was interrupted in the continued run, or 0. Only unchanged files
+        uploaded without compression and encryption are continued, if the
+        server supports writing at an offset by REST before STOR.
+        """
+
+        if self.journal is None or level is not None or self.encrypt:
+            return 0
+        # The temporary file of an upload in ranges may have holes
+        if self.use_ranges(size, level):
+            return 0
+        if not self.journal.partial_upload(name, remote_file, size, mtime):
+            return 0
+        if not self.probe_rest_stor():
+            return 0
+        try:
+            self.ftp.voidcmd('TYPE I')
+            remote_size = self.ftp.size(remote_file + UPLOAD_PARTIAL_SUFFIX)
+        except ftplib.all_errors:
+            return 0
+        if remote_size and 0 < remote_size < size:
+            return remote_size
+        return 0
+
+    # -------------------------------------------------------------------------
+    def remove_partial_uploads(self):
+        """
+        Removes the remaining temporary files of the uploads interrupted
+        by the continued run.
+        """
+
+        if self.journal is None:
+            return
+        for entry in self.journal.in_flight().values():
+            partial_file = entry['remote'] + UPLOAD_PARTIAL_SUFFIX
+            try:
+                self.ftp.delete(partial_file)
+            except ftplib.error_perm:
+                continue
+            LOG.info("Removed the interrupted upload %r.", partial_file)
+
+    # -------------------------------------------------------------------------
+    def put_stream(self, stream, remote_file, rest=None, size=None):
+        """
+        Uploads the stream under a temporary name and renames it afterwards
+        with RNFR/RNTO, so a remote file with its final name is always complete.
+        With size the size of the temporary file is checked before renaming,
+        e.g. after continuing an interrupted upload at the offset rest.
+        """
+
+        partial_file = remote_file + UPLOAD_PARTIAL_SUFFIX
+        self.ftp.storbinary('STOR %s' % (partial_file), stream, rest=rest)
+        if size is not None:
+            remote_size = self.ftp.size(partial_file)
+            if remote_size != size:
+                # The next try uploads the whole file again
+                self.ftp.delete(partial_file)
+                raise ftplib.error_temp("Size mismatch in continued upload of %r: %r != %d" % (
+                    remote_file, remote_size, size))
+        self.rename_uploaded(partial_file, remote_file)
+
+    # -------------------------------------------------------------------------
+    def rename_uploaded(self, partial_file, remote_file):
+        """Moves a completely uploaded file to its final name with RNFR/RNTO."""
+
+        try:
+            self.ftp.rename(partial_file, remote_file)
+        except ftplib.error_perm:
+            # Not all servers replace an existing file by renaming
+            self.ftp.delete(remote_file)
+            self.ftp.rename(partial_file, remote_file)
+
+    # -------------------------------------------------------------------------
+    def probe_rest_stor(self):
+        """
+        Probes once, whether the server writes into an existing file at the
+        offset given by REST before STOR without truncating it. Some servers
+        ignore REST or truncate the file at the offset, uploads in ranges are
+        impossible then.
+
+        @return: the support of REST before STOR
+        @rtype: bool
+        """
+
+        if self.rest_stor is not None:
+            return self.rest_stor
+
+        content = []
+        try:
+            self.ftp.storbinary('STOR %s' % (REST_PROBE_FILE), io.BytesIO(b'aaaa'))
+            self.ftp.storbinary('STOR %s' % (REST_PROBE_FILE), io.BytesIO(b'b'), rest=1)
+            self.ftp.retrbinary('RETR %s' % (REST_PROBE_FILE), content.append)
+        except ftplib.error_perm as e:
+            LOG.debug("Error on probing REST before STOR: %s", str(e))
+        finally:
+            try:
+                self.ftp.delete(REST_PROBE_FILE)
+            except ftplib.error_perm:
+                pass
+
+        self.rest_stor = b''.join(content) == b'abaa'
+        if self.rest_stor:
+            LOG.debug("The FTP server supports writing at an offset by REST before STOR.")
+        else:
+            LOG.info(
+                "The FTP server doesn't support writing at an offset by REST before STOR, "
+                "big files are uploaded as a single stream.")
+        return self.rest_stor
+
+    # -------------------------------------------------------------------------
+    def use_ranges(self, size, level=None):
+        """
+        Returns, whether a file of the given size is uploaded in ranges
+        written concurrently over several connections. Compressed and
+        encrypted uploads are always written as a single stream.
+        """
+
+        if level is not None or self.encrypt or self.range_workers < 2:
+            return False
+        if size < self.range_threshold:
+            return False
+        return self.probe_rest_stor()
+
+    # -------------------------------------------------------------------------
+    def _open_range_ftp(self):
+
+        ftp = self._create_ftp()
+        ftp.connect(host=self.host, port=self.port)
+        ftp.login(user=self.user, passwd=self.password)
+        ftp.cwd(self.remote_dir)
+        return ftp
+
+    # -------------------------------------------------------------------------
+    def put_ranges(self, local_file, remote_file, size, algorithms=None):
+        """
+        Uploads the given local file in ranges, which are written concurrently
+        over separate connections by REST and STOR at their offsets into a
+        temporary file. A failed range is written again over a new connection.
+        The temporary file is renamed after checking its size.
+
+        The first range creates the temporary file with a plain STOR before
+        all other ranges, because many servers truncate the file on STOR
+        after REST 0.
+
+        @raise RangeUploadError: if a range failed finally or the size
+                                 of the uploaded file is wrong
+
+        @return: the checksums of the local file by the given algorithms
+        @rtype: dict
+        """
+
+        partial_file = remote_file + UPLOAD_PARTIAL_SUFFIX
+        first = min(self.range_size, size)
+        with RangeReader(local_file, 0, first) as reader:
+            self.ftp.storbinary('STOR %s' % (partial_file), reader)
+
+        def write_range(ftp, fileobj, offset, length):
+            ftp.storbinary('STOR %s' % (partial_file), fileobj, rest=offset)
+
+        controller = None
+        if self.range_adaptive:
+            if self.range_controller is None:
+                self.range_controller = AdaptiveConcurrency(
+                    min(self.range_min_workers, self.range_workers), self.range_workers,
+                    name='range uploads')
+            controller = self.range_controller
+
+        pool = SessionPool(self._open_range_ftp, self.range_workers)
+        upload = RangeUpload(
+            local_file, size, pool, write_range, range_size=self.range_size,
+            io_mode=self.io_mode, stats=self.cache_stats, start=first, controller=controller)
+        try:
+            digests = upload.run(algorithms)
+        finally:
+            pool.close()
+
+        self.ftp.voidcmd('TYPE I')
+        remote_size = self.ftp.size(partial_file)
+        if remote_size != size:
+            # The server didn't behave like on probing
+            self.rest_stor = False
+            raise RangeUploadError("Size mismatch in the upload of %r in ranges: %r != %d" % (
+                remote_file, remote_size, size))
+        self.rename_uploaded(partial_file, remote_file)
+        return digests
+
+    # -------------------------------------------------------------------------
+    def async_client(self):
+        """
+        Returns a new, not yet connected asyncio client with the connection
+        settings of this handler, to be connected in a running event loop.
+        """
+
+        return AsyncFTPClient(
+            self.host, port=self.port, user=self.user, password=self.password,
+            remote_dir=self.remote_dir, tls=self.tls,
+            tls_verify_mode=VERIFY_OPTS[self.tls_verify], timeout=self.timeout)
+
+    # -------------------------------------------------------------------------
+    def async_pool(self, size=DEFAULT_POOL_SIZE):
+        """
+        Returns a pool of at most size asyncio clients for running many
+        listings, deletions and small uploads concurrently, e.g.:
+
+            async with handler.async_pool(32) as pool:
+                failed = await pool.delete_many(names)
+        """
+
+        return AsyncFTPPool(self.async_client, size)
+
+    # -------------------------------------------------------------------------
+    def start_verify(self):
+        """
+        Starts the verification of the uploads with an own connection to the
+        FTP server, if configured and supported by the server.
+        """
+
+        if not self.verify or self.simulate:
+            return None
+
+        LOG.debug("Opening a second connection to %r for verifying uploads ...", self.host)
+        ftp = self._create_ftp()
+        try:
+            ftp.connect(host=self.host, port=self.port)
+            ftp.login(user=self.user, passwd=self.password)
+            verifier = FTPVerifier(ftp, self.checksum)
+        except VerifyUnsupportedError as e:
+            LOG.warning("Not verifying the uploads: %s", str(e))
+            ftp.close()
+            return None
+        except ftplib.all_errors as e:
+            LOG.warning("Could not connect for verifying the uploads: %s", str(e))
+            ftp.close()
+            return None
+
+        # A single FTP control connection cannot run commands in parallel
+        self.verify_queue = VerifyQueue(verifier, 1)
+        return self.verify_queue
+
+    # -------------------------------------------------------------------------
+    def submit_verify(self, remote_file, expected):
+        """Queues the verification of the given file in the current remote directory."""
+
+        if self.verify_queue is None or not expected:
+            return
+        self.verify_queue.submit(posixpath.join(self.remote_dir, remote_file), expected)
+
+    # -------------------------------------------------------------------------
+    def put_file(self, local_file, remote_file=None, statinfo=None, fileobj=None):
+        """
+        Uploads the given local file into the current remote directory.
+        The size and the modification time are taken from statinfo, e.g. the
+        cached stat result of a scanned entry, the local file is only checked
+        and stat'ed, if it is not given. With fileobj its content is read
+        from this file object instead of the local file, the upload is not
+        repeated then on errors.
+
+        In adaptive compression mode the compression history is not saved
+        by this method, call save_compress_history() after all uploads.
+        If a manifest was started by start_manifest(), the file is recorded
+        there with its checksum, call put_manifest() after all uploads.
+        If the verification was started by start_verify(), the uploaded file
+        is verified in the background, call finish_verify() after all uploads.
+        If the journal was started by start_journal(), the upload is recorded
+        there and an upload interrupted by the continued run is continued.
+        """
 
         if not self.ftp or not self.logged_in:
             msg = "Cannot put file %r, not connected or logged in." % (local_file)
@@ -538,36 +1703,97 @@ class FTPHandler(PbBaseHandler):
         if not remote_file:
             remote_file = os.path.basename(local_file)
 
-        if not os.path.isfile(local_file):
-            raise FTPPutError(local_file, "not a regular file.")
-
-        statinfo = os.stat(local_file)
+        if statinfo is None:
+            if not os.path.isfile(local_file):
+                raise FTPPutError(local_file, "not a regular file.")
+            statinfo = os.stat(local_file)
         size = statinfo.st_size
+        mtime = statinfo.st_mtime
         s = ''
         if size != 1:
             s = 's'
         size_human = bytes2human(size, precision=1)
+        (mode, level) = self.get_compress_mode(local_file)
+        name = remote_file
+        remote_file += UploadPipeline.suffix(level, self.encrypt)
         LOG.info(
             "Transfering file %r -> %r, size %d Byte%s (%s).",
             local_file, remote_file, size, s, size_human)
-        if not self.simulate:
-            cmd = 'STOR %s' % (remote_file)
-            with open(local_file, 'rb') as fh:
-                try_nr = 0
-                while try_nr < self.max_stor_attempts:
-                    try_nr += 1
-                    if try_nr >= 2:
-                        LOG.info("Try %d transferring file %r ...", try_nr, local_file)
-                    try:
-                        self.ftp.storbinary(cmd, fh)
-                        break
-                    except ftplib.error_temp as e:
-                        if try_nr >= 10:
-                            msg = "Giving up trying to upload %r after %d tries: %s"
-                            LOG.error(msg, local_file, try_nr, str(e))
-                            raise
-                        self.handle_error(str(e), e.__class__.__name__, False)
-                        time.sleep(2)
+        if self.simulate:
+            if self.manifest is not None:
+                self.manifest.add(name, remote_file, size, mtime)
+            return
 
+        # Reading ahead makes no sense with memory mapped files
+        read_ahead = self.io_mode != IO_MODE_MMAP and fileobj is None
+        max_attempts = self.max_stor_attempts
+        if fileobj is not None:
+            max_attempts = 1
+        digest = None
+        try_nr = 0
+        if self.journal is not None:
+            self.journal.plan(name, remote_file, size, mtime)
+        if fileobj is None and self.use_ranges(size, level):
+            digest_algorithm = self.verify_algorithm(level)
+            try:
+                digests = self.put_ranges(
+                    local_file, remote_file, size, algorithms=[self.checksum, digest_algorithm])
+            except RangeUploadError as e:
+                LOG.warning(
+                    "Upload of %r in ranges failed, uploading it as a single stream: %s",
+                    local_file, str(e))
+            else:
+                digest = digests.get(self.checksum)
+                if mode:
+                    self.compress_history.record(local_file, mode, None)
+                self.submit_verify(remote_file, digests.get(digest_algorithm) or digest)
+                # No upload as a single stream
+                max_attempts = 0
+        while try_nr < max_attempts:
+            try_nr += 1
+            if try_nr >= 2:
+                LOG.info("Try %d transferring file %r ...", try_nr, local_file)
+            offset = 0
+            if fileobj is None:
+                offset = self.resume_offset(name, remote_file, size, mtime, level)
+            digest_algorithm = self.verify_algorithm(level)
+            if offset:
+                LOG.info("Continuing the upload of %r after %d Bytes.", remote_file, offset)
+                # The stream doesn't see the whole file, see resumed_digest()
+                digest_algorithm = None
+            try:
+                fh = fileobj
+                if fh is None:
+                    fh = self.open_local_file(local_file)
+                with fh:
+                    skip_prefix(fh, offset)
+                    with self.open_upload_pipeline(
+                            fh, level, read_ahead=read_ahead,
+                            digest_algorithm=digest_algorithm) as stream:
+                        if offset:
+                            self.put_stream(stream, remote_file, rest=offset, size=size)
+                        else:
+                            self.put_stream(stream, remote_file)
+                    digest = local_digest(fh)
+                stream.log_stats()
+                if mode:
+                    self.compress_history.record(local_file, mode, stream.compress_ratio())
+                if offset:
+                    self.submit_verify(remote_file, self.resumed_digest(local_file, digest))
+                else:
+                    self.submit_verify(remote_file, stream.upload_digest() or digest)
+                break
+            except ftplib.error_temp as e:
+                if try_nr >= max_attempts:
+                    msg = "Giving up trying to upload %r after %d tries: %s"
+                    LOG.error(msg, local_file, try_nr, str(e))
+                    raise
+                self.handle_error(str(e), e.__class__.__name__, False)
+                time.sleep(2)
+
+        if self.journal is not None:
+            self.journal.done(name, remote_file, size, mtime, digest)
+        if self.manifest is not None:
+            self.manifest.add(name, remote_file, size, mtime, digest)
 
 # vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
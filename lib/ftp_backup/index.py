@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Module for a local searchable index of all backed up files
+          in all backup directories, stored in a SQLite database
+"""
+
+# Standard modules
+import logging
+import os
+import time
+import sqlite3
+import posixpath
+import threading
+
+# Third party modules
+
+# Own modules
+from pb_base.errors import PbError
+
+from ftp_backup import DEFAULT_STATE_DIRECTORY
+
+__version__ = '0.1.0'
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_INDEX_FILE = DEFAULT_STATE_DIRECTORY / 'index.sqlite'
+DEFAULT_FIND_LIMIT = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS backups (
+    host TEXT NOT NULL,
+    server TEXT NOT NULL,
+    backup_dir TEXT NOT NULL,
+    algorithm TEXT,
+    created REAL,
+    indexed REAL,
+    PRIMARY KEY (host, server, backup_dir)
+);
+CREATE TABLE IF NOT EXISTS files (
+    host TEXT NOT NULL,
+    server TEXT NOT NULL,
+    backup_dir TEXT NOT NULL,
+    path TEXT NOT NULL,
+    name TEXT NOT NULL,
+    remote TEXT,
+    archive TEXT,
+    size INTEGER,
+    mtime REAL,
+    digest TEXT
+);
+CREATE INDEX IF NOT EXISTS files_path ON files (path);
+CREATE INDEX IF NOT EXISTS files_name ON files (name);
+CREATE INDEX IF NOT EXISTS files_digest ON files (digest);
+CREATE INDEX IF NOT EXISTS files_backup ON files (host, server, backup_dir);
+"""
+
+GLOB_CHARS = ('*', '?', '[')
+
+
+# =============================================================================
+class BackupIndexError(PbError):
+    """
+    Base exception class for all exceptions belonging to issues
+    in this module
+    """
+    pass
+
+
+# =============================================================================
+class IndexEntry(object):
+    """A file found in the index."""
+
+    # -------------------------------------------------------------------------
+    def __init__(
+            self, host, server, backup_dir, path, remote=None, archive=None,
+            size=None, mtime=None, digest=None):
+
+        self.host = host
+        self.server = server
+        self.backup_dir = backup_dir
+        self.path = path
+        self.remote = remote
+        self.archive = archive
+        self.size = size
+        self.mtime = mtime
+        self.digest = digest
+
+    # -------------------------------------------------------------------------
+    def as_dict(self):
+
+        return {
+            'host': self.host,
+            'server': self.server,
+            'backup_dir': self.backup_dir,
+            'path': self.path,
+            'remote': self.remote,
+            'archive': self.archive,
+            'size': self.size,
+            'mtime': self.mtime,
+            'digest': self.digest,
+        }
+
+
+# =============================================================================
+class BackupIndex(object):
+    """
+    Index of all backed up files by host, server and backup directory.
+    The files of a backup directory are always replaced as a whole from
+    its manifest, in one transaction.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, filename=DEFAULT_INDEX_FILE):
+
+        self.filename = str(filename)
+        self._lock = threading.Lock()
+
+        dirname = os.path.dirname(self.filename)
+        try:
+            if dirname and not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            self.db = sqlite3.connect(self.filename, check_same_thread=False)
+            self.db.executescript(SCHEMA)
+        except (OSError, sqlite3.Error) as e:
+            raise BackupIndexError("Could not open index %r: %s" % (self.filename, e))
+
+    # -------------------------------------------------------------------------
+    def close(self):
+
+        with self._lock:
+            self.db.close()
+
+    # -------------------------------------------------------------------------
+    def __enter__(self):
+        return self
+
+    # -------------------------------------------------------------------------
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # -------------------------------------------------------------------------
+    def add_manifest(self, host, server, manifest):
+        """
+        Records all files of the manifest of a backup directory, replacing
+        the former entries of this backup directory.
+        """
+
+        rows = []
+        for (path, entry) in manifest.files.items():
+            rows.append((
+                host, server, manifest.backup_dir, path, posixpath.basename(path),
+                entry.get('remote'), entry.get('archive'), entry.get('size'),
+                entry.get('mtime'), entry.get('digest')))
+
+        try:
+            with self._lock:
+                with self.db:
+                    self._delete(host, server, manifest.backup_dir)
+                    self.db.execute(
+                        "INSERT INTO backups (host, server, backup_dir, algorithm, created, "
+                        "indexed) VALUES (?, ?, ?, ?, ?, ?)",
+                        (host, server, manifest.backup_dir, manifest.algorithm,
+                            manifest.created, time.time()))
+                    self.db.executemany(
+                        "INSERT INTO files (host, server, backup_dir, path, name, remote, "
+                        "archive, size, mtime, digest) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        rows)
+        except sqlite3.Error as e:
+            raise BackupIndexError("Could not add backup directory %r to index %r: %s" % (
+                manifest.backup_dir, self.filename, e))
+        LOG.debug(
+            "Indexed %d files of backup directory %r on %r.",
+            len(rows), manifest.backup_dir, server)
+
+    # -------------------------------------------------------------------------
+    def _delete(self, host, server, backup_dir):
+
+        params = (host, server, backup_dir)
+        self.db.execute(
+            "DELETE FROM files WHERE host = ? AND server = ? AND backup_dir = ?", params)
+        self.db.execute(
+            "DELETE FROM backups WHERE host = ? AND server = ? AND backup_dir = ?", params)
+
+    # -------------------------------------------------------------------------
+    def remove_backup_dir(self, host, server, backup_dir):
+        """Removes all entries of a deleted backup directory."""
+
+        try:
+            with self._lock:
+                with self.db:
+                    self._delete(host, server, backup_dir)
+        except sqlite3.Error as e:
+            raise BackupIndexError("Could not remove backup directory %r from index %r: %s" % (
+                backup_dir, self.filename, e))
+        LOG.debug("Removed backup directory %r on %r from the index.", backup_dir, server)
+
+    # -------------------------------------------------------------------------
+    def clear(self, host=None, server=None):
+        """Removes all entries, or all entries of the given host and server."""
+
+        where = []
+        params = []
+        if host:
+            where.append('host = ?')
+            params.append(host)
+        if server:
+            where.append('server = ?')
+            params.append(server)
+        clause = ''
+        if where:
+            clause = ' WHERE ' + ' AND '.join(where)
+        with self._lock:
+            with self.db:
+                self.db.execute("DELETE FROM files" + clause, params)
+                self.db.execute("DELETE FROM backups" + clause, params)
+
+    # -------------------------------------------------------------------------
+    def backup_dirs(self, host=None, server=None):
+        """Returns the sorted names of all indexed backup directories."""
+
+        sql = "SELECT DISTINCT backup_dir FROM backups"
+        (clause, params) = self._filter(host=host, server=server)
+        with self._lock:
+            rows = self.db.execute(sql + clause + " ORDER BY backup_dir", params).fetchall()
+        return [row[0] for row in rows]
+
+    # -------------------------------------------------------------------------
+    def _filter(self, host=None, server=None, backup_dir=None, digest=None):
+
+        where = []
+        params = []
+        for (column, value) in (
+                ('host', host), ('server', server), ('backup_dir', backup_dir),
+                ('digest', digest)):
+            if value:
+                where.append('%s = ?' % (column))
+                params.append(value)
+        clause = ''
+        if where:
+            clause = ' WHERE ' + ' AND '.join(where)
+        return (clause, params)
+
+    # -------------------------------------------------------------------------
+    def find(
+            self, pattern=None, host=None, server=None, backup_dir=None, digest=None,
+            limit=DEFAULT_FIND_LIMIT):
+        """
+        Searches files by their path. A pattern without a slash is matched
+        against the file name, else against the whole path; both may contain
+        the shell wildcards of GLOB.
+
+        @return: the found files, the newest backup directories first
+        @rtype: list of IndexEntry
+        """
+
+        (clause, params) = self._filter(
+            host=host, server=server, backup_dir=backup_dir, digest=digest)
+        if pattern:
+            column = 'path'
+            if '/' not in pattern:
+                column = 'name'
+            op = '='
+            if any(c in pattern for c in GLOB_CHARS):
+                op = 'GLOB'
+            if clause:
+                clause += ' AND '
+            else:
+                clause = ' WHERE '
+            clause += '%s %s ?' % (column, op)
+            params.append(pattern)
+
+        sql = (
+            "SELECT host, server, backup_dir, path, remote, archive, size, mtime, digest "
+            "FROM files" + clause + " ORDER BY backup_dir DESC, path")
+        if limit:
+            sql += " LIMIT %d" % (int(limit))
+        with self._lock:
+            rows = self.db.execute(sql, params).fetchall()
+        return [IndexEntry(*row) for row in rows]
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
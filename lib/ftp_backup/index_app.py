@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Application class for script for searching backed up files
+          in the local index and for rebuilding the index from the manifests
+"""
+
+# Standard modules
+import logging
+import time
+
+# Third party modules
+
+# Own modules
+from pb_base.common import bytes2human
+
+from ftp_backup.sftp_handler import DEFAULT_SSH_SERVER
+
+from ftp_backup.restore_app import RemoteCfgApp
+
+from ftp_backup.restore import fetch_manifest, RE_BACKUP_DIR
+
+from ftp_backup.index import BackupIndex, BackupIndexError
+from ftp_backup.index import DEFAULT_INDEX_FILE, DEFAULT_FIND_LIMIT
+
+__version__ = '0.1.0'
+
+LOG = logging.getLogger(__name__)
+
+COMMANDS = ('find', 'rebuild')
+
+
+# =============================================================================
+class IndexApp(RemoteCfgApp):
+    """
+    Application class for searching backed up files in the local index
+    and for rebuilding the index from the manifests on a FTP or SSH server.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, appname=None, verbose=0):
+        """Constructor."""
+
+        description = """\
+        Searches the local index of all backed up files by file name, path
+        or checksum ('find'), or rebuilds the index from the manifests of
+        all backup directories on a FTP or SSH server ('rebuild').
+        """
+
+        self.index_file = DEFAULT_INDEX_FILE
+
+        super(IndexApp, self).__init__(
+            appname=appname, verbose=verbose, description=description)
+        self.post_init()
+
+        self.initialized = True
+
+    # -------------------------------------------------------------------------
+    def init_arg_parser(self):
+
+        super(IndexApp, self).init_arg_parser()
+
+        h = "The SQLite file of the index (default: %r)." % (str(DEFAULT_INDEX_FILE))
+        self.arg_parser.add_argument('--index-file', metavar='FILE', dest='index_file', help=h)
+
+        commands = self.arg_parser.add_subparsers(dest='command', metavar='COMMAND')
+
+        h = (
+            "Search files in the index. A pattern without a slash is matched against "
+            "the file names, else against the whole path, both with shell wildcards.")
+        find_parser = commands.add_parser('find', help=h)
+        find_parser.add_argument('pattern', metavar='PATTERN', nargs='?', help=h)
+        find_parser.add_argument(
+            '--backup-host', metavar='HOST', dest='backup_host',
+            help="Only files backed up from this host.")
+        find_parser.add_argument(
+            '--backup-dir', metavar='NAME', dest='backup_dir',
+            help="Only files in this backup directory.")
+        find_parser.add_argument(
+            '--digest', metavar='HEX', help="Only files with this checksum.")
+        find_parser.add_argument(
+            '--limit', metavar='NR', type=int, default=DEFAULT_FIND_LIMIT,
+            help="The maximum number of found files (default: %d)." % (DEFAULT_FIND_LIMIT))
+
+        h = "Rebuild the index of the server from the manifests of all its backup directories."
+        commands.add_parser('rebuild', help=h)
+
+    # -------------------------------------------------------------------------
+    def perform_arg_parser(self):
+
+        super(IndexApp, self).perform_arg_parser()
+
+        if self.args.index_file:
+            self.index_file = self.args.index_file
+
+    # -------------------------------------------------------------------------
+    def perform_config(self):
+
+        super(IndexApp, self).perform_config()
+
+        for section in self.cfg:
+            if section.lower() == 'global':
+                if 'index_file' in self.cfg[section] and not self.args.index_file:
+                    self.index_file = self.cfg[section]['index_file']
+
+    # -------------------------------------------------------------------------
+    @property
+    def server(self):
+        """The name of the server as recorded in the index."""
+
+        if self.host:
+            return self.host
+        if self.protocol == 'ftp':
+            return 'ftp'
+        return DEFAULT_SSH_SERVER
+
+    # -------------------------------------------------------------------------
+    def _run(self):
+        """The underlaying startpoint of the application."""
+
+        if self.args.command not in COMMANDS:
+            self.arg_parser.print_usage()
+            self.exit(1, "No command given, must be one of %s." % (', '.join(COMMANDS)))
+
+        try:
+            index = BackupIndex(self.index_file)
+        except BackupIndexError as e:
+            self.exit(5, str(e))
+
+        with index:
+            if self.args.command == 'find':
+                self.find(index)
+            else:
+                self.rebuild(index)
+
+    # -------------------------------------------------------------------------
+    def find(self, index):
+
+        entries = index.find(
+            self.args.pattern, host=self.args.backup_host, backup_dir=self.args.backup_dir,
+            digest=self.args.digest, limit=self.args.limit)
+        if not entries:
+            LOG.info("No files found.")
+            self.exit(2)
+
+        for entry in entries:
+            mtime = ''
+            if entry.mtime is not None:
+                mtime = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry.mtime))
+            size = ''
+            if entry.size is not None:
+                size = bytes2human(entry.size)
+            remote = entry.remote
+            if entry.archive:
+                remote = entry.archive
+            print("%s:%s %s  %10s  %s  %s (%s)" % (
+                entry.server, entry.backup_dir, entry.path, size, mtime,
+                entry.host, remote))
+
+    # -------------------------------------------------------------------------
+    def rebuild(self, index):
+
+        host = self.source_host
+        server = self.server
+        session = self.session_factory()()
+        try:
+            backup_dirs = sorted(n for n in session.listdir('.') if RE_BACKUP_DIR.match(n))
+            LOG.info(
+                "Rebuilding the index of %d backup directories on %r ...",
+                len(backup_dirs), server)
+            key = self.load_decrypt_key()
+            manifests = []
+            for backup_dir in backup_dirs:
+                manifest = fetch_manifest(session, backup_dir, key)
+                if manifest is None:
+                    LOG.warn("Backup directory %r has no manifest.", backup_dir)
+                    continue
+                manifests.append(manifest)
+        finally:
+            session.close()
+
+        index.clear(host, server)
+        nr_files = 0
+        for manifest in manifests:
+            index.add_manifest(host, server, manifest)
+            nr_files += len(manifest.files)
+        LOG.info(
+            "Indexed %d files in %d backup directories on %r.",
+            nr_files, len(manifests), server)
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
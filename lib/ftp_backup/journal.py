@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Module for a crash-safe local journal of a backup run, so an
+          interrupted backup can be resumed in the same backup directory
+"""
+
+# Standard modules
+import logging
+import os
+import io
+import json
+import time
+import hashlib
+
+# Third party modules
+
+# Own modules
+from pb_base.errors import PbError
+
+from ftp_backup import DEFAULT_STATE_DIRECTORY
+
+__version__ = '0.1.0'
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_JOURNAL_DIR = DEFAULT_STATE_DIRECTORY / 'journal'
+# Hours after the start of an interrupted run, in which it is resumed
+DEFAULT_RESUME_WINDOW = 12
+JOURNAL_VERSION = 1
+SKIP_BLOCKSIZE = 1024 * 1024
+
+
+# =============================================================================
+class RunJournalError(PbError):
+    """
+    Base exception class for all exceptions belonging to issues
+    in this module
+    """
+    pass
+
+
+# =============================================================================
+def journal_file(journal_dir, server, remote_dir, local_dir):
+    """Returns the name of the journal file of the given backup target."""
+
+    key = '\0'.join((str(server), str(remote_dir), str(local_dir)))
+    name = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16] + '.journal'
+    return os.path.join(os.path.expanduser(str(journal_dir)), name)
+
+
+# =============================================================================
+def skip_prefix(fileobj, offset):
+    """
+    Positions the given local file object behind the first offset Bytes
+    for resuming an upload. A hashing reader has to read them to get
+    the checksum of the whole file.
+    """
+
+    if not offset:
+        return
+    if not hasattr(fileobj, 'hexdigest'):
+        try:
+            fileobj.seek(offset)
+            return
+        except (AttributeError, IOError, io.UnsupportedOperation):
+            pass
+    remaining = offset
+    while remaining > 0:
+        data = fileobj.read(min(remaining, SKIP_BLOCKSIZE))
+        if not data:
+            raise RunJournalError("Local file is shorter than %d Bytes." % (offset))
+        remaining -= len(data)
+
+
+# =============================================================================
+class RunJournal(object):
+    """
+    Append-only journal of one backup run, one JSON record per line.
+
+    The first record describes the target and the backup directory, then
+    every file is recorded once before its upload starts ('plan') and once
+    after its upload was completed ('done'), with all fields of its
+    manifest entry. Every 'done' record is synced to disk, a record torn
+    by a crash is ignored. At the successful end of the run the
+    journal is removed.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, filename, server, remote_dir, local_dir, backup_dir, started=None):
+
+        self.filename = str(filename)
+        self.server = str(server)
+        self.remote_dir = str(remote_dir)
+        self.local_dir = str(local_dir)
+        self.backup_dir = str(backup_dir)
+        self.started = started
+        if self.started is None:
+            self.started = time.time()
+
+        self.planned = {}
+        self.completed = {}
+        self.fh = None
+
+    # -------------------------------------------------------------------------
+    def header(self):
+
+        return {
+            'version': JOURNAL_VERSION,
+            'server': self.server,
+            'remote_dir': self.remote_dir,
+            'local_dir': self.local_dir,
+            'backup_dir': self.backup_dir,
+            'started': self.started,
+        }
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def load(cls, filename):
+        """
+        Reads an existing journal.
+
+        @return: the journal or None, if there is no usable journal
+        @rtype: RunJournal
+        """
+
+        filename = str(filename)
+        if not os.path.exists(filename):
+            return None
+
+        journal = None
+        with open(filename, 'r', encoding='utf-8') as fh:
+            for line in fh:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    LOG.debug("Ignoring a torn record in journal %r.", filename)
+                    continue
+                if journal is None:
+                    if record.get('version') != JOURNAL_VERSION:
+                        LOG.warning("Ignoring journal %r of an unknown version.", filename)
+                        return None
+                    journal = cls(
+                        filename, record['server'], record['remote_dir'],
+                        record['local_dir'], record['backup_dir'], record['started'])
+                    continue
+                op = record.pop('op', None)
+                name = record.pop('name', None)
+                if op == 'plan':
+                    journal.planned[name] = record
+                elif op == 'done':
+                    journal.completed[name] = record
+        return journal
+
+    # -------------------------------------------------------------------------
+    def resumable(self, server, remote_dir, local_dir, window=DEFAULT_RESUME_WINDOW, now=None):
+        """
+        Returns, whether the journal belongs to the given target and was
+        started not more than window hours ago.
+        """
+
+        if (self.server, self.remote_dir, self.local_dir) != (
+                str(server), str(remote_dir), str(local_dir)):
+            return False
+        if now is None:
+            now = time.time()
+        return 0 <= now - self.started <= window * 3600
+
+    # -------------------------------------------------------------------------
+    def open(self, resume=False):
+        """
+        Opens the journal for writing. A new journal replaces an existing
+        file and starts with its header, a resumed journal is appended.
+        """
+
+        if self.fh is not None:
+            return
+        dirname = os.path.dirname(self.filename)
+        try:
+            if dirname and not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            if resume and os.path.exists(self.filename):
+                self.fh = open(self.filename, 'a', encoding='utf-8')
+                # Terminates a torn last record
+                self.fh.write('\n')
+            else:
+                self.fh = open(self.filename, 'w', encoding='utf-8')
+                self._write(self.header(), sync=True)
+        except (IOError, OSError) as e:
+            raise RunJournalError("Could not open journal %r: %s" % (self.filename, e))
+
+    # -------------------------------------------------------------------------
+    def _write(self, record, sync=False):
+
+        self.fh.write(json.dumps(record, sort_keys=True) + '\n')
+        self.fh.flush()
+        if sync:
+            os.fsync(self.fh.fileno())
+
+    # -------------------------------------------------------------------------
+    def plan(self, name, remote_name, size, mtime):
+        """Records the start of the upload of a file."""
+
+        record = {'remote': remote_name, 'size': size, 'mtime': mtime}
+        self.planned[name] = record
+        if self.fh is not None:
+            self._write(dict(record, op='plan', name=name))
+
+    # -------------------------------------------------------------------------
+    def done(self, name, remote_name, size, mtime, digest=None, archive=None):
+        """Records a completed upload with the fields of its manifest entry."""
+
+        record = {'remote': remote_name, 'size': size, 'mtime': mtime}
+        if digest:
+            record['digest'] = digest
+        if archive:
+            record['archive'] = archive
+        self.completed[name] = record
+        if self.fh is not None:
+            self._write(dict(record, op='done', name=name), sync=True)
+
+    # -------------------------------------------------------------------------
+    def completed_entry(self, name, size, mtime):
+        """
+        Returns the recorded manifest entry of an already uploaded file,
+        if the local file was not changed since then, else None.
+        """
+
+        entry = self.completed.get(name)
+        if entry is None or entry['size'] != size or entry['mtime'] != mtime:
+            return None
+        return entry
+
+    # -------------------------------------------------------------------------
+    def partial_upload(self, name, remote_name, size, mtime):
+        """
+        Returns, whether the upload of the given unchanged file into the
+        given remote file was started, but not completed.
+        """
+
+        entry = self.planned.get(name)
+        if entry is None or name in self.completed:
+            return False
+        return (entry['remote'], entry['size'], entry['mtime']) == (remote_name, size, mtime)
+
+    # -------------------------------------------------------------------------
+    def in_flight(self):
+        """Returns the records of all files, whose upload was started, but not completed."""
+
+        return dict(
+            (name, entry) for (name, entry) in self.planned.items()
+            if name not in self.completed)
+
+    # -------------------------------------------------------------------------
+    def archives(self):
+        """Returns the names of all completely uploaded tar archives."""
+
+        return set(e['archive'] for e in self.completed.values() if e.get('archive'))
+
+    # -------------------------------------------------------------------------
+    def close(self):
+
+        if self.fh is not None:
+            self.fh.close()
+            self.fh = None
+
+    # -------------------------------------------------------------------------
+    def finish(self):
+        """Removes the journal after a successful backup run."""
+
+        self.close()
+        if os.path.exists(self.filename):
+            LOG.debug("Removing journal %r.", self.filename)
+            os.remove(self.filename)
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
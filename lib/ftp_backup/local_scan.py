@@ -0,0 +1,414 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Module for scanning the local directory for files to backup
+"""
+
+# Standard modules
+import logging
+import os
+import stat
+import time
+import queue
+import threading
+
+from collections import namedtuple, deque
+
+from concurrent.futures import ThreadPoolExecutor
+
+# Third party modules
+
+# Own modules
+from pb_base.errors import PbError
+
+__version__ = '0.3.0'
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_SCAN_QUEUE_SIZE = 1000
+DEFAULT_STAT_WORKERS = 16
+MAX_STAT_WORKERS = 256
+PROC_MOUNTS = os.sep + os.path.join('proc', 'mounts')
+NETWORK_FS_TYPES = (
+    'nfs', 'nfs4', 'cifs', 'smbfs', 'smb3', 'ncpfs', 'afs', 'coda', 'ceph',
+    'glusterfs', 'lustre', 'gpfs', 'ocfs2', 'gfs2', '9p', 'sshfs', 'davfs',
+)
+
+
+# =============================================================================
+class LocalScanError(PbError):
+    """
+    Base exception class for all exceptions belonging to issues
+    in this module
+    """
+    pass
+
+
+# =============================================================================
+LocalEntry = namedtuple('LocalEntry', ['path', 'relpath', 'is_dir', 'stat'])
+LocalEntry.__doc__ = """
+An entry found in the local directory.
+
+path: the local path of the entry
+relpath: the path relative to the scanned base directory, always with '/'
+is_dir: flag, that the entry is a directory
+stat: the os.stat_result of the entry (None for directories)
+"""
+
+
+# =============================================================================
+def get_fs_type(path):
+    """
+    Returns the type of the filesystem, the given path is located on,
+    as found in /proc/mounts, or None, if it could not be detected.
+    """
+
+    path = os.path.realpath(str(path))
+    fs_type = None
+    best = -1
+    try:
+        with open(PROC_MOUNTS, 'r') as fh:
+            for line in fh:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                # Blanks etc. in mount points are octal escaped
+                mount_point = fields[1].encode('utf-8').decode('unicode_escape')
+                if mount_point != os.sep:
+                    if path != mount_point and not path.startswith(mount_point + os.sep):
+                        continue
+                # Later mounts on the same mount point are overlaying the former
+                if len(mount_point) >= best:
+                    best = len(mount_point)
+                    fs_type = fields[2]
+    except (IOError, OSError) as e:
+        LOG.debug("Could not read %r: %s", PROC_MOUNTS, str(e))
+        return None
+
+    return fs_type
+
+
+# =============================================================================
+def is_network_fs(path):
+    """Returns, whether the given path is located on a network filesystem."""
+
+    fs_type = get_fs_type(path)
+    if not fs_type:
+        return False
+    if fs_type in NETWORK_FS_TYPES:
+        return True
+    if fs_type.startswith('fuse.') and fs_type[5:] in NETWORK_FS_TYPES:
+        return True
+    return False
+
+
+# =============================================================================
+def default_stat_workers(path):
+    """
+    Returns the number of threads for collecting the stat results of the
+    given local directory: DEFAULT_STAT_WORKERS on network filesystems, where
+    every stat() is a round trip to the server, else 0 (sequential).
+    """
+
+    if is_network_fs(path):
+        LOG.info(
+            "Local directory %r is on a network filesystem (%s), collecting "
+            "stat results with %d threads.", str(path), get_fs_type(path),
+            DEFAULT_STAT_WORKERS)
+        return DEFAULT_STAT_WORKERS
+    return 0
+
+
+# =============================================================================
+def _stat_entry(entry):
+
+    try:
+        return entry.stat()
+    except OSError as e:
+        return e
+
+
+# =============================================================================
+def scan_local_dir(base_dir, recursive=False, verbose=0, stat_workers=0):
+    """
+    Generator scanning the given local directory with os.scandir().
+
+    The regular files (following symlinks) are yielded as they are discovered,
+    in the order of the directory, without sorting. The stat results cached
+    in the os.DirEntry objects are used, so that mostly only one syscall
+    per file is needed.
+
+    In recursive mode all subdirectories of a directory are yielded together
+    after its files, before descending into them, so a consumer can create
+    them on the remote side at once. Symlinks to directories are not followed.
+
+    With stat_workers the stat() calls are issued from a thread pool, which
+    hides the latency of network filesystems. Directories are detected by
+    the file type hints of the directory entries without any stat().
+
+    @param base_dir: the local directory to scan
+    @type base_dir: str
+    @param recursive: scan also all subdirectories
+    @type recursive: bool
+    @param stat_workers: the number of threads for stat(), 0 for sequential
+    @type stat_workers: int
+
+    @return: LocalEntry objects
+    """
+
+    base_dir = str(base_dir)
+    stat_workers = int(stat_workers or 0)
+    if stat_workers < 0 or stat_workers > MAX_STAT_WORKERS:
+        msg = "Invalid number %r of stat workers, must be between 0 and %d." % (
+            stat_workers, MAX_STAT_WORKERS)
+        raise ValueError(msg)
+
+    executor = None
+    if stat_workers:
+        executor = ThreadPoolExecutor(max_workers=stat_workers)
+    max_pending = 4 * stat_workers
+
+    try:
+        pending = ['']
+        while pending:
+            reldir = pending.pop()
+            subdirs = []
+            entries = _scan_one_dir(
+                base_dir, reldir, recursive, verbose, executor, max_pending)
+            for entry in entries:
+                if entry.is_dir:
+                    subdirs.append(entry.relpath)
+                yield entry
+            pending.extend(reversed(subdirs))
+    finally:
+        if executor:
+            executor.shutdown(wait=True)
+
+
+# =============================================================================
+def _scan_one_dir(base_dir, reldir, recursive, verbose, executor, max_pending):
+
+    cur_dir = base_dir
+    if reldir:
+        cur_dir = os.path.join(base_dir, reldir)
+
+    subdirs = []
+    try:
+        it = os.scandir(cur_dir)
+    except OSError as e:
+        if not reldir:
+            raise LocalScanError("Could not scan %r: %s" % (cur_dir, str(e)))
+        LOG.error("Could not scan directory %r: %s", cur_dir, str(e))
+        return
+
+    stats = deque()
+    with it:
+        for entry in it:
+            relpath = entry.name
+            if reldir:
+                relpath = reldir + '/' + entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        subdirs.append(LocalEntry(entry.path, relpath, True, None))
+                    elif verbose > 1:
+                        LOG.debug("%r is a directory, don't backup it.", entry.path)
+                    continue
+            except OSError as e:
+                LOG.warning("Could not stat %r: %s", entry.path, str(e))
+                continue
+
+            if executor is None:
+                local_entry = _check_entry(entry, relpath, _stat_entry(entry), verbose)
+                if local_entry:
+                    yield local_entry
+                continue
+
+            stats.append((entry, relpath, executor.submit(_stat_entry, entry)))
+            while len(stats) > max_pending:
+                (entry, relpath, future) = stats.popleft()
+                local_entry = _check_entry(entry, relpath, future.result(), verbose)
+                if local_entry:
+                    yield local_entry
+
+    while stats:
+        (entry, relpath, future) = stats.popleft()
+        local_entry = _check_entry(entry, relpath, future.result(), verbose)
+        if local_entry:
+            yield local_entry
+
+    for subdir in subdirs:
+        yield subdir
+
+
+# =============================================================================
+def _check_entry(entry, relpath, statinfo, verbose):
+
+    if isinstance(statinfo, OSError):
+        LOG.warning("Could not stat %r: %s", entry.path, str(statinfo))
+        return None
+    if not stat.S_ISREG(statinfo.st_mode):
+        if verbose > 1:
+            LOG.debug("%r is not a file, don't backup it.", entry.path)
+        return None
+    return LocalEntry(entry.path, relpath, False, statinfo)
+
+
+# =============================================================================
+class ScanQueue(object):
+    """
+    Scans the local directory in a separate thread into a bounded queue,
+    so the scanning overlaps with the connection setup and the uploads.
+
+    The object is iterable by the consumer, the iteration starts with the
+    first entry found and raises the error of the scanner, if any.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(
+        self, base_dir, recursive=False, verbose=0, maxsize=DEFAULT_SCAN_QUEUE_SIZE,
+            stat_workers=None):
+        """
+        @param stat_workers: the number of threads for collecting the stat results,
+                             if None, it is detected by the filesystem type
+        @type stat_workers: int or None
+        """
+
+        self.base_dir = str(base_dir)
+        self.recursive = recursive
+        self.verbose = verbose
+        if stat_workers is None:
+            stat_workers = default_stat_workers(self.base_dir)
+        self.stat_workers = stat_workers
+
+        self.entries = 0
+        self.start_time = None
+        self.scan_busy = 0.0
+        self.consumer_wait = 0.0
+
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stop = threading.Event()
+        self._error = None
+        self._done = object()
+        self._thread = None
+
+    # -------------------------------------------------------------------------
+    def start(self):
+
+        self.start_time = time.time()
+        self._thread = threading.Thread(target=self._scan, name='local-scanner')
+        self._thread.daemon = True
+        self._thread.start()
+        LOG.debug("Started scanning of %r in the background.", self.base_dir)
+
+    # -------------------------------------------------------------------------
+    def _put(self, item):
+
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    # -------------------------------------------------------------------------
+    def _scan(self):
+
+        # Only the time spent for scanning counts, not the time blocked on a full queue.
+        try:
+            start = time.time()
+            entries = scan_local_dir(
+                self.base_dir, self.recursive, self.verbose, stat_workers=self.stat_workers)
+            for entry in entries:
+                self.scan_busy += time.time() - start
+                self.entries += 1
+                if not self._put(entry):
+                    return
+                start = time.time()
+            self.scan_busy += time.time() - start
+        except Exception as e:
+            self._error = e
+        finally:
+            self._put(self._done)
+
+    # -------------------------------------------------------------------------
+    def __iter__(self):
+
+        if self._thread is None:
+            self.start()
+
+        while True:
+            start = time.time()
+            item = self._queue.get()
+            self.consumer_wait += time.time() - start
+            if item is self._done:
+                break
+            yield item
+
+        if self._error:
+            if isinstance(self._error, LocalScanError):
+                raise self._error
+            raise LocalScanError("Error scanning %r: %s" % (self.base_dir, self._error))
+
+    # -------------------------------------------------------------------------
+    def close(self):
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    # -------------------------------------------------------------------------
+    def __enter__(self):
+        return self
+
+    # -------------------------------------------------------------------------
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # -------------------------------------------------------------------------
+    def time_saved(self):
+        """
+        The wall clock time saved compared to a strictly sequential run.
+
+        A sequential run would have needed the whole scanning time in addition,
+        the overlapped run only the time the consumer waited for the scanner.
+        """
+
+        saved = self.scan_busy - self.consumer_wait
+        if saved < 0:
+            return 0.0
+        return saved
+
+    # -------------------------------------------------------------------------
+    def throughput(self):
+        """The number of scanned entries per second."""
+
+        if not self.scan_busy:
+            return 0.0
+        return self.entries / self.scan_busy
+
+    # -------------------------------------------------------------------------
+    def log_stats(self):
+
+        LOG.info(
+            "Scanned %d local entries in %.2f seconds (%.1f entries/s, %d stat threads).",
+            self.entries, self.scan_busy, self.throughput(), self.stat_workers)
+        LOG.info(
+            "Uploads waited %.2f seconds for the scanner, overlapping saved %.2f seconds.",
+            self.consumer_wait, self.time_saved())
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Module for the manifest of a backup directory and the local
+          report of a backup run
+"""
+
+# Standard modules
+import logging
+import os
+import json
+import time
+import socket
+import threading
+
+# Third party modules
+
+# Own modules
+from pb_base.errors import PbError
+
+from ftp_backup import DEFAULT_STATE_DIRECTORY
+
+__version__ = '0.2.0'
+
+LOG = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+DEFAULT_REPORT_DIR = DEFAULT_STATE_DIRECTORY / 'reports'
+
+
+# =============================================================================
+class ManifestError(PbError):
+    """
+    Base exception class for all exceptions belonging to issues
+    in this module
+    """
+    pass
+
+
+# =============================================================================
+class BackupManifest(object):
+    """
+    Manifest of all files in a backup directory with their sizes,
+    modification times and the checksums of their local content.
+    It is uploaded as MANIFEST_NAME into the backup directory.
+
+    Files striped over several servers are recorded in stripes with the
+    layout of their parts, the parts are recorded in files of the manifest
+    of the server holding them.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, backup_dir=None, algorithm=None):
+
+        self.backup_dir = backup_dir
+        self.algorithm = algorithm
+        self.created = time.time()
+        self.files = {}
+        self.stripes = {}
+        self._lock = threading.Lock()
+
+    # -------------------------------------------------------------------------
+    def add(self, name, remote_name, size, mtime, digest=None, archive=None):
+        """
+        Records an uploaded file.
+
+        @param name: the path of the file relative to the local directory
+        @type name: str
+        @param remote_name: the name of the remote file, e.g. with suffixes
+        @type remote_name: str
+        @param digest: the checksum of the local content of the file
+        @type digest: str
+        @param archive: the remote tar archive holding the file, if packed
+        @type archive: str
+        """
+
+        entry = {
+            'remote': remote_name,
+            'size': size,
+            'mtime': mtime,
+        }
+        if digest:
+            entry['digest'] = digest
+        if archive:
+            entry['archive'] = archive
+        with self._lock:
+            self.files[name] = entry
+
+    # -------------------------------------------------------------------------
+    def add_stripes(self, name, size, mtime, stripe_size, parts):
+        """
+        Records a file striped over several servers.
+
+        @param name: the path of the file relative to the local directory
+        @type name: str
+        @param parts: dicts with the name of the target holding the part, the
+                      name and the remote name of the part, its offset in the
+                      file, its size and the checksum of its local content
+        @type parts: list
+        """
+
+        entry = {
+            'size': size,
+            'mtime': mtime,
+            'stripe_size': stripe_size,
+            'parts': list(parts),
+        }
+        with self._lock:
+            self.stripes[name] = entry
+
+    # -------------------------------------------------------------------------
+    def stripe_parts(self):
+        """Returns the names of the parts of all striped files."""
+
+        names = set()
+        for entry in self.stripes.values():
+            names.update(part['name'] for part in entry['parts'])
+        return names
+
+    # -------------------------------------------------------------------------
+    def digest_of(self, name):
+        """Returns the checksum of the given file or None."""
+
+        entry = self.files.get(name)
+        if not entry:
+            return None
+        return entry.get('digest')
+
+    # -------------------------------------------------------------------------
+    def total_size(self):
+        return sum(entry['size'] for entry in self.files.values())
+
+    # -------------------------------------------------------------------------
+    def as_dict(self):
+
+        content = {
+            'backup_dir': self.backup_dir,
+            'algorithm': self.algorithm,
+            'created': self.created,
+            'files': self.files,
+        }
+        if self.stripes:
+            content['stripes'] = self.stripes
+        return content
+
+    # -------------------------------------------------------------------------
+    def to_json(self):
+
+        return json.dumps(self.as_dict(), indent=1, sort_keys=True)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def from_json(cls, data):
+
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        try:
+            content = json.loads(data)
+        except ValueError as e:
+            raise ManifestError("Invalid manifest: %s" % (e))
+        manifest = cls(content.get('backup_dir'), content.get('algorithm'))
+        manifest.created = content.get('created', manifest.created)
+        manifest.files = content.get('files', {})
+        manifest.stripes = content.get('stripes', {})
+        return manifest
+
+
+# =============================================================================
+def save_run_report(manifest, report_dir=DEFAULT_REPORT_DIR, **info):
+    """
+    Writes the local report of a backup run with all uploaded files and
+    their checksums as JSON into the report directory.
+
+    @param manifest: the manifest of the new backup directory
+    @type manifest: BackupManifest
+    @param info: additional information about the run, e.g. the start time
+
+    @return: the filename of the report or None on errors
+    @rtype: str
+    """
+
+    report_dir = os.path.expanduser(str(report_dir))
+    name = "%s_%s.json" % (socket.gethostname(), manifest.backup_dir or 'unknown')
+    filename = os.path.join(report_dir, name.replace(os.sep, '_'))
+
+    report = dict(info)
+    report['finished'] = time.time()
+    report['total_files'] = len(manifest.files)
+    report['total_size'] = manifest.total_size()
+    report['manifest'] = manifest.as_dict()
+
+    try:
+        if not os.path.isdir(report_dir):
+            os.makedirs(report_dir)
+        tmp_file = filename + '.new'
+        with open(tmp_file, 'w') as fh:
+            json.dump(report, fh, indent=1, sort_keys=True)
+        os.rename(tmp_file, filename)
+    except (IOError, OSError) as e:
+        LOG.error("Could not write run report %r: %s", filename, str(e))
+        return None
+
+    LOG.info("Wrote report of the backup run to %r.", filename)
+    return filename
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,695 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Module for running several backup jobs concurrently in one
+          process with a bounded number of jobs per server
+
+The jobs are defined in an INI file, one section per job with the settings
+of the SFTP or FTP handler (type = ftp), the section [DEFAULT] holds the
+settings common to all jobs. A job of the type 'fanout' backs up its local
+directory to all jobs listed in its targets with a single read of every
+local file, a job of the type 'stripe' splits its big files into parts
+distributed over the servers of all jobs listed in its targets. The target
+jobs are not run on their own, e.g.:
+
+    [DEFAULT]
+    host = backup.example.com
+    key_file = ~backup/.ssh/id_rsa
+    compress = yes
+
+    [databases]
+    local_dir = /var/backup/db
+    subdir = db1-dumps
+
+    [www]
+    local_dir = /srv/www
+    recursive = yes
+
+    [mirror-ftp]
+    type = ftp
+    host = ftp.example.com
+    password = secret
+
+    [mirror]
+    type = fanout
+    targets = databases, mirror-ftp
+    local_dir = /var/backup/mirror
+    stall_policy = reread
+
+    [images]
+    type = stripe
+    targets = www, mirror-ftp
+    local_dir = /var/backup/images
+    stripe_size = 128M
+"""
+
+# Standard modules
+import logging
+import os
+import json
+import time
+import socket
+import threading
+import configparser
+
+from pathlib import PurePosixPath
+
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Third party modules
+
+# Own modules
+from pb_base.common import to_bool, human2bytes
+
+from pb_base.errors import PbError
+
+from ftp_backup import DEFAULT_STATE_DIRECTORY, DEFAULT_LOCAL_DIRECTORY
+
+from ftp_backup.sftp_handler import SFTPHandler, DEFAULT_SSH_SERVER, DEFAULT_SSH_PORT
+
+from ftp_backup.ftp_handler import FTPHandler, DEFAULT_FTP_HOST, DEFAULT_FTP_PORT
+
+from ftp_backup.local_scan import ScanQueue
+
+from ftp_backup.fanout import FanOutBackup, FanOutTarget
+from ftp_backup.fanout import DEFAULT_FANOUT_BUFSIZE, DEFAULT_FANOUT_DEPTH
+from ftp_backup.fanout import DEFAULT_STALL_POLICY, DEFAULT_STALL_TIMEOUT
+
+from ftp_backup.stripe import StripeBackup, StripeTarget, DEFAULT_STRIPE_SIZE
+
+from ftp_backup.restore import FTPRestoreSession, SFTPRestoreSession
+
+__version__ = '0.3.4'
+
+LOG = logging.getLogger(__name__)
+
+# Number of jobs running at the same time
+DEFAULT_JOB_WORKERS = 4
+MAX_JOB_WORKERS = 64
+# Number of jobs running at the same time against the same server
+DEFAULT_TARGET_LIMIT = 2
+DEFAULT_TIMINGS_FILE = DEFAULT_STATE_DIRECTORY / 'job-timings.json'
+
+COPY_TYPES = ('yearly', 'monthly', 'weekly', 'daily')
+JOB_TYPES = ('sftp', 'ftp', 'fanout', 'stripe')
+# The types of jobs backing up to the servers of other jobs
+MEMBER_JOB_TYPES = ('fanout', 'stripe')
+
+# The settings of the local directory of all kinds of jobs with their converters
+LOCAL_SETTINGS = {
+    'local_dir': str,
+    'recursive': to_bool,
+    'scan_workers': int,
+}
+
+# The settings of a fan-out job with their converters
+FANOUT_SETTINGS = {
+    'targets': lambda v: [t.strip() for t in v.split(',') if t.strip()],
+    'stall_policy': str,
+    'stall_timeout': float,
+    'fanout_bufsize': human2bytes,
+    'fanout_depth': int,
+}
+
+# The settings of a striping job with their converters
+STRIPE_SETTINGS = {
+    'targets': FANOUT_SETTINGS['targets'],
+    'stripe_size': human2bytes,
+}
+
+# The settings of a SFTP job with their converters and the handler properties
+JOB_SETTINGS = {
+    'host': (str, 'host'),
+    'port': (int, 'port'),
+    'user': (str, 'user'),
+    'key_file': (str, 'key_file'),
+    'timeout': (int, 'timeout'),
+    'remote_dir': (str, 'start_remote_dir'),
+    'compress': (to_bool, 'compress'),
+    'compress_workers': (int, 'compress_workers'),
+    'compress_level': (int, 'compress_level'),
+    'compress_adaptive': (to_bool, 'compress_adaptive'),
+    'encrypt_key_file': (str, 'encrypt_key_file'),
+    'encrypt_workers': (int, 'encrypt_workers'),
+    'pack': (to_bool, 'pack'),
+    'pack_threshold': (human2bytes, 'pack_threshold'),
+    'pack_archive_size': (human2bytes, 'pack_archive_size'),
+    'read_ahead_depth': (int, 'read_ahead_depth'),
+    'read_ahead_size': (human2bytes, 'read_ahead_size'),
+    'io_mode': (str, 'io_mode'),
+    'range_threshold': (human2bytes, 'range_threshold'),
+    'range_size': (human2bytes, 'range_size'),
+    'range_workers': (int, 'range_workers'),
+    'range_adaptive': (to_bool, 'range_adaptive'),
+    'range_min_workers': (int, 'range_min_workers'),
+    'checksum': (str, 'checksum'),
+    'verify': (to_bool, 'verify'),
+    'batch_confirm': (to_bool, 'batch_confirm'),
+    'index_file': (str, 'index_file'),
+    'report_dir': (str, 'report_dir'),
+    'journal_dir': (str, 'journal_dir'),
+    'resume_window': (float, 'resume_window'),
+}
+
+# The settings of a FTP job with their converters and the handler properties
+FTP_JOB_SETTINGS = {
+    'host': (str, 'host'),
+    'port': (int, 'port'),
+    'user': (str, 'user'),
+    'password': (str, 'password'),
+    'remote_dir': (str, 'remote_dir'),
+    'passive': (to_bool, 'passive'),
+    'tls': (to_bool, 'tls'),
+    'tls_verify': (str, 'tls_verify'),
+    'timeout': (int, 'timeout'),
+    'max_stor_attempts': (int, 'max_stor_attempts'),
+    'compress': (to_bool, 'compress'),
+    'compress_workers': (int, 'compress_workers'),
+    'compress_level': (int, 'compress_level'),
+    'compress_adaptive': (to_bool, 'compress_adaptive'),
+    'encrypt_key_file': (str, 'encrypt_key_file'),
+    'encrypt_workers': (int, 'encrypt_workers'),
+    'pack': (to_bool, 'pack'),
+    'pack_threshold': (human2bytes, 'pack_threshold'),
+    'pack_archive_size': (human2bytes, 'pack_archive_size'),
+    'read_ahead_depth': (int, 'read_ahead_depth'),
+    'read_ahead_size': (human2bytes, 'read_ahead_size'),
+    'io_mode': (str, 'io_mode'),
+    'range_threshold': (human2bytes, 'range_threshold'),
+    'range_size': (human2bytes, 'range_size'),
+    'range_workers': (int, 'range_workers'),
+    'range_adaptive': (to_bool, 'range_adaptive'),
+    'range_min_workers': (int, 'range_min_workers'),
+    'checksum': (str, 'checksum'),
+    'verify': (to_bool, 'verify'),
+    'index_file': (str, 'index_file'),
+    'report_dir': (str, 'report_dir'),
+    'journal_dir': (str, 'journal_dir'),
+    'resume_window': (float, 'resume_window'),
+}
+
+HANDLER_SETTINGS = {
+    'sftp': JOB_SETTINGS,
+    'ftp': FTP_JOB_SETTINGS,
+    'fanout': {},
+    'stripe': {},
+}
+
+
+# =============================================================================
+class OrchestratorError(PbError):
+    """
+    Base exception class for all exceptions belonging to issues
+    in this module
+    """
+    pass
+
+
+# =============================================================================
+class BackupJob(object):
+    """
+    A backup of one local directory with its own settings to a SSH server,
+    to a FTP server or, as a fan-out or striping job, to the servers of
+    several other jobs.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, name, settings=None, subdir=None, defaults=None):
+
+        settings = dict(settings or {})
+        defaults = defaults or {}
+        self.name = name
+        self.type = str(settings.pop('type', 'sftp')).strip().lower()
+        if self.type not in JOB_TYPES:
+            raise OrchestratorError("Invalid type %r of job %r, must be one of %s." % (
+                self.type, name, ', '.join(JOB_TYPES)))
+        self.settings = {}
+        self.local = {}
+        self.fanout = {}
+        self.stripe = {}
+        self.copies = {}
+        self.subdir = subdir
+        # The target jobs of a fan-out or striping job
+        self.members = []
+        for (key, value) in settings.items():
+            # Settings of the [DEFAULT] section may belong to other kinds of jobs
+            self.set(key, value, strict=(key not in defaults))
+
+        self.estimate = None
+        self.status = 'pending'
+        self.error = None
+        self.started = None
+        self.finished = None
+
+    # -------------------------------------------------------------------------
+    def __repr__(self):
+
+        return "<%s %r -> %s>" % (self.__class__.__name__, self.name, self.target)
+
+    # -------------------------------------------------------------------------
+    def set(self, key, value, strict=True):
+        """Sets a setting of the job from its textual value."""
+
+        key = key.lower()
+        handler_settings = HANDLER_SETTINGS[self.type]
+        try:
+            if key == 'subdir':
+                self.subdir = value
+            elif key.startswith('copies_') and key[7:] in COPY_TYPES:
+                self.copies[key[7:]] = int(value)
+            elif key in LOCAL_SETTINGS:
+                self.local[key] = LOCAL_SETTINGS[key](value)
+            elif key in FANOUT_SETTINGS and self.type == 'fanout':
+                self.fanout[key] = FANOUT_SETTINGS[key](value)
+            elif key in STRIPE_SETTINGS and self.type == 'stripe':
+                self.stripe[key] = STRIPE_SETTINGS[key](value)
+            elif key in handler_settings:
+                self.settings[key] = handler_settings[key][0](value)
+            elif strict:
+                raise OrchestratorError("Unknown setting %r of job %r." % (key, self.name))
+        except ValueError as e:
+            raise OrchestratorError("Invalid setting %s = %r of job %r: %s" % (
+                key, value, self.name, e))
+
+    # -------------------------------------------------------------------------
+    @property
+    def servers(self):
+        """The servers of the job, whose connections are limited."""
+
+        if self.type in MEMBER_JOB_TYPES:
+            servers = []
+            for member in self.members:
+                servers += member.servers
+            return servers
+        if self.type == 'ftp':
+            host = self.settings.get('host', DEFAULT_FTP_HOST)
+            port = self.settings.get('port', DEFAULT_FTP_PORT)
+        else:
+            host = self.settings.get('host', DEFAULT_SSH_SERVER)
+            port = self.settings.get('port', DEFAULT_SSH_PORT)
+        return ["%s:%d" % (host, port)]
+
+    # -------------------------------------------------------------------------
+    @property
+    def target(self):
+        return ', '.join(self.servers)
+
+    # -------------------------------------------------------------------------
+    @property
+    def duration(self):
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+    # -------------------------------------------------------------------------
+    def create_handler(self, verbose=0, simulate=False, local=None):
+        """
+        Returns a new SFTP or FTP handler with the settings of the job,
+        a SFTP handler gets the given or its own local settings.
+        """
+
+        if local is None:
+            local = self.local
+        if self.type == 'ftp':
+            handler = FTPHandler(appname=self.name, verbose=verbose, simulate=simulate)
+            # Identifies the journal of the runs of the job
+            handler.local_dir = local.get('local_dir', DEFAULT_LOCAL_DIRECTORY)
+        else:
+            handler = SFTPHandler(appname=self.name, verbose=verbose, simulate=simulate)
+            for (key, value) in local.items():
+                setattr(handler, key, value)
+        handler_settings = HANDLER_SETTINGS[self.type]
+        for (key, value) in self.settings.items():
+            setattr(handler, handler_settings[key][1], value)
+        if 'encrypt_key_file' in self.settings:
+            handler.encrypt = True
+        handler.copies.update(self.copies)
+        return handler
+
+    # -------------------------------------------------------------------------
+    def create_session(self, subdir=None):
+        """
+        Returns a new download session of a SFTP or FTP job in the given
+        subdirectory of its remote directory, e.g. for a restore.
+        """
+
+        if subdir is None:
+            subdir = self.subdir or socket.gethostname()
+        handler = self.create_handler()
+
+        if self.type == 'ftp':
+            handler.connect()
+            handler.cwd(subdir)
+            return FTPRestoreSession(handler.ftp)
+
+        # No local directory is needed, so the handler is not connected itself
+        import paramiko
+
+        ssh_client = paramiko.SSHClient()
+        ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        LOG.debug("SSH connect to %s@%s ...", handler.user, handler.host)
+        ssh_client.connect(
+            handler.host, port=handler.port, username=handler.user,
+            key_filename=str(handler.key_file), timeout=handler.timeout)
+        sftp = ssh_client.open_sftp()
+        sftp.chdir(str(PurePosixPath(str(handler.start_remote_dir)) / subdir))
+        return SFTPRestoreSession(sftp, ssh_client)
+
+    # -------------------------------------------------------------------------
+    def create_scanner(self, verbose=0):
+        """Returns a not yet started scan of the local directory of the job."""
+
+        return ScanQueue(
+            self.local.get('local_dir', DEFAULT_LOCAL_DIRECTORY),
+            recursive=self.local.get('recursive', False), verbose=verbose,
+            stat_workers=self.local.get('scan_workers'))
+
+    # -------------------------------------------------------------------------
+    def run(self, verbose=0, simulate=False):
+        """Performs the backup of the job with an own connection."""
+
+        if self.type == 'fanout':
+            self.run_fanout(verbose=verbose, simulate=simulate)
+            return
+        if self.type == 'stripe':
+            self.run_stripe(verbose=verbose, simulate=simulate)
+            return
+
+        handler = self.create_handler(verbose=verbose, simulate=simulate)
+        scanner = self.create_scanner(verbose=verbose)
+        scanner.start()
+        try:
+            handler.connect()
+            try:
+                handler.run_backup(self.subdir or socket.gethostname(), scanner)
+            finally:
+                handler.disconnect()
+        finally:
+            scanner.close()
+
+    # -------------------------------------------------------------------------
+    def run_fanout(self, verbose=0, simulate=False):
+        """
+        Performs the backup of the local directory to the targets of the
+        fan-out job, each with its own connection, subdirectory and copies.
+        """
+
+        def create_backup(targets):
+            return FanOutBackup(
+                targets, bufsize=self.fanout.get('fanout_bufsize', DEFAULT_FANOUT_BUFSIZE),
+                depth=self.fanout.get('fanout_depth', DEFAULT_FANOUT_DEPTH),
+                stall_policy=self.fanout.get('stall_policy', DEFAULT_STALL_POLICY),
+                stall_timeout=self.fanout.get('stall_timeout', DEFAULT_STALL_TIMEOUT),
+                verbose=verbose)
+
+        self.run_members(FanOutTarget, create_backup, verbose=verbose, simulate=simulate)
+
+    # -------------------------------------------------------------------------
+    def run_stripe(self, verbose=0, simulate=False):
+        """
+        Performs the backup of the local directory striped over the targets
+        of the striping job, each with its own connection, subdirectory and copies.
+        """
+
+        def create_backup(targets):
+            return StripeBackup(
+                targets, stripe_size=self.stripe.get('stripe_size', DEFAULT_STRIPE_SIZE),
+                verbose=verbose)
+
+        self.run_members(StripeTarget, create_backup, verbose=verbose, simulate=simulate)
+
+    # -------------------------------------------------------------------------
+    def run_members(self, target_class, create_backup, verbose=0, simulate=False):
+        """
+        Performs the backup of the local directory to the targets of a fan-out
+        or striping job by the backup object returned by create_backup().
+        """
+
+        targets = []
+        for member in self.members:
+            handler = member.create_handler(verbose=verbose, simulate=simulate, local=self.local)
+            targets.append(target_class(member.name, handler))
+
+        scanner = self.create_scanner(verbose=verbose)
+        scanner.start()
+        try:
+            for (member, target) in zip(self.members, targets):
+                try:
+                    target.handler.connect()
+                    target.handler.prepare_backup(
+                        member.subdir or self.subdir or socket.gethostname())
+                except Exception as e:
+                    target.fail(e)
+
+            backup = create_backup(targets)
+            if not backup.run(scanner):
+                failed = ["%s (%s)" % (t.name, t.error) for t in targets if t.failed]
+                raise OrchestratorError("Failed targets: %s" % (', '.join(failed)))
+        finally:
+            for target in targets:
+                if target.handler.connected:
+                    target.handler.disconnect()
+            scanner.close()
+
+
+# =============================================================================
+def load_jobs(filename):
+    """
+    Reads the job definitions from the given INI file.
+
+    @return: the jobs in the order of the file without the targets of
+             fan-out and striping jobs
+    @rtype: list of BackupJob
+    """
+
+    parser = configparser.ConfigParser(interpolation=None)
+    try:
+        with open(str(filename), 'r', encoding='utf-8') as fh:
+            parser.read_file(fh)
+    except (IOError, configparser.Error) as e:
+        raise OrchestratorError("Could not read the jobs file %r: %s" % (str(filename), e))
+
+    jobs = OrderedDict()
+    for name in parser.sections():
+        jobs[name] = BackupJob(name, dict(parser.items(name)), defaults=parser.defaults())
+    if not jobs:
+        raise OrchestratorError("No jobs defined in %r." % (str(filename)))
+
+    members = set()
+    for job in jobs.values():
+        if job.type not in MEMBER_JOB_TYPES:
+            continue
+        if job.type == 'fanout':
+            names = job.fanout.get('targets')
+        else:
+            names = job.stripe.get('targets')
+        if not names:
+            raise OrchestratorError("No targets given for the %s job %r." % (job.type, job.name))
+        for name in names:
+            if name not in jobs or jobs[name].type in MEMBER_JOB_TYPES:
+                raise OrchestratorError(
+                    "Invalid target %r of the %s job %r." % (name, job.type, job.name))
+            job.members.append(jobs[name])
+            members.add(name)
+
+    return [job for job in jobs.values() if job.name not in members]
+
+
+# =============================================================================
+class JobTimings(object):
+    """The durations of the last successful runs of the jobs, kept in a JSON file."""
+
+    # -------------------------------------------------------------------------
+    def __init__(self, filename=DEFAULT_TIMINGS_FILE):
+
+        self.filename = os.path.expanduser(str(filename))
+        self.durations = {}
+        if os.path.exists(self.filename):
+            try:
+                with open(self.filename, 'r', encoding='utf-8') as fh:
+                    self.durations = dict(json.load(fh))
+            except (IOError, ValueError, TypeError) as e:
+                LOG.warning("Ignoring the job timings in %r: %s", self.filename, e)
+
+    # -------------------------------------------------------------------------
+    def estimate(self, name):
+        """Returns the duration of the last successful run of the job or None."""
+
+        return self.durations.get(name)
+
+    # -------------------------------------------------------------------------
+    def record(self, job):
+
+        if job.status == 'ok' and job.duration is not None:
+            self.durations[job.name] = round(job.duration, 3)
+
+    # -------------------------------------------------------------------------
+    def save(self):
+
+        dirname = os.path.dirname(self.filename)
+        tmp_file = self.filename + '.tmp'
+        try:
+            if dirname and not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            with open(tmp_file, 'w', encoding='utf-8') as fh:
+                json.dump(self.durations, fh, indent=2, sort_keys=True)
+            os.replace(tmp_file, self.filename)
+        except (IOError, OSError) as e:
+            LOG.warning("Could not save the job timings to %r: %s", self.filename, e)
+
+
+# =============================================================================
+class Orchestrator(object):
+    """
+    Runs backup jobs with at most workers jobs at the same time and at most
+    target_limit jobs against the same server.
+
+    The jobs are started longest first by the durations of their last runs,
+    jobs without a known duration at the very beginning. Of the jobs waiting
+    for a free worker, the longest one with a free connection to its server
+    is started, which keeps the total time of all jobs short.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(
+            self, jobs, workers=DEFAULT_JOB_WORKERS, target_limit=DEFAULT_TARGET_LIMIT,
+            timings=None, verbose=0, simulate=False):
+
+        if workers < 1 or workers > MAX_JOB_WORKERS:
+            raise OrchestratorError("Invalid number %r of workers, must be between 1 and %d." % (
+                workers, MAX_JOB_WORKERS))
+        if target_limit < 1:
+            raise OrchestratorError("Invalid limit %r of jobs per server." % (target_limit))
+
+        self.jobs = list(jobs)
+        self.workers = workers
+        self.target_limit = target_limit
+        self.timings = timings
+        self.verbose = verbose
+        self.simulate = simulate
+        self.started = None
+        self.finished = None
+
+    # -------------------------------------------------------------------------
+    def order(self):
+        """Returns the jobs in the order of their start, longest first."""
+
+        for job in self.jobs:
+            if self.timings is not None:
+                job.estimate = self.timings.estimate(job.name)
+
+        # sorted() is stable, so jobs of the same length keep the order of the file
+        return sorted(
+            self.jobs, key=lambda j: -j.estimate if j.estimate is not None else float('-inf'))
+
+    # -------------------------------------------------------------------------
+    def run_job(self, job):
+        """Performs the given job, may be overridden for other kinds of jobs."""
+
+        job.run(verbose=self.verbose, simulate=self.simulate)
+
+    # -------------------------------------------------------------------------
+    def _run(self, job):
+
+        threading.current_thread().name = 'job-' + job.name
+        LOG.info("Starting job %r on %s ...", job.name, job.target)
+        job.started = time.time()
+        job.status = 'running'
+        try:
+            self.run_job(job)
+            job.status = 'ok'
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+            LOG.exception("Job %r failed: %s", job.name, e)
+        finally:
+            job.finished = time.time()
+        LOG.info("Job %r finished after %.1f seconds.", job.name, job.duration)
+
+    # -------------------------------------------------------------------------
+    def run(self):
+        """
+        Runs all jobs and waits for their end.
+
+        @return: whether all jobs were successful
+        @rtype: bool
+        """
+
+        pending = self.order()
+        running = {}
+        per_target = Counter()
+        self.started = time.time()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while pending or running:
+                while len(running) < self.workers:
+                    job = None
+                    for candidate in pending:
+                        # A fan-out job may need more connections to a server than allowed
+                        free = all(per_target[s] < self.target_limit for s in candidate.servers)
+                        if free or not running:
+                            job = candidate
+                            break
+                    if job is None:
+                        break
+                    pending.remove(job)
+                    per_target.update(job.servers)
+                    running[executor.submit(self._run, job)] = job
+
+                (done, not_done) = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    per_target.subtract(job.servers)
+
+        self.finished = time.time()
+        if self.timings is not None:
+            for job in self.jobs:
+                self.timings.record(job)
+            if not self.simulate:
+                self.timings.save()
+        return all(job.status == 'ok' for job in self.jobs)
+
+    # -------------------------------------------------------------------------
+    def report(self):
+        """
+        Returns the timings of all jobs as lines of a table.
+
+        @rtype: list of str
+        """
+
+        width = max([len(job.name) for job in self.jobs] + [3])
+        lines = ["%-*s  %-24s  %-7s  %9s  %9s" % (
+            width, 'Job', 'Server', 'Status', 'Start', 'Duration')]
+        for job in sorted(self.jobs, key=lambda j: (j.started is None, j.started)):
+            start = '-'
+            duration = '-'
+            if job.started is not None:
+                start = "+%.1fs" % (job.started - self.started)
+            if job.duration is not None:
+                duration = "%.1fs" % (job.duration)
+            lines.append("%-*s  %-24s  %-7s  %9s  %9s" % (
+                width, job.name, job.target, job.status, start, duration))
+
+        total = sum(job.duration or 0 for job in self.jobs)
+        makespan = 0
+        if self.started is not None and self.finished is not None:
+            makespan = self.finished - self.started
+        lines.append("All %d jobs took %.1f seconds, %.1f seconds one after another." % (
+            len(self.jobs), makespan, total))
+        return lines
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Application class for script for running several backup jobs
+          concurrently in one process
+"""
+
+# Standard modules
+import logging
+import socket
+import textwrap
+import functools
+
+from collections import OrderedDict
+
+# Third party modules
+
+# Own modules
+from pb_base.cfg_app import PbCfgApp
+
+import ftp_backup
+
+from ftp_backup.orchestrator import Orchestrator, OrchestratorError, JobTimings, load_jobs
+from ftp_backup.orchestrator import DEFAULT_JOB_WORKERS, DEFAULT_TARGET_LIMIT
+from ftp_backup.orchestrator import DEFAULT_TIMINGS_FILE
+
+from ftp_backup.restore import SessionPool
+
+from ftp_backup.stripe import StripeRestorer
+
+__version__ = '0.2.0'
+
+LOG = logging.getLogger(__name__)
+
+APP_VERSION = ftp_backup.__version__
+try:
+    import ftp_backup.local_version
+    APP_VERSION = ftp_backup.local_version.__version__
+except ImportError:
+    pass
+
+
+# =============================================================================
+class OrchestratorApp(PbCfgApp):
+    """Application class for running several backup jobs concurrently."""
+
+    # -------------------------------------------------------------------------
+    def __init__(self, appname=None, verbose=0):
+        """Constructor."""
+
+        description = """\
+        Runs the backup jobs defined in a jobs file concurrently in one process,
+        with a limited number of jobs at the same time and per server, the
+        longest jobs first, and reports the timings of all jobs.
+        With --restore the latest backup of one job is restored instead,
+        a striped backup from all its servers at the same time.
+        """
+
+        self.jobs_file = None
+        self.workers = DEFAULT_JOB_WORKERS
+        self.target_limit = DEFAULT_TARGET_LIMIT
+        self.timings_file = DEFAULT_TIMINGS_FILE
+
+        super(OrchestratorApp, self).__init__(
+            appname=appname,
+            verbose=verbose,
+            version=APP_VERSION,
+            description=textwrap.dedent(description),
+            cfg_dir='ftp-backup',
+            hide_default_config=True,
+            need_config_file=False,
+        )
+        self.post_init()
+
+        self.initialized = True
+
+    # -------------------------------------------------------------------------
+    def init_arg_parser(self):
+
+        super(OrchestratorApp, self).init_arg_parser()
+
+        h = "The INI file with the definitions of the backup jobs, one section per job."
+        self.arg_parser.add_argument('-J', '--jobs', metavar='FILE', dest='jobs_file', help=h)
+
+        h = "Run only this job, may be given multiple times."
+        self.arg_parser.add_argument(
+            '--job', metavar='NAME', dest='job_names', action='append', help=h)
+
+        h = "The number of jobs running at the same time (default: %d)." % (
+            DEFAULT_JOB_WORKERS)
+        self.arg_parser.add_argument('-w', '--workers', metavar='NR', type=int, help=h)
+
+        h = "The number of jobs running at the same time against one server (default: %d)." % (
+            DEFAULT_TARGET_LIMIT)
+        self.arg_parser.add_argument(
+            '--target-limit', metavar='NR', type=int, dest='target_limit', help=h)
+
+        h = "The file with the durations of the last runs of the jobs (default: %r)." % (
+            str(DEFAULT_TIMINGS_FILE))
+        self.arg_parser.add_argument(
+            '--timings-file', metavar='FILE', dest='timings_file', help=h)
+
+        h = "Simulation mode, no modifying actions are done."
+        self.arg_parser.add_argument('-t', '--test', action='store_true', help=h)
+
+        h = ("Restore the latest backup of this job instead of running the jobs, "
+             "with --workers connections per server.")
+        self.arg_parser.add_argument('-R', '--restore', metavar='NAME', dest='restore', help=h)
+
+        h = "The local directory to restore into (default: the current directory)."
+        self.arg_parser.add_argument(
+            '--target-dir', metavar='DIR', dest='target_dir', default='.', help=h)
+
+    # -------------------------------------------------------------------------
+    def perform_arg_parser(self):
+
+        super(OrchestratorApp, self).perform_arg_parser()
+
+        if self.args.jobs_file:
+            self.jobs_file = self.args.jobs_file
+        if self.args.workers is not None:
+            if self.args.workers < 1:
+                LOG.error("Invalid number %d of workers.", self.args.workers)
+            else:
+                self.workers = self.args.workers
+        if self.args.target_limit is not None:
+            if self.args.target_limit < 1:
+                LOG.error("Invalid number %d of jobs per server.", self.args.target_limit)
+            else:
+                self.target_limit = self.args.target_limit
+        if self.args.timings_file:
+            self.timings_file = self.args.timings_file
+
+    # -------------------------------------------------------------------------
+    def perform_config(self):
+
+        super(OrchestratorApp, self).perform_config()
+
+        int_msg_tpl = "Error in configuration: [%s]/%s %r is not an integer value: %s"
+
+        for section in self.cfg:
+            if section.lower() != 'orchestrator':
+                continue
+
+            if 'jobs_file' in self.cfg[section] and not self.args.jobs_file:
+                self.jobs_file = self.cfg[section]['jobs_file']
+
+            if 'workers' in self.cfg[section] and self.args.workers is None:
+                try:
+                    self.workers = int(self.cfg[section]['workers'])
+                except ValueError as e:
+                    LOG.error(int_msg_tpl % (
+                        section, 'workers', self.cfg[section]['workers'], str(e)))
+
+            if 'target_limit' in self.cfg[section] and self.args.target_limit is None:
+                try:
+                    self.target_limit = int(self.cfg[section]['target_limit'])
+                except ValueError as e:
+                    LOG.error(int_msg_tpl % (
+                        section, 'target_limit', self.cfg[section]['target_limit'], str(e)))
+
+            if 'timings_file' in self.cfg[section] and not self.args.timings_file:
+                self.timings_file = self.cfg[section]['timings_file']
+
+    # -------------------------------------------------------------------------
+    def pre_run(self):
+
+        super(OrchestratorApp, self).pre_run()
+
+        paramiko_logger = logging.getLogger('paramiko.transport')
+        if self.verbose < 2:
+            paramiko_logger.setLevel(logging.WARNING)
+
+    # -------------------------------------------------------------------------
+    def restore(self, job):
+        """
+        Restores the latest backup of the given job, of a fan-out job from
+        its first target, of a striping job from all its targets.
+        """
+
+        if job.type == 'fanout':
+            members = job.members[:1]
+        elif job.type == 'stripe':
+            members = job.members
+        else:
+            members = [job]
+
+        pools = OrderedDict()
+        decrypt_key = None
+        for member in members:
+            subdir = member.subdir or job.subdir or socket.gethostname()
+            pools[member.name] = SessionPool(
+                functools.partial(member.create_session, subdir), self.workers)
+            key_file = member.settings.get('encrypt_key_file')
+            if key_file and decrypt_key is None:
+                from ftp_backup.crypt import load_key
+                decrypt_key = load_key(key_file)
+
+        restorer = StripeRestorer(
+            pools, self.args.target_dir, workers=self.workers, decrypt_key=decrypt_key)
+        try:
+            success = restorer.restore()
+        finally:
+            for pool in pools.values():
+                pool.close()
+        if not success:
+            self.exit(2, "Restore of job %r failed." % (job.name))
+
+    # -------------------------------------------------------------------------
+    def _run(self):
+        """The underlaying startpoint of the application."""
+
+        if not self.jobs_file:
+            self.exit(1, "No jobs file given.")
+
+        try:
+            jobs = load_jobs(self.jobs_file)
+        except OrchestratorError as e:
+            self.exit(1, str(e))
+
+        if self.args.job_names:
+            unknown = set(self.args.job_names) - set(job.name for job in jobs)
+            if unknown:
+                self.exit(1, "Unknown jobs: %s" % (', '.join(sorted(unknown))))
+            jobs = [job for job in jobs if job.name in self.args.job_names]
+
+        if self.args.restore:
+            job = dict((j.name, j) for j in jobs).get(self.args.restore)
+            if job is None:
+                self.exit(1, "Unknown job %r to restore." % (self.args.restore))
+            self.restore(job)
+            return
+
+        try:
+            orchestrator = Orchestrator(
+                jobs, workers=self.workers, target_limit=self.target_limit,
+                timings=JobTimings(self.timings_file), verbose=self.verbose,
+                simulate=self.args.test)
+        except OrchestratorError as e:
+            self.exit(1, str(e))
+
+        LOG.info(
+            "Running %d backup jobs with %d workers, at most %d per server ...",
+            len(jobs), self.workers, self.target_limit)
+        success = orchestrator.run()
+        for line in orchestrator.report():
+            LOG.info(line)
+
+        if not success:
+            failed = [job.name for job in jobs if job.status != 'ok']
+            self.exit(2, "Failed jobs: %s" % (', '.join(failed)))
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Module for packing small files into tar archives, which are
+          streamed directly to the remote side
+"""
+
+# Standard modules
+import logging
+import os
+import json
+import tarfile
+import threading
+
+# Third party modules
+
+# Own modules
+from pb_base.errors import PbError
+
+from ftp_backup.checksum import HashingReader
+
+__version__ = '0.2.0'
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_PACK_THRESHOLD = 1024 * 1024
+DEFAULT_PACK_ARCHIVE_SIZE = 256 * 1024 * 1024
+PACK_ARCHIVE_TPL = 'packed-%04d.tar'
+PACK_INDEX_NAME = 'packed-index.json'
+
+
+# =============================================================================
+class PackError(PbError):
+    """
+    Base exception class for all exceptions belonging to issues
+    in this module
+    """
+    pass
+
+
+# =============================================================================
+def plan_archives(files, max_size=DEFAULT_PACK_ARCHIVE_SIZE, first=1):
+    """
+    Distributes the given files into archives, where the sum of the file sizes
+    of an archive should not exceed max_size.
+
+    @param files: list of tuples of the local path, the name in the archive
+                  and the size of the file
+    @type files: list
+    @param first: the number of the first archive
+    @type first: int
+
+    @return: list of tuples of the archive name and the list of its files
+    @rtype: list
+    """
+
+    archives = []
+    cur_files = []
+    cur_size = 0
+    for entry in files:
+        size = entry[2]
+        if cur_files and cur_size + size > max_size:
+            archives.append((PACK_ARCHIVE_TPL % (len(archives) + first), cur_files))
+            cur_files = []
+            cur_size = 0
+        cur_files.append(entry)
+        cur_size += size
+    if cur_files:
+        archives.append((PACK_ARCHIVE_TPL % (len(archives) + first), cur_files))
+
+    return archives
+
+
+# =============================================================================
+class TarStreamReader(object):
+    """
+    File like object for reading an uncompressed tar archive of the given
+    files, which is created on the fly in a separate thread and passed
+    through a pipe, so no temporary files are needed.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, files, algorithm=None):
+        """
+        @param files: list of tuples of the local path and the name in the archive
+        @type files: list
+        @param algorithm: the algorithm for the checksums of the packed files
+        @type algorithm: str
+        """
+
+        self.files = files
+        self.algorithm = algorithm
+        self.digests = {}
+        self.bytes_out = 0
+        self._error = None
+
+        (rfd, wfd) = os.pipe()
+        self._reader = os.fdopen(rfd, 'rb')
+        self._writer = os.fdopen(wfd, 'wb')
+        self._thread = threading.Thread(target=self._write_archive, name='tar-writer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    # -------------------------------------------------------------------------
+    def _write_archive(self):
+
+        try:
+            with tarfile.open(fileobj=self._writer, mode='w|', format=tarfile.PAX_FORMAT) as tar:
+                for entry in self.files:
+                    if self.algorithm:
+                        self._add_hashed(tar, str(entry[0]), entry[1])
+                    else:
+                        tar.add(str(entry[0]), arcname=entry[1], recursive=False)
+        except Exception as e:
+            self._error = e
+        finally:
+            try:
+                self._writer.close()
+            except (IOError, OSError):
+                pass
+
+    # -------------------------------------------------------------------------
+    def _add_hashed(self, tar, path, arcname):
+
+        tarinfo = tar.gettarinfo(path, arcname=arcname)
+        if not tarinfo.isreg():
+            tar.addfile(tarinfo)
+            return
+        with HashingReader(open(path, 'rb'), self.algorithm) as fh:
+            tar.addfile(tarinfo, fh)
+            self.digests[arcname] = fh.hexdigest()
+
+    # -------------------------------------------------------------------------
+    def read(self, size=-1):
+
+        data = self._reader.read(size)
+        if not data:
+            self._thread.join()
+            if self._error:
+                raise PackError("Error creating tar archive: %s" % (self._error))
+        self.bytes_out += len(data)
+        return data
+
+    # -------------------------------------------------------------------------
+    def close(self):
+
+        # Closing the read end lets a blocked writer thread fail and terminate.
+        self._reader.close()
+        self._thread.join()
+
+    # -------------------------------------------------------------------------
+    def __enter__(self):
+        return self
+
+    # -------------------------------------------------------------------------
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# =============================================================================
+class PackIndex(object):
+    """
+    Index of all packed files, recording which archive holds which file.
+    It is uploaded as PACK_INDEX_NAME into the backup directory.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self):
+
+        self.files = {}
+
+    # -------------------------------------------------------------------------
+    def add(self, archive, name, size, mtime):
+
+        self.files[name] = {
+            'archive': archive,
+            'size': size,
+            'mtime': mtime,
+        }
+
+    # -------------------------------------------------------------------------
+    def archive_of(self, name):
+        """Returns the name of the archive containing the given file or None."""
+
+        entry = self.files.get(name)
+        if not entry:
+            return None
+        return entry['archive']
+
+    # -------------------------------------------------------------------------
+    def to_json(self):
+
+        return json.dumps({'files': self.files}, indent=1, sort_keys=True)
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def from_json(cls, data):
+
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        index = cls()
+        index.files = json.loads(data).get('files', {})
+        return index
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
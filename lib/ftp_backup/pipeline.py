@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Module for the chain of processing stages of a file to upload
+"""
+
+# Standard modules
+import logging
+
+# Third party modules
+
+# Own modules
+from ftp_backup.compress import ParallelGzipReader
+from ftp_backup.compress import DEFAULT_COMPRESS_WORKERS
+
+from ftp_backup.read_ahead import ReadAheadReader, DEFAULT_READ_AHEAD_SIZE
+
+from ftp_backup.checksum import new_hash
+
+__version__ = '0.3.0'
+
+LOG = logging.getLogger(__name__)
+
+COMPRESSED_SUFFIX = '.gz'
+
+
+# =============================================================================
+class UploadPipeline(object):
+    """
+    File like object for reading the content of a local file after passing
+    all configured stages (read ahead, compression, encryption) on its way
+    to the remote side.
+
+    The underlying file object is not closed by this object.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(
+        self, fileobj, compress_level=None, compress_workers=DEFAULT_COMPRESS_WORKERS,
+            encrypt_key=None, encrypt_workers=None, read_ahead_depth=0,
+            read_ahead_size=DEFAULT_READ_AHEAD_SIZE, digest_algorithm=None):
+
+        self.fileobj = fileobj
+        self.read_ahead = None
+        self.compressor = None
+        self.encryptor = None
+        self.stream = fileobj
+        self._hash = None
+        if digest_algorithm:
+            self._hash = new_hash(digest_algorithm)
+
+        if read_ahead_depth:
+            self.read_ahead = ReadAheadReader(
+                self.stream, depth=read_ahead_depth, bufsize=read_ahead_size)
+            self.stream = self.read_ahead
+
+        if compress_level is not None:
+            self.compressor = ParallelGzipReader(
+                self.stream, workers=compress_workers, level=compress_level)
+            self.stream = self.compressor
+
+        if encrypt_key is not None:
+            from ftp_backup.crypt import EncryptingReader, DEFAULT_CRYPT_WORKERS
+            if not encrypt_workers:
+                encrypt_workers = DEFAULT_CRYPT_WORKERS
+            self.encryptor = EncryptingReader(
+                self.stream, encrypt_key, workers=encrypt_workers)
+            self.stream = self.encryptor
+
+    # -------------------------------------------------------------------------
+    @classmethod
+    def suffix(cls, compress_level=None, encrypt=False):
+        """The suffix of the remote file name for the given stages."""
+
+        suffix = ''
+        if compress_level is not None:
+            suffix += COMPRESSED_SUFFIX
+        if encrypt:
+            from ftp_backup.crypt import ENCRYPTED_SUFFIX
+            suffix += ENCRYPTED_SUFFIX
+        return suffix
+
+    # -------------------------------------------------------------------------
+    def read(self, size=-1):
+
+        data = self.stream.read(size)
+        if self._hash is not None:
+            self._hash.update(data)
+        return data
+
+    # -------------------------------------------------------------------------
+    def upload_digest(self):
+        """
+        The checksum of the data delivered to the remote side, if a digest
+        algorithm was given, else None.
+        """
+
+        if self._hash is None:
+            return None
+        return self._hash.hexdigest()
+
+    # -------------------------------------------------------------------------
+    def close(self):
+
+        if self.encryptor:
+            self.encryptor.close()
+        if self.compressor:
+            self.compressor.close()
+        if self.read_ahead:
+            self.read_ahead.close()
+
+    # -------------------------------------------------------------------------
+    def __enter__(self):
+        return self
+
+    # -------------------------------------------------------------------------
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # -------------------------------------------------------------------------
+    def compress_ratio(self):
+        """The observed compression ratio, if compressed, else None."""
+
+        if not self.compressor:
+            return None
+        return self.compressor.ratio()
+
+    # -------------------------------------------------------------------------
+    def log_stats(self):
+
+        if self.read_ahead:
+            self.read_ahead.log_stats()
+        if self.compressor:
+            self.compressor.log_stats()
+        if self.encryptor:
+            LOG.debug(
+                "Encrypted %d Bytes to %d Bytes in %d chunks with %d workers.",
+                self.encryptor.bytes_in, self.encryptor.bytes_out,
+                self.encryptor.blocks, self.encryptor.workers)
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Module for uploading a big local file in byte ranges, which are
+          written concurrently at their offsets into the same remote file
+"""
+
+# Standard modules
+import logging
+import time
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+# Third party modules
+
+# Own modules
+from pb_base.common import bytes2human
+
+from pb_base.errors import PbError
+
+from ftp_backup.cache_io import open_local_file, DEFAULT_IO_MODE
+
+from ftp_backup.checksum import new_hash
+
+__version__ = '0.2.0'
+
+LOG = logging.getLogger(__name__)
+
+# Files of at least this size are uploaded in ranges
+DEFAULT_RANGE_THRESHOLD = 1024 * 1024 * 1024
+DEFAULT_RANGE_SIZE = 64 * 1024 * 1024
+MIN_RANGE_SIZE = 1024 * 1024
+# Number of ranges written at the same time, 1 for uploading in one stream
+DEFAULT_RANGE_WORKERS = 4
+MAX_RANGE_WORKERS = 32
+# Lower bound of the number of ranges written at the same time in adaptive mode
+DEFAULT_RANGE_MIN_WORKERS = 1
+# Number of tries of every single range
+DEFAULT_RANGE_ATTEMPTS = 3
+RANGE_BLOCKSIZE = 256 * 1024
+
+
+# =============================================================================
+class RangeUploadError(PbError):
+    """
+    Base exception class for all exceptions belonging to issues
+    in this module
+    """
+    pass
+
+
+# =============================================================================
+def split_ranges(size, range_size, start=0):
+    """
+    Splits a file of the given size behind the given start offset into ranges.
+
+    @return: tuples of the offset and the length of the ranges
+    @rtype: list
+    """
+
+    if range_size < 1:
+        raise RangeUploadError("Invalid range size %r." % (range_size))
+    ranges = []
+    offset = start
+    while offset < size:
+        length = min(range_size, size - offset)
+        ranges.append((offset, length))
+        offset += length
+    return ranges
+
+
+# =============================================================================
+class RangeReader(object):
+    """
+    File like object reading a range of a local file, computing the
+    checksum of the read data on the way. The callback is called with
+    the number of Bytes of every read.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, filename, offset, length, algorithm=None, callback=None):
+
+        self.fileobj = open(str(filename), 'rb')
+        self.fileobj.seek(offset)
+        self.remaining = length
+        self.callback = callback
+        self._hash = None
+        if algorithm:
+            self._hash = new_hash(algorithm)
+
+    # -------------------------------------------------------------------------
+    def read(self, size=-1):
+
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        if size <= 0:
+            return b''
+        data = self.fileobj.read(size)
+        self.remaining -= len(data)
+        if self._hash is not None:
+            self._hash.update(data)
+        if self.callback is not None:
+            self.callback(len(data))
+        return data
+
+    # -------------------------------------------------------------------------
+    def hexdigest(self):
+
+        if self._hash is None:
+            return None
+        return self._hash.hexdigest()
+
+    # -------------------------------------------------------------------------
+    def close(self):
+        self.fileobj.close()
+
+    # -------------------------------------------------------------------------
+    def __enter__(self):
+        return self
+
+    # -------------------------------------------------------------------------
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# =============================================================================
+class RangeUpload(object):
+    """
+    Upload of a local file in ranges, which are written concurrently over
+    the sessions of a pool, e.g. SFTP channels or FTP connections, each at
+    its offset into the same remote file.
+
+    The remote file is written by write_range(session, fileobj, offset, length),
+    which has to write all Bytes read from fileobj at the given offset.
+    A failed range is written again with another session of the pool up
+    to max_attempts times, the session of the failure is discarded.
+
+    The checksums of the whole local file are computed by reading it once
+    more from the beginning during the upload of the ranges. With start
+    only the part of the file behind this offset is uploaded in ranges.
+
+    With an AdaptiveConcurrency controller the number of ranges written
+    at the same time is adjusted by the throughput and the failed writes,
+    up to the size of the pool.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(
+            self, local_file, size, pool, write_range, range_size=DEFAULT_RANGE_SIZE,
+            max_attempts=DEFAULT_RANGE_ATTEMPTS, io_mode=DEFAULT_IO_MODE, stats=None,
+            callback=None, start=0, controller=None):
+
+        if max_attempts < 1:
+            raise RangeUploadError("Invalid number %r of tries per range." % (max_attempts))
+
+        self.local_file = str(local_file)
+        self.size = size
+        self.pool = pool
+        self.write_range = write_range
+        self.ranges = split_ranges(size, range_size, start)
+        self.max_attempts = max_attempts
+        self.io_mode = io_mode
+        self.stats = stats
+        self.callback = callback
+        self.controller = controller
+        self.done = start
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    # -------------------------------------------------------------------------
+    def _write_once(self, offset, length):
+
+        controller = self.controller
+        session = None
+        progress = None
+        if controller is not None:
+            controller.acquire()
+            progress = controller.transferred
+        failed = True
+        try:
+            session = self.pool.get()
+            with RangeReader(self.local_file, offset, length, callback=progress) as reader:
+                self.write_range(session, reader, offset, length)
+            if reader.remaining:
+                raise RangeUploadError("Local file %r is shorter than %d Bytes." % (
+                    self.local_file, offset + length))
+            failed = False
+        except Exception:
+            if session is not None:
+                self.pool.discard(session)
+            raise
+        finally:
+            if controller is not None:
+                controller.release(error=failed)
+
+        self.pool.put(session)
+        # Sessions above a lowered limit are closed, e.g. against connection limits
+        if controller is not None:
+            self.pool.shrink(controller.limit)
+
+    # -------------------------------------------------------------------------
+    def _upload_range(self, offset, length):
+
+        try_nr = 0
+        while True:
+            try_nr += 1
+            try:
+                self._write_once(offset, length)
+            except Exception as e:
+                if try_nr >= self.max_attempts:
+                    raise RangeUploadError(
+                        "Giving up the range of %d Bytes at %d of %r after %d tries: %s" % (
+                            length, offset, self.local_file, try_nr, e))
+                LOG.warning(
+                    "Try %d of the range of %d Bytes at %d of %r failed: %s",
+                    try_nr, length, offset, self.local_file, e)
+                with self._lock:
+                    self.retries += 1
+                continue
+            break
+
+        with self._lock:
+            self.done += length
+            done = self.done
+        if self.callback is not None:
+            self.callback(done, self.size)
+
+    # -------------------------------------------------------------------------
+    def local_digests(self, algorithms):
+        """Returns the checksums of the whole local file with the given algorithms."""
+
+        hashes = dict((alg, new_hash(alg)) for alg in algorithms if alg)
+        if not hashes:
+            return {}
+        with open_local_file(self.local_file, self.io_mode, stats=self.stats) as fh:
+            while True:
+                data = fh.read(RANGE_BLOCKSIZE)
+                if not data:
+                    break
+                for h in hashes.values():
+                    h.update(data)
+        return dict((alg, h.hexdigest()) for (alg, h) in hashes.items())
+
+    # -------------------------------------------------------------------------
+    def run(self, algorithms=None):
+        """
+        Uploads all ranges with at most the size of the pool ranges at the
+        same time and waits for their end.
+
+        @param algorithms: the algorithms for the checksums of the local file
+        @type algorithms: list
+
+        @return: the checksums of the local file by their algorithms
+        @rtype: dict
+        """
+
+        start = time.time()
+        if self.controller is not None:
+            self.controller.restart()
+        with ThreadPoolExecutor(max_workers=self.pool.size) as executor:
+            futures = [executor.submit(self._upload_range, o, l) for (o, l) in self.ranges]
+            try:
+                digests = self.local_digests(algorithms or [])
+            finally:
+                errors = []
+                for future in futures:
+                    try:
+                        future.result()
+                    except Exception as e:
+                        errors.append(str(e))
+        if errors:
+            raise RangeUploadError(errors[0])
+
+        duration = time.time() - start
+        rate = ''
+        if duration > 0:
+            rate = ', %s/s' % (bytes2human(int(self.size / duration), precision=1))
+        LOG.info(
+            "Uploaded %r in %d ranges with %d sessions in %.1f seconds%s, %d ranges repeated.",
+            self.local_file, len(self.ranges), self.pool.size, duration, rate, self.retries)
+        return digests
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Module for reading a local file ahead in a separate thread,
+          so reading from disk overlaps with sending over the network
+"""
+
+# Standard modules
+import logging
+import time
+import queue
+import threading
+
+# Third party modules
+
+# Own modules
+from pb_base.errors import PbError
+
+__version__ = '0.1.0'
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_READ_AHEAD_DEPTH = 4
+MAX_READ_AHEAD_DEPTH = 256
+DEFAULT_READ_AHEAD_SIZE = 1024 * 1024
+
+
+# =============================================================================
+class ReadAheadError(PbError):
+    """
+    Base exception class for all exceptions belonging to issues
+    in this module
+    """
+    pass
+
+
+# =============================================================================
+class ReadAheadReader(object):
+    """
+    File like object for reading another file object, which is read ahead
+    by a separate thread into a ring of reusable buffers with readinto().
+
+    A buffer is given back to the reader thread, after its content was
+    completely delivered, so the memory consumption is limited to
+    depth * bufsize.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, fileobj, depth=DEFAULT_READ_AHEAD_DEPTH, bufsize=DEFAULT_READ_AHEAD_SIZE):
+
+        depth = int(depth)
+        if depth < 1 or depth > MAX_READ_AHEAD_DEPTH:
+            msg = "Invalid read ahead depth %r, must be between 1 and %d." % (
+                depth, MAX_READ_AHEAD_DEPTH)
+            raise ValueError(msg)
+        bufsize = int(bufsize)
+        if bufsize < 1:
+            raise ValueError("Invalid read ahead buffer size %r." % (bufsize))
+
+        self.fileobj = fileobj
+        self.depth = depth
+        self.bufsize = bufsize
+
+        self.bytes_read = 0
+        self.reader_wait = 0.0
+        self.consumer_wait = 0.0
+
+        self._buffers = [bytearray(bufsize) for i in range(depth)]
+        self._free = queue.Queue()
+        self._filled = queue.Queue()
+        for i in range(depth):
+            self._free.put(i)
+
+        self._cur = None
+        self._view = None
+        self._len = 0
+        self._pos = 0
+        self._eof = False
+        self._closed = False
+        self._stop = False
+
+        self._thread = threading.Thread(target=self._read_ahead, name='read-ahead')
+        self._thread.daemon = True
+        self._thread.start()
+
+    # -------------------------------------------------------------------------
+    def _read_ahead(self):
+
+        try:
+            while True:
+                start = time.time()
+                index = self._free.get()
+                self.reader_wait += time.time() - start
+                if index is None or self._stop:
+                    return
+                buf = self._buffers[index]
+                if hasattr(self.fileobj, 'readinto'):
+                    length = self.fileobj.readinto(buf)
+                else:
+                    data = self.fileobj.read(self.bufsize)
+                    length = len(data)
+                    buf[:length] = data
+                self.bytes_read += length
+                self._filled.put((index, length))
+                if not length:
+                    return
+        except Exception as e:
+            self._filled.put((None, e))
+
+    # -------------------------------------------------------------------------
+    def _release(self):
+
+        if self._cur is not None:
+            self._view.release()
+            self._free.put(self._cur)
+            self._cur = None
+            self._view = None
+
+    # -------------------------------------------------------------------------
+    def _next_buffer(self):
+
+        self._release()
+        if self._eof:
+            return False
+
+        start = time.time()
+        (index, length) = self._filled.get()
+        self.consumer_wait += time.time() - start
+        if index is None:
+            self._eof = True
+            raise ReadAheadError("Error reading ahead: %s" % (length))
+        if not length:
+            self._eof = True
+            self._free.put(index)
+            return False
+
+        self._cur = index
+        self._view = memoryview(self._buffers[index])
+        self._len = length
+        self._pos = 0
+        return True
+
+    # -------------------------------------------------------------------------
+    def read(self, size=-1):
+
+        if self._closed:
+            raise ReadAheadError("I/O operation on a closed %s." % (self.__class__.__name__))
+
+        if size is None or size < 0:
+            size = -1
+
+        chunks = []
+        while size:
+            if self._cur is None or self._pos >= self._len:
+                if not self._next_buffer():
+                    break
+            end = self._len
+            if size > 0:
+                end = min(self._len, self._pos + size)
+            # The data must be copied, because the buffer will be reused.
+            chunks.append(bytes(self._view[self._pos:end]))
+            if size > 0:
+                size -= end - self._pos
+            self._pos = end
+
+        return b''.join(chunks)
+
+    # -------------------------------------------------------------------------
+    def close(self):
+
+        if self._closed:
+            return
+        self._closed = True
+        self._stop = True
+        self._release()
+        self._free.put(None)
+        self._thread.join()
+        self._buffers = []
+
+    # -------------------------------------------------------------------------
+    def __enter__(self):
+        return self
+
+    # -------------------------------------------------------------------------
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # -------------------------------------------------------------------------
+    def log_stats(self):
+
+        LOG.debug(
+            "Read ahead %d Bytes with %d buffers of %d Bytes, the disk waited %.2f seconds "
+            "for free buffers, the network waited %.2f seconds for data.",
+            self.bytes_read, self.depth, self.bufsize, self.reader_wait, self.consumer_wait)
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,788 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Module for restoring a backup directory from a FTP or SSH server
+
+The files are downloaded in parallel over a pool of connections. Every
+file is downloaded first into a partial file beside its target, which is
+continued with REST (FTP) or from its offset (SFTP), if the restore was
+interrupted. Afterwards the partial file is decrypted and uncompressed,
+if necessary, into the target, the modification time is restored and the
+content is verified against the checksum in the manifest.
+"""
+
+# Standard modules
+import logging
+import os
+import io
+import re
+import gzip
+import time
+import queue
+import ftplib
+import tarfile
+import posixpath
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+# Third party modules
+
+# Own modules
+from pb_base.common import bytes2human
+
+from pb_base.errors import PbError
+
+from ftp_backup import UPLOAD_PARTIAL_SUFFIX
+
+from ftp_backup.checksum import new_hash
+
+from ftp_backup.manifest import BackupManifest, MANIFEST_NAME
+
+from ftp_backup.pipeline import COMPRESSED_SUFFIX
+
+from ftp_backup.packer import PACK_INDEX_NAME
+
+__version__ = '0.3.2'
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_RESTORE_WORKERS = 4
+MAX_RESTORE_WORKERS = 64
+DEFAULT_PROGRESS_INTERVAL = 10
+PARTIAL_SUFFIX = '.part'
+# Suffix of restored files with a wrong checksum or size, kept for inspection
+CORRUPT_SUFFIX = '.corrupt'
+ENCRYPTED_SUFFIX = '.enc'
+DOWNLOAD_BLOCKSIZE = 256 * 1024
+
+RE_BACKUP_DIR = re.compile(r'^\d{4}[-_]+\d\d[-_]+\d\d[-_]+\d+$')
+
+
+# =============================================================================
+class RestoreError(PbError):
+    """
+    Base exception class for all exceptions belonging to issues
+    in this module
+    """
+    pass
+
+
+# =============================================================================
+def strip_suffixes(remote_name):
+    """Returns the name of the restored file and the suffixes of the remote file."""
+
+    name = remote_name
+    encrypted = False
+    compressed = False
+    if name.endswith(ENCRYPTED_SUFFIX):
+        encrypted = True
+        name = name[:-len(ENCRYPTED_SUFFIX)]
+    if name.endswith(COMPRESSED_SUFFIX):
+        compressed = True
+        name = name[:-len(COMPRESSED_SUFFIX)]
+    return (name, compressed, encrypted)
+
+
+# =============================================================================
+def latest_backup_dir(names):
+    """Returns the name of the latest backup directory of the given names or None."""
+
+    backup_dirs = sorted(n for n in names if RE_BACKUP_DIR.match(n))
+    if not backup_dirs:
+        return None
+    return backup_dirs[-1]
+
+
+# =============================================================================
+def open_decoded(fileobj, compressed=False, encrypted=False, key=None):
+    """Returns a file object reading the decrypted and uncompressed content of fileobj."""
+
+    stream = fileobj
+    if encrypted:
+        if not key:
+            raise RestoreError("Encrypted backup, but no key given.")
+        from ftp_backup.crypt import DecryptingReader
+        stream = DecryptingReader(stream, key)
+    if compressed:
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+    return stream
+
+
+# =============================================================================
+def fetch_manifest(session, backup_dir, key=None, names=None):
+    """
+    Downloads and decrypts the manifest of the given backup directory.
+
+    @param session: a download session, e.g. a SFTPRestoreSession
+    @param names: the names of the files in the backup directory, if already known
+
+    @return: the manifest or None, if the backup directory has no manifest
+    @rtype: BackupManifest
+    """
+
+    if names is None:
+        names = set(session.listdir(backup_dir))
+    for remote_name in (MANIFEST_NAME, MANIFEST_NAME + ENCRYPTED_SUFFIX):
+        if remote_name not in names:
+            continue
+        fh = io.BytesIO()
+        session.download(posixpath.join(backup_dir, remote_name), fh)
+        fh.seek(0)
+        encrypted = remote_name.endswith(ENCRYPTED_SUFFIX)
+        return BackupManifest.from_json(open_decoded(fh, encrypted=encrypted, key=key).read())
+    return None
+
+
+# =============================================================================
+class FTPRestoreSession(object):
+    """A FTP connection for downloading files, used by one thread at a time."""
+
+    # -------------------------------------------------------------------------
+    def __init__(self, ftp):
+
+        self.ftp = ftp
+        self.rest_supported = True
+        self.ftp.voidcmd('TYPE I')
+
+    # -------------------------------------------------------------------------
+    def listdir(self, path='.'):
+        return [posixpath.basename(n) for n in self.ftp.nlst(path)]
+
+    # -------------------------------------------------------------------------
+    def size(self, remote_path):
+
+        try:
+            return self.ftp.size(remote_path)
+        except ftplib.error_perm:
+            return None
+
+    # -------------------------------------------------------------------------
+    def download(self, remote_path, fh, offset=0, callback=None):
+        """
+        Downloads the given remote file into the file object fh, starting
+        at the given offset. Returns the offset really used, which is 0,
+        if the server doesn't support REST.
+        """
+
+        def write(data):
+            fh.write(data)
+            if callback:
+                callback(len(data))
+
+        if offset and not self.rest_supported:
+            offset = 0
+        fh.seek(offset)
+        fh.truncate()
+        if not offset:
+            self.ftp.retrbinary('RETR %s' % (remote_path), write, DOWNLOAD_BLOCKSIZE)
+            return 0
+
+        # REST is sent by ftplib directly before RETR, after PASV or PORT
+        try:
+            self.ftp.retrbinary(
+                'RETR %s' % (remote_path), write, DOWNLOAD_BLOCKSIZE, rest=offset)
+        except ftplib.error_perm as e:
+            # Only a refused REST, not e.g. a missing file
+            if fh.tell() != offset or not str(e).startswith(('500', '502', '504')):
+                raise
+            LOG.debug("FTP server doesn't support REST: %s", str(e))
+            self.rest_supported = False
+            return self.download(remote_path, fh, 0, callback)
+        return offset
+
+    # -------------------------------------------------------------------------
+    def close(self):
+
+        try:
+            self.ftp.quit()
+        except (ftplib.Error, IOError, OSError, EOFError):
+            pass
+
+
+# =============================================================================
+class SFTPRestoreSession(object):
+    """A SFTP channel for downloading files, used by one thread at a time."""
+
+    # -------------------------------------------------------------------------
+    def __init__(self, sftp, ssh_client=None):
+
+        self.sftp = sftp
+        self.ssh_client = ssh_client
+
+    # -------------------------------------------------------------------------
+    def listdir(self, path='.'):
+        return self.sftp.listdir(path)
+
+    # -------------------------------------------------------------------------
+    def size(self, remote_path):
+
+        try:
+            return self.sftp.stat(remote_path).st_size
+        except IOError:
+            return None
+
+    # -------------------------------------------------------------------------
+    def download(self, remote_path, fh, offset=0, callback=None):
+        """
+        Downloads the given remote file into the file object fh, starting
+        at the given offset, with prefetching of the following blocks.
+        """
+
+        with self.sftp.open(remote_path, 'rb') as remote:
+            size = remote.stat().st_size
+            if offset > size:
+                offset = 0
+            remote.seek(offset)
+            fh.seek(offset)
+            fh.truncate()
+            remote.prefetch(size)
+            while True:
+                data = remote.read(DOWNLOAD_BLOCKSIZE)
+                if not data:
+                    break
+                fh.write(data)
+                if callback:
+                    callback(len(data))
+        return offset
+
+    # -------------------------------------------------------------------------
+    def close(self):
+
+        self.sftp.close()
+        if self.ssh_client is not None:
+            self.ssh_client.close()
+
+
+# =============================================================================
+class SessionPool(object):
+    """
+    A pool of connections to the server, created on demand by the given
+    factory up to the given size.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, factory, size=DEFAULT_RESTORE_WORKERS):
+
+        self.factory = factory
+        self.size = size
+        self._idle = queue.Queue()
+        self._created = 0
+        self._sessions = []
+        self._lock = threading.Lock()
+
+    # -------------------------------------------------------------------------
+    @property
+    def created(self):
+        """The number of open sessions, idle or in use."""
+        return self._created
+
+    # -------------------------------------------------------------------------
+    def get(self):
+
+        with self._lock:
+            if self._idle.empty() and self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if not create:
+            return self._idle.get()
+        try:
+            session = self.factory()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+        with self._lock:
+            self._sessions.append(session)
+        return session
+
+    # -------------------------------------------------------------------------
+    def put(self, session):
+        self._idle.put(session)
+
+    # -------------------------------------------------------------------------
+    def discard(self, session):
+        """Closes a broken session, a new one is created on demand."""
+
+        with self._lock:
+            if session in self._sessions:
+                self._sessions.remove(session)
+            self._created -= 1
+        session.close()
+
+    # -------------------------------------------------------------------------
+    def shrink(self, size):
+        """Closes idle sessions, until at most size sessions are open."""
+
+        while self._created > size:
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(session)
+
+    # -------------------------------------------------------------------------
+    def close(self):
+
+        with self._lock:
+            for session in self._sessions:
+                session.close()
+            self._sessions = []
+            self._created = 0
+
+
+# =============================================================================
+class RestoreProgress(object):
+    """
+    Thread safe progress of a restore with the throughput and the
+    estimated time until the end, logged periodically.
+
+    The progress is measured in Bytes of the restored files. The Bytes of
+    compressed or encrypted downloads are scaled by the ratio of the size of
+    the restored file to the size of the remote file.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, total_bytes, total_files, interval=DEFAULT_PROGRESS_INTERVAL):
+
+        self.total_bytes = total_bytes
+        self.total_files = total_files
+        self.interval = interval
+        self.bytes_done = 0.0
+        self.bytes_transferred = 0
+        self.files_done = 0
+        self.start_time = time.time()
+        self._last_log = self.start_time
+        self._lock = threading.Lock()
+
+    # -------------------------------------------------------------------------
+    def add(self, transferred, scale=1.0):
+
+        with self._lock:
+            self.bytes_transferred += transferred
+            self.bytes_done += transferred * scale
+            now = time.time()
+            if now - self._last_log < self.interval:
+                return
+            self._last_log = now
+        self.log()
+
+    # -------------------------------------------------------------------------
+    def file_done(self, remaining=0):
+        """Marks a file as finished with the given not yet counted Bytes."""
+
+        with self._lock:
+            self.files_done += 1
+            self.bytes_done += remaining
+
+    # -------------------------------------------------------------------------
+    def throughput(self):
+        """The downloaded Bytes per second."""
+
+        elapsed = time.time() - self.start_time
+        if elapsed <= 0:
+            return 0.0
+        return self.bytes_transferred / elapsed
+
+    # -------------------------------------------------------------------------
+    def eta(self):
+        """The estimated seconds until the end of the restore or None."""
+
+        elapsed = time.time() - self.start_time
+        if elapsed <= 0 or self.bytes_done <= 0:
+            return None
+        rate = self.bytes_done / elapsed
+        return max(0.0, (self.total_bytes - self.bytes_done) / rate)
+
+    # -------------------------------------------------------------------------
+    def log(self):
+
+        percent = 100.0
+        if self.total_bytes:
+            percent = min(100.0, self.bytes_done * 100.0 / self.total_bytes)
+        eta = self.eta()
+        eta_out = 'unknown'
+        if eta is not None:
+            eta_out = '%d:%02d:%02d' % (eta // 3600, (eta % 3600) // 60, eta % 60)
+        LOG.info(
+            "Restored %d of %d files, %s of %s (%.1f%%), %s/s, ETA %s.",
+            self.files_done, self.total_files, bytes2human(int(self.bytes_done), precision=1),
+            bytes2human(self.total_bytes, precision=1), percent,
+            bytes2human(int(self.throughput()), precision=1), eta_out)
+
+
+# =============================================================================
+class RestoreJob(object):
+    """A remote file to restore with the files restored from it."""
+
+    # -------------------------------------------------------------------------
+    def __init__(self, remote_name, entries=None, archive=False):
+
+        self.remote_name = remote_name
+        # list of tuples (name, size, mtime, digest)
+        self.entries = entries or []
+        self.archive = archive
+
+    # -------------------------------------------------------------------------
+    def size(self):
+        return sum(entry[1] for entry in self.entries)
+
+
+# =============================================================================
+class BackupRestorer(object):
+    """
+    Restores a backup directory from a server in parallel over a pool of
+    connections into a local directory.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(
+            self, pool, target_dir, workers=DEFAULT_RESTORE_WORKERS, decrypt_key=None,
+            verify=True, progress_interval=DEFAULT_PROGRESS_INTERVAL):
+
+        workers = int(workers)
+        if workers < 1 or workers > MAX_RESTORE_WORKERS:
+            msg = "Invalid number %r of restore workers, must be between 1 and %d." % (
+                workers, MAX_RESTORE_WORKERS)
+            raise ValueError(msg)
+
+        self.pool = pool
+        self.target_dir = str(target_dir)
+        self.workers = workers
+        self.decrypt_key = decrypt_key
+        self.verify = verify
+        self.progress_interval = progress_interval
+        self.progress = None
+        self.algorithm = None
+        self.restored = []
+        self.skipped = []
+        self.failures = []
+        self.mismatches = []
+        self._lock = threading.Lock()
+
+    # -------------------------------------------------------------------------
+    def _run_with_session(self, func, *args):
+
+        return self._run_in_pool(self.pool, func, *args)
+
+    # -------------------------------------------------------------------------
+    def _run_in_pool(self, pool, func, *args):
+
+        session = pool.get()
+        try:
+            result = func(session, *args)
+        except (ftplib.Error, IOError, OSError, EOFError):
+            pool.discard(session)
+            raise
+        pool.put(session)
+        return result
+
+    # -------------------------------------------------------------------------
+    def find_backup_dir(self, backup_dir=None):
+        """Returns the given backup directory or the latest one on the server."""
+
+        if backup_dir and backup_dir != 'latest':
+            return backup_dir
+        names = self._run_with_session(lambda session: session.listdir('.'))
+        latest = latest_backup_dir(names)
+        if not latest:
+            raise RestoreError("No backup directories found on the server.")
+        LOG.info("Latest backup directory is %r.", latest)
+        return latest
+
+    # -------------------------------------------------------------------------
+    def load_manifest(self, backup_dir):
+        """
+        Downloads and decrypts the manifest of the given backup directory.
+
+        @return: the manifest or None, if the backup directory has no manifest
+        @rtype: BackupManifest
+        """
+
+        names = set(self._run_with_session(lambda session: session.listdir(backup_dir)))
+        manifest = self._run_with_session(fetch_manifest, backup_dir, self.decrypt_key, names)
+        if manifest is not None:
+            return manifest
+
+        LOG.warning(
+            "Backup directory %r has no manifest, restoring without verification.",
+            backup_dir)
+        manifest = BackupManifest(backup_dir)
+        for remote_name in sorted(names):
+            if remote_name.endswith(UPLOAD_PARTIAL_SUFFIX):
+                LOG.warning("Skipping the incomplete upload %r.", remote_name)
+                continue
+            (name, compressed, encrypted) = strip_suffixes(remote_name)
+            if name == PACK_INDEX_NAME:
+                continue
+            manifest.add(name, remote_name, 0, None)
+        return manifest
+
+    # -------------------------------------------------------------------------
+    def plan(self, manifest):
+        """
+        Groups the entries of the manifest by the remote files to download,
+        without the parts of striped files.
+        """
+
+        parts = manifest.stripe_parts()
+        jobs = {}
+        for (name, entry) in sorted(manifest.files.items()):
+            if name in parts:
+                continue
+            item = (name, entry.get('size', 0), entry.get('mtime'), entry.get('digest'))
+            archive = entry.get('archive')
+            remote_name = archive or entry['remote']
+            if remote_name not in jobs:
+                jobs[remote_name] = RestoreJob(remote_name, archive=bool(archive))
+            jobs[remote_name].entries.append(item)
+        # The biggest files first, for a short tail of the restore
+        return sorted(jobs.values(), key=lambda job: job.size(), reverse=True)
+
+    # -------------------------------------------------------------------------
+    def _target_path(self, name):
+
+        path = os.path.normpath(os.path.join(self.target_dir, name))
+        if not path.startswith(os.path.normpath(self.target_dir) + os.sep):
+            raise RestoreError("Refusing to restore %r outside of the target directory." % (name))
+        return path
+
+    # -------------------------------------------------------------------------
+    def _is_restored(self, entry):
+
+        (name, size, mtime, digest) = entry
+        path = self._target_path(name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        if mtime is None:
+            return False
+        if st.st_size != size or int(st.st_mtime) != int(mtime):
+            return False
+        if not (self.verify and digest and self.algorithm):
+            return True
+        hasher = new_hash(self.algorithm)
+        with open(path, 'rb') as fh:
+            while True:
+                data = fh.read(DOWNLOAD_BLOCKSIZE)
+                if not data:
+                    break
+                hasher.update(data)
+        if hasher.hexdigest() != digest:
+            LOG.warning("Existing file %r has a wrong checksum, restoring it again.", name)
+            return False
+        return True
+
+    # -------------------------------------------------------------------------
+    def _download(self, session, remote_path, part_file, restored_size):
+        """
+        Downloads the remote file into the partial file, continuing an
+        existing partial file.
+
+        @return: the downloaded Bytes, scaled to the size of the restored files
+        @rtype: float
+        """
+
+        remote_size = session.size(remote_path)
+        offset = 0
+        mode = 'wb'
+        if os.path.exists(part_file):
+            mode = 'r+b'
+            offset = os.path.getsize(part_file)
+            if remote_size is not None and offset > remote_size:
+                offset = 0
+        if remote_size is not None and offset == remote_size and offset:
+            LOG.debug("%r was already downloaded completely.", remote_path)
+            return 0.0
+        if offset:
+            LOG.info("Resuming download of %r at %d Bytes.", remote_path, offset)
+
+        # The download is counted in Bytes of the restored files
+        scale = 1.0
+        if remote_size:
+            scale = float(restored_size) / float(remote_size)
+        counted = [0.0]
+
+        def count(length):
+            counted[0] += length * scale
+            self.progress.add(length, scale)
+
+        with open(part_file, mode) as fh:
+            used = session.download(remote_path, fh, offset, callback=count)
+        if offset and not used:
+            LOG.info("Download of %r was restarted from the beginning.", remote_path)
+        return counted[0]
+
+    # -------------------------------------------------------------------------
+    def _quarantine(self, tmp_file, path, name):
+        """Keeps a corrupt restored file under a name, which is never taken as restored."""
+
+        corrupt_file = path + CORRUPT_SUFFIX
+        os.rename(tmp_file, corrupt_file)
+        LOG.error("Kept the corrupt restored file %r as %r.", name, corrupt_file)
+        with self._lock:
+            self.mismatches.append(name)
+
+    # -------------------------------------------------------------------------
+    def _finish_file(self, path, fileobj, entry):
+        """
+        Writes the restored file from fileobj and moves it into its place,
+        if its checksum or size is correct.
+
+        @return: the file was restored correctly
+        @rtype: bool
+        """
+
+        (name, size, mtime, digest) = entry
+        hasher = None
+        if self.verify and digest and self.algorithm:
+            hasher = new_hash(self.algorithm)
+        tmp_file = path + '.new'
+        with open(tmp_file, 'wb') as out:
+            while True:
+                data = fileobj.read(DOWNLOAD_BLOCKSIZE)
+                if not data:
+                    break
+                out.write(data)
+                if hasher is not None:
+                    hasher.update(data)
+        if hasher is not None and hasher.hexdigest() != digest:
+            LOG.error(
+                "Checksum mismatch of restored file %r: expected %s, got %s.",
+                name, digest, hasher.hexdigest())
+            self._quarantine(tmp_file, path, name)
+            return False
+        if self.verify and not digest and size and os.path.getsize(tmp_file) != size:
+            LOG.error("Restored file %r has the wrong size.", name)
+            self._quarantine(tmp_file, path, name)
+            return False
+        os.rename(tmp_file, path)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        with self._lock:
+            self.restored.append(name)
+        return True
+
+    # -------------------------------------------------------------------------
+    def _restore_job(self, backup_dir, job):
+
+        pending = [entry for entry in job.entries if not self._is_restored(entry)]
+        if not pending:
+            with self._lock:
+                self.skipped.extend(entry[0] for entry in job.entries)
+            for entry in job.entries:
+                self.progress.file_done(entry[1])
+            return
+
+        (plain_name, compressed, encrypted) = strip_suffixes(job.remote_name)
+        remote_path = posixpath.join(backup_dir, job.remote_name)
+        part_file = self._target_path(job.remote_name) + PARTIAL_SUFFIX
+        part_dir = os.path.dirname(part_file)
+        if not os.path.isdir(part_dir):
+            os.makedirs(part_dir, exist_ok=True)
+
+        counted = self._run_with_session(self._download, remote_path, part_file, job.size())
+
+        try:
+            with open(part_file, 'rb') as fh:
+                stream = open_decoded(fh, compressed, encrypted, self.decrypt_key)
+                if job.archive:
+                    self._extract(stream, pending)
+                else:
+                    self._finish_file(self._target_path(pending[0][0]), stream, pending[0])
+        finally:
+            # A complete download is never continued, also not a corrupt one
+            os.remove(part_file)
+
+        # Resumed parts were not counted during the download
+        self.progress.file_done(job.size() - counted)
+        for entry in job.entries[1:]:
+            self.progress.file_done()
+
+    # -------------------------------------------------------------------------
+    def _extract(self, stream, entries):
+
+        wanted = dict((entry[0], entry) for entry in entries)
+        with tarfile.open(fileobj=stream, mode='r|') as tar:
+            for member in tar:
+                entry = wanted.get(member.name)
+                if entry is None or not member.isfile():
+                    continue
+                path = self._target_path(member.name)
+                target_dir = os.path.dirname(path)
+                if not os.path.isdir(target_dir):
+                    os.makedirs(target_dir, exist_ok=True)
+                self._finish_file(path, tar.extractfile(member), entry)
+
+    # -------------------------------------------------------------------------
+    def restore(self, backup_dir=None):
+        """
+        Restores the given or the latest backup directory into the target directory.
+
+        @return: True, if all files were restored and verified successfully
+        @rtype: bool
+        """
+
+        backup_dir = self.find_backup_dir(backup_dir)
+        return self.restore_manifest(backup_dir, self.load_manifest(backup_dir))
+
+    # -------------------------------------------------------------------------
+    def restore_manifest(self, backup_dir, manifest):
+        """
+        Restores the files of the given manifest of the backup directory
+        into the target directory, striped files are left to a StripeRestorer.
+
+        @return: True, if all files were restored and verified successfully
+        @rtype: bool
+        """
+
+        self.algorithm = manifest.algorithm
+        jobs = self.plan(manifest)
+        nr_files = sum(len(job.entries) for job in jobs)
+
+        total = sum(job.size() for job in jobs)
+        self.progress = RestoreProgress(total, nr_files, self.progress_interval)
+        LOG.info(
+            "Restoring %d files with %s from %r into %r with %d workers ...",
+            nr_files, bytes2human(total, precision=1), backup_dir,
+            self.target_dir, self.workers)
+
+        if not os.path.isdir(self.target_dir):
+            os.makedirs(self.target_dir)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {}
+            for job in jobs:
+                futures[executor.submit(self._restore_job, backup_dir, job)] = job
+            for future in futures:
+                job = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    LOG.error("Could not restore %r: %s", job.remote_name, str(e))
+                    with self._lock:
+                        self.failures.append(job.remote_name)
+
+        self.progress.log()
+        LOG.info(
+            "Restored %d files, %d already present, %d failed downloads, %d checksum mismatches.",
+            len(self.restored), len(self.skipped), len(self.failures), len(self.mismatches))
+        return not self.failures and not self.mismatches
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,465 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Application classes for scripts working on the backup directories
+          of a FTP or SSH server, e.g. for restoring a backup directory
+"""
+
+# Standard modules
+import sys
+import logging
+import textwrap
+import os
+import ssl
+import ftplib
+import socket
+
+from pathlib import PurePosixPath
+
+# Third party modules
+
+# Own modules
+from pb_logging.colored import ColoredFormatter
+
+from pb_base.common import to_bool
+
+from pb_base.cfg_app import PbCfgApp
+
+import ftp_backup
+
+from ftp_backup.sftp_handler import DEFAULT_SSH_SERVER, DEFAULT_SSH_PORT
+from ftp_backup.sftp_handler import DEFAULT_SSH_USER, DEFAULT_REMOTE_DIR
+from ftp_backup.sftp_handler import DEFAULT_SSH_TIMEOUT, DEFAULT_SSH_KEY
+
+from ftp_backup.by_ftp_app import DEFAULT_FTP_PORT, DEFAULT_FTP_USER, DEFAULT_FTP_PWD
+from ftp_backup.by_ftp_app import DEFAULT_FTP_DIR, DEFAULT_FTP_TIMEOUT
+
+from ftp_backup.restore import BackupRestorer, SessionPool
+from ftp_backup.restore import FTPRestoreSession, SFTPRestoreSession
+from ftp_backup.restore import DEFAULT_RESTORE_WORKERS, MAX_RESTORE_WORKERS
+
+__version__ = '0.2.0'
+
+LOG = logging.getLogger(__name__)
+
+PROTOCOLS = ('ftp', 'sftp')
+DEFAULT_PROTOCOL = 'sftp'
+
+APP_VERSION = ftp_backup.__version__
+try:
+    import ftp_backup.local_version
+    APP_VERSION = ftp_backup.local_version.__version__
+except ImportError:
+    pass
+
+
+# =============================================================================
+class RemoteCfgApp(PbCfgApp):
+    """
+    Base application class for working on the backup directories of a FTP
+    or SSH server, with the connection parameters from the command line
+    or the sections [ftp] or [sftp] of the configuration.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, appname=None, verbose=0, description=None):
+        """Constructor."""
+
+        self.protocol = DEFAULT_PROTOCOL
+        self.host = None
+        self.port = None
+        self.user = None
+        self.password = DEFAULT_FTP_PWD
+        self.passive = False
+        self.tls = False
+        self.key_file = DEFAULT_SSH_KEY
+        self.timeout = None
+        self.remote_dir = None
+        self.source_host = socket.gethostname()
+        self.encrypt_key_file = None
+
+        self.cfg_sections = {}
+
+        super(RemoteCfgApp, self).__init__(
+            appname=appname,
+            verbose=verbose,
+            version=APP_VERSION,
+            description=textwrap.dedent(description or ''),
+            cfg_dir='ftp-backup',
+            hide_default_config=True,
+            need_config_file=False,
+        )
+
+    # -------------------------------------------------------------------------
+    def init_arg_parser(self):
+
+        super(RemoteCfgApp, self).init_arg_parser()
+
+        h = "The key file for decrypting an encrypted backup."
+        self.arg_parser.add_argument(
+            '--encrypt-key', metavar='FILE', dest='encrypt_key_file', help=h)
+
+        remote_group = self.arg_parser.add_argument_group('Server parameters')
+
+        h = "The protocol for downloading, one of %s (default: %r)." % (
+            ', '.join(PROTOCOLS), DEFAULT_PROTOCOL)
+        remote_group.add_argument(
+            '-P', '--protocol', metavar='PROTO', choices=PROTOCOLS, dest='protocol', help=h)
+
+        h = "The server, where the backup is stored."
+        remote_group.add_argument('--host', metavar='HOST', help=h)
+
+        h = "The listening port of the server."
+        remote_group.add_argument('--port', metavar='PORT', type=int, help=h)
+
+        h = "The remote user on the server."
+        remote_group.add_argument('--user', metavar='USER', help=h)
+
+        h = "The password of the remote user on the FTP server."
+        remote_group.add_argument('--password', metavar='PASSWORD', help=h)
+
+        h = "Use passive mode on the FTP server."
+        remote_group.add_argument('--passive', action='store_true', help=h)
+
+        h = "Use FTPS with TLS on the FTP server."
+        remote_group.add_argument('--tls', action='store_true', help=h)
+
+        h = "The private key file for authentication on the SSH server (default: %r)." % (
+            str(DEFAULT_SSH_KEY))
+        remote_group.add_argument('-K', '--ssh-key', metavar='FILE', help=h)
+
+        h = (
+            "The remote directory containing the backup directories (default: %r on "
+            "FTP servers, %r and the name of the backed up host on SSH servers).") % (
+            DEFAULT_FTP_DIR, str(DEFAULT_REMOTE_DIR))
+        remote_group.add_argument('--remote-dir', metavar='DIR', help=h)
+
+        h = "The name of the backed up host on SSH servers (default: %r)." % (
+            socket.gethostname())
+        remote_group.add_argument('--source-host', metavar='HOST', dest='source_host', help=h)
+
+    # -------------------------------------------------------------------------
+    def perform_arg_parser(self):
+
+        super(RemoteCfgApp, self).perform_arg_parser()
+
+        if self.args.encrypt_key_file:
+            self.encrypt_key_file = self.args.encrypt_key_file
+
+        if self.args.protocol:
+            self.protocol = self.args.protocol
+        if self.args.host:
+            self.host = self.args.host
+        if self.args.port and self.args.port > 0:
+            self.port = self.args.port
+        if self.args.user:
+            self.user = self.args.user
+        if self.args.password:
+            self.password = self.args.password
+        if self.args.passive:
+            self.passive = True
+        if self.args.tls:
+            self.tls = True
+        if self.args.ssh_key:
+            self.key_file = self.args.ssh_key
+        if self.args.remote_dir:
+            self.remote_dir = self.args.remote_dir
+        if self.args.source_host:
+            self.source_host = self.args.source_host
+
+    # -------------------------------------------------------------------------
+    def init_logging(self):
+        """
+        Initialize the logger object.
+        It creates a colored loghandler with all output to STDERR.
+        Maybe overridden in descendant classes.
+
+        @return: None
+        """
+
+        root_log = logging.getLogger()
+        root_log.setLevel(logging.INFO)
+        if self.verbose:
+            root_log.setLevel(logging.DEBUG)
+
+        # create formatter
+        format_str = '[%(asctime)s]: ' + self.appname + ': '
+        if self.verbose:
+            if self.verbose > 1:
+                format_str += '%(name)s(%(lineno)d) %(funcName)s() '
+            else:
+                format_str += '%(name)s '
+        format_str += '%(levelname)s - %(message)s'
+        formatter = None
+        if self.terminal_has_colors:
+            formatter = ColoredFormatter(format_str)
+        else:
+            formatter = logging.Formatter(format_str)
+
+        # create log handler for console output
+        lh_console = logging.StreamHandler(sys.stderr)
+        if self.verbose:
+            lh_console.setLevel(logging.DEBUG)
+        else:
+            lh_console.setLevel(logging.INFO)
+        lh_console.setFormatter(formatter)
+
+        root_log.addHandler(lh_console)
+
+        return
+
+    # -------------------------------------------------------------------------
+    def perform_config(self):
+
+        super(RemoteCfgApp, self).perform_config()
+
+        int_msg_tpl = "Error in configuration: [%s]/%s %r is not an integer value: %s"
+
+        # The server parameters are taken from the section of the protocol
+        # after all command line parameters are known.
+        for section in self.cfg:
+
+            if section.lower() in ('ftp', 'sftp', 'scp'):
+                name = section.lower()
+                if name == 'scp':
+                    name = 'sftp'
+                self.cfg_sections[name] = self.cfg[section]
+
+            if section.lower() == 'restore':
+                if 'protocol' in self.cfg[section] and not self.args.protocol:
+                    protocol = self.cfg[section]['protocol'].strip().lower()
+                    if protocol in PROTOCOLS:
+                        self.protocol = protocol
+                    else:
+                        LOG.error(
+                            "Error in configuration: [%s]/protocol %r is not one of %s.",
+                            section, self.cfg[section]['protocol'], ', '.join(PROTOCOLS))
+
+            if section.lower() == 'encryption':
+                if 'key_file' in self.cfg[section] and not self.args.encrypt_key_file:
+                    self.encrypt_key_file = self.cfg[section]['key_file']
+
+        cfg = self.cfg_sections.get(self.protocol, {})
+        if 'host' in cfg and not self.args.host:
+            self.host = cfg['host']
+        if 'port' in cfg and not self.args.port:
+            try:
+                self.port = int(cfg['port'])
+            except ValueError as e:
+                LOG.error(int_msg_tpl % (self.protocol.upper(), 'port', cfg['port'], str(e)))
+        if 'timeout' in cfg:
+            try:
+                self.timeout = int(cfg['timeout'])
+            except ValueError as e:
+                LOG.error(int_msg_tpl % (
+                    self.protocol.upper(), 'timeout', cfg['timeout'], str(e)))
+        if 'user' in cfg and not self.args.user:
+            self.user = cfg['user']
+        if 'dir' in cfg and not self.args.remote_dir:
+            self.remote_dir = cfg['dir']
+        if self.protocol == 'ftp':
+            if 'password' in cfg and not self.args.password:
+                self.password = cfg['password']
+            if 'passive' in cfg and not self.args.passive:
+                self.passive = to_bool(cfg['passive'])
+            if 'tls' in cfg and not self.args.tls:
+                self.tls = to_bool(cfg['tls'])
+        elif 'key_file' in cfg and not self.args.ssh_key:
+            self.key_file = cfg['key_file']
+
+    # -------------------------------------------------------------------------
+    def pre_run(self):
+
+        super(RemoteCfgApp, self).pre_run()
+
+        paramiko_logger = logging.getLogger('paramiko.transport')
+        if self.verbose < 1:
+            paramiko_logger.setLevel(logging.WARNING)
+        elif self.verbose < 2:
+            paramiko_logger.setLevel(logging.INFO)
+
+    # -------------------------------------------------------------------------
+    def ftp_session(self):
+        """Creates a new logged in FTP connection in the remote directory."""
+
+        timeout = self.timeout or DEFAULT_FTP_TIMEOUT
+        if self.tls:
+            context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+            context.verify_mode = ssl.CERT_NONE
+            ftp = ftplib.FTP_TLS(context=context, timeout=timeout)
+        else:
+            ftp = ftplib.FTP(timeout=timeout)
+        ftp.set_pasv(self.passive)
+        host = self.host or 'ftp'
+        port = self.port or DEFAULT_FTP_PORT
+        LOG.debug("Connecting to FTP server %r (port %d) ...", host, port)
+        ftp.connect(host=host, port=port)
+        ftp.login(user=self.user or DEFAULT_FTP_USER, passwd=self.password)
+        if self.tls:
+            ftp.prot_p()
+        ftp.cwd(self.remote_dir or DEFAULT_FTP_DIR)
+        return FTPRestoreSession(ftp)
+
+    # -------------------------------------------------------------------------
+    def sftp_session(self):
+        """
+        Creates a new SFTP session in the remote directory, every session
+        with its own SSH connection, so the downloads don't share one window.
+        """
+
+        import paramiko
+
+        host = self.host or DEFAULT_SSH_SERVER
+        user = self.user or DEFAULT_SSH_USER
+        ssh_client = paramiko.SSHClient()
+        ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        LOG.debug("SSH connect to %s@%s ...", user, host)
+        ssh_client.connect(
+            host, port=self.port or DEFAULT_SSH_PORT, username=user,
+            key_filename=str(self.key_file), timeout=self.timeout or DEFAULT_SSH_TIMEOUT)
+        sftp = ssh_client.open_sftp()
+        remote_dir = self.remote_dir
+        if not remote_dir:
+            remote_dir = str(PurePosixPath(DEFAULT_REMOTE_DIR) / self.source_host)
+        sftp.chdir(str(remote_dir))
+        return SFTPRestoreSession(sftp, ssh_client)
+
+    # -------------------------------------------------------------------------
+    def session_factory(self):
+        """Returns the function creating a new session with the configured protocol."""
+
+        if self.protocol == 'ftp':
+            return self.ftp_session
+        return self.sftp_session
+
+    # -------------------------------------------------------------------------
+    def load_decrypt_key(self):
+
+        if not self.encrypt_key_file:
+            return None
+        from ftp_backup.crypt import load_key
+        return load_key(self.encrypt_key_file)
+
+
+# =============================================================================
+class RestoreApp(RemoteCfgApp):
+    """Application class for restoring a backup directory from a FTP or SSH server."""
+
+    # -------------------------------------------------------------------------
+    def __init__(self, appname=None, verbose=0):
+        """Constructor."""
+
+        description = """\
+        Restores a backup directory from a FTP server or via SFTP from a
+        SSH server into a local directory. The files are downloaded in parallel,
+        interrupted downloads are continued, the modification times are
+        restored and the files are verified against the manifest.
+        """
+
+        self.backup_dir = 'latest'
+        self.target_dir = None
+        self.workers = DEFAULT_RESTORE_WORKERS
+        self.verify = True
+
+        super(RestoreApp, self).__init__(
+            appname=appname, verbose=verbose, description=description)
+        self.post_init()
+
+        self.initialized = True
+
+    # -------------------------------------------------------------------------
+    def init_arg_parser(self):
+
+        super(RestoreApp, self).init_arg_parser()
+
+        h = "Local directory to restore the files into."
+        self.arg_parser.add_argument(
+            '-D', '--dir', '--target-dir', metavar='DIR', dest='target_dir', help=h)
+
+        h = "The backup directory to restore, e.g. '2016-01-31_00' (default: 'latest')."
+        self.arg_parser.add_argument(
+            '-B', '--backup-dir', metavar='NAME', dest='backup_dir', help=h)
+
+        h = "Number of parallel downloads and connections (default: %d)." % (
+            DEFAULT_RESTORE_WORKERS)
+        self.arg_parser.add_argument(
+            '-w', '--workers', metavar='NR', type=int, dest='workers', help=h)
+
+        h = "Don't verify the restored files against the checksums of the manifest."
+        self.arg_parser.add_argument(
+            '--no-verify', action='store_true', dest='no_verify', help=h)
+
+    # -------------------------------------------------------------------------
+    def perform_arg_parser(self):
+
+        super(RestoreApp, self).perform_arg_parser()
+
+        if self.args.target_dir:
+            self.target_dir = self.args.target_dir
+        if self.args.backup_dir:
+            self.backup_dir = self.args.backup_dir
+        if self.args.workers is not None:
+            if self.args.workers < 1 or self.args.workers > MAX_RESTORE_WORKERS:
+                LOG.error("Invalid number %d of workers.", self.args.workers)
+            else:
+                self.workers = self.args.workers
+        if self.args.no_verify:
+            self.verify = False
+
+    # -------------------------------------------------------------------------
+    def perform_config(self):
+
+        super(RestoreApp, self).perform_config()
+
+        int_msg_tpl = "Error in configuration: [%s]/%s %r is not an integer value: %s"
+
+        for section in self.cfg:
+
+            if section.lower() == 'restore':
+                if 'target_dir' in self.cfg[section] and not self.args.target_dir:
+                    self.target_dir = self.cfg[section]['target_dir']
+                if 'workers' in self.cfg[section] and self.args.workers is None:
+                    try:
+                        self.workers = int(self.cfg[section]['workers'])
+                    except ValueError as e:
+                        msg = int_msg_tpl % (
+                            section, 'workers', self.cfg[section]['workers'], str(e))
+                        LOG.error(msg)
+                if 'verify' in self.cfg[section] and not self.args.no_verify:
+                    self.verify = to_bool(self.cfg[section]['verify'])
+
+    # -------------------------------------------------------------------------
+    def _run(self):
+        """The underlaying startpoint of the application."""
+
+        if not self.target_dir:
+            self.exit(1, "No target directory given.")
+        target_dir = os.path.abspath(os.path.expanduser(self.target_dir))
+
+        pool = SessionPool(self.session_factory(), self.workers)
+        restorer = BackupRestorer(
+            pool, target_dir, workers=self.workers, decrypt_key=self.load_decrypt_key(),
+            verify=self.verify)
+
+        try:
+            success = restorer.restore(self.backup_dir)
+        finally:
+            pool.close()
+
+        if not success:
+            self.exit(5, "The restore was not successful.")
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Module for cron-like schedules and for running backups
+          on a schedule in a long-running daemon
+"""
+
+# Standard modules
+import logging
+import threading
+
+from datetime import datetime, timedelta
+
+# Third party modules
+
+# Own modules
+from pb_base.errors import PbError
+
+__version__ = '0.1.0'
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_SCHEDULE = '@daily'
+# Seconds between two calls of the idle function of a waiting daemon
+DEFAULT_IDLE_INTERVAL = 60
+
+SCHEDULE_ALIASES = {
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+    '@monthly': '0 0 1 * *',
+    '@weekly': '0 0 * * 0',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@hourly': '0 * * * *',
+}
+
+MONTH_NAMES = ('jan', 'feb', 'mar', 'apr', 'may', 'jun',
+               'jul', 'aug', 'sep', 'oct', 'nov', 'dec')
+DAY_NAMES = ('sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat')
+
+# Schedules without any point of time in this period are refused
+MAX_SEARCH_DAYS = 366 * 5
+
+
+# =============================================================================
+class ScheduleError(PbError):
+    """
+    Base exception class for all exceptions belonging to issues
+    in this module
+    """
+    pass
+
+
+# =============================================================================
+def _parse_field(field, minimum, maximum, names=None):
+
+    values = set()
+    for part in field.lower().split(','):
+        step = 1
+        if '/' in part:
+            (part, step) = part.split('/', 1)
+            step = int(step)
+            if step < 1:
+                raise ValueError("invalid step %d" % (step))
+        if part == '*':
+            (first, last) = (minimum, maximum)
+        else:
+            bounds = []
+            for value in part.split('-', 1):
+                if names and value in names:
+                    bounds.append(names.index(value) + minimum)
+                else:
+                    bounds.append(int(value))
+            first = bounds[0]
+            last = bounds[-1]
+            if len(bounds) == 1 and step > 1:
+                last = maximum
+        if first < minimum or last > maximum or first > last:
+            raise ValueError("%r is out of the range %d-%d" % (part, minimum, maximum))
+        values.update(range(first, last + 1, step))
+    return values
+
+
+# =============================================================================
+class CronSchedule(object):
+    """
+    Schedule with the five fields of a crontab line (minute, hour, day of
+    month, month and day of week) or one of the aliases like '@daily'.
+    Like cron, a point of time matches either restricted day field, if
+    both the day of the month and the day of the week are restricted.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, expression=DEFAULT_SCHEDULE):
+
+        self.expression = str(expression).strip()
+        fields = SCHEDULE_ALIASES.get(self.expression.lower(), self.expression).split()
+        if len(fields) != 5:
+            raise ScheduleError(
+                "Invalid schedule %r, it needs five fields." % (self.expression))
+
+        try:
+            self.minutes = _parse_field(fields[0], 0, 59)
+            self.hours = _parse_field(fields[1], 0, 23)
+            self.days = _parse_field(fields[2], 1, 31)
+            self.months = _parse_field(fields[3], 1, 12, MONTH_NAMES)
+            weekdays = _parse_field(fields[4], 0, 7, DAY_NAMES)
+        except ValueError as e:
+            raise ScheduleError("Invalid schedule %r: %s" % (self.expression, e))
+
+        # Sunday is 0 and 7 in crontabs
+        self.weekdays = set(d % 7 for d in weekdays)
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    # -------------------------------------------------------------------------
+    def __repr__(self):
+
+        return "%s(%r)" % (self.__class__.__name__, self.expression)
+
+    # -------------------------------------------------------------------------
+    def _day_matches(self, dt):
+
+        day_ok = dt.day in self.days
+        # datetime counts from Monday = 0, cron from Sunday = 0
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        if self.any_day:
+            return weekday_ok
+        if self.any_weekday:
+            return day_ok
+        return day_ok or weekday_ok
+
+    # -------------------------------------------------------------------------
+    def next_run(self, after=None):
+        """
+        Returns the first point of time of the schedule after the given
+        one, in the same (local) time as the given one.
+
+        @rtype: datetime
+        """
+
+        if after is None:
+            after = datetime.now()
+        dt = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=MAX_SEARCH_DAYS)
+
+        while dt < limit:
+            if dt.month not in self.months:
+                if dt.month == 12:
+                    dt = dt.replace(year=dt.year + 1, month=1, day=1, hour=0, minute=0)
+                else:
+                    dt = dt.replace(month=dt.month + 1, day=1, hour=0, minute=0)
+                continue
+            if not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+                continue
+            if dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+                continue
+            return dt
+
+        raise ScheduleError("Schedule %r never matches." % (self.expression))
+
+
+# =============================================================================
+class ScheduleRunner(object):
+    """
+    Runs a job at every point of time of a schedule until it is stopped.
+
+    While waiting, the idle function is called every idle_interval seconds,
+    e.g. for checking the connection to the server. An exception of the
+    job or the idle function is logged and does not stop the runner.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(
+            self, schedule, job, idle=None, idle_interval=DEFAULT_IDLE_INTERVAL,
+            run_at_start=False):
+
+        if not isinstance(schedule, CronSchedule):
+            schedule = CronSchedule(schedule)
+        self.schedule = schedule
+        self.job = job
+        self.idle = idle
+        self.idle_interval = idle_interval
+        self.run_at_start = run_at_start
+        self.runs = 0
+        self.failures = 0
+        self._stop = threading.Event()
+
+    # -------------------------------------------------------------------------
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    # -------------------------------------------------------------------------
+    def stop(self, *args):
+        """Stops the runner after the current job, usable as a signal handler."""
+
+        LOG.info("Stopping the scheduled backups ...")
+        self._stop.set()
+
+    # -------------------------------------------------------------------------
+    def _call(self, func, what):
+
+        try:
+            func()
+            return True
+        except Exception as e:
+            LOG.exception("Error in the %s: %s", what, str(e))
+            return False
+
+    # -------------------------------------------------------------------------
+    def wait_until(self, when):
+        """
+        Waits until the given local time, calling the idle function in between.
+
+        @return: False, if the runner was stopped during waiting
+        @rtype: bool
+        """
+
+        while not self._stop.is_set():
+            remaining = (when - datetime.now()).total_seconds()
+            if remaining <= 0:
+                return True
+            if self._stop.wait(min(remaining, self.idle_interval)):
+                return False
+            if self.idle is not None and when > datetime.now():
+                self._call(self.idle, 'idle function')
+        return False
+
+    # -------------------------------------------------------------------------
+    def run_job(self):
+
+        self.runs += 1
+        if not self._call(self.job, 'scheduled backup'):
+            self.failures += 1
+
+    # -------------------------------------------------------------------------
+    def run(self):
+        """Runs the job on the schedule until stop() is called."""
+
+        if self.run_at_start:
+            self.run_job()
+
+        while not self._stop.is_set():
+            next_run = self.schedule.next_run()
+            LOG.info("Next backup at %s.", next_run.strftime('%Y-%m-%d %H:%M'))
+            if not self.wait_until(next_run):
+                break
+            self.run_job()
+
+        LOG.info(
+            "Scheduled backups stopped after %d runs, %d of them failed.",
+            self.runs, self.failures)
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
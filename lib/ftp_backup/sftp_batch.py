@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Module for confirming SFTP uploads in a batch at the end of
+          a backup instead of a stat() round trip for every file
+
+The times of the uploaded files are set by pipelined SETSTAT requests,
+without waiting for the answers. At the end the sizes and modification
+times of all files are confirmed by one listdir_attr() per remote
+directory, and the mismatching files are returned for uploading again.
+
+The pipelined requests need private methods of paramiko.SFTPClient, which
+exist in the paramiko versions required by setup.py. Without them the
+times are set by a plain utime() for every file.
+"""
+
+# Standard modules
+import logging
+import posixpath
+
+# Third party modules
+import paramiko
+
+from paramiko.sftp import CMD_SETSTAT
+
+# Own modules
+from pb_base.errors import PbError
+
+__version__ = '0.1.1'
+
+LOG = logging.getLogger(__name__)
+
+# The private attributes of paramiko.SFTPClient used for pipelined requests
+PIPELINE_ATTRIBUTES = ('_adjust_cwd', '_async_request', '_expecting', '_read_response')
+
+
+# =============================================================================
+class BatchConfirmError(PbError):
+    """
+    Base exception class for all exceptions belonging to issues
+    in this module
+    """
+    pass
+
+
+# =============================================================================
+class BatchUpload(object):
+    """An uploaded file waiting for its confirmation."""
+
+    # -------------------------------------------------------------------------
+    def __init__(self, remote_file, size, mtime, local_file=None, name=None, statinfo=None):
+
+        self.remote_file = remote_file
+        self.size = size
+        self.mtime = int(mtime)
+        self.local_file = local_file
+        self.name = name
+        self.statinfo = statinfo
+
+
+# =============================================================================
+class BatchConfirm(object):
+    """
+    Collects the uploads into a remote directory tree, sets their times
+    pipelined and confirms them all at once.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, sftp_client):
+
+        self.sftp_client = sftp_client
+        self.uploads = []
+        self.pending = []
+        self.setstat_errors = 0
+        self.pipelined = all(hasattr(sftp_client, attr) for attr in PIPELINE_ATTRIBUTES)
+        if not self.pipelined:
+            LOG.info(
+                "The SFTP client doesn't support pipelined requests, "
+                "setting the times of the uploads one by one.")
+
+    # -------------------------------------------------------------------------
+    def add(self, remote_file, size, times, local_file=None, name=None, statinfo=None):
+        """
+        Records an upload with the number of transferred Bytes and sends the
+        request for setting its access and modification time without waiting
+        for the answer.
+
+        @param local_file: the uploaded local file, for uploading it again
+        @param name: the name of the file in the backup, for uploading it again
+        @param statinfo: the stat result of the local file, for uploading it again
+        """
+
+        if not self.pipelined:
+            try:
+                self.sftp_client.utime(remote_file, (int(times[0]), int(times[1])))
+            except IOError as e:
+                LOG.debug("Setting the times of %r failed: %s", remote_file, str(e))
+                self.setstat_errors += 1
+            self.uploads.append(
+                BatchUpload(remote_file, size, times[1], local_file, name, statinfo))
+            return
+
+        path = self.sftp_client._adjust_cwd(remote_file)
+        attr = paramiko.SFTPAttributes()
+        (attr.st_atime, attr.st_mtime) = (int(times[0]), int(times[1]))
+        num = self.sftp_client._async_request(type(None), CMD_SETSTAT, path, attr)
+        self.pending.append((num, path))
+        self.uploads.append(BatchUpload(path, size, times[1], local_file, name, statinfo))
+
+    # -------------------------------------------------------------------------
+    def _drain(self):
+
+        # Answers already read by a synchronous request in between were
+        # dropped by paramiko, only the still expected ones can be awaited.
+        for (num, path) in self.pending:
+            if num not in self.sftp_client._expecting:
+                continue
+            try:
+                self.sftp_client._read_response(num)
+            except IOError as e:
+                LOG.debug("Setting the times of %r failed: %s", path, str(e))
+                self.setstat_errors += 1
+        self.pending = []
+
+    # -------------------------------------------------------------------------
+    def confirm(self):
+        """
+        Confirms the sizes and modification times of all recorded uploads.
+
+        @return: the list of mismatching uploads
+        @rtype: list of BatchUpload
+        """
+
+        self._drain()
+
+        by_dir = {}
+        for upload in self.uploads:
+            (dirname, basename) = posixpath.split(upload.remote_file)
+            by_dir.setdefault(dirname, {})[basename] = upload
+
+        mismatches = []
+        for dirname in sorted(by_dir):
+            expected = by_dir[dirname]
+            found = {}
+            for attr in self.sftp_client.listdir_attr(dirname or '.'):
+                found[attr.filename] = attr
+            for (basename, upload) in sorted(expected.items()):
+                attr = found.get(basename)
+                if attr is None:
+                    LOG.warning("Uploaded file %r is missing.", upload.remote_file)
+                    mismatches.append(upload)
+                elif attr.st_size != upload.size:
+                    LOG.warning(
+                        "Uploaded file %r has a size of %d Bytes instead of %d.",
+                        upload.remote_file, attr.st_size, upload.size)
+                    mismatches.append(upload)
+                elif attr.st_mtime != upload.mtime:
+                    LOG.warning(
+                        "Uploaded file %r has a wrong modification time %r instead of %r.",
+                        upload.remote_file, attr.st_mtime, upload.mtime)
+                    mismatches.append(upload)
+
+        LOG.info(
+            "Confirmed %d uploads in %d directories, %d mismatches.",
+            len(self.uploads), len(by_dir), len(mismatches))
+        self.uploads = []
+        return mismatches
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
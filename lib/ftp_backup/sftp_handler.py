@@ -14,7 +14,10 @@ import os
 import errno
 import stat
 import re
+import time
+import socket
 import stat
+import posixpath
 
 from datetime import datetime
 
@@ -35,11 +38,56 @@ from pb_base.common import to_bool, pp, bytes2human
 from pb_base.handler import PbBaseHandlerError
 from pb_base.handler import PbBaseHandler
 
-from ftp_backup import DEFAULT_LOCAL_DIRECTORY
+from ftp_backup import DEFAULT_LOCAL_DIRECTORY, UPLOAD_PARTIAL_SUFFIX
 from ftp_backup import DEFAULT_COPIES_YEARLY, DEFAULT_COPIES_MONTHLY
 from ftp_backup import DEFAULT_COPIES_WEEKLY, DEFAULT_COPIES_DAILY
 
-__version__ = '0.7.1'
+from ftp_backup.compress import DEFAULT_COMPRESS_WORKERS, DEFAULT_COMPRESS_LEVEL
+from ftp_backup.compress import MAX_COMPRESS_WORKERS
+from ftp_backup.compress import CompressionHistory
+from ftp_backup.compress import DEFAULT_COMPRESS_HISTORY_FILE
+
+from ftp_backup.pipeline import UploadPipeline
+
+from ftp_backup.read_ahead import DEFAULT_READ_AHEAD_DEPTH, DEFAULT_READ_AHEAD_SIZE
+from ftp_backup.read_ahead import MAX_READ_AHEAD_DEPTH
+
+from ftp_backup.cache_io import CacheStats, IO_MODES, DEFAULT_IO_MODE
+from ftp_backup.cache_io import IO_MODE_MMAP
+
+from ftp_backup.checksum import local_digest
+from ftp_backup.checksum import DEFAULT_CHECKSUM_ALGORITHM, CHECKSUM_ALGORITHMS
+
+from ftp_backup.verify import SFTPVerifier, VerifyQueue
+from ftp_backup.verify import DEFAULT_VERIFY_WORKERS
+
+from ftp_backup.sftp_batch import BatchConfirm
+
+from ftp_backup.manifest import DEFAULT_REPORT_DIR
+
+from ftp_backup.index import DEFAULT_INDEX_FILE
+
+from ftp_backup.journal import skip_prefix
+from ftp_backup.journal import DEFAULT_JOURNAL_DIR, DEFAULT_RESUME_WINDOW
+
+from ftp_backup.packer import DEFAULT_PACK_THRESHOLD, DEFAULT_PACK_ARCHIVE_SIZE
+
+from ftp_backup.aio_sftp import AsyncSFTPClient, AsyncSFTPPool
+from ftp_backup.aio_pool import DEFAULT_POOL_SIZE
+
+from ftp_backup.ranges import RangeUpload, DEFAULT_RANGE_THRESHOLD, DEFAULT_RANGE_SIZE
+from ftp_backup.ranges import DEFAULT_RANGE_WORKERS, MAX_RANGE_WORKERS, MIN_RANGE_SIZE
+from ftp_backup.ranges import DEFAULT_RANGE_MIN_WORKERS
+
+from ftp_backup.concurrency import AdaptiveConcurrency
+
+from ftp_backup.restore import SessionPool
+
+from ftp_backup.backup_run import BackupRunMixin
+
+from ftp_backup.local_scan import scan_local_dir, default_stat_workers, MAX_STAT_WORKERS
+
+__version__ = '0.27.1'
 
 LOG = logging.getLogger(__name__)
 
@@ -49,8 +97,11 @@ DEFAULT_SSH_USER = 'frank.brehm'
 DEFAULT_REMOTE_DIR = PurePosixPath(
     os.sep + os.path.join('users', DEFAULT_SSH_USER, 'Backup'))
 DEFAULT_SSH_TIMEOUT = 60
+# Seconds between two keepalive messages of the SSH connection, 0 for none
+DEFAULT_SSH_KEEPALIVE = 30
 MAX_SSH_TIMEOUT = 3600
 DEFAULT_SSH_KEY = PosixPath(os.path.expanduser('~backup/.ssh/id_rsa'))
+REMOTE_DIR_MODE = stat.S_IRWXU | stat.S_IRGRP | stat.S_IXGRP | stat.S_IROTH | stat.S_IXOTH
 
 
 # =============================================================================
@@ -69,6 +120,15 @@ class SFTPLocalPathError(SFTPHandlerError):
     """
     pass
 
+
+# =============================================================================
+class SFTPRemotePathError(SFTPHandlerError):
+    """
+    Exception class for all exceptions belonging to remote paths.
+    """
+    pass
+
+
 # =============================================================================
 class SFTPSetOnConnectedError(SFTPHandlerError):
 
@@ -152,7 +212,7 @@ class SFTPPutError(SFTPHandlerError):
 
 
 # =============================================================================
-class SFTPHandler(PbBaseHandler):
+class SFTPHandler(BackupRunMixin, PbBaseHandler):
     """
     Handler class with additional properties and methods to handle SFTP operations.
     """
@@ -161,8 +221,20 @@ class SFTPHandler(PbBaseHandler):
     def __init__(
         self, host=DEFAULT_SSH_SERVER, port=DEFAULT_SSH_PORT, user=DEFAULT_SSH_USER,
             local_dir=DEFAULT_LOCAL_DIRECTORY, remote_dir=None,
-            timeout=DEFAULT_SSH_TIMEOUT, key_file=DEFAULT_SSH_KEY,
-            appname=None, base_dir=None, verbose=0, version=__version__,
+            timeout=DEFAULT_SSH_TIMEOUT, key_file=DEFAULT_SSH_KEY, compress=False,
+            compress_workers=DEFAULT_COMPRESS_WORKERS, compress_level=DEFAULT_COMPRESS_LEVEL,
+            compress_adaptive=False, compress_history_file=DEFAULT_COMPRESS_HISTORY_FILE,
+            encrypt=False, encrypt_key_file=None, encrypt_workers=None, pack=False,
+            pack_threshold=DEFAULT_PACK_THRESHOLD, pack_archive_size=DEFAULT_PACK_ARCHIVE_SIZE,
+            read_ahead_depth=DEFAULT_READ_AHEAD_DEPTH, read_ahead_size=DEFAULT_READ_AHEAD_SIZE,
+            io_mode=DEFAULT_IO_MODE, range_threshold=DEFAULT_RANGE_THRESHOLD,
+            range_size=DEFAULT_RANGE_SIZE, range_workers=DEFAULT_RANGE_WORKERS,
+            range_adaptive=False, range_min_workers=DEFAULT_RANGE_MIN_WORKERS,
+            checksum=DEFAULT_CHECKSUM_ALGORITHM, report_dir=None,
+            index_file=DEFAULT_INDEX_FILE, journal_dir=DEFAULT_JOURNAL_DIR,
+            resume_window=DEFAULT_RESUME_WINDOW, verify=False, batch_confirm=False,
+            recursive=False, scan_workers=None, keepalive=DEFAULT_SSH_KEEPALIVE,
+            cache_remote=False, appname=None, base_dir=None, verbose=0, version=__version__,
             use_stderr=False, simulate=False, sudo=False, quiet=False,
             *targs, **kwargs):
 
@@ -176,6 +248,54 @@ class SFTPHandler(PbBaseHandler):
         self._key_file = DEFAULT_SSH_KEY
         self._timeout = DEFAULT_SSH_TIMEOUT
         self._new_backup_dir = None
+        self._compress = bool(compress)
+        self._compress_workers = DEFAULT_COMPRESS_WORKERS
+        self._compress_level = DEFAULT_COMPRESS_LEVEL
+        self._compress_adaptive = bool(compress_adaptive)
+        self._compress_history_file = DEFAULT_COMPRESS_HISTORY_FILE
+        self._compress_history = None
+        self._encrypt = bool(encrypt)
+        self._encrypt_key_file = None
+        self._encrypt_workers = None
+        self._encrypt_key = None
+        self._pack = bool(pack)
+        self._pack_threshold = DEFAULT_PACK_THRESHOLD
+        self._pack_archive_size = DEFAULT_PACK_ARCHIVE_SIZE
+        self._read_ahead_depth = DEFAULT_READ_AHEAD_DEPTH
+        self._read_ahead_size = DEFAULT_READ_AHEAD_SIZE
+        self._io_mode = DEFAULT_IO_MODE
+        self._cache_stats = CacheStats()
+        self._range_threshold = DEFAULT_RANGE_THRESHOLD
+        self._range_size = DEFAULT_RANGE_SIZE
+        self._range_workers = DEFAULT_RANGE_WORKERS
+        self._range_adaptive = bool(range_adaptive)
+        self._range_min_workers = DEFAULT_RANGE_MIN_WORKERS
+        # The limit of concurrent ranges of the adaptive mode, kept for all files
+        self.range_controller = None
+        self._checksum = DEFAULT_CHECKSUM_ALGORITHM
+        self._report_dir = DEFAULT_REPORT_DIR
+        self._index_file = DEFAULT_INDEX_FILE
+        self._journal_dir = DEFAULT_JOURNAL_DIR
+        self._resume_window = DEFAULT_RESUME_WINDOW
+        self.journal = None
+        self._posix_rename = None
+        self.manifest = None
+        self._verify = bool(verify)
+        self.verify_queue = None
+        self._batch_confirm = bool(batch_confirm)
+        self.batch = None
+        self._recursive = bool(recursive)
+        self._scan_workers = None
+        self._keepalive = DEFAULT_SSH_KEEPALIVE
+        self._cache_remote = bool(cache_remote)
+        self._remote_listings = {}
+        self._remote_usages = {}
+        # The absolute path of the backup directory of the last run
+        self.backup_path = None
+        self.backup_started = None
+        self._resume = False
+        self._packed_files = []
+        self._packed_done = []
 
         self._local_dir = DEFAULT_LOCAL_DIRECTORY
 
@@ -208,6 +328,27 @@ class SFTPHandler(PbBaseHandler):
         self.start_remote_dir = remote_dir
         self.key_file = key_file
         self.local_dir = local_dir
+        self.compress_workers = compress_workers
+        self.compress_level = compress_level
+        self.compress_history_file = compress_history_file
+        self.encrypt_key_file = encrypt_key_file
+        self.encrypt_workers = encrypt_workers
+        self.pack_threshold = pack_threshold
+        self.pack_archive_size = pack_archive_size
+        self.read_ahead_depth = read_ahead_depth
+        self.read_ahead_size = read_ahead_size
+        self.io_mode = io_mode
+        self.range_threshold = range_threshold
+        self.range_size = range_size
+        self.range_workers = range_workers
+        self.range_min_workers = range_min_workers
+        self.checksum = checksum
+        self.report_dir = report_dir
+        self.index_file = index_file
+        self.journal_dir = journal_dir
+        self.resume_window = resume_window
+        self.scan_workers = scan_workers
+        self.keepalive = keepalive
 
         self.ssh_client = paramiko.SSHClient()
         self.ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
@@ -388,6 +529,475 @@ class SFTPHandler(PbBaseHandler):
             return
         self._new_backup_dir = PurePosixPath(str(value))
 
+    # -----------------------------------------------------------
+    @property
+    def compress(self):
+        """Compress the files with gzip during the upload."""
+        return self._compress
+
+    @compress.setter
+    def compress(self, value):
+        self._compress = bool(value)
+
+    # -----------------------------------------------------------
+    @property
+    def compress_workers(self):
+        """The number of parallel threads for compressing the files."""
+        return self._compress_workers
+
+    @compress_workers.setter
+    def compress_workers(self, value):
+        if not value:
+            self._compress_workers = DEFAULT_COMPRESS_WORKERS
+            return
+        v = int(value)
+        if v < 1 or v > MAX_COMPRESS_WORKERS:
+            msg = "Invalid number %r of compression workers, must be between 1 and %d." % (
+                value, MAX_COMPRESS_WORKERS)
+            raise ValueError(msg)
+        self._compress_workers = v
+
+    # -----------------------------------------------------------
+    @property
+    def compress_level(self):
+        """The gzip compression level (0 - 9)."""
+        return self._compress_level
+
+    @compress_level.setter
+    def compress_level(self, value):
+        if value is None:
+            self._compress_level = DEFAULT_COMPRESS_LEVEL
+            return
+        v = int(value)
+        if v < 0 or v > 9:
+            msg = "Invalid compression level %r, must be between 0 and 9." % (value)
+            raise ValueError(msg)
+        self._compress_level = v
+
+    # -----------------------------------------------------------
+    @property
+    def compress_adaptive(self):
+        """Choose the compression mode of every file by probing its compressibility."""
+        return self._compress_adaptive
+
+    @compress_adaptive.setter
+    def compress_adaptive(self, value):
+        self._compress_adaptive = bool(value)
+
+    # -----------------------------------------------------------
+    @property
+    def compress_history_file(self):
+        """The local file with the history of the compression decisions."""
+        return self._compress_history_file
+
+    @compress_history_file.setter
+    def compress_history_file(self, value):
+        if not value:
+            self._compress_history_file = DEFAULT_COMPRESS_HISTORY_FILE
+            return
+        self._compress_history_file = os.path.expanduser(str(value))
+        self._compress_history = None
+
+    # -----------------------------------------------------------
+    @property
+    def compress_history(self):
+        """The history of the compression decisions in adaptive mode."""
+        if self._compress_history is None and self.compress_adaptive:
+            self._compress_history = CompressionHistory(self.compress_history_file)
+        return self._compress_history
+
+    # -----------------------------------------------------------
+    @property
+    def encrypt(self):
+        """Encrypt the files on the client side before uploading."""
+        return self._encrypt
+
+    @encrypt.setter
+    def encrypt(self, value):
+        self._encrypt = bool(value)
+
+    # -----------------------------------------------------------
+    @property
+    def encrypt_key_file(self):
+        """The local file containing the master key for encryption."""
+        return self._encrypt_key_file
+
+    @encrypt_key_file.setter
+    def encrypt_key_file(self, value):
+        if not value:
+            self._encrypt_key_file = None
+        else:
+            self._encrypt_key_file = os.path.expanduser(str(value))
+        self._encrypt_key = None
+
+    # -----------------------------------------------------------
+    @property
+    def encrypt_workers(self):
+        """The number of parallel threads for encrypting the files."""
+        return self._encrypt_workers
+
+    @encrypt_workers.setter
+    def encrypt_workers(self, value):
+        if not value:
+            self._encrypt_workers = None
+            return
+        v = int(value)
+        if v < 1 or v > MAX_COMPRESS_WORKERS:
+            msg = "Invalid number %r of encryption workers, must be between 1 and %d." % (
+                value, MAX_COMPRESS_WORKERS)
+            raise ValueError(msg)
+        self._encrypt_workers = v
+
+    # -----------------------------------------------------------
+    @property
+    def encrypt_key(self):
+        """The master key for encryption, loaded from the key file."""
+        if not self.encrypt:
+            return None
+        if self._encrypt_key is None:
+            if not self.encrypt_key_file:
+                raise SFTPHandlerError("Encryption requested, but no key file given.")
+            from ftp_backup.crypt import load_key
+            self._encrypt_key = load_key(self.encrypt_key_file)
+        return self._encrypt_key
+
+    # -----------------------------------------------------------
+    @property
+    def pack(self):
+        """Pack small files into tar archives instead of uploading them one by one."""
+        return self._pack
+
+    @pack.setter
+    def pack(self, value):
+        self._pack = bool(value)
+
+    # -----------------------------------------------------------
+    @property
+    def pack_threshold(self):
+        """Files smaller than this size in Bytes are packed into tar archives."""
+        return self._pack_threshold
+
+    @pack_threshold.setter
+    def pack_threshold(self, value):
+        if not value:
+            self._pack_threshold = DEFAULT_PACK_THRESHOLD
+            return
+        v = int(value)
+        if v < 1:
+            msg = "Invalid size threshold %r for packing files." % (value)
+            raise ValueError(msg)
+        self._pack_threshold = v
+
+    # -----------------------------------------------------------
+    @property
+    def pack_archive_size(self):
+        """The maximum sum of the file sizes in one tar archive."""
+        return self._pack_archive_size
+
+    @pack_archive_size.setter
+    def pack_archive_size(self, value):
+        if not value:
+            self._pack_archive_size = DEFAULT_PACK_ARCHIVE_SIZE
+            return
+        v = int(value)
+        if v < 1:
+            msg = "Invalid maximum archive size %r for packing files." % (value)
+            raise ValueError(msg)
+        self._pack_archive_size = v
+
+    # -----------------------------------------------------------
+    @property
+    def recursive(self):
+        """Backup also all files in subdirectories of the local directory."""
+        return self._recursive
+
+    @recursive.setter
+    def recursive(self, value):
+        self._recursive = bool(value)
+
+    # -----------------------------------------------------------
+    @property
+    def scan_workers(self):
+        """
+        The number of threads for collecting the stat results of the local files,
+        None for detecting it by the type of the local filesystem.
+        """
+        return self._scan_workers
+
+    @scan_workers.setter
+    def scan_workers(self, value):
+        if value is None:
+            self._scan_workers = None
+            return
+        v = int(value)
+        if v < 0 or v > MAX_STAT_WORKERS:
+            msg = "Invalid number %r of scan workers, must be between 0 and %d." % (
+                value, MAX_STAT_WORKERS)
+            raise ValueError(msg)
+        self._scan_workers = v
+
+    # -----------------------------------------------------------
+    @property
+    def keepalive(self):
+        """Seconds between two keepalive messages of the SSH connection, 0 for none."""
+        return self._keepalive
+
+    @keepalive.setter
+    def keepalive(self, value):
+        v = int(value)
+        if v < 0:
+            raise ValueError("Invalid keepalive interval %r, must not be negative." % (value))
+        self._keepalive = v
+        if self.connected:
+            self.ssh_client.get_transport().set_keepalive(v)
+
+    # -----------------------------------------------------------
+    @property
+    def cache_remote(self):
+        """
+        Keep the listings of the remote directories and the disk usages of
+        the finished backup directories between the backup runs of a daemon.
+        """
+        return self._cache_remote
+
+    @cache_remote.setter
+    def cache_remote(self, value):
+        self._cache_remote = bool(value)
+        if not self._cache_remote:
+            self.clear_remote_cache()
+
+    # -----------------------------------------------------------
+    @property
+    def read_ahead_depth(self):
+        """The number of buffers for reading local files ahead, 0 for no read ahead."""
+        return self._read_ahead_depth
+
+    @read_ahead_depth.setter
+    def read_ahead_depth(self, value):
+        v = int(value)
+        if v < 0 or v > MAX_READ_AHEAD_DEPTH:
+            msg = "Invalid read ahead depth %r, must be between 0 and %d." % (
+                value, MAX_READ_AHEAD_DEPTH)
+            raise ValueError(msg)
+        self._read_ahead_depth = v
+
+    # -----------------------------------------------------------
+    @property
+    def read_ahead_size(self):
+        """The size of a single read ahead buffer."""
+        return self._read_ahead_size
+
+    @read_ahead_size.setter
+    def read_ahead_size(self, value):
+        if not value:
+            self._read_ahead_size = DEFAULT_READ_AHEAD_SIZE
+            return
+        v = int(value)
+        if v < 1:
+            msg = "Invalid read ahead buffer size %r." % (value)
+            raise ValueError(msg)
+        self._read_ahead_size = v
+
+    # -----------------------------------------------------------
+    @property
+    def io_mode(self):
+        """The I/O mode for reading local files (buffered, nocache or direct)."""
+        return self._io_mode
+
+    @io_mode.setter
+    def io_mode(self, value):
+        if not value:
+            self._io_mode = DEFAULT_IO_MODE
+            return
+        v = str(value).strip().lower()
+        if v not in IO_MODES:
+            msg = "Invalid I/O mode %r, must be one of %s." % (value, ', '.join(IO_MODES))
+            raise ValueError(msg)
+        self._io_mode = v
+
+    # -----------------------------------------------------------
+    @property
+    def cache_stats(self):
+        """The statistics about the page cache usage of all read local files."""
+        return self._cache_stats
+
+    # -----------------------------------------------------------
+    @property
+    def range_threshold(self):
+        """The minimum size of a file uploaded in ranges over several SFTP channels."""
+        return self._range_threshold
+
+    @range_threshold.setter
+    def range_threshold(self, value):
+        if not value:
+            self._range_threshold = DEFAULT_RANGE_THRESHOLD
+            return
+        v = int(value)
+        if v < 1:
+            msg = "Invalid range upload threshold %r." % (value)
+            raise ValueError(msg)
+        self._range_threshold = v
+
+    # -----------------------------------------------------------
+    @property
+    def range_size(self):
+        """The size of a single range of a file uploaded in ranges."""
+        return self._range_size
+
+    @range_size.setter
+    def range_size(self, value):
+        if not value:
+            self._range_size = DEFAULT_RANGE_SIZE
+            return
+        v = int(value)
+        if v < MIN_RANGE_SIZE:
+            msg = "Invalid range size %r, must be at least %d." % (value, MIN_RANGE_SIZE)
+            raise ValueError(msg)
+        self._range_size = v
+
+    # -----------------------------------------------------------
+    @property
+    def range_workers(self):
+        """The number of ranges of a file uploaded at the same time, 1 for no range uploads."""
+        return self._range_workers
+
+    @range_workers.setter
+    def range_workers(self, value):
+        v = int(value)
+        if v < 1 or v > MAX_RANGE_WORKERS:
+            msg = "Invalid number of range upload workers %r, must be between 1 and %d." % (
+                value, MAX_RANGE_WORKERS)
+            raise ValueError(msg)
+        self._range_workers = v
+
+    # -----------------------------------------------------------
+    @property
+    def range_adaptive(self):
+        """
+        Adjust the number of ranges written at the same time between
+        range_min_workers and range_workers by the throughput and the errors.
+        """
+        return self._range_adaptive
+
+    @range_adaptive.setter
+    def range_adaptive(self, value):
+        self._range_adaptive = bool(value)
+
+    # -----------------------------------------------------------
+    @property
+    def range_min_workers(self):
+        """The minimum number of ranges written at the same time in adaptive mode."""
+        return self._range_min_workers
+
+    @range_min_workers.setter
+    def range_min_workers(self, value):
+        v = int(value)
+        if v < 1 or v > MAX_RANGE_WORKERS:
+            msg = (
+                "Invalid minimum number of range upload workers %r, "
+                "must be between 1 and %d.") % (value, MAX_RANGE_WORKERS)
+            raise ValueError(msg)
+        self._range_min_workers = v
+
+    # -----------------------------------------------------------
+    @property
+    def checksum(self):
+        """The algorithm for the checksums of the uploaded files, None for no checksums."""
+        return self._checksum
+
+    @checksum.setter
+    def checksum(self, value):
+        if not value or str(value).strip().lower() == 'none':
+            self._checksum = None
+            return
+        v = str(value).strip().lower()
+        if v not in CHECKSUM_ALGORITHMS:
+            msg = "Invalid checksum algorithm %r, must be one of %s." % (
+                value, ', '.join(CHECKSUM_ALGORITHMS))
+            raise ValueError(msg)
+        self._checksum = v
+
+    # -----------------------------------------------------------
+    @property
+    def report_dir(self):
+        """The local directory for the reports of the backup runs."""
+        return self._report_dir
+
+    @report_dir.setter
+    def report_dir(self, value):
+        if not value:
+            self._report_dir = DEFAULT_REPORT_DIR
+            return
+        self._report_dir = PosixPath(os.path.expanduser(str(value)))
+
+    # -----------------------------------------------------------
+    @property
+    def index_file(self):
+        """
+        The local SQLite file of the index of all backed up files,
+        None, if no index should be maintained.
+        """
+        return self._index_file
+
+    @index_file.setter
+    def index_file(self, value):
+        if not value or str(value).strip().lower() == 'none':
+            self._index_file = None
+            return
+        self._index_file = PosixPath(os.path.expanduser(str(value)))
+
+    # -----------------------------------------------------------
+    @property
+    def journal_dir(self):
+        """The local directory for the journals of the backup runs."""
+        return self._journal_dir
+
+    @journal_dir.setter
+    def journal_dir(self, value):
+        if not value:
+            self._journal_dir = DEFAULT_JOURNAL_DIR
+            return
+        self._journal_dir = PosixPath(os.path.expanduser(str(value)))
+
+    # -----------------------------------------------------------
+    @property
+    def resume_window(self):
+        """
+        The number of hours after the start of an interrupted backup run,
+        in which the next run continues its backup directory, 0 for never.
+        """
+        return self._resume_window
+
+    @resume_window.setter
+    def resume_window(self, value):
+        v = float(value)
+        if v < 0:
+            raise ValueError("Invalid resume window %r, must not be negative." % (value))
+        self._resume_window = v
+
+    # -----------------------------------------------------------
+    @property
+    def verify(self):
+        """Verify the uploaded files by checksums computed by the server."""
+        return self._verify
+
+    @verify.setter
+    def verify(self, value):
+        self._verify = bool(value)
+
+    # -----------------------------------------------------------
+    @property
+    def batch_confirm(self):
+        """
+        Set the times of the uploaded files pipelined and confirm all uploads
+        at the end of the backup instead of after every single file.
+        """
+        return self._batch_confirm
+
+    @batch_confirm.setter
+    def batch_confirm(self, value):
+        self._batch_confirm = bool(value)
+
     # -------------------------------------------------------------------------
     def as_dict(self, short=False):
         """
@@ -411,6 +1021,36 @@ class SFTPHandler(PbBaseHandler):
         res['local_dir'] = self.local_dir
         res['timeout'] = self.timeout
         res['new_backup_dir'] = self.new_backup_dir
+        res['compress'] = self.compress
+        res['compress_workers'] = self.compress_workers
+        res['compress_level'] = self.compress_level
+        res['compress_adaptive'] = self.compress_adaptive
+        res['compress_history_file'] = self.compress_history_file
+        res['encrypt'] = self.encrypt
+        res['encrypt_key_file'] = self.encrypt_key_file
+        res['encrypt_workers'] = self.encrypt_workers
+        res['pack'] = self.pack
+        res['pack_threshold'] = self.pack_threshold
+        res['pack_archive_size'] = self.pack_archive_size
+        res['read_ahead_depth'] = self.read_ahead_depth
+        res['read_ahead_size'] = self.read_ahead_size
+        res['io_mode'] = self.io_mode
+        res['range_threshold'] = self.range_threshold
+        res['range_size'] = self.range_size
+        res['range_workers'] = self.range_workers
+        res['range_adaptive'] = self.range_adaptive
+        res['range_min_workers'] = self.range_min_workers
+        res['checksum'] = self.checksum
+        res['report_dir'] = self.report_dir
+        res['index_file'] = self.index_file
+        res['journal_dir'] = self.journal_dir
+        res['resume_window'] = self.resume_window
+        res['verify'] = self.verify
+        res['batch_confirm'] = self.batch_confirm
+        res['recursive'] = self.recursive
+        res['scan_workers'] = self.scan_workers
+        res['keepalive'] = self.keepalive
+        res['cache_remote'] = self.cache_remote
 
         return res
 
@@ -464,6 +1104,8 @@ class SFTPHandler(PbBaseHandler):
             self.host, port=self.port, username=self.user, key_filename=str(self.key_file),
             timeout=self.timeout)
         self._connected = True
+        if self.keepalive:
+            self.ssh_client.get_transport().set_keepalive(self.keepalive)
 
         self.sftp_client = self.ssh_client.open_sftp()
 
@@ -482,6 +1124,86 @@ class SFTPHandler(PbBaseHandler):
         self.ssh_client.close()
         self._connected = False
 
+    # -------------------------------------------------------------------------
+    def ensure_connected(self):
+        """
+        Connects to the SSH server, if not connected or if the connection
+        was lost, e.g. between the backup runs of a daemon.
+
+        @return: whether a new connection was established
+        @rtype: bool
+        """
+
+        if self.connected:
+            transport = self.ssh_client.get_transport()
+            try:
+                if transport is not None and transport.is_active():
+                    # Detects a connection silently dropped by the server
+                    self.sftp_client.stat('.')
+                    return False
+                LOG.warning("The connection to %r was closed.", self.host)
+            except (paramiko.SSHException, EOFError, socket.error) as e:
+                LOG.warning("Lost the connection to %r: %s", self.host, str(e))
+            self.sftp_client = None
+            try:
+                self.ssh_client.close()
+            except Exception as e:
+                LOG.debug("Error on closing the lost connection: %s", str(e))
+            self._connected = False
+            # Another client could have changed the remote side meanwhile
+            self.clear_remote_cache()
+
+        self.connect()
+        return True
+
+    # -------------------------------------------------------------------------
+    def start_run(self):
+        """Resets the state of the previous backup run of a daemon."""
+
+        if self.journal is not None:
+            self.journal.close()
+        self.journal = None
+        self.new_backup_dir = None
+        self.manifest = None
+        self.batch = None
+        self.verify_queue = None
+        self._cache_stats = CacheStats()
+        if self.connected:
+            self.remote_dir = None
+
+    # -------------------------------------------------------------------------
+    def clear_remote_cache(self):
+
+        self._remote_listings = {}
+        self._remote_usages = {}
+
+    # -------------------------------------------------------------------------
+    def _remote_key(self, path):
+
+        return posixpath.normpath(posixpath.join(str(self.remote_dir), str(path)))
+
+    # -------------------------------------------------------------------------
+    def _remote_added(self, path):
+
+        if not self.cache_remote:
+            return
+        key = self._remote_key(path)
+        (parent, name) = posixpath.split(key)
+        if parent in self._remote_listings:
+            self._remote_listings[parent][name] = self.sftp_client.stat(key)
+
+    # -------------------------------------------------------------------------
+    def _remote_removed(self, path):
+
+        if not self.cache_remote:
+            return
+        key = self._remote_key(path)
+        (parent, name) = posixpath.split(key)
+        self._remote_listings.pop(key, None)
+        self._remote_usages.pop(key, None)
+        if parent in self._remote_listings:
+            self._remote_listings[parent].pop(name, None)
+
     # -------------------------------------------------------------------------
     def exists(self, remote_file):
 
@@ -506,6 +1228,7 @@ class SFTPHandler(PbBaseHandler):
 
         LOG.info("Creating remote directory %r with mode %04o ...", path, mode)
         self.sftp_client.mkdir(path, mode)
+        self._remote_added(path)
 
     # -------------------------------------------------------------------------
     def is_dir(self, remote_path):
@@ -536,6 +1259,12 @@ class SFTPHandler(PbBaseHandler):
 
         if not self.connected:
             raise SFTPHandlerError("Cannot get directory list of %r, not connected." % (path))
+        key = None
+        if self.cache_remote:
+            key = self._remote_key(path)
+            if key in self._remote_listings:
+                LOG.debug("Using the cached directory list of %r.", path)
+                return OrderedDict(self._remote_listings[key])
         LOG.debug("Getting directory list of %r ...", path)
 
         dlist = OrderedDict()
@@ -549,6 +1278,8 @@ class SFTPHandler(PbBaseHandler):
                 LOG.debug("Got stat of %r: %r.", entry_path, entry_stat)
             dlist[entry] = entry_stat
 
+        if key is not None:
+            self._remote_listings[key] = OrderedDict(dlist)
         return dlist
 
     # -------------------------------------------------------------------------
@@ -580,7 +1311,8 @@ class SFTPHandler(PbBaseHandler):
         # Retrieving new backup directory
         self._get_new_backup_dir(cur_backup_dirs)
         new_backup_dir = str(self.new_backup_dir)
-        cur_backup_dirs.append(new_backup_dir)
+        if new_backup_dir not in cur_backup_dirs:
+            cur_backup_dirs.append(new_backup_dir)
 
         type_mapping = {
             'yearly': [],
@@ -633,6 +1365,7 @@ class SFTPHandler(PbBaseHandler):
 
         if dirs_delete:
             self.remove_recursive(*dirs_delete)
+            self.prune_index(*dirs_delete)
 
     # -------------------------------------------------------------------------
     def _get_new_backup_dir(self, cur_backup_dirs=None):
@@ -651,6 +1384,12 @@ class SFTPHandler(PbBaseHandler):
                     continue
                 cur_backup_dirs.append(entry)
 
+        resumed_dir = self.find_resumable_backup_dir(cur_backup_dirs)
+        if resumed_dir:
+            self.new_backup_dir = resumed_dir
+            LOG.info("Continuing the interrupted backup in %r.", resumed_dir)
+            return
+
         cur_date = datetime.utcnow()
         backup_dir_tpl = cur_date.strftime('%Y-%m-%d_%%02d')
         LOG.debug("Backup directory template: %r", backup_dir_tpl)
@@ -727,6 +1466,7 @@ class SFTPHandler(PbBaseHandler):
                 LOG.warning("Cannot remove special directory %r.", str(ipath))
                 continue
 
+            self._remote_removed(ipath)
             if self.is_dir(ipath):
                 LOG.info("Removing recursive %r ...", str(ipath))
                 dlist = self.sftp_client.listdir(str(ipath))
@@ -743,16 +1483,356 @@ class SFTPHandler(PbBaseHandler):
                 self.sftp_client.remove(str(ipath))
 
     # -------------------------------------------------------------------------
-    def do_backup(self):
+    def resume_offset(self, name, remote_file, size, mtime, level=None):
+        """
+        Returns the size of the already uploaded part of a file, whose upload
+        was interrupted in the continued run, or 0. Only unchanged files
+        uploaded without compression and encryption are continued.
+        """
+
+        if self.journal is None or level is not None or self.encrypt:
+            return 0
+        # The temporary file of an upload in ranges may have holes
+        if self.use_ranges(size, level):
+            return 0
+        if not self.journal.partial_upload(name, remote_file, size, mtime):
+            return 0
+        try:
+            remote_size = self.sftp_client.stat(remote_file + UPLOAD_PARTIAL_SUFFIX).st_size
+        except IOError:
+            return 0
+        if 0 < remote_size < size:
+            return remote_size
+        return 0
+
+    # -------------------------------------------------------------------------
+    def _append_upload(self, stream, remote_file, offset, callback=None):
+        """
+        Writes the content of the stream behind the first offset Bytes
+        of the temporary file of the interrupted upload and renames it.
+
+        @return: the size of the remote file
+        @rtype: int
+        """
+
+        partial_file = remote_file + UPLOAD_PARTIAL_SUFFIX
+        done = offset
+        with self.sftp_client.open(partial_file, 'r+b') as rfh:
+            rfh.set_pipelined(True)
+            rfh.seek(offset)
+            while True:
+                data = stream.read(32768)
+                if not data:
+                    break
+                rfh.write(data)
+                done += len(data)
+                if callback is not None:
+                    callback(done, 0)
+        remote_size = self.sftp_client.stat(partial_file).st_size
+        if remote_size != done:
+            raise IOError("Size mismatch in continued upload of %r: %d != %d" % (
+                remote_file, remote_size, done))
+        self.rename_uploaded(partial_file, remote_file)
+        return done
+
+    # -------------------------------------------------------------------------
+    def use_ranges(self, size, level=None):
+        """
+        Returns, whether a file of the given size is uploaded in ranges
+        written concurrently over several SFTP channels. Compressed and
+        encrypted uploads are always written as a single stream.
+        """
+
+        if level is not None or self.encrypt or self.range_workers < 2:
+            return False
+        return size >= self.range_threshold
+
+    # -------------------------------------------------------------------------
+    def put_ranges(self, local_file, remote_file, size, algorithms=None, callback=None):
+        """
+        Uploads the given local file in ranges, which are written concurrently
+        over separate SFTP channels at their offsets into a temporary file.
+        A failed range is written again over a new channel. The temporary
+        file is renamed after checking its size.
+
+        @return: the checksums of the local file by the given algorithms
+        @rtype: dict
+        """
+
+        partial_file = remote_file + UPLOAD_PARTIAL_SUFFIX
+        self.sftp_client.open(partial_file, 'wb').close()
+
+        def write_range(sftp, fileobj, offset, length):
+            with sftp.open(partial_file, 'r+b') as rfh:
+                rfh.set_pipelined(True)
+                rfh.seek(offset)
+                while True:
+                    data = fileobj.read(32768)
+                    if not data:
+                        break
+                    rfh.write(data)
+
+        controller = None
+        if self.range_adaptive:
+            if self.range_controller is None:
+                self.range_controller = AdaptiveConcurrency(
+                    min(self.range_min_workers, self.range_workers), self.range_workers,
+                    name='range uploads')
+            controller = self.range_controller
+
+        pool = SessionPool(self._open_async_sftp, self.range_workers)
+        upload = RangeUpload(
+            local_file, size, pool, write_range, range_size=self.range_size,
+            io_mode=self.io_mode, stats=self.cache_stats, callback=callback,
+            controller=controller)
+        try:
+            digests = upload.run(algorithms)
+        finally:
+            pool.close()
+
+        remote_size = self.sftp_client.stat(partial_file).st_size
+        if remote_size != size:
+            raise IOError("Size mismatch in the upload of %r in ranges: %d != %d" % (
+                remote_file, remote_size, size))
+        self.rename_uploaded(partial_file, remote_file)
+        return digests
+
+    # -------------------------------------------------------------------------
+    def _open_async_sftp(self):
+
+        sftp = self.ssh_client.open_sftp()
+        sftp.chdir(str(self.remote_dir))
+        return sftp
+
+    # -------------------------------------------------------------------------
+    def async_client(self):
+        """
+        Returns a new, not yet connected asyncio client, which opens its
+        own SFTP channel in the current SSH connection.
+        """
+
+        if not self.connected:
+            raise SFTPHandlerError("The SSH connection is not established.")
+        return AsyncSFTPClient(self._open_async_sftp)
+
+    # -------------------------------------------------------------------------
+    def async_pool(self, size=DEFAULT_POOL_SIZE):
+        """
+        Returns a pool of at most size asyncio clients for running many
+        listings, deletions and small uploads concurrently, e.g.:
+
+            async with handler.async_pool(32) as pool:
+                failed = await pool.delete_many(names)
+        """
+
+        return AsyncSFTPPool(self.async_client, size)
+
+    # -------------------------------------------------------------------------
+    def rename_uploaded(self, partial_file, remote_file):
+        """
+        Moves a completely uploaded file to its final name. An existing file
+        is replaced atomically with the SFTP extension posix-rename@openssh.com,
+        if the server supports it.
+        """
+
+        if self._posix_rename is not False:
+            try:
+                self.sftp_client.posix_rename(partial_file, remote_file)
+                self._posix_rename = True
+                return
+            except (AttributeError, IOError) as e:
+                if self._posix_rename:
+                    raise
+                LOG.debug("No support of posix-rename@openssh.com: %s", str(e))
+                self._posix_rename = False
+
+        # A plain SFTP rename doesn't replace an existing file
+        if self.exists(remote_file):
+            self.sftp_client.remove(remote_file)
+        self.sftp_client.rename(partial_file, remote_file)
+
+    # -------------------------------------------------------------------------
+    def put_stream(self, stream, remote_file, callback=None, confirm=True):
+        """
+        Uploads the stream under a temporary name and renames it afterwards,
+        so a remote file with its final name is always complete.
+        """
+
+        partial_file = remote_file + UPLOAD_PARTIAL_SUFFIX
+        self.sftp_client.putfo(stream, partial_file, callback=callback, confirm=confirm)
+        self.rename_uploaded(partial_file, remote_file)
+
+    # -------------------------------------------------------------------------
+    def remove_partial_uploads(self):
+        """
+        Removes the remaining temporary files of the uploads interrupted
+        by the continued run.
+        """
+
+        if self.journal is None:
+            return
+        for entry in self.journal.in_flight().values():
+            partial_file = entry['remote'] + UPLOAD_PARTIAL_SUFFIX
+            try:
+                self.sftp_client.remove(partial_file)
+            except IOError:
+                continue
+            LOG.info("Removed the interrupted upload %r.", partial_file)
+
+    # -------------------------------------------------------------------------
+    def start_verify(self):
+        """
+        Starts the verification of the uploads in separate SFTP channels,
+        if configured and supported by the server.
+        """
+
+        if not self.verify or self.simulate:
+            return None
+        verifier = SFTPVerifier(self.ssh_client, self.checksum, self.timeout)
+        self.verify_queue = VerifyQueue(verifier, DEFAULT_VERIFY_WORKERS)
+        return self.verify_queue
+
+    # -------------------------------------------------------------------------
+    def submit_verify(self, remote_file, expected):
+        """Queues the verification of the given file in the current remote directory."""
+
+        if self.verify_queue is None or not expected:
+            return
+        cwd = self.sftp_client.getcwd()
+        if cwd:
+            remote_file = posixpath.join(cwd, remote_file)
+        self.verify_queue.submit(remote_file, expected)
+
+    # -------------------------------------------------------------------------
+    def confirm_batch(self):
+        """
+        Confirms all uploads recorded since the start of the backup by one
+        directory listing per remote directory and uploads the mismatching
+        files again, this time confirming them one by one.
+
+        @return: the number of files uploaded again
+        @rtype: int
+        """
+
+        if self.batch is None:
+            return 0
+        batch = self.batch
+        self.batch = None
+        mismatches = batch.confirm()
+        for upload in mismatches:
+            LOG.info("Uploading %r again ...", upload.local_file)
+            self.put_file(upload.local_file, upload.name, upload.statinfo)
+        return len(mismatches)
+
+    # -------------------------------------------------------------------------
+    def run_backup(self, subdir=None, local_entries=None):
+        """
+        Performs a complete backup run with an established connection: removes
+        the old backup directories in the given subdirectory of the remote
+        start directory, uploads the local directory and shows the disk usage.
+
+        @param subdir: the remote subdirectory for the backup directories,
+                       by default the name of the local host
+        @type subdir: str
+        """
+
+        subdir = self.prepare_backup(subdir)
+        self.do_backup(local_entries)
+        if hasattr(local_entries, 'log_stats'):
+            local_entries.log_stats()
+        self.remote_dir = subdir
+        self.show_disk_usage()
+
+    # -------------------------------------------------------------------------
+    def prepare_backup(self, subdir=None):
+        """
+        Changes into the given subdirectory of the remote start directory,
+        which is created if necessary, and removes the old backup directories
+        there. Call do_backup() or start_backup() afterwards.
+
+        @return: the remote subdirectory
+        """
+
+        if subdir is None:
+            subdir = socket.gethostname()
 
+        if self.exists(subdir):
+            LOG.debug("Remote file %r exists.", subdir)
+            if self.is_dir(subdir):
+                LOG.debug("Remote file %r is a directory.", subdir)
+            else:
+                raise SFTPRemotePathError("Remote file %r is NOT a directory." % (subdir))
+        else:
+            LOG.warn("Remote file %r does not exists.", subdir)
+            self.mkdir(subdir)
+
+        self.remote_dir = subdir
+        subdir = self.remote_dir
+        LOG.info("Current main remote directory is now %r.", str(self.remote_dir))
+
+        self.cleanup_old_backupdirs()
+        return subdir
+
+    # -------------------------------------------------------------------------
+    def do_backup(self, local_entries=None):
+        """
+        Uploads all files of the local directory into a new backup directory.
+
+        @param local_entries: the already running scan of the local directory,
+                              e.g. a ScanQueue, if not given, the local directory
+                              is scanned during the backup
+        @type local_entries: iterable of LocalEntry
+        """
+
+        self.start_backup()
+
+        if local_entries is None:
+            stat_workers = self.scan_workers
+            if stat_workers is None:
+                stat_workers = default_stat_workers(self.local_dir)
+            local_entries = scan_local_dir(
+                self.local_dir, recursive=self.recursive, verbose=self.verbose,
+                stat_workers=stat_workers)
+
+        for entry in local_entries:
+            if self.queue_entry(entry):
+                self.put_entry(entry)
+
+        self.finish_backup()
+
+    # -------------------------------------------------------------------------
+    def start_backup(self):
+        """
+        Starts a backup run in the current remote directory: creates the new
+        backup directory or continues an interrupted one and changes into it.
+        Call queue_entry() and put_entry() for all local entries and
+        finish_backup() afterwards, like do_backup() does.
+        """
+
+        self.backup_started = time.time()
         if not self.new_backup_dir:
-            self._get_new_backup_dir(cur_backup_dirs)
+            self._get_new_backup_dir()
         new_backup_dir = str(self.new_backup_dir)
-
-        dir_mode = stat.S_IRWXU | stat.S_IRGRP | stat.S_IXGRP | stat.S_IROTH | stat.S_IXOTH
-        LOG.info("Creating backup directory %r with permissions %04o.", new_backup_dir, dir_mode)
-        if not self.simulate:
-            self.sftp_client.mkdir(new_backup_dir, dir_mode)
+        self.start_manifest(new_backup_dir)
+        self._resume = self.journal is not None
+        self.start_journal(new_backup_dir)
+        self.start_verify()
+        if self.batch_confirm and not self.simulate:
+            self.batch = BatchConfirm(self.sftp_client)
+        self._packed_files = []
+        self._packed_done = []
+
+        if self._resume:
+            LOG.info(
+                "Continuing backup directory %r, %d files were already uploaded.",
+                new_backup_dir, len(self.journal.completed))
+        else:
+            LOG.info(
+                "Creating backup directory %r with permissions %04o.",
+                new_backup_dir, REMOTE_DIR_MODE)
+            if not self.simulate:
+                self.sftp_client.mkdir(new_backup_dir, REMOTE_DIR_MODE)
+                self._remote_added(new_backup_dir)
 
         LOG.debug("Changing to local directory %r ...", self.local_dir)
         os.chdir(str(self.local_dir))
@@ -760,45 +1840,223 @@ class SFTPHandler(PbBaseHandler):
         LOG.debug("Changing to remote directory %r ...", new_backup_dir)
         if not self.simulate:
             self.remote_dir = new_backup_dir
+            self.backup_path = self.remote_dir
             LOG.debug("Remote directory is now %r.", self.remote_dir)
 
-        local_files = self.local_dir.glob('*')
-        for local_file in sorted(local_files, key=lambda l: str(l).lower()):
+    # -------------------------------------------------------------------------
+    def queue_entry(self, entry):
+        """
+        Creates the remote directory of a local directory, skips files already
+        uploaded by an interrupted run and collects small files for packing
+        them at the end of the backup.
+
+        @return: whether the local file has to be uploaded by put_entry()
+        @rtype: bool
+        """
+
+        if entry.is_dir:
+            if self._resume and self.exists(entry.relpath):
+                return False
+            LOG.info("Creating remote directory %r ...", entry.relpath)
+            if not self.simulate:
+                self.sftp_client.mkdir(entry.relpath, REMOTE_DIR_MODE)
+            return False
 
+        size = entry.stat.st_size
+        done = self.take_completed(entry.relpath, size, entry.stat.st_mtime)
+        if done is not None:
+            if done.get('archive'):
+                self._packed_done.append(
+                    (done['archive'], entry.relpath, size, entry.stat.st_mtime))
+            return False
+
+        if self.pack and size < self.pack_threshold:
             if self.verbose > 1:
-                LOG.debug("Checking local file %r ...", local_file)
-            if not local_file.is_file():
-                if self.verbose > 1:
-                    LOG.debug("%r is not a file, don't backup it.", str(local_file))
+                LOG.debug("Packing %r into a tar archive.", entry.path)
+            self._packed_files.append((entry.path, entry.relpath, size, entry.stat.st_mtime))
+            return False
+        return True
+
+    # -------------------------------------------------------------------------
+    def put_entry(self, entry, fileobj=None):
+        """Uploads the file of the given local entry, see put_file()."""
+
+        self.put_file(entry.path, entry.relpath, entry.stat, fileobj=fileobj)
+
+    # -------------------------------------------------------------------------
+    def finish_backup(self):
+        """
+        Uploads the packed files and the manifest of the backup directory
+        started by start_backup() and waits for all confirmations.
+
+        @return: the list of remote files with mismatching checksums
+        @rtype: list
+        """
+
+        if self._packed_files or self._packed_done:
+            self.put_packed(self._packed_files, self._packed_done)
+        self._packed_files = []
+        self._packed_done = []
+        self.confirm_batch()
+        self.remove_partial_uploads()
+        self.put_manifest()
+        mismatches = self.finish_verify()
+
+        if not self.simulate:
+            self.save_compress_history()
+        self.update_index()
+        self.log_cache_stats()
+        self.save_run_report(
+            started=self.backup_started, local_dir=str(self.local_dir),
+            verify_mismatches=mismatches)
+        self.finish_journal()
+        return mismatches
+
+    # -------------------------------------------------------------------------
+    def put_watched(self, files):
+        """
+        Uploads files completed in the local directory after the last backup
+        run into its backup directory and uploads its updated manifest.
+
+        @param files: the absolute paths of the local files
+        @type files: list
+
+        @return: the number of uploaded files
+        @rtype: int
+        """
+
+        if self.backup_path is None:
+            raise SFTPHandlerError(
+                "No backup directory for uploading %d new files." % (len(files)))
+        self.remote_dir = self.backup_path
+        # Single files are confirmed immediately
+        self.batch = None
+        local_dir = os.path.abspath(str(self.local_dir))
+
+        uploaded = 0
+        for local_file in files:
+            relpath = os.path.relpath(local_file, local_dir)
+            if relpath.startswith(os.pardir) or (not self.recursive and os.sep in relpath):
+                LOG.debug("Not uploading %r outside of the backup.", local_file)
+                continue
+            try:
+                statinfo = os.stat(local_file)
+            except FileNotFoundError:
+                LOG.debug("File %r vanished before its upload.", local_file)
+                continue
+            if not stat.S_ISREG(statinfo.st_mode):
                 continue
 
-            statinfo = local_file.stat()
-            size = statinfo.st_size
-            atime = statinfo.st_atime
-            mtime = statinfo.st_mtime
-            times = (atime, mtime)
-            atime_out = datetime.utcfromtimestamp(atime).isoformat(' ')
-            mtime_out = datetime.utcfromtimestamp(mtime).isoformat(' ')
-            s = ''
-            if size != 1:
-                s = 's'
-            size_human = bytes2human(size, precision=1)
+            parent = posixpath.dirname(relpath)
+            if parent and not self.simulate and not self.exists(parent):
+                path = ''
+                for part in parent.split('/'):
+                    path = posixpath.join(path, part)
+                    if not self.exists(path):
+                        self.mkdir(path)
+            self.put_file(local_file, relpath, statinfo)
+            uploaded += 1
+
+        if uploaded:
+            self.put_manifest()
+            self.update_index()
+        return uploaded
 
-            remote_file = local_file.name
+    # -------------------------------------------------------------------------
+    def put_file(self, local_file, remote_file, statinfo, fileobj=None):
+        """
+        Uploads the given local file with the given path relative to the
+        current remote directory and sets the access and modification time
+        of the remote file. With fileobj its content is read from this file
+        object instead of the local file.
+        """
 
-            LOG.info(
-                "Transfering file %r -> %r, size %d Byte%s (%s).",
-                str(local_file), remote_file, size, s, size_human)
+        size = statinfo.st_size
+        atime = statinfo.st_atime
+        mtime = statinfo.st_mtime
+        times = (atime, mtime)
+        atime_out = datetime.utcfromtimestamp(atime).isoformat(' ')
+        mtime_out = datetime.utcfromtimestamp(mtime).isoformat(' ')
+        s = ''
+        if size != 1:
+            s = 's'
+        size_human = bytes2human(size, precision=1)
 
-            if not self.simulate:
-                attr = self.sftp_client.put(
-                    str(local_file), remote_file, confirm=True)
+        (mode, level) = self.get_compress_mode(local_file)
+        name = remote_file
+        remote_file += UploadPipeline.suffix(level, self.encrypt)
 
-            LOG.debug(
-                "Setting atime of %r to %r and mtime to %r.",
-                remote_file, atime_out, mtime_out)
-            if not self.simulate:
-                self.sftp_client.utime(remote_file, times)
+        LOG.info(
+            "Transfering file %r -> %r, size %d Byte%s (%s).",
+            str(local_file), remote_file, size, s, size_human)
+
+        digest = None
+        transferred = [0]
+
+        def count_transferred(done, total):
+            transferred[0] = done
+
+        if not self.simulate:
+            # Reading ahead makes no sense with memory mapped files
+            read_ahead = self.io_mode != IO_MODE_MMAP and fileobj is None
+            # In batch mode the upload is confirmed at the end of the backup
+            confirm = self.batch is None
+            offset = self.resume_offset(name, remote_file, size, mtime, level)
+            digest_algorithm = self.verify_algorithm(level)
+            if offset:
+                LOG.info("Continuing the upload of %r after %d Bytes.", remote_file, offset)
+                # The stream doesn't see the whole file, see resumed_digest()
+                digest_algorithm = None
+            if self.journal is not None:
+                self.journal.plan(name, remote_file, size, mtime)
+            if fileobj is None and self.use_ranges(size, level):
+                digests = self.put_ranges(
+                    local_file, remote_file, size,
+                    algorithms=[self.checksum, digest_algorithm], callback=count_transferred)
+                digest = digests.get(self.checksum)
+                if mode:
+                    self.compress_history.record(local_file, mode, None)
+                self.submit_verify(remote_file, digests.get(digest_algorithm) or digest)
+            else:
+                fh = fileobj
+                if fh is None:
+                    fh = self.open_local_file(local_file)
+                with fh:
+                    skip_prefix(fh, offset)
+                    with self.open_upload_pipeline(
+                            fh, level, read_ahead=read_ahead,
+                            digest_algorithm=digest_algorithm) as stream:
+                        if offset:
+                            self._append_upload(
+                                stream, remote_file, offset, callback=count_transferred)
+                        else:
+                            self.put_stream(
+                                stream, remote_file, callback=count_transferred,
+                                confirm=confirm)
+                    digest = local_digest(fh)
+                stream.log_stats()
+                if mode:
+                    self.compress_history.record(local_file, mode, stream.compress_ratio())
+                if offset:
+                    self.submit_verify(remote_file, self.resumed_digest(local_file, digest))
+                else:
+                    self.submit_verify(remote_file, stream.upload_digest() or digest)
+            if self.journal is not None:
+                self.journal.done(name, remote_file, size, mtime, digest)
+        if self.manifest is not None:
+            self.manifest.add(name, remote_file, size, mtime, digest)
+
+        LOG.debug(
+            "Setting atime of %r to %r and mtime to %r.",
+            remote_file, atime_out, mtime_out)
+        if self.simulate:
+            return
+        if self.batch is not None:
+            self.batch.add(
+                remote_file, transferred[0], times, local_file=local_file, name=name,
+                statinfo=statinfo)
+        else:
+            self.sftp_client.utime(remote_file, times)
 
     # -------------------------------------------------------------------------
     def disk_usage(self, item):
@@ -858,8 +2116,11 @@ class SFTPHandler(PbBaseHandler):
             total = long(0)
 
         dlist = []
-        for entry in self.sftp_client.listdir():
-            dlist.append(entry)
+        if self.cache_remote:
+            dlist = list(self.dir_list().keys())
+        else:
+            for entry in self.sftp_client.listdir():
+                dlist.append(entry)
 
         total_s = 'Total'
         max_len = len(total_s)
@@ -872,7 +2133,14 @@ class SFTPHandler(PbBaseHandler):
         LOG.info("Current disk usages:")
 
         for entry in sorted(dlist, key=str.lower):
-            sz = self.disk_usage(entry)
+            key = self._remote_key(entry)
+            if key in self._remote_usages and entry != str(self.new_backup_dir):
+                sz = self._remote_usages[key]
+            else:
+                sz = self.disk_usage(entry)
+                if self.cache_remote:
+                    # Only the current backup directory changes until the next run
+                    self._remote_usages[key] = sz
             total += sz
             if not only_total:
                 s = ''
@@ -0,0 +1,572 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Module for striping the backup of big files over several servers
+          for the sum of their throughputs and for restoring it
+
+A striped file is split into parts of a fixed size, which are distributed
+round-robin over the servers and uploaded in parallel, one upload at a time
+per server. Smaller files are uploaded as a whole to the server with the
+least Bytes assigned. The layout of the parts is recorded in the manifests
+of all servers, so the restore can fetch the parts from all servers at once.
+"""
+
+# Standard modules
+import logging
+import os
+import posixpath
+import threading
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Third party modules
+
+# Own modules
+from pb_base.common import bytes2human
+
+from pb_base.errors import PbError
+
+from ftp_backup.checksum import new_hash
+
+from ftp_backup.local_scan import LocalEntry
+
+from ftp_backup.ranges import RangeReader
+
+from ftp_backup.fanout import FanOutTarget
+
+from ftp_backup.restore import BackupRestorer, RestoreProgress, open_decoded, strip_suffixes
+from ftp_backup.restore import DEFAULT_RESTORE_WORKERS, DEFAULT_PROGRESS_INTERVAL
+from ftp_backup.restore import DOWNLOAD_BLOCKSIZE, PARTIAL_SUFFIX
+
+__version__ = '0.1.2'
+
+LOG = logging.getLogger(__name__)
+
+# Size of the parts of a striped file, smaller files are not striped
+DEFAULT_STRIPE_SIZE = 64 * 1024 * 1024
+MIN_STRIPE_SIZE = 64 * 1024
+# Remote name of a part by the number of the striped file and the number of the part
+STRIPE_PART_NAME = 'stripe-%06d.%04d'
+# Number of uploads waiting for the targets, before the reading of entries pauses
+MAX_PENDING_UPLOADS = 1000
+
+
+# =============================================================================
+class StripeError(PbError):
+    """
+    Base exception class for all exceptions belonging to issues
+    in this module
+    """
+    pass
+
+
+# =============================================================================
+class StripePart(object):
+    """A part of a striped file, uploaded as an own remote file."""
+
+    # -------------------------------------------------------------------------
+    def __init__(self, entry, name, offset, size):
+
+        self.entry = entry
+        self.name = name
+        self.offset = offset
+        self.size = size
+        # Set by the successful upload
+        self.target = None
+        self.remote = None
+        self.digest = None
+
+    # -------------------------------------------------------------------------
+    def __repr__(self):
+
+        return "<%s %r of %r at %d>" % (
+            self.__class__.__name__, self.name, self.entry.relpath, self.offset)
+
+    # -------------------------------------------------------------------------
+    def as_dict(self):
+
+        part = {
+            'target': self.target,
+            'name': self.name,
+            'remote': self.remote,
+            'offset': self.offset,
+            'size': self.size,
+        }
+        if self.digest:
+            part['digest'] = self.digest
+        return part
+
+
+# =============================================================================
+class StripeTarget(FanOutTarget):
+    """A target of a striped backup with its own handler and upload thread."""
+
+    # -------------------------------------------------------------------------
+    def __init__(self, name, handler):
+
+        super(StripeTarget, self).__init__(name, handler)
+        self.parts = 0
+        # Bytes of the files and parts assigned to the target
+        self.assigned = 0
+        self.executor = None
+
+
+# =============================================================================
+class StripeBackup(object):
+    """
+    Backup of one local directory striped over several targets, e.g. FTP
+    and SFTP servers. Every target has its own handler with its own
+    connection, remote directory and numbers of copies to keep, and its
+    own thread, so all targets upload at the same time.
+
+    Files bigger than stripe_size are split into parts of stripe_size,
+    which are distributed round-robin over the targets. Smaller files are
+    uploaded as a whole to the target with the least Bytes assigned.
+    If an upload fails, its target is given up for the rest of the run
+    and its uploads are moved to the remaining targets.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, targets, stripe_size=DEFAULT_STRIPE_SIZE, verbose=0):
+
+        if not targets:
+            raise StripeError("No targets given for the striped backup.")
+        if stripe_size < MIN_STRIPE_SIZE:
+            raise StripeError("Invalid stripe size %r, must be at least %d Bytes." % (
+                stripe_size, MIN_STRIPE_SIZE))
+
+        self.targets = list(targets)
+        self.stripe_size = stripe_size
+        self.verbose = verbose
+        # The parts of the striped files by their relative paths
+        self.striped = OrderedDict()
+        # Files and parts, which could not be uploaded to any target
+        self.lost = []
+        self._next = 0
+        self._pending = 0
+        self._cond = threading.Condition()
+
+    # -------------------------------------------------------------------------
+    @property
+    def active(self):
+        """The targets, which were not given up."""
+        return [t for t in self.targets if not t.failed]
+
+    # -------------------------------------------------------------------------
+    def _call(self, target, method, *args):
+
+        if target.failed:
+            return None
+        try:
+            return getattr(target.handler, method)(*args)
+        except Exception as e:
+            if self.verbose > 1:
+                LOG.exception("Error in %s() of target %r:", method, target.name)
+            target.fail(e)
+            return None
+
+    # -------------------------------------------------------------------------
+    def _submit(self, target, kind, item):
+
+        with self._cond:
+            self._pending += 1
+        target.executor.submit(self._execute, target, kind, item)
+
+    # -------------------------------------------------------------------------
+    def _wait(self, limit=0):
+
+        with self._cond:
+            while self._pending > limit:
+                self._cond.wait()
+
+    # -------------------------------------------------------------------------
+    def _execute(self, target, kind, item):
+
+        uploads = {
+            'dir': self._mkdir,
+            'file': self._put_file,
+            'part': self._put_part,
+        }
+        try:
+            if not target.failed:
+                try:
+                    uploads[kind](target, item)
+                    return
+                except Exception as e:
+                    if self.verbose > 1:
+                        LOG.exception("Error on upload of %r to target %r:", item, target.name)
+                    target.fail(e)
+            # The directories are created on all targets anyway
+            if kind != 'dir':
+                self._reroute(kind, item)
+        finally:
+            with self._cond:
+                self._pending -= 1
+                self._cond.notify_all()
+
+    # -------------------------------------------------------------------------
+    def _reroute(self, kind, item):
+
+        if kind == 'part':
+            (what, size) = (item, item.size)
+        else:
+            (what, size) = (item.path, item.stat.st_size)
+        with self._cond:
+            active = self.active
+            if not active:
+                self.lost.append(item)
+                LOG.error("No target left for the upload of %r.", what)
+                return
+            target = min(active, key=lambda t: t.assigned)
+            target.assigned += size
+        LOG.info("Uploading %r to target %r instead ...", what, target.name)
+        self._submit(target, kind, item)
+
+    # -------------------------------------------------------------------------
+    def _mkdir(self, target, entry):
+
+        target.handler.queue_entry(entry)
+
+    # -------------------------------------------------------------------------
+    def _put_file(self, target, entry):
+
+        if target.handler.queue_entry(entry):
+            target.handler.put_entry(entry)
+        target.files += 1
+        target.bytes += entry.stat.st_size
+
+    # -------------------------------------------------------------------------
+    def _put_part(self, target, part):
+
+        entry = part.entry
+        # The handler sees the part as a file of its own size
+        statinfo = os.stat_result(tuple(entry.stat)[:6] + (part.size, ) + tuple(entry.stat)[7:10])
+        part_entry = LocalEntry(entry.path, part.name, False, statinfo)
+        reader = RangeReader(entry.path, part.offset, part.size, target.handler.checksum)
+        target.handler.put_entry(part_entry, reader)
+
+        recorded = {}
+        manifest = getattr(target.handler, 'manifest', None)
+        if manifest is not None:
+            recorded = manifest.files.get(part.name, {})
+        # The local file may have been shrunk meanwhile
+        part.size -= reader.remaining
+        part.remote = recorded.get('remote', part.name)
+        part.digest = reader.hexdigest()
+        part.target = target.name
+        target.parts += 1
+        target.bytes += part.size
+
+    # -------------------------------------------------------------------------
+    def put_striped(self, entry):
+        """Splits the file of the entry into parts and distributes them over the targets."""
+
+        size = entry.stat.st_size
+        number = len(self.striped) + 1
+        parts = []
+        offset = 0
+        while offset < size:
+            length = min(self.stripe_size, size - offset)
+            name = STRIPE_PART_NAME % (number, len(parts))
+            parts.append(StripePart(entry, name, offset, length))
+            offset += length
+        self.striped[entry.relpath] = parts
+        if self.verbose > 1:
+            LOG.debug("Striping %r into %d parts.", entry.path, len(parts))
+
+        for part in parts:
+            with self._cond:
+                active = self.active
+                if not active:
+                    self.lost.append(part)
+                    continue
+                target = active[self._next % len(active)]
+                self._next += 1
+                target.assigned += part.size
+            self._submit(target, 'part', part)
+
+    # -------------------------------------------------------------------------
+    def put_whole(self, entry):
+        """Assigns the file of the entry to the target with the least Bytes assigned."""
+
+        with self._cond:
+            active = self.active
+            if not active:
+                self.lost.append(entry)
+                return
+            target = min(active, key=lambda t: t.assigned)
+            target.assigned += entry.stat.st_size
+        self._submit(target, 'file', entry)
+
+    # -------------------------------------------------------------------------
+    def record_layout(self):
+        """Records the layout of all completely uploaded striped files in all manifests."""
+
+        for (relpath, parts) in self.striped.items():
+            if any(part.target is None for part in parts):
+                LOG.error("Striped file %r is incomplete, not recording it.", relpath)
+                continue
+            statinfo = parts[0].entry.stat
+            layout = [part.as_dict() for part in parts]
+            for target in self.active:
+                manifest = getattr(target.handler, 'manifest', None)
+                if manifest is not None:
+                    manifest.add_stripes(
+                        relpath, sum(part.size for part in parts), statinfo.st_mtime,
+                        self.stripe_size, layout)
+
+    # -------------------------------------------------------------------------
+    def run(self, local_entries):
+        """
+        Uploads the given local entries into a new backup directory on every
+        target, each handler has to be connected and in its remote directory.
+
+        @return: whether the backup was successful on all targets
+        @rtype: bool
+        """
+
+        for target in self.targets:
+            self._call(target, 'start_backup')
+            target.executor = ThreadPoolExecutor(max_workers=1)
+
+        try:
+            for entry in local_entries:
+                if not self.active:
+                    break
+                if entry.is_dir:
+                    for target in self.active:
+                        self._submit(target, 'dir', entry)
+                elif len(self.active) > 1 and entry.stat.st_size > self.stripe_size:
+                    self.put_striped(entry)
+                else:
+                    self.put_whole(entry)
+                self._wait(MAX_PENDING_UPLOADS)
+            self._wait()
+        finally:
+            for target in self.targets:
+                target.executor.shutdown(wait=True)
+                target.executor = None
+
+        self.record_layout()
+        for target in self.active:
+            self._call(target, 'finish_backup')
+
+        self.log_stats()
+        return not self.lost and not any(t.failed for t in self.targets)
+
+    # -------------------------------------------------------------------------
+    def log_stats(self):
+
+        nr_parts = sum(len(parts) for parts in self.striped.values())
+        LOG.info(
+            "Striped %d files into %d parts of at most %s over %d targets.",
+            len(self.striped), nr_parts, bytes2human(self.stripe_size, precision=1),
+            len(self.targets))
+        for target in self.targets:
+            status = 'ok'
+            if target.failed:
+                status = 'failed: ' + target.error
+            LOG.info(
+                "Target %r: %d files and %d parts with %s, %s.", target.name, target.files,
+                target.parts, bytes2human(target.bytes, precision=1), status)
+        if self.lost:
+            LOG.error("%d files or parts could not be uploaded to any target.", len(self.lost))
+
+
+# =============================================================================
+class StripeRestorer(BackupRestorer):
+    """
+    Restores a backup striped over several servers into a local directory.
+
+    The files of every server are restored over its own pool of connections,
+    the parts of the striped files are fetched from all servers at the same
+    time and written into their places of the restored files.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(
+            self, pools, target_dir, workers=DEFAULT_RESTORE_WORKERS, decrypt_key=None,
+            verify=True, progress_interval=DEFAULT_PROGRESS_INTERVAL):
+
+        super(StripeRestorer, self).__init__(
+            None, target_dir, workers=workers, decrypt_key=decrypt_key, verify=verify,
+            progress_interval=progress_interval)
+
+        self.pools = OrderedDict(pools)
+        if not self.pools:
+            raise StripeError("No servers given for the restore.")
+        self.restorers = OrderedDict()
+        for (name, pool) in self.pools.items():
+            self.restorers[name] = BackupRestorer(
+                pool, target_dir, workers=workers, decrypt_key=decrypt_key, verify=verify,
+                progress_interval=progress_interval)
+        self.backup_dirs = {}
+        self.algorithms = {}
+
+    # -------------------------------------------------------------------------
+    def _download_part(self, path, part):
+
+        server = part['target']
+        if server not in self.pools:
+            raise StripeError("Part %r is on the unknown server %r." % (part['name'], server))
+        remote_path = posixpath.join(self.backup_dirs[server], part['remote'])
+        part_file = "%s.%s%s" % (path, part['name'], PARTIAL_SUFFIX)
+        self._run_in_pool(
+            self.pools[server], self._download, remote_path, part_file, part['size'])
+
+        algorithm = self.algorithms.get(server)
+        hasher = None
+        if self.verify and part.get('digest') and algorithm:
+            hasher = new_hash(algorithm)
+        (name, compressed, encrypted) = strip_suffixes(part['remote'])
+        written = 0
+        with open(part_file, 'rb') as fh:
+            stream = open_decoded(fh, compressed, encrypted, self.decrypt_key)
+            with open(path + '.new', 'r+b') as out:
+                out.seek(part['offset'])
+                while True:
+                    data = stream.read(DOWNLOAD_BLOCKSIZE)
+                    if not data:
+                        break
+                    out.write(data)
+                    written += len(data)
+                    if hasher is not None:
+                        hasher.update(data)
+        os.remove(part_file)
+
+        if hasher is not None and hasher.hexdigest() != part['digest']:
+            LOG.error(
+                "Checksum mismatch of part %r from %r: expected %s, got %s.",
+                part['name'], server, part['digest'], hasher.hexdigest())
+            return False
+        if written != part['size']:
+            LOG.error("Part %r from %r has the wrong size.", part['name'], server)
+            return False
+        return True
+
+    # -------------------------------------------------------------------------
+    def restore_stripes(self, stripes):
+        """
+        Restores the given striped files with the parts fetched from all servers.
+
+        @param stripes: the layouts of the striped files by their names
+        @type stripes: dict
+        """
+
+        pending = []
+        for (name, entry) in sorted(stripes.items()):
+            if self._is_restored((name, entry['size'], entry.get('mtime'), None)):
+                self.skipped.append(name)
+                continue
+            pending.append((name, entry))
+        total = sum(entry['size'] for (name, entry) in pending)
+        self.progress = RestoreProgress(total, len(pending), self.progress_interval)
+        if not pending:
+            return
+        LOG.info(
+            "Restoring %d striped files with %s from %d servers ...",
+            len(pending), bytes2human(total, precision=1), len(self.pools))
+
+        with ThreadPoolExecutor(max_workers=self.workers * len(self.pools)) as executor:
+            files = []
+            for (name, entry) in pending:
+                path = self._target_path(name)
+                target_dir = os.path.dirname(path)
+                if not os.path.isdir(target_dir):
+                    os.makedirs(target_dir, exist_ok=True)
+                with open(path + '.new', 'wb') as fh:
+                    fh.truncate(entry['size'])
+                futures = [
+                    executor.submit(self._download_part, path, part) for part in entry['parts']]
+                files.append((name, entry, path, futures))
+
+            for (name, entry, path, futures) in files:
+                verified = True
+                failed = False
+                for future in futures:
+                    try:
+                        verified = future.result() and verified
+                    except Exception as e:
+                        LOG.error("Could not restore a part of %r: %s", name, str(e))
+                        failed = True
+                if failed:
+                    self.failures.append(name)
+                    continue
+                if not verified:
+                    self._quarantine(path + '.new', path, name)
+                    continue
+                os.rename(path + '.new', path)
+                if entry.get('mtime') is not None:
+                    os.utime(path, (entry['mtime'], entry['mtime']))
+                self.restored.append(name)
+                self.progress.file_done()
+
+    # -------------------------------------------------------------------------
+    def restore(self, backup_dirs=None):
+        """
+        Restores the given or the latest backup directories of all servers
+        into the target directory.
+
+        @param backup_dirs: the backup directories by the names of the servers
+        @type backup_dirs: dict
+
+        @return: True, if all files were restored and verified successfully
+        @rtype: bool
+        """
+
+        backup_dirs = backup_dirs or {}
+        manifests = OrderedDict()
+        for (name, restorer) in self.restorers.items():
+            backup_dir = restorer.find_backup_dir(backup_dirs.get(name))
+            self.backup_dirs[name] = backup_dir
+            manifests[name] = restorer.load_manifest(backup_dir)
+            self.algorithms[name] = manifests[name].algorithm
+
+        stripes = {}
+        for manifest in manifests.values():
+            stripes.update(manifest.stripes)
+
+        if not os.path.isdir(self.target_dir):
+            os.makedirs(self.target_dir)
+
+        # The files of all servers are restored during the restore of the striped files
+        with ThreadPoolExecutor(max_workers=len(self.restorers)) as executor:
+            futures = OrderedDict()
+            for (name, restorer) in self.restorers.items():
+                futures[name] = executor.submit(
+                    restorer.restore_manifest, self.backup_dirs[name], manifests[name])
+            self.restore_stripes(stripes)
+            for (name, future) in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    LOG.error("Could not restore the files from %r: %s", name, str(e))
+                    self.failures.append(name)
+
+        for restorer in self.restorers.values():
+            self.restored += restorer.restored
+            self.skipped += restorer.skipped
+            self.failures += restorer.failures
+            self.mismatches += restorer.mismatches
+
+        LOG.info(
+            "Restored %d files from %d servers, %d already present, %d failed downloads, "
+            "%d checksum mismatches.", len(self.restored), len(self.pools), len(self.skipped),
+            len(self.failures), len(self.mismatches))
+        return not self.failures and not self.mismatches
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Module for verifying uploaded files by checksums computed
+          on the remote side, without downloading them again
+
+FTP servers are asked with the HASH command (draft-bryan-ftpext-hash)
+or with one of the commands XSHA256, XSHA1 or XMD5, depending on the
+features listed in the answer to FEAT. SFTP servers are asked with the
+check-file extension, if supported, else by executing sha256sum (or
+sha1sum, md5sum) over SSH.
+
+The verification is done in a separate thread with its own connection
+or channel, so it runs in parallel with the following uploads.
+"""
+
+# Standard modules
+import logging
+import re
+import ftplib
+import binascii
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+# Third party modules
+
+# Own modules
+from pb_base.errors import PbError
+
+__version__ = '0.1.0'
+
+LOG = logging.getLogger(__name__)
+
+# The algorithms by preference
+VERIFY_ALGORITHMS = ('sha256', 'sha1', 'md5')
+
+FTP_HASH_NAMES = {
+    'sha256': 'SHA-256',
+    'sha1': 'SHA-1',
+    'md5': 'MD5',
+}
+FTP_X_COMMANDS = {
+    'sha256': 'XSHA256',
+    'sha1': 'XSHA1',
+    'md5': 'XMD5',
+}
+SSH_SUM_COMMANDS = {
+    'sha256': 'sha256sum',
+    'sha1': 'sha1sum',
+    'md5': 'md5sum',
+}
+
+DEFAULT_VERIFY_WORKERS = 2
+
+RE_HEX_DIGEST = re.compile(r'\b([0-9a-f]{32,128})\b', re.IGNORECASE)
+
+
+# =============================================================================
+class VerifyError(PbError):
+    """
+    Base exception class for all exceptions belonging to issues
+    in this module
+    """
+    pass
+
+
+# =============================================================================
+class VerifyUnsupportedError(VerifyError):
+    """The server doesn't support any way of computing checksums."""
+    pass
+
+
+# =============================================================================
+def shell_quote(value):
+
+    return "'" + value.replace("'", "'\\''") + "'"
+
+
+# =============================================================================
+class FTPVerifier(object):
+    """
+    Computes the checksums of remote files by a FTP server with its own
+    control connection, so it doesn't disturb the uploads.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, ftp, preferred=None):
+        """
+        @param ftp: a logged in FTP connection exclusively for verification
+        @type ftp: ftplib.FTP
+        @param preferred: the algorithm to use, if supported by the server
+        @type preferred: str
+        """
+
+        self.ftp = ftp
+        self.algorithm = None
+        self.method = None
+        self._lock = threading.Lock()
+        self._detect(preferred)
+
+    # -------------------------------------------------------------------------
+    def _detect(self, preferred=None):
+
+        try:
+            features = self.ftp.sendcmd('FEAT')
+        except ftplib.Error as e:
+            raise VerifyUnsupportedError("FTP server doesn't support FEAT: %s" % (e))
+
+        hash_algos = []
+        x_commands = set()
+        for line in features.splitlines()[1:]:
+            words = line.strip().split(None, 1)
+            if not words:
+                continue
+            keyword = words[0].upper()
+            if keyword == 'HASH' and len(words) > 1:
+                for name in words[1].split(';'):
+                    hash_algos.append(name.strip().rstrip('*').upper())
+            elif keyword in FTP_X_COMMANDS.values():
+                x_commands.add(keyword)
+
+        candidates = list(VERIFY_ALGORITHMS)
+        if preferred in candidates:
+            candidates.remove(preferred)
+            candidates.insert(0, preferred)
+
+        for algorithm in candidates:
+            if FTP_HASH_NAMES[algorithm] in hash_algos:
+                self.ftp.sendcmd('OPTS HASH %s' % (FTP_HASH_NAMES[algorithm]))
+                self.algorithm = algorithm
+                self.method = 'HASH'
+                break
+            if FTP_X_COMMANDS[algorithm] in x_commands:
+                self.algorithm = algorithm
+                self.method = FTP_X_COMMANDS[algorithm]
+                break
+
+        if not self.algorithm:
+            raise VerifyUnsupportedError("FTP server supports neither HASH nor XSHA256/XMD5.")
+        LOG.info("Verifying uploads by %s with %s.", self.method, self.algorithm)
+
+    # -------------------------------------------------------------------------
+    def remote_digest(self, remote_path):
+
+        with self._lock:
+            reply = self.ftp.sendcmd('%s %s' % (self.method, remote_path))
+        # HASH: "213 SHA-256 0-1234 <digest> <file>", XSHA256: "250 <digest>"
+        words = reply.split()
+        for word in words[1:]:
+            if RE_HEX_DIGEST.match(word) and len(word) >= 32:
+                return word.lower()
+        raise VerifyError("Could not parse checksum reply %r." % (reply))
+
+    # -------------------------------------------------------------------------
+    def close(self):
+
+        try:
+            self.ftp.quit()
+        except (ftplib.Error, IOError, OSError, EOFError):
+            pass
+
+
+# =============================================================================
+class SFTPVerifier(object):
+    """
+    Computes the checksums of remote files on a SSH server on own channels
+    of the existing SSH connection.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, ssh_client, preferred=None, timeout=None):
+
+        self.ssh_client = ssh_client
+        self.timeout = timeout
+        self.algorithm = VERIFY_ALGORITHMS[0]
+        if preferred in SSH_SUM_COMMANDS:
+            self.algorithm = preferred
+        self.check_file = True
+        self._local = threading.local()
+        self._channels = []
+        self._lock = threading.Lock()
+        LOG.info("Verifying uploads by check-file or %s.", SSH_SUM_COMMANDS[self.algorithm])
+
+    # -------------------------------------------------------------------------
+    def _sftp(self):
+
+        # Every thread uses its own SFTP channel
+        sftp = getattr(self._local, 'sftp', None)
+        if sftp is None:
+            sftp = self.ssh_client.open_sftp()
+            self._local.sftp = sftp
+            with self._lock:
+                self._channels.append(sftp)
+        return sftp
+
+    # -------------------------------------------------------------------------
+    def _check_file(self, remote_path):
+
+        with self._sftp().open(remote_path, 'rb') as fh:
+            return binascii.hexlify(fh.check(self.algorithm)).decode('ascii')
+
+    # -------------------------------------------------------------------------
+    def _exec_sum(self, remote_path):
+
+        cmd = '%s -b -- %s' % (SSH_SUM_COMMANDS[self.algorithm], shell_quote(remote_path))
+        (stdin, stdout, stderr) = self.ssh_client.exec_command(cmd, timeout=self.timeout)
+        stdin.close()
+        out = stdout.read().decode('utf-8', 'replace')
+        status = stdout.channel.recv_exit_status()
+        if status != 0:
+            err = stderr.read().decode('utf-8', 'replace').strip()
+            raise VerifyUnsupportedError("Command %r failed: %s" % (cmd, err or status))
+        match = RE_HEX_DIGEST.match(out.strip())
+        if not match:
+            raise VerifyError("Could not parse output %r of %r." % (out, cmd))
+        return match.group(1).lower()
+
+    # -------------------------------------------------------------------------
+    def remote_digest(self, remote_path):
+
+        if self.check_file:
+            try:
+                return self._check_file(remote_path)
+            except IOError as e:
+                # OpenSSH doesn't support the check-file extension
+                LOG.debug("SFTP extension check-file not supported: %s", str(e))
+                self.check_file = False
+        return self._exec_sum(remote_path)
+
+    # -------------------------------------------------------------------------
+    def close(self):
+
+        with self._lock:
+            for sftp in self._channels:
+                sftp.close()
+            self._channels = []
+
+
+# =============================================================================
+class VerifyQueue(object):
+    """
+    Verifies uploaded files in a thread pool in parallel with the following
+    uploads, by comparing the expected checksums with the checksums
+    computed by the server.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, verifier, workers=1):
+
+        self.verifier = verifier
+        self.workers = workers
+        self.verified = 0
+        self.mismatches = []
+        self.failures = []
+        self._futures = []
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    # -----------------------------------------------------------
+    @property
+    def algorithm(self):
+        """The algorithm of the checksums computed by the server."""
+        return self.verifier.algorithm
+
+    # -------------------------------------------------------------------------
+    def _verify(self, remote_path, expected):
+
+        try:
+            digest = self.verifier.remote_digest(remote_path)
+        except Exception as e:
+            LOG.warning("Could not verify %r: %s", remote_path, str(e))
+            self.failures.append(remote_path)
+            return None
+        if digest != expected.lower():
+            LOG.error(
+                "Checksum mismatch of %r: expected %s, server computed %s.",
+                remote_path, expected, digest)
+            self.mismatches.append(remote_path)
+            return False
+        LOG.debug("Verified %r: %s %s.", remote_path, self.algorithm, digest)
+        self.verified += 1
+        return True
+
+    # -------------------------------------------------------------------------
+    def submit(self, remote_path, expected):
+        """
+        Queues the verification of the given remote file with the given
+        expected checksum.
+        """
+
+        future = self._executor.submit(self._verify, remote_path, expected)
+        self._futures.append(future)
+        return future
+
+    # -------------------------------------------------------------------------
+    def finish(self):
+        """
+        Waits for all pending verifications and logs a summary.
+
+        @return: the list of remote files with mismatching checksums
+        @rtype: list
+        """
+
+        for future in self._futures:
+            future.result()
+        self._futures = []
+        LOG.info(
+            "Verified %d uploaded files by %s checksums of the server, %d mismatches, "
+            "%d not verifiable.", self.verified, self.algorithm, len(self.mismatches),
+            len(self.failures))
+        return self.mismatches
+
+    # -------------------------------------------------------------------------
+    def close(self):
+
+        self._executor.shutdown(wait=True)
+        self.verifier.close()
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
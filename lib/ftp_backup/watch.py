@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: Module for watching the local directory with inotify for
+          completed files, which are uploaded between the scheduled backups
+"""
+
+# Standard modules
+import logging
+import os
+import errno
+import struct
+import select
+import ctypes
+import ctypes.util
+import threading
+import time
+
+from collections import OrderedDict
+
+# Third party modules
+
+# Own modules
+from pb_base.errors import PbError
+
+__version__ = '0.1.0'
+
+LOG = logging.getLogger(__name__)
+
+# Seconds without any event for a file, before it is queued for the upload
+DEFAULT_WATCH_DEBOUNCE = 5.0
+# Maximum number of files waiting for their upload
+DEFAULT_WATCH_QUEUE = 1000
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+    IN_DELETE_SELF | IN_ONLYDIR)
+
+EVENT_HEADER = struct.Struct('iIII')
+READ_SIZE = 64 * 1024
+
+
+# =============================================================================
+class WatchError(PbError):
+    """
+    Base exception class for all exceptions belonging to issues
+    in this module
+    """
+    pass
+
+
+# =============================================================================
+class Inotify(object):
+    """Thin wrapper around the inotify system calls of the Linux kernel."""
+
+    # -------------------------------------------------------------------------
+    def __init__(self):
+
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        try:
+            self.libc = ctypes.CDLL(libc_name, use_errno=True)
+            init = self.libc.inotify_init1
+        except (OSError, AttributeError) as e:
+            raise WatchError("inotify is not available: %s" % (e))
+        self.fd = init(IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise WatchError("Could not initialize inotify: %s" % (os.strerror(err)))
+
+    # -------------------------------------------------------------------------
+    def add_watch(self, path, mask=WATCH_MASK):
+        """
+        Watches the given directory.
+
+        @return: the watch descriptor
+        @rtype: int
+        """
+
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise WatchError("Could not watch %r: %s" % (path, os.strerror(err)))
+        return wd
+
+    # -------------------------------------------------------------------------
+    def read_events(self, timeout=None):
+        """
+        Waits at most timeout seconds for events.
+
+        @return: tuples of watch descriptor, mask, cookie and name
+        @rtype: list
+        """
+
+        try:
+            (readable, w, x) = select.select([self.fd], [], [], timeout)
+        except InterruptedError:
+            return []
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, READ_SIZE)
+        except OSError as e:
+            if e.errno in (errno.EINTR, errno.EAGAIN):
+                return []
+            raise
+
+        events = []
+        pos = 0
+        while pos + EVENT_HEADER.size <= len(data):
+            (wd, mask, cookie, length) = EVENT_HEADER.unpack_from(data, pos)
+            pos += EVENT_HEADER.size
+            name = data[pos:pos + length].rstrip(b'\0')
+            pos += length
+            events.append((wd, mask, cookie, os.fsdecode(name)))
+        return events
+
+    # -------------------------------------------------------------------------
+    def close(self):
+
+        if self.fd is not None and self.fd >= 0:
+            os.close(self.fd)
+        self.fd = None
+
+
+# =============================================================================
+class DirectoryWatcher(object):
+    """
+    Watches the local directory in an own thread for files, which were
+    completely written (IN_CLOSE_WRITE) or moved into it (IN_MOVED_TO).
+
+    A file becomes ready for the upload after debounce seconds without any
+    further event for it, so a file written in several steps is uploaded
+    once. At most max_queue files are waiting, more files are dropped with
+    a warning and left to the next scheduled backup.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(
+            self, local_dir, recursive=False, debounce=DEFAULT_WATCH_DEBOUNCE,
+            max_queue=DEFAULT_WATCH_QUEUE):
+
+        self.local_dir = os.path.abspath(str(local_dir))
+        self.recursive = bool(recursive)
+        self.debounce = float(debounce)
+        self.max_queue = int(max_queue)
+        if self.debounce < 0:
+            raise WatchError("Invalid debounce time %r, must not be negative." % (debounce))
+        if self.max_queue < 1:
+            raise WatchError("Invalid queue size %r, must be at least 1." % (max_queue))
+
+        self.inotify = None
+        self.dirs = {}
+        # Files waiting for the end of their debounce time and ready files
+        self.pending = OrderedDict()
+        self.ready = OrderedDict()
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # -------------------------------------------------------------------------
+    @property
+    def queued(self):
+        """The number of files waiting for their upload."""
+        with self._lock:
+            return len(self.pending) + len(self.ready)
+
+    # -------------------------------------------------------------------------
+    def start(self):
+
+        self.inotify = Inotify()
+        self._add_dir(self.local_dir, scan=False)
+        self._thread = threading.Thread(target=self._watch, name='watch-local-dir')
+        self._thread.daemon = True
+        self._thread.start()
+        LOG.info("Watching %r for new files ...", self.local_dir)
+
+    # -------------------------------------------------------------------------
+    def close(self):
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+    # -------------------------------------------------------------------------
+    def __enter__(self):
+        self.start()
+        return self
+
+    # -------------------------------------------------------------------------
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # -------------------------------------------------------------------------
+    def _add_dir(self, path, scan=True):
+
+        try:
+            wd = self.inotify.add_watch(path)
+        except WatchError as e:
+            LOG.warning(str(e))
+            return
+        self.dirs[wd] = path
+        if not self.recursive and not scan:
+            return
+
+        # Files created before the watch was added would be missed
+        try:
+            names = os.listdir(path)
+        except OSError as e:
+            LOG.warning("Could not list new directory %r: %s", path, e)
+            return
+        for name in names:
+            entry = os.path.join(path, name)
+            if os.path.isdir(entry):
+                if self.recursive:
+                    self._add_dir(entry)
+            elif scan and os.path.isfile(entry):
+                self._touch(entry)
+
+    # -------------------------------------------------------------------------
+    def _touch(self, path, now=None):
+
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            if path in self.pending:
+                del self.pending[path]
+            elif path not in self.ready and len(self.pending) + len(self.ready) >= self.max_queue:
+                self.dropped += 1
+                LOG.warning(
+                    "Too many files waiting for their upload, leaving %r to the "
+                    "next scheduled backup.", path)
+                return
+            self.ready.pop(path, None)
+            self.pending[path] = now
+
+    # -------------------------------------------------------------------------
+    def _forget(self, path):
+
+        with self._lock:
+            self.pending.pop(path, None)
+            self.ready.pop(path, None)
+
+    # -------------------------------------------------------------------------
+    def handle_event(self, wd, mask, name, now=None):
+
+        if mask & IN_Q_OVERFLOW:
+            self.dropped += 1
+            LOG.warning(
+                "Lost inotify events, new files may be left to the next scheduled backup.")
+            return
+        if mask & IN_IGNORED:
+            self.dirs.pop(wd, None)
+            return
+
+        parent = self.dirs.get(wd)
+        if parent is None or not name:
+            return
+        path = os.path.join(parent, name)
+
+        if mask & IN_ISDIR:
+            if self.recursive and mask & (IN_CREATE | IN_MOVED_TO):
+                self._add_dir(path)
+            return
+        if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+            self._touch(path, now)
+        elif mask & (IN_MOVED_FROM | IN_DELETE):
+            self._forget(path)
+
+    # -------------------------------------------------------------------------
+    def promote(self, now=None):
+        """Moves all files, whose debounce time is over, into the ready files."""
+
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            for (path, last) in list(self.pending.items()):
+                if now - last >= self.debounce:
+                    del self.pending[path]
+                    self.ready[path] = last
+
+    # -------------------------------------------------------------------------
+    def _watch(self):
+
+        while not self._stop.is_set():
+            try:
+                events = self.inotify.read_events(timeout=min(max(self.debounce, 0.1), 1.0))
+            except OSError as e:
+                LOG.error("Error reading inotify events: %s", e)
+                break
+            for (wd, mask, cookie, name) in events:
+                self.handle_event(wd, mask, name)
+            self.promote()
+
+    # -------------------------------------------------------------------------
+    def take(self, max_items=None):
+        """
+        Takes the ready files out of the queue.
+
+        @return: the paths of the files in the order of their completion
+        @rtype: list
+        """
+
+        with self._lock:
+            paths = list(self.ready.keys())
+            if max_items is not None:
+                paths = paths[:max_items]
+            for path in paths:
+                del self.ready[path]
+        return paths
+
+    # -------------------------------------------------------------------------
+    def retry(self, paths):
+        """Queues the given files again, e.g. after a failed upload."""
+
+        for path in paths:
+            if os.path.isfile(path):
+                self._touch(path)
+
+
+# =============================================================================
+
+if __name__ == "__main__":
+
+    pass
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
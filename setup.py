@@ -156,6 +156,9 @@ def pp(obj):
 scripts = [
     'bin/backup-per-ftp',
     'bin/backup-per-sftp',
+    'bin/restore-backup',
+    'bin/backup-index',
+    'bin/backup-jobs',
 ]
 
 
@@ -191,6 +194,7 @@ setup(
         'pb_logging',
         'argparse',
         'pb_base',
+        'paramiko (>=1.15, <4.0)',
     ]
 )
 
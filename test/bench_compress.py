@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: benchmark of the block parallel compression against the number of workers
+'''
+
+import os
+import sys
+import io
+import time
+import argparse
+import multiprocessing
+
+libdir = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..', 'lib'))
+sys.path.insert(0, libdir)
+
+from ftp_backup.compress import ParallelGzipReader, DEFAULT_COMPRESS_BLOCKSIZE
+
+
+# =============================================================================
+def get_sample(size):
+    """Generates some half compressible sample data."""
+
+    chunk = os.urandom(64 * 1024) + b'backup line with some text\n' * 2400
+    data = chunk * (size // len(chunk) + 1)
+    return data[:size]
+
+
+# =============================================================================
+def bench(data, workers, level, blocksize):
+
+    reader = ParallelGzipReader(
+        io.BytesIO(data), workers=workers, level=level, blocksize=blocksize)
+    start = time.time()
+    while reader.read(256 * 1024):
+        pass
+    duration = time.time() - start
+    reader.close()
+    return duration, reader.ratio()
+
+
+# =============================================================================
+def main():
+
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument(
+        '-s', '--size', type=int, default=256, metavar='MB',
+        help='Size of the sample data in MiB (default: %(default)s).')
+    arg_parser.add_argument(
+        '-l', '--level', type=int, default=6, help='Compression level (default: %(default)s).')
+    arg_parser.add_argument(
+        '-b', '--blocksize', type=int, default=DEFAULT_COMPRESS_BLOCKSIZE,
+        help='Block size in Bytes (default: %(default)s).')
+    args = arg_parser.parse_args()
+
+    data = get_sample(args.size * 1024 * 1024)
+    max_workers = multiprocessing.cpu_count()
+
+    workers = 1
+    base = None
+    print("%8s %10s %8s %8s" % ('Workers', 'MiB/s', 'Speedup', 'Ratio'))
+    while True:
+        duration, ratio = bench(data, workers, args.level, args.blocksize)
+        mb_s = float(args.size) / duration
+        if base is None:
+            base = mb_s
+        print("%8d %10.1f %8.2f %7.1f%%" % (workers, mb_s, mb_s / base, ratio * 100))
+        if workers >= max_workers:
+            break
+        workers = min(workers * 2, max_workers)
+
+
+# =============================================================================
+
+if __name__ == '__main__':
+
+    main()
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: benchmark of reading ahead from a slow disk while sending to a slow network
+'''
+
+import os
+import sys
+import io
+import time
+import argparse
+
+libdir = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..', 'lib'))
+sys.path.insert(0, libdir)
+
+from ftp_backup.read_ahead import ReadAheadReader, DEFAULT_READ_AHEAD_SIZE
+
+
+# =============================================================================
+class SlowDisk(io.RawIOBase):
+    """Stand-in of a slow disk with a fixed throughput."""
+
+    def __init__(self, size, mb_per_s):
+        self.remaining = size
+        self.mb_per_s = mb_per_s
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        length = min(len(buf), self.remaining)
+        time.sleep(float(length) / (self.mb_per_s * 1024 * 1024))
+        buf[:length] = b'\0' * length
+        self.remaining -= length
+        return length
+
+
+# =============================================================================
+def send(stream, mb_per_s, blocksize=32 * 1024):
+    """Stand-in of a network link with a fixed throughput, like paramiko's putfo()."""
+
+    while True:
+        data = stream.read(blocksize)
+        if not data:
+            break
+        time.sleep(float(len(data)) / (mb_per_s * 1024 * 1024))
+
+
+# =============================================================================
+def bench(size, depth, bufsize, disk_mb_s, net_mb_s):
+
+    disk = io.BufferedReader(SlowDisk(size, disk_mb_s), buffer_size=bufsize)
+    start = time.time()
+    if depth:
+        with ReadAheadReader(disk, depth=depth, bufsize=bufsize) as reader:
+            send(reader, net_mb_s)
+    else:
+        send(disk, net_mb_s)
+    return time.time() - start
+
+
+# =============================================================================
+def main():
+
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument(
+        '-s', '--size', type=int, default=64, metavar='MB',
+        help='Size of the file in MiB (default: %(default)s).')
+    arg_parser.add_argument(
+        '--disk', type=float, default=100.0, metavar='MB/S',
+        help='Throughput of the slow disk (default: %(default)s).')
+    arg_parser.add_argument(
+        '--net', type=float, default=100.0, metavar='MB/S',
+        help='Throughput of the network (default: %(default)s).')
+    arg_parser.add_argument(
+        '-b', '--bufsize', type=int, default=DEFAULT_READ_AHEAD_SIZE,
+        help='Size of a read ahead buffer in Bytes (default: %(default)s).')
+    args = arg_parser.parse_args()
+
+    size = args.size * 1024 * 1024
+    base = None
+    print("%8s %10s %8s" % ('Depth', 'MiB/s', 'Speedup'))
+    for depth in (0, 1, 2, 4, 8):
+        duration = bench(size, depth, args.bufsize, args.disk, args.net)
+        mb_s = float(args.size) / duration
+        if base is None:
+            base = mb_s
+        print("%8d %10.1f %8.2f" % (depth, mb_s, mb_s / base))
+
+
+# =============================================================================
+
+if __name__ == '__main__':
+
+    main()
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
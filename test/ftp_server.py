@@ -0,0 +1,372 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: minimal local FTP server on a temporary directory as stand-in
+          for a real FTP server in the unit tests
+'''
+
+import os
+import logging
+import hashlib
+import asyncio
+import threading
+
+LOG = logging.getLogger(__name__)
+
+
+# =============================================================================
+class _FTPSession(object):
+    """One control connection of the LocalFTPServer."""
+
+    # -------------------------------------------------------------------------
+    def __init__(self, server, reader, writer):
+
+        self.server = server
+        self.reader = reader
+        self.writer = writer
+        self.cwd = '/'
+        self.rest = None
+        self.rename_from = None
+        self.data_conn = None
+        self.data_server = None
+
+    # -------------------------------------------------------------------------
+    def local_path(self, path):
+
+        path = os.path.normpath(os.path.join(self.cwd, path or '.'))
+        if not path.startswith('/'):
+            path = '/' + path
+        return os.path.join(self.server.root_dir, path.lstrip('/'))
+
+    # -------------------------------------------------------------------------
+    async def reply(self, text):
+
+        self.writer.write((text + '\r\n').encode('utf-8'))
+        await self.writer.drain()
+
+    # -------------------------------------------------------------------------
+    async def handle(self):
+
+        await self.reply('220 Local FTP server ready.')
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            line = line.decode('utf-8').rstrip('\r\n')
+            (cmd, sep, arg) = line.partition(' ')
+            cmd = cmd.upper()
+            self.server.commands.append(cmd)
+            method = getattr(self, 'ftp_' + cmd.lower(), None)
+            if method is None:
+                await self.reply('502 Command %s not implemented.' % (cmd))
+                continue
+            try:
+                if await method(arg) is False:
+                    break
+            except (IOError, OSError) as e:
+                await self.reply('550 %s' % (e))
+        self.writer.close()
+
+    # -------------------------------------------------------------------------
+    async def ftp_user(self, arg):
+        await self.reply('331 Password required.')
+
+    # -------------------------------------------------------------------------
+    async def ftp_pass(self, arg):
+        await self.reply('230 Logged in.')
+
+    # -------------------------------------------------------------------------
+    async def ftp_type(self, arg):
+        await self.reply('200 Type set.')
+
+    # -------------------------------------------------------------------------
+    async def ftp_noop(self, arg):
+        await self.reply('200 OK.')
+
+    # -------------------------------------------------------------------------
+    async def ftp_quit(self, arg):
+        await self.reply('221 Goodbye.')
+        return False
+
+    # -------------------------------------------------------------------------
+    async def ftp_pwd(self, arg):
+        await self.reply('257 "%s" is the current directory.' % (self.cwd))
+
+    # -------------------------------------------------------------------------
+    async def ftp_cwd(self, arg):
+
+        path = os.path.normpath(os.path.join(self.cwd, arg))
+        if not os.path.isdir(self.local_path(path)):
+            await self.reply('550 No such directory.')
+            return
+        self.cwd = path
+        await self.reply('250 Directory changed.')
+
+    # -------------------------------------------------------------------------
+    async def ftp_cdup(self, arg):
+        await self.ftp_cwd('..')
+
+    # -------------------------------------------------------------------------
+    async def ftp_mkd(self, arg):
+        os.mkdir(self.local_path(arg))
+        await self.reply('257 "%s" created.' % (arg))
+
+    # -------------------------------------------------------------------------
+    async def ftp_rmd(self, arg):
+        os.rmdir(self.local_path(arg))
+        await self.reply('250 Directory removed.')
+
+    # -------------------------------------------------------------------------
+    async def ftp_dele(self, arg):
+        os.remove(self.local_path(arg))
+        await self.reply('250 File removed.')
+
+    # -------------------------------------------------------------------------
+    async def ftp_size(self, arg):
+        await self.reply('213 %d' % (os.path.getsize(self.local_path(arg))))
+
+    # -------------------------------------------------------------------------
+    async def ftp_feat(self, arg):
+
+        lines = ['211-Features:'] + [' ' + cmd for cmd in self.server.hash_commands]
+        await self.reply('\r\n'.join(lines + ['211 End.']))
+
+    # -------------------------------------------------------------------------
+    async def _x_digest(self, cmd, algorithm, arg):
+
+        if cmd not in self.server.hash_commands:
+            await self.reply('502 Command %s not implemented.' % (cmd))
+            return
+        with open(self.local_path(arg), 'rb') as fh:
+            digest = hashlib.new(algorithm, fh.read()).hexdigest()
+        await self.reply('250 %s' % (digest))
+
+    # -------------------------------------------------------------------------
+    async def ftp_xmd5(self, arg):
+        await self._x_digest('XMD5', 'md5', arg)
+
+    # -------------------------------------------------------------------------
+    async def ftp_xsha256(self, arg):
+        await self._x_digest('XSHA256', 'sha256', arg)
+
+    # -------------------------------------------------------------------------
+    async def ftp_rnfr(self, arg):
+
+        if not os.path.exists(self.local_path(arg)):
+            await self.reply('550 No such file.')
+            return
+        self.rename_from = self.local_path(arg)
+        await self.reply('350 Ready for RNTO.')
+
+    # -------------------------------------------------------------------------
+    async def ftp_rnto(self, arg):
+
+        target = self.local_path(arg)
+        if os.path.exists(target) and not self.server.rename_replaces:
+            await self.reply('550 Target exists.')
+            return
+        os.replace(self.rename_from, target)
+        self.rename_from = None
+        await self.reply('250 Renamed.')
+
+    # -------------------------------------------------------------------------
+    async def ftp_rest(self, arg):
+
+        if not self.server.support_rest:
+            await self.reply('502 REST not implemented.')
+            return
+        self.rest = int(arg)
+        await self.reply('350 Restarting at %d.' % (self.rest))
+
+    # -------------------------------------------------------------------------
+    async def _passive(self):
+
+        # Like strict servers, a REST is only valid directly before RETR or STOR
+        self.rest = None
+        if self.data_server is not None:
+            self.data_server.close()
+        self.data_conn = asyncio.get_event_loop().create_future()
+
+        def accept(reader, writer):
+            if not self.data_conn.done():
+                self.data_conn.set_result((reader, writer))
+
+        self.data_server = await asyncio.start_server(accept, '127.0.0.1', 0)
+        return self.data_server.sockets[0].getsockname()[1]
+
+    # -------------------------------------------------------------------------
+    async def ftp_epsv(self, arg):
+        port = await self._passive()
+        await self.reply('229 Entering Extended Passive Mode (|||%d|)' % (port))
+
+    # -------------------------------------------------------------------------
+    async def ftp_pasv(self, arg):
+        port = await self._passive()
+        await self.reply(
+            '227 Entering Passive Mode (127,0,0,1,%d,%d).' % (port // 256, port % 256))
+
+    # -------------------------------------------------------------------------
+    async def _transfer(self, func):
+
+        if self.data_conn is None:
+            await self.reply('425 Use PASV or EPSV first.')
+            return
+        await self.reply('150 Opening data connection.')
+        (reader, writer) = await asyncio.wait_for(self.data_conn, 10)
+        try:
+            await func(reader, writer)
+        finally:
+            writer.close()
+            self.data_server.close()
+            self.data_conn = None
+            self.data_server = None
+            self.rest = None
+        await self.reply('226 Transfer complete.')
+
+    # -------------------------------------------------------------------------
+    async def _send_lines(self, lines):
+
+        async def send(reader, writer):
+            writer.write(''.join(line + '\r\n' for line in lines).encode('utf-8'))
+            await writer.drain()
+
+        await self._transfer(send)
+
+    # -------------------------------------------------------------------------
+    async def ftp_nlst(self, arg):
+        await self._send_lines(sorted(os.listdir(self.local_path(arg))))
+
+    # -------------------------------------------------------------------------
+    async def ftp_list(self, arg):
+
+        path = self.local_path(arg)
+        lines = []
+        for name in sorted(os.listdir(path)):
+            st = os.stat(os.path.join(path, name))
+            kind = 'd' if os.path.isdir(os.path.join(path, name)) else '-'
+            lines.append('%srw-r--r--   1 ftp ftp %12d Jan  1 00:00 %s' % (kind, st.st_size, name))
+        await self._send_lines(lines)
+
+    # -------------------------------------------------------------------------
+    async def ftp_stor(self, arg):
+
+        path = self.local_path(arg)
+        offset = self.rest
+
+        async def receive(reader, writer):
+            mode = 'wb'
+            if offset and os.path.exists(path):
+                mode = 'r+b'
+            with open(path, mode) as fh:
+                if offset:
+                    fh.seek(offset)
+                    if self.server.rest_truncates:
+                        fh.truncate()
+                while True:
+                    data = await reader.read(65536)
+                    if not data:
+                        break
+                    fh.write(data)
+
+        await self._transfer(receive)
+
+    # -------------------------------------------------------------------------
+    async def ftp_retr(self, arg):
+
+        path = self.local_path(arg)
+        if not os.path.isfile(path):
+            await self.reply('550 No such file.')
+            return
+        offset = self.rest
+
+        async def send(reader, writer):
+            with open(path, 'rb') as fh:
+                if offset:
+                    fh.seek(offset)
+                while True:
+                    data = fh.read(65536)
+                    if not data:
+                        break
+                    writer.write(data)
+                    await writer.drain()
+
+        await self._transfer(send)
+
+
+# =============================================================================
+class LocalFTPServer(object):
+    """
+    FTP server with passive data connections on 127.0.0.1, serving a
+    temporary directory from its own thread, with the subset of commands
+    used by the FTP clients of ftp_backup.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(
+            self, root_dir, support_rest=True, rename_replaces=True, rest_truncates=False,
+            hash_commands=()):
+
+        self.root_dir = root_dir
+        # The checksum commands announced by FEAT, e.g. XMD5
+        self.hash_commands = tuple(hash_commands)
+        self.support_rest = support_rest
+        self.rename_replaces = rename_replaces
+        self.rest_truncates = rest_truncates
+        self.commands = []
+        self.port = None
+        self.loop = None
+        self._thread = None
+        self._server = None
+        self._ready = threading.Event()
+
+    # -------------------------------------------------------------------------
+    async def _client(self, reader, writer):
+
+        await _FTPSession(self, reader, writer).handle()
+
+    # -------------------------------------------------------------------------
+    def _serve(self):
+
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._server = self.loop.run_until_complete(
+            asyncio.start_server(self._client, '127.0.0.1', 0))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self.loop.run_forever()
+        self._server.close()
+        self.loop.run_until_complete(self._server.wait_closed())
+        self.loop.close()
+
+    # -------------------------------------------------------------------------
+    def start(self):
+
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        self._ready.wait(10)
+        return self.port
+
+    # -------------------------------------------------------------------------
+    def stop(self):
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(10)
+
+
+# =============================================================================
+def make_tree(root_dir, files):
+    """Creates the given files with their content below root_dir."""
+
+    for (name, data) in files.items():
+        path = os.path.join(root_dir, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as fh:
+            fh.write(data)
+
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
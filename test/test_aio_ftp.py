@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: test script (and module) for unit tests on the asyncio
+          FTP client and the session pool
+'''
+
+import os
+import sys
+import io
+import shutil
+import asyncio
+import logging
+import tempfile
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+libdir = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..', 'lib'))
+sys.path.insert(0, libdir)
+
+from general import FtpBackupTestcase, get_arg_verbose, init_root_logger
+
+from ftp_server import LocalFTPServer, make_tree
+
+MY_APPNAME = os.path.basename(sys.argv[0]).replace('.py', '')
+LOG = logging.getLogger(MY_APPNAME)
+
+
+# =============================================================================
+class TestAsyncFTP(FtpBackupTestcase):
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.server = LocalFTPServer(self.tmp_dir)
+        self.port = self.server.start()
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    # -------------------------------------------------------------------------
+    def client(self):
+
+        from ftp_backup.aio_ftp import AsyncFTPClient
+
+        return AsyncFTPClient('127.0.0.1', port=self.port, user='backup', password='secret')
+
+    # -------------------------------------------------------------------------
+    def test_import(self):
+
+        LOG.info("Test importing ftp_backup.aio_ftp ...")
+
+        import ftp_backup.aio_ftp                                       # noqa
+
+    # -------------------------------------------------------------------------
+    def test_client(self):
+
+        LOG.info("Testing the single commands of the asyncio FTP client ...")
+
+        from ftp_backup.aio_ftp import AsyncFTPPermError
+
+        make_tree(self.tmp_dir, {'old/a.txt': b'aaa'})
+
+        async def run():
+            async with self.client() as ftp:
+                self.assertEqual(await ftp.pwd(), '/')
+                await ftp.mkd('new')
+                await ftp.cwd('new')
+                size = await ftp.upload('b.bin', io.BytesIO(b'x' * 200000))
+                self.assertEqual(size, 200000)
+                self.assertEqual(await ftp.size('b.bin'), 200000)
+                self.assertEqual(await ftp.nlst(), ['b.bin'])
+                listing = await ftp.list('/old')
+                self.assertEqual(len(listing), 1)
+                self.assertTrue(listing[0].endswith(' a.txt'))
+                fh = io.BytesIO()
+                await ftp.retrieve('/old/a.txt', fh, rest=1)
+                self.assertEqual(fh.getvalue(), b'aa')
+                await ftp.delete('/old/a.txt')
+                with self.assertRaises(AsyncFTPPermError) as cm:
+                    await ftp.delete('/old/a.txt')
+                self.assertEqual(cm.exception.code, 550)
+                await ftp.rmd('/old')
+
+        asyncio.run(run())
+        self.assertEqual(os.listdir(self.tmp_dir), ['new'])
+        self.assertEqual(os.listdir(os.path.join(self.tmp_dir, 'new')), ['b.bin'])
+
+    # -------------------------------------------------------------------------
+    def test_pool(self):
+
+        LOG.info("Testing many concurrent operations with a pool of FTP sessions ...")
+
+        from ftp_backup.aio_ftp import AsyncFTPPool
+
+        nr_files = 200
+        make_tree(self.tmp_dir, dict(
+            ('dir%d/old%d' % (i % 10, i), b'old') for i in range(nr_files)))
+        dirs = ['dir%d' % (i) for i in range(10)] + ['missing']
+        uploads = [('dir%d/new%d' % (i % 10, i), b'new %d' % (i)) for i in range(nr_files)]
+
+        async def run():
+            async with AsyncFTPPool(self.client, 16) as pool:
+                listings = await pool.list_many(dirs)
+                failed = await pool.upload_many(uploads)
+                self.assertEqual(failed, {})
+                failed = await pool.delete_many(
+                    ['dir%d/old%d' % (i % 10, i) for i in range(nr_files)] + ['nothing'])
+                self.assertEqual(list(failed.keys()), ['nothing'])
+                self.assertLessEqual(len(pool._sessions), 16)
+            return listings
+
+        listings = asyncio.run(run())
+        self.assertEqual(len(listings['dir3']), nr_files // 10)
+        self.assertIsInstance(listings['missing'], Exception)
+        names = []
+        for i in range(10):
+            names += os.listdir(os.path.join(self.tmp_dir, 'dir%d' % (i)))
+        self.assertEqual(sorted(names), sorted('new%d' % (i) for i in range(nr_files)))
+        with open(os.path.join(self.tmp_dir, 'dir7', 'new17'), 'rb') as fh:
+            self.assertEqual(fh.read(), b'new 17')
+
+    # -------------------------------------------------------------------------
+    def test_broken_session(self):
+
+        LOG.info("Testing discarding broken sessions of the pool ...")
+
+        from ftp_backup.aio_pool import AsyncSessionPool, AsyncPoolError
+
+        class Session(object):
+            created = 0
+
+            def __init__(self):
+                Session.created += 1
+                self.broken = False
+                self.closed = False
+
+            async def connect(self):
+                pass
+
+            async def close(self):
+                self.closed = True
+
+        async def work(session, item):
+            if item == 3:
+                session.broken = True
+                raise EOFError("lost")
+            await asyncio.sleep(0)
+            return item
+
+        async def run():
+            pool = AsyncSessionPool(Session, 2)
+            results = await pool.map(work, range(6))
+            await pool.close()
+            with self.assertRaises(AsyncPoolError):
+                await pool.acquire()
+            return results
+
+        results = asyncio.run(run())
+        self.assertIsInstance(results[3], EOFError)
+        self.assertEqual([r for r in results if not isinstance(r, Exception)], [0, 1, 2, 4, 5])
+        self.assertEqual(Session.created, 3)
+
+        with self.assertRaises(AsyncPoolError):
+            AsyncSessionPool(Session, 0)
+
+
+# =============================================================================
+
+if __name__ == '__main__':
+
+    verbose = get_arg_verbose()
+    if verbose is None:
+        verbose = 0
+    init_root_logger(verbose)
+
+    LOG.info("Starting tests ...")
+
+    suite = unittest.TestSuite()
+
+    suite.addTest(TestAsyncFTP('test_import', verbose))
+    suite.addTest(TestAsyncFTP('test_client', verbose))
+    suite.addTest(TestAsyncFTP('test_pool', verbose))
+    suite.addTest(TestAsyncFTP('test_broken_session', verbose))
+
+    runner = unittest.TextTestRunner(verbosity=verbose)
+
+    result = runner.run(suite)
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
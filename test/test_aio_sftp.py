@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: test script (and module) for unit tests on the asyncio
+          wrapper of the SFTP client
+'''
+
+import os
+import sys
+import asyncio
+import logging
+import posixpath
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+libdir = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..', 'lib'))
+sys.path.insert(0, libdir)
+
+from general import FtpBackupTestcase, get_arg_verbose, init_root_logger
+
+MY_APPNAME = os.path.basename(sys.argv[0]).replace('.py', '')
+LOG = logging.getLogger(MY_APPNAME)
+
+
+# =============================================================================
+def fake_sftp_client(files):
+    """
+    Returns a SFTP client on the given dictionary of file names and sizes,
+    which answers the pipelined requests in reverse order.
+    """
+
+    import paramiko
+    from paramiko.sftp import CMD_STATUS, CMD_ATTRS, CMD_REMOVE
+    from paramiko.sftp import SFTP_OK, SFTP_NO_SUCH_FILE
+
+    class FakeSFTPClient(paramiko.SFTPClient):
+
+        def __init__(self):
+            self._cwd = b'/backup'
+            self._expecting = {}
+            self.request_number = 1
+            self.queue = []
+            self.max_waiting = 0
+            self.closed = False
+
+        def _async_request(self, fileobj, t, path):
+            num = self.request_number
+            self.request_number += 1
+            self._expecting[num] = fileobj
+            self.queue.append((num, t, path.decode('utf-8')))
+            self.max_waiting = max(self.max_waiting, len(self.queue))
+            return num
+
+        def _read_response(self, waitfor=None):
+            (num, t, path) = self.queue.pop()
+            msg = paramiko.Message()
+            if path not in files:
+                msg.add_int(SFTP_NO_SUCH_FILE)
+                msg.add_string('No such file')
+                msg.add_string('')
+                answer = CMD_STATUS
+            elif t == CMD_REMOVE:
+                del files[path]
+                msg.add_int(SFTP_OK)
+                msg.add_string('OK')
+                msg.add_string('')
+                answer = CMD_STATUS
+            else:
+                attr = paramiko.SFTPAttributes()
+                attr.st_size = files[path]
+                attr._pack(msg)
+                answer = CMD_ATTRS
+            msg.rewind()
+            self._expecting.pop(num)._async_response(answer, msg, num)
+            return (None, None)
+
+        def listdir(self, path='.'):
+            path = posixpath.join(self._cwd.decode('utf-8'), path)
+            return sorted(posixpath.basename(f) for f in files if posixpath.dirname(f) == path)
+
+        def close(self):
+            self.closed = True
+
+    return FakeSFTPClient
+
+
+# =============================================================================
+class TestAsyncSFTP(FtpBackupTestcase):
+
+    # -------------------------------------------------------------------------
+    def test_import(self):
+
+        LOG.info("Test importing ftp_backup.aio_sftp ...")
+
+        import ftp_backup.aio_sftp                                      # noqa
+
+    # -------------------------------------------------------------------------
+    def test_pipelined(self):
+
+        LOG.info("Testing pipelined removing and stat() of many files ...")
+
+        from ftp_backup.aio_sftp import AsyncSFTPClient
+
+        files = dict(('/backup/old/f%03d' % (i), i) for i in range(150))
+        factory = fake_sftp_client(files)
+
+        async def run():
+            client = AsyncSFTPClient(factory, pipeline_depth=20)
+            async with client:
+                sftp = client.sftp
+                attrs = await client.stat_many(['old/f%03d' % (i) for i in (5, 7, 200)])
+                results = await client.remove_many(
+                    ['old/f%03d' % (i) for i in range(100)] + ['old/nothing'])
+            return (sftp, attrs, results)
+
+        (sftp, attrs, results) = asyncio.run(run())
+        self.assertTrue(sftp.closed)
+        self.assertEqual(sftp.max_waiting, 20)
+        self.assertEqual([a.st_size for a in attrs[:2]], [5, 7])
+        self.assertIsInstance(attrs[2], IOError)
+        self.assertEqual(results[:100], [None] * 100)
+        self.assertIsInstance(results[100], IOError)
+        self.assertEqual(
+            sorted(files.keys()), ['/backup/old/f%03d' % (i) for i in range(100, 150)])
+
+    # -------------------------------------------------------------------------
+    def test_pool(self):
+
+        LOG.info("Testing a pool of asyncio SFTP sessions ...")
+
+        from ftp_backup.aio_sftp import AsyncSFTPClient, AsyncSFTPPool
+
+        files = dict(('/backup/d%d/f%03d' % (i % 4, i), i) for i in range(300))
+        factory = fake_sftp_client(files)
+
+        async def run():
+            async with AsyncSFTPPool(lambda: AsyncSFTPClient(factory), 5) as pool:
+                listings = await pool.list_many(['d0', 'd1'])
+                failed = await pool.delete_many(
+                    ['d%d/f%03d' % (i % 4, i) for i in range(0, 300, 2)] + ['d9/x'])
+                attrs = await pool.stat_many(['d1/f001', 'd2/f002'])
+                self.assertEqual(len(pool._sessions), 5)
+            return (listings, failed, attrs)
+
+        (listings, failed, attrs) = asyncio.run(run())
+        self.assertEqual(len(listings['d0']), 75)
+        self.assertEqual(list(failed.keys()), ['d9/x'])
+        self.assertEqual(len(files), 150)
+        self.assertEqual(attrs['d1/f001'].st_size, 1)
+        self.assertIsInstance(attrs['d2/f002'], IOError)
+
+
+# =============================================================================
+
+if __name__ == '__main__':
+
+    verbose = get_arg_verbose()
+    if verbose is None:
+        verbose = 0
+    init_root_logger(verbose)
+
+    LOG.info("Starting tests ...")
+
+    suite = unittest.TestSuite()
+
+    suite.addTest(TestAsyncSFTP('test_import', verbose))
+    suite.addTest(TestAsyncSFTP('test_pipelined', verbose))
+    suite.addTest(TestAsyncSFTP('test_pool', verbose))
+
+    runner = unittest.TextTestRunner(verbosity=verbose)
+
+    result = runner.run(suite)
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
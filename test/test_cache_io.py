@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: test script (and module) for unit tests on reading local files
+          without polluting the page cache
+'''
+
+import os
+import sys
+import shutil
+import logging
+import tempfile
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+libdir = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..', 'lib'))
+sys.path.insert(0, libdir)
+
+from general import FtpBackupTestcase, get_arg_verbose, init_root_logger
+
+MY_APPNAME = os.path.basename(sys.argv[0]).replace('.py', '')
+LOG = logging.getLogger(MY_APPNAME)
+
+
+# =============================================================================
+class TestCacheIO(FtpBackupTestcase):
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.data = os.urandom(3 * 1024 * 1024 + 123)
+        self.filename = os.path.join(self.tmp_dir, 'dump.bin')
+        with open(self.filename, 'wb') as fh:
+            fh.write(self.data)
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    # -------------------------------------------------------------------------
+    def test_import(self):
+
+        LOG.info("Test importing ftp_backup.cache_io ...")
+
+        import ftp_backup.cache_io                                      # noqa
+
+    # -------------------------------------------------------------------------
+    def test_io_modes(self):
+
+        LOG.info("Testing reading local files in all I/O modes ...")
+
+        from ftp_backup.cache_io import open_local_file, CacheStats, IO_MODES
+        from ftp_backup.cache_io import CacheIOError
+
+        for io_mode in IO_MODES:
+            stats = CacheStats()
+            chunks = []
+            with open_local_file(self.filename, io_mode, stats=stats) as fh:
+                while True:
+                    chunk = fh.read(32 * 1024 + 7)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+            self.assertEqual(b''.join(chunks), self.data)
+            if io_mode in ('buffered', 'mmap'):
+                self.assertEqual(stats.files, 0)
+            else:
+                self.assertEqual(stats.files, 1)
+                self.assertEqual(stats.bytes_read, len(self.data))
+                self.assertEqual(stats.bytes_dropped, len(self.data))
+                ratio = stats.hit_ratio()
+                if ratio is not None:
+                    self.assertTrue(0.0 <= ratio <= 1.0)
+
+        with self.assertRaises(CacheIOError):
+            open_local_file(self.filename, 'unknown')
+
+# =============================================================================
+
+if __name__ == '__main__':
+
+    verbose = get_arg_verbose()
+    if verbose is None:
+        verbose = 0
+    init_root_logger(verbose)
+
+    LOG.info("Starting tests ...")
+
+    suite = unittest.TestSuite()
+
+    suite.addTest(TestCacheIO('test_import', verbose))
+    suite.addTest(TestCacheIO('test_io_modes', verbose))
+
+    runner = unittest.TextTestRunner(verbosity=verbose)
+
+    result = runner.run(suite)
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: test script (and module) for unit tests on checksums and manifests
+'''
+
+import os
+import sys
+import io
+import shutil
+import hashlib
+import logging
+import tempfile
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+libdir = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..', 'lib'))
+sys.path.insert(0, libdir)
+
+from general import FtpBackupTestcase, get_arg_verbose, init_root_logger
+
+MY_APPNAME = os.path.basename(sys.argv[0]).replace('.py', '')
+LOG = logging.getLogger(MY_APPNAME)
+
+
+# =============================================================================
+class TestChecksum(FtpBackupTestcase):
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.data = os.urandom(200 * 1000 + 3)
+        self.filename = os.path.join(self.tmp_dir, 'dump.bin')
+        with open(self.filename, 'wb') as fh:
+            fh.write(self.data)
+        self.digest = hashlib.sha256(self.data).hexdigest()
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    # -------------------------------------------------------------------------
+    def test_import(self):
+
+        LOG.info("Test importing ftp_backup.checksum and ftp_backup.manifest ...")
+
+        import ftp_backup.checksum                                      # noqa
+        import ftp_backup.manifest                                      # noqa
+
+    # -------------------------------------------------------------------------
+    def test_single_pass(self):
+
+        LOG.info("Testing computing checksums while reading ...")
+
+        from ftp_backup.checksum import HashingReader, MmapHashReader, local_digest
+        from ftp_backup.compress import ParallelGzipReader
+        import gzip
+
+        with MmapHashReader(self.filename) as reader:
+            chunks = []
+            while True:
+                chunk = reader.read(32 * 1024)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            self.assertEqual(b''.join(chunks), self.data)
+            self.assertEqual(reader.hexdigest(), self.digest)
+            del chunks, chunk
+
+        # The memoryview slices must be usable by the following stages
+        with MmapHashReader(self.filename) as reader:
+            with ParallelGzipReader(reader, workers=2, blocksize=64 * 1024) as gz:
+                compressed = gz.read()
+            self.assertEqual(gzip.GzipFile(fileobj=io.BytesIO(compressed)).read(), self.data)
+            self.assertEqual(local_digest(reader), self.digest)
+
+        with HashingReader(open(self.filename, 'rb')) as reader:
+            buf = bytearray(1000)
+            while reader.readinto(buf):
+                pass
+            self.assertEqual(reader.hexdigest(), self.digest)
+
+        empty = os.path.join(self.tmp_dir, 'empty')
+        open(empty, 'wb').close()
+        with MmapHashReader(empty, 'md5') as reader:
+            self.assertEqual(reader.read(), b'')
+            self.assertEqual(reader.hexdigest(), hashlib.md5(b'').hexdigest())
+
+        self.assertIsNone(local_digest(io.BytesIO(self.data)))
+
+    # -------------------------------------------------------------------------
+    def test_manifest(self):
+
+        LOG.info("Testing the manifest of a backup directory ...")
+
+        from ftp_backup.manifest import BackupManifest, save_run_report
+        from ftp_backup.packer import TarStreamReader
+
+        with TarStreamReader([(self.filename, 'dump.bin')], algorithm='sha256') as tar:
+            tar.read()
+        self.assertEqual(tar.digests['dump.bin'], self.digest)
+
+        manifest = BackupManifest('2016-01-01_00', 'sha256')
+        manifest.add('dump.bin', 'dump.bin.gz', len(self.data), 1234.5, self.digest)
+        manifest.add('small.cfg', 'small.cfg', 10, 1234.5, archive='packed-0001.tar')
+        manifest = BackupManifest.from_json(manifest.to_json())
+        self.assertEqual(manifest.digest_of('dump.bin'), self.digest)
+        self.assertIsNone(manifest.digest_of('small.cfg'))
+        self.assertEqual(manifest.total_size(), len(self.data) + 10)
+
+        report = save_run_report(manifest, os.path.join(self.tmp_dir, 'reports'), started=1.0)
+        self.assertTrue(os.path.isfile(report))
+
+# =============================================================================
+
+if __name__ == '__main__':
+
+    verbose = get_arg_verbose()
+    if verbose is None:
+        verbose = 0
+    init_root_logger(verbose)
+
+    LOG.info("Starting tests ...")
+
+    suite = unittest.TestSuite()
+
+    suite.addTest(TestChecksum('test_import', verbose))
+    suite.addTest(TestChecksum('test_single_pass', verbose))
+    suite.addTest(TestChecksum('test_manifest', verbose))
+
+    runner = unittest.TextTestRunner(verbosity=verbose)
+
+    result = runner.run(suite)
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: test script (and module) for unit tests on the parallel compression
+'''
+
+import os
+import sys
+import io
+import gzip
+import shutil
+import logging
+import tempfile
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+libdir = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..', 'lib'))
+sys.path.insert(0, libdir)
+
+from general import FtpBackupTestcase, get_arg_verbose, init_root_logger
+
+MY_APPNAME = os.path.basename(sys.argv[0]).replace('.py', '')
+LOG = logging.getLogger(MY_APPNAME)
+
+
+# =============================================================================
+class TestCompress(FtpBackupTestcase):
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+        pass
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        pass
+
+    # -------------------------------------------------------------------------
+    def test_import(self):
+
+        LOG.info("Test importing ftp_backup.compress ...")
+
+        import ftp_backup.compress                                      # noqa
+
+    # -------------------------------------------------------------------------
+    def test_parallel_gzip(self):
+
+        LOG.info("Testing the block parallel gzip reader ...")
+
+        from ftp_backup.compress import ParallelGzipReader
+
+        data = os.urandom(100000) + b'0123456789' * 50000
+        for workers in (1, 2, 4):
+            reader = ParallelGzipReader(
+                io.BytesIO(data), workers=workers, blocksize=65536, max_pending=3)
+            chunks = []
+            while True:
+                chunk = reader.read(8192)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            reader.close()
+            compressed = b''.join(chunks)
+            LOG.debug(
+                "Compressed %d Bytes with %d workers to %d Bytes.",
+                len(data), workers, len(compressed))
+            self.assertEqual(gzip.decompress(compressed), data)
+            self.assertEqual(reader.bytes_in, len(data))
+            self.assertEqual(reader.bytes_out, len(compressed))
+
+    # -------------------------------------------------------------------------
+    def test_parallel_gzip_empty(self):
+
+        LOG.info("Testing the block parallel gzip reader with an empty file ...")
+
+        from ftp_backup.compress import ParallelGzipReader
+
+        with ParallelGzipReader(io.BytesIO(b''), workers=2) as reader:
+            compressed = reader.read()
+        self.assertEqual(gzip.decompress(compressed), b'')
+
+    # -------------------------------------------------------------------------
+    def test_adaptive_history(self):
+
+        LOG.info("Testing the adaptive compression history ...")
+
+        from ftp_backup.compress import CompressionHistory
+        from ftp_backup.compress import COMPRESS_MODE_STORE, COMPRESS_MODE_STRONG
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            text_file = os.path.join(tmp_dir, 'dump.sql')
+            with open(text_file, 'wb') as fh:
+                fh.write(b'INSERT INTO backup VALUES (1, 2, 3);\n' * 20000)
+            random_file = os.path.join(tmp_dir, 'archive.tar.gz')
+            with open(random_file, 'wb') as fh:
+                fh.write(os.urandom(500000))
+            history_file = os.path.join(tmp_dir, 'history.json')
+
+            history = CompressionHistory(history_file)
+            self.assertEqual(history.get_mode(text_file), COMPRESS_MODE_STRONG)
+            self.assertEqual(history.get_mode(random_file), COMPRESS_MODE_STORE)
+            self.assertEqual(history.probes, 2)
+            history.record(text_file, COMPRESS_MODE_STRONG, 0.02)
+            history.save()
+
+            history = CompressionHistory(history_file)
+            self.assertEqual(history.get_mode(text_file), COMPRESS_MODE_STRONG)
+            self.assertEqual(history.get_mode(random_file), COMPRESS_MODE_STORE)
+            self.assertEqual(history.probes, 0)
+            self.assertEqual(history.hits, 2)
+
+            # A rewritten file is probed again
+            with open(random_file, 'wb') as fh:
+                fh.write(b'INSERT INTO backup VALUES (4, 5, 6);\n' * 20000)
+            self.assertEqual(history.get_mode(random_file), COMPRESS_MODE_STRONG)
+            self.assertEqual(history.probes, 1)
+
+            # Entries of vanished and of long unused files are dropped
+            os.remove(text_file)
+            history.entries[random_file]['updated'] -= history.max_age + 1
+            other_file = os.path.join(tmp_dir, 'other.sql')
+            with open(other_file, 'wb') as fh:
+                fh.write(b'SELECT 1;\n' * 1000)
+            history.get_mode(other_file)
+            history.save()
+            history = CompressionHistory(history_file)
+            self.assertEqual(list(history.entries.keys()), [os.path.abspath(other_file)])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+# =============================================================================
+
+if __name__ == '__main__':
+
+    verbose = get_arg_verbose()
+    if verbose is None:
+        verbose = 0
+    init_root_logger(verbose)
+
+    LOG.info("Starting tests ...")
+
+    suite = unittest.TestSuite()
+
+    suite.addTest(TestCompress('test_import', verbose))
+    suite.addTest(TestCompress('test_parallel_gzip', verbose))
+    suite.addTest(TestCompress('test_parallel_gzip_empty', verbose))
+    suite.addTest(TestCompress('test_adaptive_history', verbose))
+
+    runner = unittest.TextTestRunner(verbosity=verbose)
+
+    result = runner.run(suite)
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: test script (and module) for unit tests on the adaptive limit
+          of concurrent transfers
+'''
+
+import os
+import sys
+import shutil
+import ftplib
+import logging
+import tempfile
+import threading
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+libdir = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..', 'lib'))
+sys.path.insert(0, libdir)
+
+from general import FtpBackupTestcase, get_arg_verbose, init_root_logger
+
+MY_APPNAME = os.path.basename(sys.argv[0]).replace('.py', '')
+LOG = logging.getLogger(MY_APPNAME)
+
+
+# =============================================================================
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+# =============================================================================
+class FakeSession(object):
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+# =============================================================================
+class TestConcurrency(FtpBackupTestcase):
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp(prefix='test-concurrency-')
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    # -------------------------------------------------------------------------
+    def test_import(self):
+
+        LOG.info("Test importing ftp_backup.concurrency ...")
+
+        import ftp_backup.concurrency                                   # noqa
+
+    # -------------------------------------------------------------------------
+    def test_aimd(self):
+
+        LOG.info("Testing the adjustment of the concurrency by throughput and errors ...")
+
+        from ftp_backup.concurrency import AdaptiveConcurrency, ConcurrencyError
+        from ftp_backup.concurrency import DECISION_INCREASE, DECISION_DECREASE, DECISION_HOLD
+
+        with self.assertRaises(ConcurrencyError):
+            AdaptiveConcurrency(4, 2)
+
+        clock = FakeClock()
+        ctl = AdaptiveConcurrency(2, 8, interval=1.0, clock=clock)
+        self.assertEqual(ctl.limit, 2)
+
+        def window(busy, nbytes, errors=0):
+            for i in range(busy):
+                ctl.acquire()
+            ctl.transferred(nbytes)
+            for i in range(busy - 1):
+                ctl.release(error=i < errors)
+            # The last transfer ends the interval
+            clock.now += 1.0
+            ctl.release(error=busy <= errors)
+            return ctl.decisions[-1]
+
+        # Increased additively, while all transfers are busy
+        self.assertEqual(window(2, 1000), (DECISION_INCREASE, 2, 3, 1000.0))
+        self.assertEqual(window(3, 1500)[:3], (DECISION_INCREASE, 3, 4))
+        # Not all transfers busy
+        self.assertEqual(window(2, 1500)[:3], (DECISION_HOLD, 4, 4))
+        # Multiplicative decrease after a failed transfer
+        self.assertEqual(window(4, 2000, errors=1)[:3], (DECISION_DECREASE, 4, 2))
+        # No slowdown is measured against the throughput before a decrease
+        self.assertEqual(window(2, 1000)[:3], (DECISION_INCREASE, 2, 3))
+        # A slowdown
+        self.assertEqual(window(3, 500)[:3], (DECISION_DECREASE, 3, 2))
+        # Within the bounds
+        self.assertEqual(window(2, 500, errors=2)[:3], (DECISION_HOLD, 2, 2))
+        for i in range(8):
+            window(ctl.limit, 1000)
+        self.assertEqual(ctl.limit, 8)
+        self.assertEqual(ctl.decisions[-1][:3], (DECISION_HOLD, 8, 8))
+
+    # -------------------------------------------------------------------------
+    def test_limit(self):
+
+        LOG.info("Testing the waiting for a free transfer ...")
+
+        from ftp_backup.concurrency import AdaptiveConcurrency
+
+        ctl = AdaptiveConcurrency(1, 2, interval=3600)
+        ctl.acquire()
+        started = threading.Event()
+
+        def transfer():
+            ctl.acquire()
+            started.set()
+
+        thread = threading.Thread(target=transfer)
+        thread.start()
+        self.assertFalse(started.wait(0.2))
+        ctl.release()
+        self.assertTrue(started.wait(5))
+        thread.join(5)
+        self.assertEqual(ctl.active, 1)
+
+    # -------------------------------------------------------------------------
+    def test_range_upload(self):
+
+        LOG.info("Testing the upload of ranges with an adaptive concurrency ...")
+
+        from ftp_backup.concurrency import AdaptiveConcurrency
+        from ftp_backup.ranges import RangeUpload
+        from ftp_backup.restore import SessionPool
+
+        data = os.urandom(200000)
+        filename = os.path.join(self.tmp_dir, 'data.bin')
+        with open(filename, 'wb') as fh:
+            fh.write(data)
+
+        target = bytearray(len(data))
+        lock = threading.Lock()
+        state = {'running': 0, 'peak': 0, 'failed': False}
+
+        def write_range(session, fileobj, offset, length):
+            with lock:
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+            try:
+                chunk = fileobj.read()
+                with lock:
+                    if offset == 50000 and not state['failed']:
+                        state['failed'] = True
+                        raise ftplib.error_temp('421 Too many connections')
+                target[offset:offset + len(chunk)] = chunk
+            finally:
+                with lock:
+                    state['running'] -= 1
+
+        # Without decreases by the noisy throughput of such short intervals
+        ctl = AdaptiveConcurrency(1, 4, initial=2, interval=0.0, slowdown=0.0)
+        pool = SessionPool(FakeSession, 4)
+        upload = RangeUpload(
+            filename, len(data), pool, write_range, range_size=10000, controller=ctl)
+        upload.run()
+
+        self.assertEqual(bytes(target), data)
+        self.assertEqual(upload.retries, 1)
+        self.assertLessEqual(state['peak'], 4)
+        self.assertIn('decrease', [d[0] for d in ctl.decisions])
+        self.assertLessEqual(pool.created, ctl.limit)
+        self.assertEqual(ctl.active, 0)
+        pool.close()
+
+
+# =============================================================================
+
+if __name__ == '__main__':
+
+    verbose = get_arg_verbose()
+    if verbose is None:
+        verbose = 0
+    init_root_logger(verbose)
+
+    LOG.info("Starting tests ...")
+
+    suite = unittest.TestSuite()
+
+    suite.addTest(TestConcurrency('test_import', verbose))
+    suite.addTest(TestConcurrency('test_aimd', verbose))
+    suite.addTest(TestConcurrency('test_limit', verbose))
+    suite.addTest(TestConcurrency('test_range_upload', verbose))
+
+    runner = unittest.TextTestRunner(verbosity=verbose)
+
+    result = runner.run(suite)
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
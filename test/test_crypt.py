@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: test script (and module) for unit tests on the client side encryption
+'''
+
+import os
+import sys
+import io
+import logging
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+libdir = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..', 'lib'))
+sys.path.insert(0, libdir)
+
+from general import FtpBackupTestcase, get_arg_verbose, init_root_logger
+
+MY_APPNAME = os.path.basename(sys.argv[0]).replace('.py', '')
+LOG = logging.getLogger(MY_APPNAME)
+
+
+# =============================================================================
+class TestCrypt(FtpBackupTestcase):
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+        pass
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        pass
+
+    # -------------------------------------------------------------------------
+    def test_import(self):
+
+        LOG.info("Test importing ftp_backup.crypt ...")
+
+        import ftp_backup.crypt                                         # noqa
+
+    # -------------------------------------------------------------------------
+    def test_encrypt_decrypt(self):
+
+        LOG.info("Testing the parallel encryption and decryption ...")
+
+        from ftp_backup.crypt import EncryptingReader, decrypt_stream
+
+        key = os.urandom(32)
+        for size in (0, 10, 65536, 3 * 65536 + 17):
+            data = os.urandom(size)
+            with EncryptingReader(io.BytesIO(data), key, workers=3, chunksize=65536) as reader:
+                encrypted = reader.read()
+            LOG.debug("Encrypted %d Bytes to %d Bytes.", size, len(encrypted))
+            self.assertNotEqual(encrypted[-size:], data)
+            decrypted = io.BytesIO()
+            decrypt_stream(io.BytesIO(encrypted), decrypted, key, workers=2)
+            self.assertEqual(decrypted.getvalue(), data)
+
+    # -------------------------------------------------------------------------
+    def test_detect_manipulation(self):
+
+        LOG.info("Testing the detection of manipulated and truncated data ...")
+
+        from ftp_backup.crypt import EncryptingReader, decrypt_stream
+        from ftp_backup.crypt import CryptFormatError, HEADER_SIZE
+
+        key = os.urandom(32)
+        data = os.urandom(3 * 1024)
+        with EncryptingReader(io.BytesIO(data), key, workers=2, chunksize=1024) as reader:
+            encrypted = reader.read()
+
+        truncated = encrypted[:HEADER_SIZE + 2 * (4 + 1024 + 16)]
+        with self.assertRaises(CryptFormatError):
+            decrypt_stream(io.BytesIO(truncated), io.BytesIO(), key)
+
+        modified = bytearray(encrypted)
+        modified[HEADER_SIZE + 10] ^= 0x01
+        with self.assertRaises(CryptFormatError):
+            decrypt_stream(io.BytesIO(bytes(modified)), io.BytesIO(), key)
+
+        with self.assertRaises(CryptFormatError):
+            decrypt_stream(io.BytesIO(encrypted), io.BytesIO(), os.urandom(32))
+
+# =============================================================================
+
+if __name__ == '__main__':
+
+    verbose = get_arg_verbose()
+    if verbose is None:
+        verbose = 0
+    init_root_logger(verbose)
+
+    LOG.info("Starting tests ...")
+
+    suite = unittest.TestSuite()
+
+    suite.addTest(TestCrypt('test_import', verbose))
+    suite.addTest(TestCrypt('test_encrypt_decrypt', verbose))
+    suite.addTest(TestCrypt('test_detect_manipulation', verbose))
+
+    runner = unittest.TextTestRunner(verbosity=verbose)
+
+    result = runner.run(suite)
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: test script (and module) for unit tests on the backup to
+          several targets with a single read of the local files
+'''
+
+import os
+import sys
+import io
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+libdir = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..', 'lib'))
+sys.path.insert(0, libdir)
+
+from general import FtpBackupTestcase, get_arg_verbose, init_root_logger
+
+from ftp_server import LocalFTPServer, make_tree
+
+MY_APPNAME = os.path.basename(sys.argv[0]).replace('.py', '')
+LOG = logging.getLogger(MY_APPNAME)
+
+
+# =============================================================================
+class BrokenHandler(object):
+    """Stand-in for a handler, whose server fails on every upload."""
+
+    checksum = 'sha256'
+
+    def start_backup(self):
+        pass
+
+    def queue_entry(self, entry):
+        return not entry.is_dir
+
+    def put_entry(self, entry, fileobj=None):
+        raise IOError("Connection reset by peer")
+
+    def finish_backup(self):
+        raise AssertionError("finish_backup() of a failed target called.")
+
+
+# =============================================================================
+class TestFanOut(FtpBackupTestcase):
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp(prefix='test-fanout-')
+        self.servers = []
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        for server in self.servers:
+            server.stop()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    # -------------------------------------------------------------------------
+    def test_import(self):
+
+        LOG.info("Test importing ftp_backup.fanout ...")
+
+        import ftp_backup.fanout                                        # noqa
+
+    # -------------------------------------------------------------------------
+    def test_shared_reader(self):
+
+        LOG.info("Testing the shared reading of a file by several uploads ...")
+
+        from ftp_backup.fanout import SharedReader
+
+        data = os.urandom(100000)
+        source = SharedReader(io.BytesIO(data), bufsize=4096, depth=2)
+        branches = [source.branch('a', 'sha256'), source.branch('b', 'md5')]
+        results = {}
+
+        def consume(branch, size):
+            parts = []
+            with branch:
+                while True:
+                    chunk = branch.read(size)
+                    if not chunk:
+                        break
+                    parts.append(chunk)
+                results[branch.name] = (b''.join(parts), branch.hexdigest())
+
+        threads = [
+            threading.Thread(target=consume, args=(branches[0], 1000)),
+            threading.Thread(target=consume, args=(branches[1], 32768)),
+        ]
+        with source:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(source.bytes_read, len(data))
+        self.assertEqual(results['a'][0], data)
+        self.assertEqual(results['b'][0], data)
+        self.assertEqual(results['a'][1], hashlib.sha256(data).hexdigest())
+        self.assertEqual(results['b'][1], hashlib.md5(data).hexdigest())
+
+    # -------------------------------------------------------------------------
+    def test_stall(self):
+
+        LOG.info("Testing the detaching of an upload holding back the reading ...")
+
+        from ftp_backup.fanout import SharedReader, FanOutStalledError
+
+        data = os.urandom(50000)
+        source = SharedReader(
+            io.BytesIO(data), bufsize=1024, depth=2, stall_policy='reread', stall_timeout=0.3)
+        fast = source.branch('fast')
+        slow = source.branch('slow')
+
+        with source:
+            self.assertEqual(fast.read(), data)
+            self.assertTrue(slow.stalled)
+            with self.assertRaises(FanOutStalledError):
+                slow.read(10)
+        self.assertGreaterEqual(slow.held_back, 0.3)
+
+    # -------------------------------------------------------------------------
+    def ftp_handler(self, root_dir, copies_daily):
+
+        from ftp_backup.ftp_handler import FTPHandler
+
+        server = LocalFTPServer(root_dir)
+        port = server.start()
+        self.servers.append(server)
+
+        handler = FTPHandler(
+            host='127.0.0.1', port=port, user='backup', password='secret', passive=True,
+            report_dir=os.path.join(self.tmp_dir, 'reports'), index_file='none')
+        handler.copies['daily'] = copies_daily
+        handler.connect()
+        return handler
+
+    # -------------------------------------------------------------------------
+    def test_backup(self):
+
+        LOG.info("Testing a backup to two FTP servers and a failing target ...")
+
+        from ftp_backup.fanout import FanOutBackup, FanOutTarget
+        from ftp_backup.local_scan import scan_local_dir
+
+        local_dir = os.path.join(self.tmp_dir, 'local')
+        files = {
+            'small.txt': b'Hello world\n',
+            'big.bin': os.urandom(300000),
+            'with space.dat': b'x' * 5000,
+        }
+        make_tree(local_dir, files)
+
+        old_dirs = {'2000-01-03_00/old.txt': b'old', '2000-01-04_00/old.txt': b'old'}
+        roots = []
+        for name in ('one', 'two'):
+            root = os.path.join(self.tmp_dir, name)
+            make_tree(os.path.join(root, 'host'), old_dirs)
+            roots.append(root)
+
+        # Different numbers of copies to keep on both servers
+        targets = [
+            FanOutTarget('one', self.ftp_handler(roots[0], 1)),
+            FanOutTarget('two', self.ftp_handler(roots[1], 2)),
+            FanOutTarget('broken', BrokenHandler()),
+        ]
+        for target in targets[:2]:
+            target.handler.prepare_backup('host')
+
+        fanout = FanOutBackup(targets, bufsize=65536, depth=4)
+        self.assertFalse(fanout.run(scan_local_dir(local_dir)))
+        for target in targets[:2]:
+            target.handler.disconnect()
+
+        self.assertTrue(targets[2].failed)
+        self.assertIn('Connection reset', targets[2].error)
+        self.assertEqual(fanout.bytes_read, sum(len(d) for d in files.values()))
+
+        for (root, kept) in ((roots[0], []), (roots[1], ['2000-01-04_00'])):
+            backup_dirs = sorted(os.listdir(os.path.join(root, 'host')))
+            self.assertEqual(backup_dirs[:-1], kept)
+            backup_dir = os.path.join(root, 'host', backup_dirs[-1])
+            with open(os.path.join(backup_dir, 'with_space.dat'), 'rb') as fh:
+                self.assertEqual(fh.read(), files['with space.dat'])
+            with open(os.path.join(backup_dir, 'big.bin'), 'rb') as fh:
+                self.assertEqual(fh.read(), files['big.bin'])
+            manifest = [n for n in os.listdir(backup_dir) if 'manifest' in n]
+            self.assertEqual(len(manifest), 1)
+            with open(os.path.join(backup_dir, manifest[0]), 'rb') as fh:
+                content = json.loads(fh.read().decode('utf-8'))
+            self.assertIn(hashlib.sha256(files['big.bin']).hexdigest(), json.dumps(content))
+
+
+# =============================================================================
+
+if __name__ == '__main__':
+
+    verbose = get_arg_verbose()
+    if verbose is None:
+        verbose = 0
+    init_root_logger(verbose)
+
+    LOG.info("Starting tests ...")
+
+    suite = unittest.TestSuite()
+
+    suite.addTest(TestFanOut('test_import', verbose))
+    suite.addTest(TestFanOut('test_shared_reader', verbose))
+    suite.addTest(TestFanOut('test_stall', verbose))
+    suite.addTest(TestFanOut('test_backup', verbose))
+
+    runner = unittest.TextTestRunner(verbosity=verbose)
+
+    result = runner.run(suite)
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
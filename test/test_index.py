@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: test script (and module) for unit tests on the local index
+          of the backed up files
+'''
+
+import os
+import sys
+import shutil
+import logging
+import tempfile
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+libdir = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..', 'lib'))
+sys.path.insert(0, libdir)
+
+from general import FtpBackupTestcase, get_arg_verbose, init_root_logger
+
+MY_APPNAME = os.path.basename(sys.argv[0]).replace('.py', '')
+LOG = logging.getLogger(MY_APPNAME)
+
+
+# =============================================================================
+class TestIndex(FtpBackupTestcase):
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.index_file = os.path.join(self.tmp_dir, 'state', 'index.sqlite')
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    # -------------------------------------------------------------------------
+    def manifest(self, backup_dir, *files):
+
+        from ftp_backup.manifest import BackupManifest
+
+        manifest = BackupManifest(backup_dir, 'sha256')
+        for (path, digest) in files:
+            manifest.add(path, path + '.gz', 100, 1000000, digest)
+        return manifest
+
+    # -------------------------------------------------------------------------
+    def test_import(self):
+
+        LOG.info("Test importing ftp_backup.index ...")
+
+        import ftp_backup.index                                         # noqa
+
+    # -------------------------------------------------------------------------
+    def test_find(self):
+
+        LOG.info("Testing searching files in the index ...")
+
+        from ftp_backup.index import BackupIndex
+
+        with BackupIndex(self.index_file) as index:
+            index.add_manifest('web1', 'backup', self.manifest(
+                '2016-01-01_00', ('etc/hosts', 'aa'), ('var/log/messages', 'bb')))
+            index.add_manifest('web1', 'backup', self.manifest(
+                '2016-01-02_00', ('etc/hosts', 'aa'), ('etc/passwd', 'cc')))
+            index.add_manifest('db1', 'backup', self.manifest(
+                '2016-01-02_00', ('etc/hosts', 'dd')))
+
+            found = index.find('hosts')
+            self.assertEqual(len(found), 3)
+            self.assertEqual(found[0].backup_dir, '2016-01-02_00')
+            self.assertEqual(found[-1].backup_dir, '2016-01-01_00')
+            self.assertEqual(found[-1].remote, 'etc/hosts.gz')
+
+            found = index.find('etc/*', host='web1')
+            self.assertEqual(
+                sorted((e.backup_dir, e.path) for e in found),
+                [('2016-01-01_00', 'etc/hosts'), ('2016-01-02_00', 'etc/hosts'),
+                    ('2016-01-02_00', 'etc/passwd')])
+
+            self.assertEqual([e.host for e in index.find(digest='dd')], ['db1'])
+            self.assertEqual(len(index.find('*', limit=2)), 2)
+            self.assertEqual(index.find('shadow'), [])
+
+            # Indexing a backup directory again replaces its files
+            index.add_manifest('web1', 'backup', self.manifest(
+                '2016-01-02_00', ('etc/group', 'ee')))
+            self.assertEqual(index.find('passwd'), [])
+            self.assertEqual(len(index.find('group')), 1)
+
+    # -------------------------------------------------------------------------
+    def test_prune(self):
+
+        LOG.info("Testing removing deleted backup directories from the index ...")
+
+        from ftp_backup.index import BackupIndex
+
+        with BackupIndex(self.index_file) as index:
+            for backup_dir in ('2016-01-01_00', '2016-01-02_00', '2016-01-03_00'):
+                index.add_manifest('web1', 'backup', self.manifest(
+                    backup_dir, ('etc/hosts', 'aa')))
+            index.remove_backup_dir('web1', 'backup', '2016-01-01_00')
+            self.assertEqual(
+                index.backup_dirs('web1', 'backup'), ['2016-01-02_00', '2016-01-03_00'])
+            self.assertEqual(len(index.find('hosts')), 2)
+
+        # The index survives reopening
+        with BackupIndex(self.index_file) as index:
+            index.clear('web1', 'backup')
+            self.assertEqual(index.backup_dirs(), [])
+            self.assertEqual(index.find('hosts'), [])
+
+# =============================================================================
+
+if __name__ == '__main__':
+
+    verbose = get_arg_verbose()
+    if verbose is None:
+        verbose = 0
+    init_root_logger(verbose)
+
+    LOG.info("Starting tests ...")
+
+    suite = unittest.TestSuite()
+
+    suite.addTest(TestIndex('test_import', verbose))
+    suite.addTest(TestIndex('test_find', verbose))
+    suite.addTest(TestIndex('test_prune', verbose))
+
+    runner = unittest.TextTestRunner(verbosity=verbose)
+
+    result = runner.run(suite)
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
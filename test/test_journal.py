@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: test script (and module) for unit tests on the journal
+          of the backup runs
+'''
+
+import os
+import sys
+import io
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+libdir = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..', 'lib'))
+sys.path.insert(0, libdir)
+
+from general import FtpBackupTestcase, get_arg_verbose, init_root_logger
+
+from ftp_server import LocalFTPServer, make_tree
+
+MY_APPNAME = os.path.basename(sys.argv[0]).replace('.py', '')
+LOG = logging.getLogger(MY_APPNAME)
+
+
+# =============================================================================
+class TestJournal(FtpBackupTestcase):
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    # -------------------------------------------------------------------------
+    def test_import(self):
+
+        LOG.info("Test importing ftp_backup.journal ...")
+
+        import ftp_backup.journal                                       # noqa
+
+    # -------------------------------------------------------------------------
+    def test_resume(self):
+
+        LOG.info("Testing reading the journal of an interrupted run ...")
+
+        from ftp_backup.journal import RunJournal, journal_file
+
+        filename = journal_file(self.tmp_dir, 'backup', '/backup/web1', '/var/backup')
+        self.assertEqual(
+            filename, journal_file(self.tmp_dir, 'backup', '/backup/web1', '/var/backup'))
+        self.assertNotEqual(
+            filename, journal_file(self.tmp_dir, 'backup', '/backup/web2', '/var/backup'))
+
+        journal = RunJournal(filename, 'backup', '/backup/web1', '/var/backup', '2016-01-02_00')
+        journal.open()
+        journal.plan('a.bin', 'a.bin', 100, 1000.0)
+        journal.done('a.bin', 'a.bin', 100, 1000.0, digest='aa')
+        journal.plan('b.bin', 'b.bin', 200, 2000.0)
+        journal.done('c.cfg', 'c.cfg', 10, 3000.0, digest='cc', archive='packed-0001.tar')
+        journal.close()
+        # A record torn by a crash
+        with open(filename, 'a') as fh:
+            fh.write('{"op": "done", "name": "b.b')
+
+        journal = RunJournal.load(filename)
+        self.assertEqual(journal.backup_dir, '2016-01-02_00')
+        self.assertTrue(journal.resumable('backup', '/backup/web1', '/var/backup', 1))
+        self.assertFalse(journal.resumable('backup', '/backup/web2', '/var/backup', 1))
+        self.assertFalse(journal.resumable(
+            'backup', '/backup/web1', '/var/backup', 1, now=time.time() + 7200))
+
+        self.assertEqual(journal.completed_entry('a.bin', 100, 1000.0)['digest'], 'aa')
+        self.assertIsNone(journal.completed_entry('a.bin', 101, 1000.0))
+        self.assertIsNone(journal.completed_entry('b.bin', 200, 2000.0))
+        self.assertTrue(journal.partial_upload('b.bin', 'b.bin', 200, 2000.0))
+        self.assertFalse(journal.partial_upload('b.bin', 'b.bin.gz', 200, 2000.0))
+        self.assertFalse(journal.partial_upload('a.bin', 'a.bin', 100, 1000.0))
+        self.assertEqual(journal.archives(), set(['packed-0001.tar']))
+        self.assertEqual(list(journal.in_flight()), ['b.bin'])
+
+        # Continuing the run appends to the journal
+        journal.open(resume=True)
+        journal.done('b.bin', 'b.bin', 200, 2000.0)
+        journal.close()
+        journal = RunJournal.load(filename)
+        self.assertEqual(sorted(journal.completed), ['a.bin', 'b.bin', 'c.cfg'])
+
+        journal.finish()
+        self.assertFalse(os.path.exists(filename))
+        self.assertIsNone(RunJournal.load(filename))
+
+    # -------------------------------------------------------------------------
+    def test_skip_prefix(self):
+
+        LOG.info("Testing skipping the uploaded part of a local file ...")
+
+        from ftp_backup.journal import skip_prefix
+        from ftp_backup.checksum import HashingReader
+        from ftp_backup.packer import plan_archives
+
+        data = os.urandom(3000000)
+        reader = HashingReader(io.BytesIO(data), 'sha256')
+        skip_prefix(reader, 2000000)
+        self.assertEqual(reader.read(), data[2000000:])
+        self.assertEqual(reader.hexdigest(), hashlib.sha256(data).hexdigest())
+
+        fh = io.BytesIO(data)
+        skip_prefix(fh, 100)
+        self.assertEqual(fh.tell(), 100)
+
+        files = [('/data/%d' % (i), str(i), 10) for i in range(4)]
+        archives = plan_archives(files, 20, first=3)
+        self.assertEqual([a[0] for a in archives], ['packed-0003.tar', 'packed-0004.tar'])
+
+    # -------------------------------------------------------------------------
+    def interrupt_ftp_backup(self, verify=False, **server_args):
+        """
+        Runs a backup over FTP, which is interrupted during the upload of a
+        big file, and continues it.
+
+        @return: the FTP server and the mismatches found by the verification
+        @rtype: tuple
+        """
+
+        from ftp_backup import UPLOAD_PARTIAL_SUFFIX
+        from ftp_backup.ftp_handler import FTPHandler
+        from ftp_backup.local_scan import scan_local_dir
+
+        local_dir = os.path.join(self.tmp_dir, 'local')
+        root = os.path.join(self.tmp_dir, 'server')
+        journal_dir = os.path.join(self.tmp_dir, 'journal')
+        files = {
+            'big.bin': os.urandom(300000),
+            'sub/small.txt': b'Hello world\n',
+        }
+        make_tree(local_dir, files)
+        os.makedirs(root)
+        server = LocalFTPServer(root, **server_args)
+        port = server.start()
+
+        def create_handler():
+            handler = FTPHandler(
+                host='127.0.0.1', port=port, user='backup', password='secret', passive=True,
+                local_dir=local_dir, journal_dir=journal_dir,
+                report_dir=os.path.join(self.tmp_dir, 'reports'), index_file='none',
+                verify=verify)
+            handler.connect()
+            handler.prepare_backup('host')
+            handler.start_backup()
+            return handler
+
+        try:
+            # The run is interrupted during the upload of the big file
+            handler = create_handler()
+            entries = dict((e.relpath, e) for e in scan_local_dir(local_dir, recursive=True))
+            for relpath in ('sub', 'sub/small.txt'):
+                if handler.queue_entry(entries[relpath]):
+                    handler.put_entry(entries[relpath])
+            backup_dir = handler.new_backup_dir
+            statinfo = entries['big.bin'].stat
+            handler.journal.plan('big.bin', 'big.bin', statinfo.st_size, statinfo.st_mtime)
+            partial_file = os.path.join(
+                root, 'host', backup_dir, 'big.bin' + UPLOAD_PARTIAL_SUFFIX)
+            with open(partial_file, 'wb') as fh:
+                fh.write(files['big.bin'][:100000])
+            handler.disconnect()
+
+            del server.commands[:]
+            handler = create_handler()
+            self.assertEqual(handler.new_backup_dir, backup_dir)
+            for entry in scan_local_dir(local_dir, recursive=True):
+                if handler.queue_entry(entry):
+                    handler.put_entry(entry)
+            mismatches = handler.finish_backup()
+            handler.disconnect()
+        finally:
+            server.stop()
+
+        self.assertEqual(os.listdir(os.path.join(root, 'host')), [backup_dir])
+        for (name, data) in files.items():
+            with open(os.path.join(root, 'host', backup_dir, name), 'rb') as fh:
+                self.assertEqual(fh.read(), data)
+        self.assertFalse(os.path.exists(partial_file))
+        self.assertEqual(sorted(handler.manifest.files), ['big.bin', 'sub/small.txt'])
+        self.assertEqual(
+            handler.manifest.files['big.bin']['digest'],
+            hashlib.sha256(files['big.bin']).hexdigest())
+        self.assertEqual(os.listdir(journal_dir), [])
+        return (server, mismatches)
+
+    # -------------------------------------------------------------------------
+    def test_ftp_resume(self):
+
+        LOG.info("Testing the continuation of an interrupted backup over FTP ...")
+
+        server = self.interrupt_ftp_backup()[0]
+        # Probing REST before STOR, the rest of the big file and the manifest
+        self.assertEqual(server.commands.count('STOR'), 4)
+        self.assertEqual(server.commands.count('REST'), 2)
+        index = server.commands.index('SIZE')
+        self.assertEqual(server.commands[index + 1:index + 5], ['TYPE', 'PASV', 'REST', 'STOR'])
+
+    # -------------------------------------------------------------------------
+    def test_ftp_resume_without_rest(self):
+
+        LOG.info("Testing the continuation of a backup over FTP without REST before STOR ...")
+
+        for server_args in ({'support_rest': False}, {'rest_truncates': True}):
+            server = self.interrupt_ftp_backup(**server_args)[0]
+            # The big file is uploaded again completely after the failed probe
+            self.assertNotIn('SIZE', server.commands)
+            shutil.rmtree(self.tmp_dir)
+            os.makedirs(self.tmp_dir)
+
+    # -------------------------------------------------------------------------
+    def test_ftp_resume_verify(self):
+
+        LOG.info("Testing the verification of a continued upload with another checksum ...")
+
+        (server, mismatches) = self.interrupt_ftp_backup(verify=True, hash_commands=('XMD5', ))
+        # The server computes MD5, the local checksum is SHA-256
+        self.assertIn('REST', server.commands)
+        self.assertEqual(server.commands.count('XMD5'), 1)
+        self.assertEqual(mismatches, [])
+
+
+# =============================================================================
+
+if __name__ == '__main__':
+
+    verbose = get_arg_verbose()
+    if verbose is None:
+        verbose = 0
+    init_root_logger(verbose)
+
+    LOG.info("Starting tests ...")
+
+    suite = unittest.TestSuite()
+
+    suite.addTest(TestJournal('test_import', verbose))
+    suite.addTest(TestJournal('test_resume', verbose))
+    suite.addTest(TestJournal('test_skip_prefix', verbose))
+    suite.addTest(TestJournal('test_ftp_resume', verbose))
+    suite.addTest(TestJournal('test_ftp_resume_without_rest', verbose))
+    suite.addTest(TestJournal('test_ftp_resume_verify', verbose))
+
+    runner = unittest.TextTestRunner(verbosity=verbose)
+
+    result = runner.run(suite)
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
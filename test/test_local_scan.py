@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: test script (and module) for unit tests on scanning the local directory
+'''
+
+import os
+import sys
+import shutil
+import logging
+import tempfile
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+libdir = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..', 'lib'))
+sys.path.insert(0, libdir)
+
+from general import FtpBackupTestcase, get_arg_verbose, init_root_logger
+
+MY_APPNAME = os.path.basename(sys.argv[0]).replace('.py', '')
+LOG = logging.getLogger(MY_APPNAME)
+
+
+# =============================================================================
+class TestLocalScan(FtpBackupTestcase):
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp()
+        for path in ('a', 'b/c', 'b/d/e'):
+            full_path = os.path.join(self.tmp_dir, path)
+            if not os.path.isdir(os.path.dirname(full_path)):
+                os.makedirs(os.path.dirname(full_path))
+            with open(full_path, 'wb') as fh:
+                fh.write(path.encode('utf-8'))
+        os.symlink(os.path.join(self.tmp_dir, 'b'), os.path.join(self.tmp_dir, 'lnk'))
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    # -------------------------------------------------------------------------
+    def test_import(self):
+
+        LOG.info("Test importing ftp_backup.local_scan ...")
+
+        import ftp_backup.local_scan                                    # noqa
+
+    # -------------------------------------------------------------------------
+    def test_scan(self):
+
+        LOG.info("Testing scanning of the local directory ...")
+
+        from ftp_backup.local_scan import scan_local_dir
+
+        entries = list(scan_local_dir(self.tmp_dir))
+        self.assertEqual([e.relpath for e in entries], ['a'])
+        self.assertEqual(entries[0].stat.st_size, 1)
+
+        entries = list(scan_local_dir(self.tmp_dir, recursive=True))
+        files = sorted(e.relpath for e in entries if not e.is_dir)
+        dirs = [e.relpath for e in entries if e.is_dir]
+        self.assertEqual(files, ['a', 'b/c', 'b/d/e'])
+        self.assertEqual(dirs, ['b', 'b/d'])
+        relpaths = [e.relpath for e in entries]
+        self.assertLess(relpaths.index('b'), relpaths.index('b/c'))
+        self.assertLess(relpaths.index('b/d'), relpaths.index('b/d/e'))
+
+    # -------------------------------------------------------------------------
+    def test_scan_queue(self):
+
+        LOG.info("Testing scanning of the local directory in the background ...")
+
+        from ftp_backup.local_scan import ScanQueue, LocalScanError
+
+        with ScanQueue(self.tmp_dir, recursive=True, maxsize=1, stat_workers=0) as scanner:
+            scanner.start()
+            relpaths = sorted(e.relpath for e in scanner)
+        self.assertEqual(relpaths, ['a', 'b', 'b/c', 'b/d', 'b/d/e'])
+        self.assertEqual(scanner.entries, 5)
+        self.assertGreaterEqual(scanner.time_saved(), 0.0)
+
+        with ScanQueue(self.tmp_dir, recursive=True, stat_workers=4) as scanner:
+            relpaths = [e.relpath for e in scanner]
+        self.assertEqual(sorted(relpaths), ['a', 'b', 'b/c', 'b/d', 'b/d/e'])
+        self.assertLess(relpaths.index('b/d'), relpaths.index('b/d/e'))
+
+        scanner = ScanQueue(os.path.join(self.tmp_dir, 'missing'), stat_workers=0)
+        with self.assertRaises(LocalScanError):
+            list(scanner)
+        scanner.close()
+
+# =============================================================================
+
+if __name__ == '__main__':
+
+    verbose = get_arg_verbose()
+    if verbose is None:
+        verbose = 0
+    init_root_logger(verbose)
+
+    LOG.info("Starting tests ...")
+
+    suite = unittest.TestSuite()
+
+    suite.addTest(TestLocalScan('test_import', verbose))
+    suite.addTest(TestLocalScan('test_scan', verbose))
+    suite.addTest(TestLocalScan('test_scan_queue', verbose))
+
+    runner = unittest.TextTestRunner(verbosity=verbose)
+
+    result = runner.run(suite)
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
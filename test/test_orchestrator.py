@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: test script (and module) for unit tests on the orchestrator
+          running several backup jobs concurrently
+'''
+
+import os
+import sys
+import time
+import logging
+import tempfile
+import shutil
+import threading
+
+from collections import Counter
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+libdir = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..', 'lib'))
+sys.path.insert(0, libdir)
+
+from general import FtpBackupTestcase, get_arg_verbose, init_root_logger
+
+MY_APPNAME = os.path.basename(sys.argv[0]).replace('.py', '')
+LOG = logging.getLogger(MY_APPNAME)
+
+JOBS_FILE = """\
+[DEFAULT]
+host = backup.example.com
+compress = yes
+
+[db]
+local_dir = /var/backup/db
+subdir = db1-dumps
+copies_daily = 7
+
+[www]
+host = other.example.com
+port = 2222
+local_dir = /srv/www
+recursive = yes
+pack_threshold = 64K
+"""
+
+FANOUT_JOBS = """
+[ftp]
+type = ftp
+host = ftp.example.com
+password = secret
+copies_daily = 3
+
+[mirror]
+type = fanout
+targets = www, ftp
+local_dir = /srv/www
+stall_policy = drop
+"""
+
+
+# =============================================================================
+class TestOrchestrator(FtpBackupTestcase):
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp(prefix='test-orchestrator-')
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    # -------------------------------------------------------------------------
+    def test_import(self):
+
+        LOG.info("Test importing ftp_backup.orchestrator ...")
+
+        import ftp_backup.orchestrator                                  # noqa
+
+    # -------------------------------------------------------------------------
+    def test_load_jobs(self):
+
+        LOG.info("Testing the reading of the jobs file ...")
+
+        from ftp_backup.orchestrator import load_jobs, OrchestratorError
+
+        jobs_file = os.path.join(self.tmp_dir, 'jobs.ini')
+        with open(jobs_file, 'w') as fh:
+            fh.write(JOBS_FILE)
+
+        jobs = load_jobs(jobs_file)
+        self.assertEqual([job.name for job in jobs], ['db', 'www'])
+        (db, www) = jobs
+        self.assertEqual(db.target, 'backup.example.com:22')
+        self.assertEqual(db.subdir, 'db1-dumps')
+        self.assertEqual(db.copies, {'daily': 7})
+        self.assertIs(db.settings['compress'], True)
+        self.assertEqual(www.target, 'other.example.com:2222')
+        self.assertIs(www.local['recursive'], True)
+        self.assertEqual(www.settings['pack_threshold'], 64 * 1024)
+
+        with open(jobs_file, 'w') as fh:
+            fh.write("[db]\nlocal_dir = /tmp\nunknown = 1\n")
+        with self.assertRaises(OrchestratorError):
+            load_jobs(jobs_file)
+
+        with open(jobs_file, 'w') as fh:
+            fh.write("[db]\nport = twenty-two\n")
+        with self.assertRaises(OrchestratorError):
+            load_jobs(jobs_file)
+
+        with open(jobs_file, 'w') as fh:
+            fh.write(JOBS_FILE + FANOUT_JOBS)
+        jobs = load_jobs(jobs_file)
+        # The targets of the fan-out job don't run on their own
+        self.assertEqual([job.name for job in jobs], ['db', 'mirror'])
+        mirror = jobs[1]
+        self.assertEqual(mirror.type, 'fanout')
+        self.assertEqual([job.name for job in mirror.members], ['www', 'ftp'])
+        self.assertEqual(mirror.fanout['stall_policy'], 'drop')
+        self.assertEqual(mirror.servers, ['other.example.com:2222', 'ftp.example.com:21'])
+        ftp = mirror.members[1]
+        self.assertEqual(ftp.settings['password'], 'secret')
+        # The SFTP setting from [DEFAULT] doesn't disturb the FTP job
+        self.assertNotIn('compress', ftp.local)
+
+        with open(jobs_file, 'w') as fh:
+            fh.write(JOBS_FILE + "[ftp]\ntype = ftp\nkey_file = /root/.ssh/id_rsa\n")
+        with self.assertRaises(OrchestratorError):
+            load_jobs(jobs_file)
+
+        with open(jobs_file, 'w') as fh:
+            fh.write(JOBS_FILE + "[mirror]\ntype = fanout\ntargets = db, nowhere\n")
+        with self.assertRaises(OrchestratorError):
+            load_jobs(jobs_file)
+
+        with open(jobs_file, 'w') as fh:
+            fh.write(JOBS_FILE + "[images]\ntype = stripe\ntargets = db, www\nstripe_size = 1M\n")
+        jobs = load_jobs(jobs_file)
+        self.assertEqual([job.name for job in jobs], ['images'])
+        self.assertEqual(jobs[0].stripe['stripe_size'], 1024 * 1024)
+        self.assertEqual(len(jobs[0].servers), 2)
+
+        with open(jobs_file, 'w') as fh:
+            fh.write(JOBS_FILE + FANOUT_JOBS + "[images]\ntype = stripe\ntargets = db, mirror\n")
+        with self.assertRaises(OrchestratorError):
+            load_jobs(jobs_file)
+
+        with open(jobs_file, 'w') as fh:
+            fh.write("# no jobs\n")
+        with self.assertRaises(OrchestratorError):
+            load_jobs(jobs_file)
+
+    # -------------------------------------------------------------------------
+    def test_timings(self):
+
+        LOG.info("Testing the durations of the last runs of the jobs ...")
+
+        from ftp_backup.orchestrator import BackupJob, JobTimings
+
+        timings_file = os.path.join(self.tmp_dir, 'state', 'timings.json')
+        timings = JobTimings(timings_file)
+        self.assertIsNone(timings.estimate('db'))
+
+        ok = BackupJob('db')
+        ok.status = 'ok'
+        (ok.started, ok.finished) = (100.0, 142.5)
+        failed = BackupJob('www')
+        failed.status = 'failed'
+        (failed.started, failed.finished) = (100.0, 101.0)
+        timings.record(ok)
+        timings.record(failed)
+        timings.save()
+
+        timings = JobTimings(timings_file)
+        self.assertEqual(timings.estimate('db'), 42.5)
+        self.assertIsNone(timings.estimate('www'))
+
+        with open(timings_file, 'w') as fh:
+            fh.write('{broken')
+        self.assertEqual(JobTimings(timings_file).durations, {})
+
+    # -------------------------------------------------------------------------
+    def test_run(self):
+
+        LOG.info("Testing the concurrent run of jobs ...")
+
+        from ftp_backup.orchestrator import BackupJob, JobTimings, Orchestrator
+        from ftp_backup.orchestrator import OrchestratorError
+
+        class FakeOrchestrator(Orchestrator):
+
+            lock = threading.Lock()
+            active = Counter()
+            max_active = Counter()
+            max_all = 0
+            start_order = []
+
+            def run_job(self, job):
+                cls = self.__class__
+                with cls.lock:
+                    cls.start_order.append(job.name)
+                    cls.active[job.target] += 1
+                    cls.max_active[job.target] = max(
+                        cls.max_active[job.target], cls.active[job.target])
+                    cls.max_all = max(cls.max_all, sum(cls.active.values()))
+                try:
+                    time.sleep(durations[job.name])
+                    if job.name == 'bad':
+                        raise RuntimeError("Connection refused")
+                finally:
+                    with cls.lock:
+                        cls.active[job.target] -= 1
+
+        durations = {'a': 0.05, 'b': 0.2, 'c': 0.1, 'd': 0.05, 'bad': 0.01, 'new': 0.01}
+        timings = JobTimings(os.path.join(self.tmp_dir, 'timings.json'))
+        timings.durations.update({'a': 5, 'b': 20, 'c': 10, 'd': 5, 'bad': 1})
+
+        jobs = [
+            BackupJob('a', {'host': 'one'}),
+            BackupJob('b', {'host': 'one'}),
+            BackupJob('c', {'host': 'one'}),
+            BackupJob('d', {'host': 'two'}),
+            BackupJob('bad', {'host': 'two'}),
+            BackupJob('new', {'host': 'two'}),
+        ]
+
+        with self.assertRaises(OrchestratorError):
+            FakeOrchestrator(jobs, workers=0)
+        with self.assertRaises(OrchestratorError):
+            FakeOrchestrator(jobs, target_limit=0)
+
+        orchestrator = FakeOrchestrator(jobs, workers=3, target_limit=2, timings=timings)
+        self.assertEqual(
+            [job.name for job in orchestrator.order()], ['new', 'b', 'c', 'a', 'd', 'bad'])
+
+        self.assertFalse(orchestrator.run())
+        self.assertEqual(FakeOrchestrator.start_order[:3], ['new', 'b', 'c'])
+        self.assertLessEqual(FakeOrchestrator.max_all, 3)
+        self.assertLessEqual(FakeOrchestrator.max_active['one:22'], 2)
+        self.assertLessEqual(FakeOrchestrator.max_active['two:22'], 2)
+
+        status = dict((job.name, job.status) for job in jobs)
+        self.assertEqual(status['bad'], 'failed')
+        self.assertEqual(jobs[4].error, 'Connection refused')
+        for name in ('a', 'b', 'c', 'd', 'new'):
+            self.assertEqual(status[name], 'ok')
+
+        # The failed job keeps its former duration
+        timings = JobTimings(os.path.join(self.tmp_dir, 'timings.json'))
+        self.assertEqual(timings.estimate('bad'), 1)
+        self.assertLess(timings.estimate('new'), 1)
+
+        lines = orchestrator.report()
+        self.assertEqual(len(lines), len(jobs) + 2)
+        self.assertIn('failed', ''.join(line for line in lines if line.startswith('bad')))
+        self.assertTrue(lines[-1].startswith('All 6 jobs took'))
+
+
+# =============================================================================
+
+if __name__ == '__main__':
+
+    verbose = get_arg_verbose()
+    if verbose is None:
+        verbose = 0
+    init_root_logger(verbose)
+
+    LOG.info("Starting tests ...")
+
+    suite = unittest.TestSuite()
+
+    suite.addTest(TestOrchestrator('test_import', verbose))
+    suite.addTest(TestOrchestrator('test_load_jobs', verbose))
+    suite.addTest(TestOrchestrator('test_timings', verbose))
+    suite.addTest(TestOrchestrator('test_run', verbose))
+
+    runner = unittest.TextTestRunner(verbosity=verbose)
+
+    result = runner.run(suite)
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: test script (and module) for unit tests on packing small files
+'''
+
+import os
+import sys
+import io
+import shutil
+import tarfile
+import logging
+import tempfile
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+libdir = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..', 'lib'))
+sys.path.insert(0, libdir)
+
+from general import FtpBackupTestcase, get_arg_verbose, init_root_logger
+
+MY_APPNAME = os.path.basename(sys.argv[0]).replace('.py', '')
+LOG = logging.getLogger(MY_APPNAME)
+
+
+# =============================================================================
+class TestPacker(FtpBackupTestcase):
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    # -------------------------------------------------------------------------
+    def test_import(self):
+
+        LOG.info("Test importing ftp_backup.packer ...")
+
+        import ftp_backup.packer                                        # noqa
+
+    # -------------------------------------------------------------------------
+    def test_pack_files(self):
+
+        LOG.info("Testing streaming small files into tar archives ...")
+
+        from ftp_backup.packer import TarStreamReader, PackIndex, plan_archives
+
+        files = []
+        for i in range(20):
+            name = 'dump-%02d.cfg' % (i)
+            path = os.path.join(self.tmp_dir, name)
+            with open(path, 'wb') as fh:
+                fh.write(os.urandom(i * 100))
+            files.append((path, name, i * 100, os.stat(path).st_mtime))
+
+        archives = plan_archives(files, max_size=5000)
+        self.assertGreater(len(archives), 1)
+        index = PackIndex()
+        for (archive, archive_files) in archives:
+            self.assertLessEqual(sum(entry[2] for entry in archive_files), 5000)
+            with TarStreamReader([(entry[0], entry[1]) for entry in archive_files]) as reader:
+                data = reader.read()
+            tar = tarfile.open(fileobj=io.BytesIO(data))
+            for entry in archive_files:
+                index.add(archive, entry[1], entry[2], entry[3])
+                with open(entry[0], 'rb') as fh:
+                    self.assertEqual(tar.extractfile(entry[1]).read(), fh.read())
+
+        index = PackIndex.from_json(index.to_json())
+        self.assertEqual(len(index.files), len(files))
+        self.assertEqual(index.archive_of('dump-00.cfg'), archives[0][0])
+        self.assertEqual(index.archive_of('dump-19.cfg'), archives[-1][0])
+        self.assertIsNone(index.archive_of('unknown'))
+
+# =============================================================================
+
+if __name__ == '__main__':
+
+    verbose = get_arg_verbose()
+    if verbose is None:
+        verbose = 0
+    init_root_logger(verbose)
+
+    LOG.info("Starting tests ...")
+
+    suite = unittest.TestSuite()
+
+    suite.addTest(TestPacker('test_import', verbose))
+    suite.addTest(TestPacker('test_pack_files', verbose))
+
+    runner = unittest.TextTestRunner(verbosity=verbose)
+
+    result = runner.run(suite)
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: test script (and module) for unit tests on the upload
+          of big files in ranges
+'''
+
+import os
+import sys
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+libdir = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..', 'lib'))
+sys.path.insert(0, libdir)
+
+from general import FtpBackupTestcase, get_arg_verbose, init_root_logger
+
+from ftp_server import LocalFTPServer
+
+MY_APPNAME = os.path.basename(sys.argv[0]).replace('.py', '')
+LOG = logging.getLogger(MY_APPNAME)
+
+
+# =============================================================================
+class FakeRemoteFile(object):
+    """A remote file of the fake SFTP client, failing on demand on writing."""
+
+    def __init__(self, client, path, mode):
+        self.client = client
+        self.fh = open(path, mode)
+
+    def set_pipelined(self, pipelined=True):
+        pass
+
+    def seek(self, offset):
+        self.fh.seek(offset)
+
+    def write(self, data):
+        with FakeSFTPClient.lock:
+            if FakeSFTPClient.failures:
+                FakeSFTPClient.failures -= 1
+                raise IOError("Channel closed.")
+        self.fh.write(data)
+
+    def close(self):
+        self.fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# =============================================================================
+class FakeSFTPClient(object):
+    """SFTP client working on a local directory."""
+
+    lock = threading.Lock()
+    failures = 0
+
+    def __init__(self, root):
+        self.root = root
+        self.closed = False
+
+    def open(self, path, mode='r'):
+        return FakeRemoteFile(self, os.path.join(self.root, path), mode)
+
+    def stat(self, path):
+        return os.stat(os.path.join(self.root, path))
+
+    def posix_rename(self, old, new):
+        os.rename(os.path.join(self.root, old), os.path.join(self.root, new))
+
+    def close(self):
+        self.closed = True
+
+
+# =============================================================================
+class FakeSession(object):
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+# =============================================================================
+class TestRanges(FtpBackupTestcase):
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp(prefix='test-ranges-')
+        FakeSFTPClient.failures = 0
+        self.servers = []
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        for server in self.servers:
+            server.stop()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    # -------------------------------------------------------------------------
+    def test_import(self):
+
+        LOG.info("Test importing ftp_backup.ranges ...")
+
+        import ftp_backup.ranges                                        # noqa
+
+    # -------------------------------------------------------------------------
+    def test_split(self):
+
+        LOG.info("Testing the splitting of a file into ranges ...")
+
+        from ftp_backup.ranges import split_ranges, RangeUploadError
+
+        self.assertEqual(split_ranges(0, 10), [])
+        self.assertEqual(split_ranges(10, 10), [(0, 10)])
+        self.assertEqual(split_ranges(25, 10), [(0, 10), (10, 10), (20, 5)])
+        self.assertEqual(split_ranges(25, 10, 10), [(10, 10), (20, 5)])
+        with self.assertRaises(RangeUploadError):
+            split_ranges(25, 0)
+
+    # -------------------------------------------------------------------------
+    def test_range_upload(self):
+
+        LOG.info("Testing the upload of ranges with a repeated range ...")
+
+        from ftp_backup.ranges import RangeUpload, RangeUploadError
+        from ftp_backup.restore import SessionPool
+
+        data = os.urandom(100000)
+        filename = os.path.join(self.tmp_dir, 'data.bin')
+        with open(filename, 'wb') as fh:
+            fh.write(data)
+
+        target = bytearray(len(data))
+        failed = []
+        lock = threading.Lock()
+
+        def write_range(session, fileobj, offset, length):
+            chunk = fileobj.read()
+            with lock:
+                if offset == 30000 and not failed:
+                    failed.append(session)
+                    raise IOError("Connection reset by peer")
+            target[offset:offset + len(chunk)] = chunk
+
+        pool = SessionPool(FakeSession, 3)
+        upload = RangeUpload(filename, len(data), pool, write_range, range_size=10000)
+        digests = upload.run(['sha256', 'md5'])
+        pool.close()
+
+        self.assertEqual(bytes(target), data)
+        self.assertEqual(upload.retries, 1)
+        self.assertEqual(upload.done, len(data))
+        self.assertTrue(failed[0].closed)
+        self.assertEqual(digests['sha256'], hashlib.sha256(data).hexdigest())
+        self.assertEqual(digests['md5'], hashlib.md5(data).hexdigest())
+
+        def broken(session, fileobj, offset, length):
+            raise IOError("Connection reset by peer")
+
+        pool = SessionPool(FakeSession, 2)
+        upload = RangeUpload(filename, len(data), pool, broken, range_size=50000, max_attempts=2)
+        with self.assertRaises(RangeUploadError):
+            upload.run()
+        self.assertEqual(upload.retries, 2)
+
+    # -------------------------------------------------------------------------
+    def test_sftp_put_ranges(self):
+
+        LOG.info("Testing the upload of a big file in ranges over SFTP channels ...")
+
+        from ftp_backup.sftp_handler import SFTPHandler
+        from ftp_backup.ranges import MIN_RANGE_SIZE
+
+        local_dir = os.path.join(self.tmp_dir, 'local')
+        remote_dir = os.path.join(self.tmp_dir, 'remote')
+        os.makedirs(local_dir)
+        os.makedirs(remote_dir)
+
+        data = os.urandom(3 * MIN_RANGE_SIZE + 12345)
+        filename = os.path.join(local_dir, 'big.bin')
+        with open(filename, 'wb') as fh:
+            fh.write(data)
+
+        handler = SFTPHandler(
+            local_dir=local_dir, range_threshold=2 * MIN_RANGE_SIZE,
+            range_size=MIN_RANGE_SIZE, range_workers=3)
+        self.assertTrue(handler.use_ranges(len(data)))
+        self.assertFalse(handler.use_ranges(len(data), level=6))
+        self.assertFalse(handler.use_ranges(MIN_RANGE_SIZE))
+        with self.assertRaises(ValueError):
+            handler.range_size = 1000
+
+        handler.sftp_client = FakeSFTPClient(remote_dir)
+        channels = []
+
+        def open_channel():
+            channels.append(FakeSFTPClient(remote_dir))
+            return channels[-1]
+
+        handler._open_async_sftp = open_channel
+        # A failing write of one range
+        FakeSFTPClient.failures = 1
+
+        digests = handler.put_ranges(filename, 'big.bin', len(data), algorithms=['sha256'])
+        self.assertEqual(digests['sha256'], hashlib.sha256(data).hexdigest())
+        self.assertEqual(sorted(os.listdir(remote_dir)), ['big.bin'])
+        with open(os.path.join(remote_dir, 'big.bin'), 'rb') as fh:
+            self.assertEqual(fh.read(), data)
+        # All channels of the workers are closed at the end
+        self.assertGreaterEqual(len(channels), 2)
+        self.assertLessEqual(len(channels), 4)
+        self.assertTrue(all(channel.closed for channel in channels))
+
+    # -------------------------------------------------------------------------
+    def test_ftp_put_ranges(self):
+
+        LOG.info("Testing the upload of a big file in ranges over FTP connections ...")
+
+        from ftp_backup.ftp_handler import FTPHandler
+        from ftp_backup.ranges import MIN_RANGE_SIZE
+
+        data = os.urandom(3 * MIN_RANGE_SIZE + 12345)
+        filename = os.path.join(self.tmp_dir, 'big.bin')
+        with open(filename, 'wb') as fh:
+            fh.write(data)
+
+        cases = (
+            ('rest', {}, True, 6),
+            ('truncating', {'rest_truncates': True}, False, 3),
+            ('norest', {'support_rest': False}, False, 2),
+        )
+        for (name, options, rest_stor, stors) in cases:
+            root = os.path.join(self.tmp_dir, name)
+            os.makedirs(root)
+            server = LocalFTPServer(root, **options)
+            port = server.start()
+            self.servers.append(server)
+
+            handler = FTPHandler(
+                host='127.0.0.1', port=port, user='backup', password='secret', passive=True,
+                range_threshold=2 * MIN_RANGE_SIZE, range_size=MIN_RANGE_SIZE,
+                range_workers=3, report_dir=os.path.join(self.tmp_dir, 'reports'),
+                index_file='none')
+            handler.connect()
+            handler.start_manifest('.')
+            handler.put_file(filename)
+            handler.disconnect()
+
+            self.assertEqual(handler.rest_stor, rest_stor)
+            self.assertEqual(sorted(os.listdir(root)), ['big.bin'])
+            with open(os.path.join(root, 'big.bin'), 'rb') as fh:
+                self.assertEqual(fh.read(), data)
+            self.assertEqual(
+                handler.manifest.files['big.bin']['digest'], hashlib.sha256(data).hexdigest())
+            # The probe, then the first and 3 further ranges or a single upload
+            self.assertEqual(server.commands.count('STOR'), stors)
+
+
+# =============================================================================
+
+if __name__ == '__main__':
+
+    verbose = get_arg_verbose()
+    if verbose is None:
+        verbose = 0
+    init_root_logger(verbose)
+
+    LOG.info("Starting tests ...")
+
+    suite = unittest.TestSuite()
+
+    suite.addTest(TestRanges('test_import', verbose))
+    suite.addTest(TestRanges('test_split', verbose))
+    suite.addTest(TestRanges('test_range_upload', verbose))
+    suite.addTest(TestRanges('test_sftp_put_ranges', verbose))
+    suite.addTest(TestRanges('test_ftp_put_ranges', verbose))
+
+    runner = unittest.TextTestRunner(verbosity=verbose)
+
+    result = runner.run(suite)
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
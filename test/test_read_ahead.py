@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: test script (and module) for unit tests on reading local files ahead
+'''
+
+import os
+import sys
+import io
+import logging
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+libdir = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..', 'lib'))
+sys.path.insert(0, libdir)
+
+from general import FtpBackupTestcase, get_arg_verbose, init_root_logger
+
+MY_APPNAME = os.path.basename(sys.argv[0]).replace('.py', '')
+LOG = logging.getLogger(MY_APPNAME)
+
+
+# =============================================================================
+class FailingReader(io.RawIOBase):
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        raise IOError("Simulated read error")
+
+
+# =============================================================================
+class TestReadAhead(FtpBackupTestcase):
+
+    # -------------------------------------------------------------------------
+    def test_import(self):
+
+        LOG.info("Test importing ftp_backup.read_ahead ...")
+
+        import ftp_backup.read_ahead                                    # noqa
+
+    # -------------------------------------------------------------------------
+    def test_read_ahead(self):
+
+        LOG.info("Testing reading ahead with a ring of buffers ...")
+
+        from ftp_backup.read_ahead import ReadAheadReader
+
+        data = os.urandom(100 * 1000 + 17)
+        for (depth, bufsize, readsize) in ((1, 1000, 333), (3, 4096, 10000), (4, 7, -1)):
+            with ReadAheadReader(io.BytesIO(data), depth=depth, bufsize=bufsize) as reader:
+                chunks = []
+                while True:
+                    chunk = reader.read(readsize)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                self.assertEqual(b''.join(chunks), data)
+                self.assertEqual(reader.bytes_read, len(data))
+                self.assertEqual(reader.read(), b'')
+
+        with ReadAheadReader(io.BytesIO(b''), depth=2, bufsize=10) as reader:
+            self.assertEqual(reader.read(10), b'')
+
+        # Closing before the end must not block
+        reader = ReadAheadReader(io.BytesIO(data), depth=2, bufsize=10)
+        self.assertEqual(reader.read(5), data[:5])
+        reader.close()
+
+    # -------------------------------------------------------------------------
+    def test_read_error(self):
+
+        LOG.info("Testing read errors while reading ahead ...")
+
+        from ftp_backup.read_ahead import ReadAheadReader, ReadAheadError
+
+        with ReadAheadReader(FailingReader(), depth=2, bufsize=10) as reader:
+            with self.assertRaises(ReadAheadError):
+                reader.read(10)
+
+# =============================================================================
+
+if __name__ == '__main__':
+
+    verbose = get_arg_verbose()
+    if verbose is None:
+        verbose = 0
+    init_root_logger(verbose)
+
+    LOG.info("Starting tests ...")
+
+    suite = unittest.TestSuite()
+
+    suite.addTest(TestReadAhead('test_import', verbose))
+    suite.addTest(TestReadAhead('test_read_ahead', verbose))
+    suite.addTest(TestReadAhead('test_read_error', verbose))
+
+    runner = unittest.TextTestRunner(verbosity=verbose)
+
+    result = runner.run(suite)
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: test script (and module) for unit tests on restoring backups
+'''
+
+import os
+import sys
+import gzip
+import ftplib
+import shutil
+import hashlib
+import logging
+import tempfile
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+libdir = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..', 'lib'))
+sys.path.insert(0, libdir)
+
+from general import FtpBackupTestcase, get_arg_verbose, init_root_logger      # noqa
+
+from ftp_server import LocalFTPServer                                          # noqa
+
+MY_APPNAME = os.path.basename(sys.argv[0]).replace('.py', '')
+LOG = logging.getLogger(MY_APPNAME)
+
+
+# =============================================================================
+class LocalSession(object):
+    """A download session on a local directory standing in for a server."""
+
+    def __init__(self, root):
+        self.root = root
+        self.offsets = []
+
+    def listdir(self, path='.'):
+        return os.listdir(os.path.join(self.root, path))
+
+    def size(self, remote_path):
+        return os.path.getsize(os.path.join(self.root, remote_path))
+
+    def download(self, remote_path, fh, offset=0, callback=None):
+        self.offsets.append((remote_path, offset))
+        with open(os.path.join(self.root, remote_path), 'rb') as src:
+            src.seek(offset)
+            fh.seek(offset)
+            fh.truncate()
+            data = src.read()
+        fh.write(data)
+        if callback:
+            callback(len(data))
+        return offset
+
+    def close(self):
+        pass
+
+
+# =============================================================================
+class TestRestore(FtpBackupTestcase):
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        from ftp_backup.manifest import BackupManifest
+        from ftp_backup.packer import TarStreamReader
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.server = os.path.join(self.tmp_dir, 'server')
+        self.local = os.path.join(self.tmp_dir, 'local')
+        self.target = os.path.join(self.tmp_dir, 'restore')
+        backup = os.path.join(self.server, '2016-01-02_00')
+        os.makedirs(backup)
+        os.makedirs(os.path.join(self.server, '2016-01-01_00'))
+        os.makedirs(self.local)
+
+        self.contents = {
+            'big.bin': os.urandom(300000),
+            'text.log': b'line\n' * 20000,
+            'small1.cfg': b'a = 1\n',
+            'small2.cfg': b'b = 2\n',
+        }
+        for (name, data) in self.contents.items():
+            with open(os.path.join(self.local, name), 'wb') as fh:
+                fh.write(data)
+
+        manifest = BackupManifest('2016-01-02_00', 'sha256')
+        with open(os.path.join(backup, 'big.bin'), 'wb') as fh:
+            fh.write(self.contents['big.bin'])
+        with gzip.open(os.path.join(backup, 'text.log.gz'), 'wb') as fh:
+            fh.write(self.contents['text.log'])
+        for (name, remote) in (('big.bin', 'big.bin'), ('text.log', 'text.log.gz')):
+            manifest.add(
+                name, remote, len(self.contents[name]), 1000000 + len(name),
+                hashlib.sha256(self.contents[name]).hexdigest())
+
+        files = [(os.path.join(self.local, n), n) for n in ('small1.cfg', 'small2.cfg')]
+        with TarStreamReader(files) as tar:
+            with open(os.path.join(backup, 'packed-0001.tar'), 'wb') as fh:
+                fh.write(tar.read())
+        for name in ('small1.cfg', 'small2.cfg'):
+            manifest.add(
+                name, name, len(self.contents[name]), 1000000,
+                hashlib.sha256(self.contents[name]).hexdigest(), archive='packed-0001.tar')
+
+        with open(os.path.join(backup, 'manifest.json'), 'w') as fh:
+            fh.write(manifest.to_json())
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    # -------------------------------------------------------------------------
+    def test_import(self):
+
+        LOG.info("Test importing ftp_backup.restore ...")
+
+        import ftp_backup.restore                                       # noqa
+
+    # -------------------------------------------------------------------------
+    def test_restore(self):
+
+        LOG.info("Testing the parallel restore of a backup directory ...")
+
+        from ftp_backup.restore import BackupRestorer, SessionPool, PARTIAL_SUFFIX
+
+        sessions = []
+
+        def factory():
+            session = LocalSession(self.server)
+            sessions.append(session)
+            return session
+
+        # An interrupted download of the big file
+        os.makedirs(self.target)
+        with open(os.path.join(self.target, 'big.bin' + PARTIAL_SUFFIX), 'wb') as fh:
+            fh.write(self.contents['big.bin'][:100000])
+
+        pool = SessionPool(factory, 3)
+        restorer = BackupRestorer(pool, self.target, workers=3)
+        self.assertTrue(restorer.restore('latest'))
+        pool.close()
+
+        for (name, data) in self.contents.items():
+            path = os.path.join(self.target, name)
+            with open(path, 'rb') as fh:
+                self.assertEqual(fh.read(), data)
+        self.assertEqual(
+            int(os.stat(os.path.join(self.target, 'big.bin')).st_mtime), 1000000 + len('big.bin'))
+        self.assertFalse(os.path.exists(os.path.join(self.target, 'big.bin' + PARTIAL_SUFFIX)))
+        offsets = dict(o for s in sessions for o in s.offsets)
+        self.assertEqual(offsets['2016-01-02_00/big.bin'], 100000)
+        self.assertLessEqual(len(sessions), 3)
+        self.assertEqual(int(restorer.progress.bytes_done), restorer.progress.total_bytes)
+
+        # A second run finds everything restored
+        restorer = BackupRestorer(SessionPool(factory, 2), self.target, workers=2)
+        self.assertTrue(restorer.restore('2016-01-02_00'))
+        self.assertEqual(len(restorer.restored), 0)
+        self.assertEqual(len(restorer.skipped), 4)
+
+    # -------------------------------------------------------------------------
+    def test_mismatch(self):
+
+        LOG.info("Testing the detection of corrupt files during a restore ...")
+
+        from ftp_backup.restore import BackupRestorer, SessionPool
+        from ftp_backup.restore import CORRUPT_SUFFIX, PARTIAL_SUFFIX
+
+        with open(os.path.join(self.server, '2016-01-02_00', 'big.bin'), 'r+b') as fh:
+            fh.write(b'corrupt')
+
+        restorer = BackupRestorer(
+            SessionPool(lambda: LocalSession(self.server), 2), self.target, workers=2)
+        self.assertFalse(restorer.restore())
+        self.assertEqual(restorer.mismatches, ['big.bin'])
+
+        # The corrupt data is kept aside, neither taken as restored nor continued
+        path = os.path.join(self.target, 'big.bin')
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(os.path.exists(path + CORRUPT_SUFFIX))
+        self.assertFalse(os.path.exists(path + PARTIAL_SUFFIX))
+        self.assertNotIn('big.bin', restorer.restored)
+
+        with open(os.path.join(self.server, '2016-01-02_00', 'big.bin'), 'wb') as fh:
+            fh.write(self.contents['big.bin'])
+        restorer = BackupRestorer(
+            SessionPool(lambda: LocalSession(self.server), 2), self.target, workers=2)
+        self.assertTrue(restorer.restore())
+        self.assertEqual(restorer.restored, ['big.bin'])
+        with open(path, 'rb') as fh:
+            self.assertEqual(fh.read(), self.contents['big.bin'])
+
+        # A file of the right size and time, but with other content, is restored again
+        st = os.stat(path)
+        with open(path, 'r+b') as fh:
+            fh.write(b'changed')
+        os.utime(path, (st.st_mtime, st.st_mtime))
+        restorer = BackupRestorer(
+            SessionPool(lambda: LocalSession(self.server), 2), self.target, workers=2)
+        self.assertTrue(restorer.restore())
+        self.assertEqual(restorer.restored, ['big.bin'])
+        with open(path, 'rb') as fh:
+            self.assertEqual(fh.read(), self.contents['big.bin'])
+
+    # -------------------------------------------------------------------------
+    def test_ftp_resume(self):
+
+        LOG.info("Testing the continued download of a file over FTP ...")
+
+        from ftp_backup.restore import FTPRestoreSession, PARTIAL_SUFFIX
+
+        data = self.contents['big.bin']
+        remote_path = '2016-01-02_00/big.bin'
+        part_file = os.path.join(self.tmp_dir, 'big.bin' + PARTIAL_SUFFIX)
+
+        # The server forgets a REST on PASV like strict servers
+        for (support_rest, offset) in ((True, 100000), (False, 0)):
+            with open(part_file, 'wb') as fh:
+                fh.write(data[:100000])
+            server = LocalFTPServer(self.server, support_rest=support_rest)
+            port = server.start()
+            try:
+                ftp = ftplib.FTP()
+                ftp.connect('127.0.0.1', port)
+                ftp.login('backup', 'secret')
+                session = FTPRestoreSession(ftp)
+                with open(part_file, 'r+b') as fh:
+                    used = session.download(remote_path, fh, 100000)
+                ftp.quit()
+            finally:
+                server.stop()
+
+            self.assertEqual(used, offset)
+            self.assertEqual(session.rest_supported, support_rest)
+            with open(part_file, 'rb') as fh:
+                self.assertEqual(fh.read(), data)
+            if support_rest:
+                # REST directly before RETR
+                index = server.commands.index('RETR')
+                self.assertEqual(server.commands[index - 1], 'REST')
+                self.assertIn(server.commands[index - 2], ('PASV', 'EPSV'))
+
+
+# =============================================================================
+
+if __name__ == '__main__':
+
+    verbose = get_arg_verbose()
+    if verbose is None:
+        verbose = 0
+    init_root_logger(verbose)
+
+    LOG.info("Starting tests ...")
+
+    suite = unittest.TestSuite()
+
+    suite.addTest(TestRestore('test_import', verbose))
+    suite.addTest(TestRestore('test_restore', verbose))
+    suite.addTest(TestRestore('test_mismatch', verbose))
+    suite.addTest(TestRestore('test_ftp_resume', verbose))
+
+    runner = unittest.TextTestRunner(verbosity=verbose)
+
+    result = runner.run(suite)
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: test script (and module) for unit tests on the schedules
+          of the backup daemon
+'''
+
+import os
+import sys
+import logging
+
+from datetime import datetime, timedelta
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+libdir = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..', 'lib'))
+sys.path.insert(0, libdir)
+
+from general import FtpBackupTestcase, get_arg_verbose, init_root_logger
+
+MY_APPNAME = os.path.basename(sys.argv[0]).replace('.py', '')
+LOG = logging.getLogger(MY_APPNAME)
+
+
+# =============================================================================
+class TestSchedule(FtpBackupTestcase):
+
+    # -------------------------------------------------------------------------
+    def test_import(self):
+
+        LOG.info("Test importing ftp_backup.schedule ...")
+
+        import ftp_backup.schedule                                      # noqa
+
+    # -------------------------------------------------------------------------
+    def test_next_run(self):
+
+        LOG.info("Testing the points of time of cron-like schedules ...")
+
+        from ftp_backup.schedule import CronSchedule, ScheduleError
+
+        # A Saturday
+        now = datetime(2016, 2, 27, 13, 14, 35)
+
+        self.assertEqual(CronSchedule('@daily').next_run(now), datetime(2016, 2, 28, 0, 0))
+        self.assertEqual(CronSchedule('@hourly').next_run(now), datetime(2016, 2, 27, 14, 0))
+        self.assertEqual(CronSchedule('*/15 * * * *').next_run(now), datetime(2016, 2, 27, 13, 15))
+        self.assertEqual(CronSchedule('30 2 * * *').next_run(now), datetime(2016, 2, 28, 2, 30))
+        self.assertEqual(
+            CronSchedule('0 3 * * mon-fri').next_run(now), datetime(2016, 2, 29, 3, 0))
+        self.assertEqual(CronSchedule('0 0 29 feb *').next_run(now), datetime(2016, 2, 29, 0, 0))
+        self.assertEqual(CronSchedule('0 4 1 * *').next_run(now), datetime(2016, 3, 1, 4, 0))
+        self.assertEqual(CronSchedule('0 4 * * 7').next_run(now), datetime(2016, 2, 28, 4, 0))
+        self.assertEqual(CronSchedule('5,45 1-3 * * *').next_run(
+            datetime(2016, 2, 27, 1, 45)), datetime(2016, 2, 27, 2, 5))
+        self.assertEqual(CronSchedule('@yearly').next_run(now), datetime(2017, 1, 1, 0, 0))
+
+        # Either restricted day field matches
+        self.assertEqual(CronSchedule('0 0 15 * sun').next_run(now), datetime(2016, 2, 28, 0, 0))
+
+        for expression in ('* * *', '60 * * * *', '0 0 * 13 *', '*/0 * * * *', '0 0 x * *'):
+            with self.assertRaises(ScheduleError):
+                CronSchedule(expression)
+        with self.assertRaises(ScheduleError):
+            CronSchedule('0 0 31 feb *').next_run(now)
+
+    # -------------------------------------------------------------------------
+    def test_runner(self):
+
+        LOG.info("Testing running jobs on a schedule ...")
+
+        from ftp_backup.schedule import ScheduleRunner
+
+        calls = []
+
+        def job():
+            calls.append(len(calls))
+            if len(calls) == 2:
+                raise IOError("Connection lost")
+
+        runner = ScheduleRunner('@hourly', job, idle=lambda: None, idle_interval=0.01)
+        self.assertTrue(runner.wait_until(datetime.now() - timedelta(seconds=1)))
+        runner.run_job()
+        runner.run_job()
+        runner.run_job()
+        self.assertEqual(calls, [0, 1, 2])
+        self.assertEqual((runner.runs, runner.failures), (3, 1))
+
+        runner.stop()
+        self.assertFalse(runner.wait_until(datetime.now() + timedelta(hours=1)))
+        runner.run()
+        self.assertEqual(runner.runs, 3)
+
+        idle_calls = []
+        runner = ScheduleRunner(
+            '@hourly', job, idle=lambda: idle_calls.append(1), idle_interval=0.01)
+        self.assertTrue(runner.wait_until(datetime.now() + timedelta(seconds=0.1)))
+        self.assertGreater(len(idle_calls), 2)
+
+
+# =============================================================================
+
+if __name__ == '__main__':
+
+    verbose = get_arg_verbose()
+    if verbose is None:
+        verbose = 0
+    init_root_logger(verbose)
+
+    LOG.info("Starting tests ...")
+
+    suite = unittest.TestSuite()
+
+    suite.addTest(TestSchedule('test_import', verbose))
+    suite.addTest(TestSchedule('test_next_run', verbose))
+    suite.addTest(TestSchedule('test_runner', verbose))
+
+    runner = unittest.TextTestRunner(verbosity=verbose)
+
+    result = runner.run(suite)
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: test script (and module) for unit tests on the batched
+          confirmation of SFTP uploads
+'''
+
+import os
+import sys
+import logging
+import posixpath
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+libdir = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..', 'lib'))
+sys.path.insert(0, libdir)
+
+from general import FtpBackupTestcase, get_arg_verbose, init_root_logger
+
+MY_APPNAME = os.path.basename(sys.argv[0]).replace('.py', '')
+LOG = logging.getLogger(MY_APPNAME)
+
+
+# =============================================================================
+class FakeSFTPClient(object):
+    """Queues SETSTAT requests and answers them not before being asked."""
+
+    def __init__(self, cwd):
+        self.cwd = cwd
+        self.files = {}
+        self.requests = 0
+        self._expecting = {}
+
+    def _adjust_cwd(self, path):
+        return posixpath.join(self.cwd, path)
+
+    def _async_request(self, fileobj, t, path, attr):
+        self.requests += 1
+        self._expecting[self.requests] = (path, attr)
+        return self.requests
+
+    def _read_response(self, num):
+        (path, attr) = self._expecting.pop(num)
+        if path not in self.files:
+            raise IOError("No such file %r." % (path))
+        self.files[path].st_mtime = attr.st_mtime
+
+    def listdir_attr(self, path):
+        result = []
+        for (name, attr) in self.files.items():
+            if posixpath.dirname(name) == path:
+                attr.filename = posixpath.basename(name)
+                result.append(attr)
+        return result
+
+
+# =============================================================================
+class PlainSFTPClient(object):
+    """SFTP client without the private methods for pipelined requests."""
+
+    def __init__(self, cwd):
+        self.cwd = cwd
+        self.files = {}
+        self.utimes = 0
+
+    def utime(self, path, times):
+        self.utimes += 1
+        path = posixpath.join(self.cwd, path)
+        if path not in self.files:
+            raise IOError("No such file %r." % (path))
+        self.files[path].st_mtime = times[1]
+
+    def listdir_attr(self, path):
+        return FakeSFTPClient.listdir_attr(
+            self, posixpath.normpath(posixpath.join(self.cwd, path)))
+
+
+# =============================================================================
+class TestSFTPBatch(FtpBackupTestcase):
+
+    # -------------------------------------------------------------------------
+    def test_import(self):
+
+        LOG.info("Test importing ftp_backup.sftp_batch ...")
+
+        import ftp_backup.sftp_batch                                    # noqa
+
+    # -------------------------------------------------------------------------
+    def test_confirm(self):
+
+        LOG.info("Testing the batched confirmation of uploads ...")
+
+        import paramiko
+        from ftp_backup.sftp_batch import BatchConfirm
+
+        client = FakeSFTPClient('/backup/2016-01-01_00')
+        for (name, size) in (('a.bin', 10), ('b.bin', 20), ('sub/c.bin', 30)):
+            attr = paramiko.SFTPAttributes()
+            attr.st_size = size
+            attr.st_mtime = 0
+            client.files[posixpath.join(client.cwd, name)] = attr
+
+        batch = BatchConfirm(client)
+        batch.add('a.bin', 10, (1000.5, 2000.7), local_file='/data/a.bin', name='a.bin')
+        batch.add('b.bin', 21, (1000, 2000), local_file='/data/b.bin', name='b.bin')
+        batch.add('sub/c.bin', 30, (1000, 2000), local_file='/data/sub/c.bin', name='sub/c.bin')
+        batch.add('missing.bin', 5, (1000, 2000), local_file='/data/missing.bin')
+        self.assertEqual(len(batch.pending), 4)
+        self.assertEqual(len(client._expecting), 4)
+
+        mismatches = batch.confirm()
+        self.assertEqual(client._expecting, {})
+        self.assertEqual(batch.setstat_errors, 1)
+        self.assertEqual(
+            sorted(upload.local_file for upload in mismatches),
+            ['/data/b.bin', '/data/missing.bin'])
+        self.assertEqual(client.files['/backup/2016-01-01_00/a.bin'].st_mtime, 2000)
+
+    # -------------------------------------------------------------------------
+    def test_fallback(self):
+
+        LOG.info("Testing the confirmation of uploads without pipelined requests ...")
+
+        import paramiko
+        from ftp_backup.sftp_batch import BatchConfirm
+
+        client = PlainSFTPClient('/backup/2016-01-01_00')
+        for (name, size) in (('a.bin', 10), ('sub/c.bin', 30)):
+            attr = paramiko.SFTPAttributes()
+            attr.st_size = size
+            attr.st_mtime = 0
+            client.files[posixpath.join(client.cwd, name)] = attr
+
+        batch = BatchConfirm(client)
+        self.assertFalse(batch.pipelined)
+        batch.add('a.bin', 10, (1000.5, 2000.7), local_file='/data/a.bin', name='a.bin')
+        batch.add('sub/c.bin', 31, (1000, 2000), local_file='/data/sub/c.bin', name='sub/c.bin')
+        batch.add('missing.bin', 5, (1000, 2000), local_file='/data/missing.bin')
+        self.assertEqual(client.utimes, 3)
+        self.assertEqual(batch.pending, [])
+
+        mismatches = batch.confirm()
+        self.assertEqual(batch.setstat_errors, 1)
+        self.assertEqual(
+            sorted(upload.local_file for upload in mismatches),
+            ['/data/missing.bin', '/data/sub/c.bin'])
+        self.assertEqual(client.files['/backup/2016-01-01_00/a.bin'].st_mtime, 2000)
+
+# =============================================================================
+
+if __name__ == '__main__':
+
+    verbose = get_arg_verbose()
+    if verbose is None:
+        verbose = 0
+    init_root_logger(verbose)
+
+    LOG.info("Starting tests ...")
+
+    suite = unittest.TestSuite()
+
+    suite.addTest(TestSFTPBatch('test_import', verbose))
+    suite.addTest(TestSFTPBatch('test_confirm', verbose))
+    suite.addTest(TestSFTPBatch('test_fallback', verbose))
+
+    runner = unittest.TextTestRunner(verbosity=verbose)
+
+    result = runner.run(suite)
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
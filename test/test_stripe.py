@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: test script (and module) for unit tests on the backup striped
+          over several servers and its restore
+'''
+
+import os
+import sys
+import json
+import shutil
+import ftplib
+import hashlib
+import logging
+import tempfile
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+libdir = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..', 'lib'))
+sys.path.insert(0, libdir)
+
+from general import FtpBackupTestcase, get_arg_verbose, init_root_logger
+
+from ftp_server import LocalFTPServer, make_tree
+
+MY_APPNAME = os.path.basename(sys.argv[0]).replace('.py', '')
+LOG = logging.getLogger(MY_APPNAME)
+
+
+# =============================================================================
+class BrokenHandler(object):
+    """Stand-in for a handler, whose server fails on every upload."""
+
+    checksum = 'sha256'
+
+    def start_backup(self):
+        pass
+
+    def queue_entry(self, entry):
+        return not entry.is_dir
+
+    def put_entry(self, entry, fileobj=None):
+        raise IOError("Connection reset by peer")
+
+    def finish_backup(self):
+        raise AssertionError("finish_backup() of a failed target called.")
+
+
+# =============================================================================
+class TestStripe(FtpBackupTestcase):
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.tmp_dir = tempfile.mkdtemp(prefix='test-stripe-')
+        self.servers = []
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+
+        for server in self.servers:
+            server.stop()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    # -------------------------------------------------------------------------
+    def test_import(self):
+
+        LOG.info("Test importing ftp_backup.stripe ...")
+
+        import ftp_backup.stripe                                        # noqa
+
+    # -------------------------------------------------------------------------
+    def test_range_reader(self):
+
+        LOG.info("Testing the reading of a range of a local file ...")
+
+        from ftp_backup.stripe import RangeReader
+
+        data = os.urandom(10000)
+        filename = os.path.join(self.tmp_dir, 'data.bin')
+        with open(filename, 'wb') as fh:
+            fh.write(data)
+
+        with RangeReader(filename, 3000, 5000, 'sha256') as reader:
+            parts = [reader.read(1024)]
+            parts.append(reader.read())
+            self.assertEqual(reader.read(), b'')
+        self.assertEqual(b''.join(parts), data[3000:8000])
+        self.assertEqual(reader.hexdigest(), hashlib.sha256(data[3000:8000]).hexdigest())
+
+        # A range behind the end of a shrunk file
+        with RangeReader(filename, 9000, 5000) as reader:
+            self.assertEqual(reader.read(), data[9000:])
+        self.assertEqual(reader.remaining, 4000)
+        self.assertIsNone(reader.hexdigest())
+
+    # -------------------------------------------------------------------------
+    def ftp_server(self, root_dir):
+
+        server = LocalFTPServer(root_dir)
+        port = server.start()
+        self.servers.append(server)
+        return port
+
+    # -------------------------------------------------------------------------
+    def ftp_handler(self, port):
+
+        from ftp_backup.ftp_handler import FTPHandler
+
+        handler = FTPHandler(
+            host='127.0.0.1', port=port, user='backup', password='secret', passive=True,
+            report_dir=os.path.join(self.tmp_dir, 'reports'), index_file='none')
+        handler.connect()
+        return handler
+
+    # -------------------------------------------------------------------------
+    def test_backup_restore(self):
+
+        LOG.info("Testing a backup striped over two FTP servers and its restore ...")
+
+        from ftp_backup.stripe import StripeBackup, StripeTarget, StripeRestorer
+        from ftp_backup.stripe import MIN_STRIPE_SIZE
+        from ftp_backup.restore import FTPRestoreSession, SessionPool
+        from ftp_backup.local_scan import scan_local_dir
+
+        local_dir = os.path.join(self.tmp_dir, 'local')
+        files = {
+            'small.txt': b'Hello world\n',
+            'big.bin': os.urandom(5 * MIN_STRIPE_SIZE - 1000),
+            'sub/other.bin': os.urandom(2 * MIN_STRIPE_SIZE + 1),
+        }
+        make_tree(local_dir, files)
+
+        roots = []
+        ports = []
+        for name in ('one', 'two'):
+            root = os.path.join(self.tmp_dir, name)
+            os.makedirs(os.path.join(root, 'host'))
+            roots.append(root)
+            ports.append(self.ftp_server(root))
+
+        targets = [
+            StripeTarget('one', self.ftp_handler(ports[0])),
+            StripeTarget('two', self.ftp_handler(ports[1])),
+            StripeTarget('broken', BrokenHandler()),
+        ]
+        for target in targets[:2]:
+            target.handler.prepare_backup('host')
+
+        stripe = StripeBackup(targets, stripe_size=MIN_STRIPE_SIZE)
+        self.assertFalse(stripe.run(scan_local_dir(local_dir, recursive=True)))
+        for target in targets[:2]:
+            target.handler.disconnect()
+
+        # The uploads of the broken target were moved to the others
+        self.assertTrue(targets[2].failed)
+        self.assertEqual(stripe.lost, [])
+        self.assertEqual(targets[0].parts + targets[1].parts, 8)
+        self.assertGreater(targets[0].parts, 0)
+        self.assertGreater(targets[1].parts, 0)
+
+        manifests = []
+        for root in roots:
+            backup_dirs = os.listdir(os.path.join(root, 'host'))
+            self.assertEqual(len(backup_dirs), 1)
+            with open(os.path.join(root, 'host', backup_dirs[0], 'manifest.json'), 'rb') as fh:
+                manifests.append(json.loads(fh.read().decode('utf-8')))
+        self.assertEqual(manifests[0]['stripes'], manifests[1]['stripes'])
+        layout = manifests[0]['stripes']['big.bin']
+        self.assertEqual(len(layout['parts']), 5)
+        self.assertEqual(sum(part['size'] for part in layout['parts']), len(files['big.bin']))
+        # The parts are recorded with their own sizes by the FTP targets
+        for part in layout['parts']:
+            manifest = manifests[['one', 'two'].index(part['target'])]
+            self.assertEqual(manifest['files'][part['name']]['size'], part['size'])
+
+        def factory(port):
+            def create():
+                ftp = ftplib.FTP()
+                ftp.connect('127.0.0.1', port)
+                ftp.login('backup', 'secret')
+                ftp.cwd('host')
+                return FTPRestoreSession(ftp)
+            return create
+
+        pools = [
+            ('one', SessionPool(factory(ports[0]), 2)),
+            ('two', SessionPool(factory(ports[1]), 2)),
+        ]
+        target_dir = os.path.join(self.tmp_dir, 'restore')
+        restorer = StripeRestorer(pools, target_dir, workers=2)
+        try:
+            self.assertTrue(restorer.restore())
+        finally:
+            for (name, pool) in pools:
+                pool.close()
+
+        self.assertEqual(sorted(restorer.restored), sorted(files.keys()))
+        for (name, data) in files.items():
+            with open(os.path.join(target_dir, name), 'rb') as fh:
+                self.assertEqual(fh.read(), data)
+        self.assertEqual(
+            sorted(os.listdir(target_dir)), ['big.bin', 'small.txt', 'sub'])
+
+        # A corrupt part keeps the restored file aside
+        part = layout['parts'][0]
+        root = roots[['one', 'two'].index(part['target'])]
+        backup_dir = os.listdir(os.path.join(root, 'host'))[0]
+        with open(os.path.join(root, 'host', backup_dir, part['remote']), 'r+b') as fh:
+            fh.write(b'corrupt')
+        os.remove(os.path.join(target_dir, 'big.bin'))
+        pools = [
+            ('one', SessionPool(factory(ports[0]), 2)),
+            ('two', SessionPool(factory(ports[1]), 2)),
+        ]
+        restorer = StripeRestorer(pools, target_dir, workers=2)
+        try:
+            self.assertFalse(restorer.restore())
+        finally:
+            for (name, pool) in pools:
+                pool.close()
+        self.assertEqual(restorer.mismatches, ['big.bin'])
+        self.assertNotIn('big.bin', restorer.restored)
+        self.assertEqual(
+            sorted(os.listdir(target_dir)), ['big.bin.corrupt', 'small.txt', 'sub'])
+
+
+# =============================================================================
+
+if __name__ == '__main__':
+
+    verbose = get_arg_verbose()
+    if verbose is None:
+        verbose = 0
+    init_root_logger(verbose)
+
+    LOG.info("Starting tests ...")
+
+    suite = unittest.TestSuite()
+
+    suite.addTest(TestStripe('test_import', verbose))
+    suite.addTest(TestStripe('test_range_reader', verbose))
+    suite.addTest(TestStripe('test_backup_restore', verbose))
+
+    runner = unittest.TextTestRunner(verbosity=verbose)
+
+    result = runner.run(suite)
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
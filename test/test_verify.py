@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: test script (and module) for unit tests on verifying uploads
+          by checksums computed on the server
+'''
+
+import os
+import sys
+import io
+import hashlib
+import logging
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+libdir = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..', 'lib'))
+sys.path.insert(0, libdir)
+
+from general import FtpBackupTestcase, get_arg_verbose, init_root_logger
+
+MY_APPNAME = os.path.basename(sys.argv[0]).replace('.py', '')
+LOG = logging.getLogger(MY_APPNAME)
+
+
+# =============================================================================
+class FakeFTP(object):
+    """Answers FEAT and the checksum commands like a FTP server."""
+
+    def __init__(self, features, files):
+        self.features = features
+        self.files = files
+        self.commands = []
+
+    def sendcmd(self, cmd):
+        self.commands.append(cmd)
+        if cmd == 'FEAT':
+            return '211-Features:\n' + '\n'.join(' ' + f for f in self.features) + '\n211 End'
+        if cmd.startswith('OPTS'):
+            return '200 OK'
+        (verb, path) = cmd.split(' ', 1)
+        digest = hashlib.new(self.algo_of(verb), self.files[path]).hexdigest()
+        if verb == 'HASH':
+            return '213 SHA-256 0-%d %s %s' % (len(self.files[path]), digest, path)
+        return '250 %s' % (digest)
+
+    def algo_of(self, verb):
+        return {'HASH': 'sha256', 'XSHA256': 'sha256', 'XSHA1': 'sha1', 'XMD5': 'md5'}[verb]
+
+    def quit(self):
+        pass
+
+
+# =============================================================================
+class TestVerify(FtpBackupTestcase):
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+
+        self.files = {
+            '/backup/good.bin': os.urandom(10000),
+            '/backup/bad.bin': os.urandom(10000),
+        }
+
+    # -------------------------------------------------------------------------
+    def test_import(self):
+
+        LOG.info("Test importing ftp_backup.verify ...")
+
+        import ftp_backup.verify                                        # noqa
+
+    # -------------------------------------------------------------------------
+    def test_ftp_features(self):
+
+        LOG.info("Testing the detection of the checksum commands of FTP servers ...")
+
+        from ftp_backup.verify import FTPVerifier, VerifyUnsupportedError
+
+        ftp = FakeFTP(['MDTM', 'HASH SHA-1;SHA-256*;MD5', 'SIZE'], self.files)
+        verifier = FTPVerifier(ftp)
+        self.assertEqual(verifier.method, 'HASH')
+        self.assertEqual(verifier.algorithm, 'sha256')
+        self.assertIn('OPTS HASH SHA-256', ftp.commands)
+        self.assertEqual(
+            verifier.remote_digest('/backup/good.bin'),
+            hashlib.sha256(self.files['/backup/good.bin']).hexdigest())
+
+        verifier = FTPVerifier(FakeFTP(['XMD5', 'XSHA1'], self.files), 'md5')
+        self.assertEqual(verifier.method, 'XMD5')
+        self.assertEqual(
+            verifier.remote_digest('/backup/good.bin'),
+            hashlib.md5(self.files['/backup/good.bin']).hexdigest())
+
+        with self.assertRaises(VerifyUnsupportedError):
+            FTPVerifier(FakeFTP(['MDTM', 'SIZE'], self.files))
+
+    # -------------------------------------------------------------------------
+    def test_verify_queue(self):
+
+        LOG.info("Testing the verification of uploads in the background ...")
+
+        from ftp_backup.verify import FTPVerifier, VerifyQueue
+
+        queue = VerifyQueue(FTPVerifier(FakeFTP(['XSHA256'], self.files)), workers=2)
+        good = hashlib.sha256(self.files['/backup/good.bin']).hexdigest()
+        queue.submit('/backup/good.bin', good.upper())
+        queue.submit('/backup/bad.bin', good)
+        queue.submit('/backup/missing.bin', good)
+        mismatches = queue.finish()
+        queue.close()
+
+        self.assertEqual(queue.verified, 1)
+        self.assertEqual(mismatches, ['/backup/bad.bin'])
+        self.assertEqual(queue.failures, ['/backup/missing.bin'])
+
+    # -------------------------------------------------------------------------
+    def test_upload_digest(self):
+
+        LOG.info("Testing the checksum of the uploaded data of a pipeline ...")
+
+        from ftp_backup.pipeline import UploadPipeline
+
+        data = self.files['/backup/good.bin']
+        with UploadPipeline(io.BytesIO(data), compress_level=6, digest_algorithm='md5') as stream:
+            uploaded = stream.read()
+        self.assertEqual(stream.upload_digest(), hashlib.md5(uploaded).hexdigest())
+
+        with UploadPipeline(io.BytesIO(data)) as stream:
+            stream.read()
+        self.assertIsNone(stream.upload_digest())
+
+# =============================================================================
+
+if __name__ == '__main__':
+
+    verbose = get_arg_verbose()
+    if verbose is None:
+        verbose = 0
+    init_root_logger(verbose)
+
+    LOG.info("Starting tests ...")
+
+    suite = unittest.TestSuite()
+
+    suite.addTest(TestVerify('test_import', verbose))
+    suite.addTest(TestVerify('test_ftp_features', verbose))
+    suite.addTest(TestVerify('test_verify_queue', verbose))
+    suite.addTest(TestVerify('test_upload_digest', verbose))
+
+    runner = unittest.TextTestRunner(verbosity=verbose)
+
+    result = runner.run(suite)
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+@author: Frank Brehm
+@contact: frank@brehm-online.com
+@copyright: © 2010 - 2016 by Frank Brehm, Berlin
+@license: GPL3
+@summary: test script (and module) for unit tests on watching the
+          local directory for new files
+'''
+
+import os
+import sys
+import time
+import shutil
+import logging
+import tempfile
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+libdir = os.path.abspath(os.path.join(os.path.dirname(sys.argv[0]), '..', 'lib'))
+sys.path.insert(0, libdir)
+
+from general import FtpBackupTestcase, get_arg_verbose, init_root_logger
+
+MY_APPNAME = os.path.basename(sys.argv[0]).replace('.py', '')
+LOG = logging.getLogger(MY_APPNAME)
+
+
+# =============================================================================
+class TestWatch(FtpBackupTestcase):
+
+    # -------------------------------------------------------------------------
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    # -------------------------------------------------------------------------
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    # -------------------------------------------------------------------------
+    def test_import(self):
+
+        LOG.info("Test importing ftp_backup.watch ...")
+
+        import ftp_backup.watch                                         # noqa
+
+    # -------------------------------------------------------------------------
+    def test_debounce(self):
+
+        LOG.info("Testing debouncing and the bounded queue of watched files ...")
+
+        from ftp_backup.watch import DirectoryWatcher
+        from ftp_backup.watch import IN_CLOSE_WRITE, IN_MOVED_TO, IN_MOVED_FROM
+        from ftp_backup.watch import IN_Q_OVERFLOW
+
+        watcher = DirectoryWatcher(self.tmp_dir, debounce=5, max_queue=3)
+        watcher.dirs[1] = self.tmp_dir
+        path = os.path.join(self.tmp_dir, 'dump.sql')
+
+        watcher.handle_event(1, IN_CLOSE_WRITE, 'dump.sql', now=100)
+        watcher.handle_event(1, IN_CLOSE_WRITE, 'tmp.xyz', now=100)
+        watcher.handle_event(1, IN_CLOSE_WRITE, 'dump.sql', now=103)
+        watcher.promote(now=104)
+        self.assertEqual(watcher.take(), [])
+        watcher.handle_event(1, IN_MOVED_FROM, 'tmp.xyz', now=106)
+        watcher.handle_event(1, IN_MOVED_TO, 'a.tar', now=106)
+        watcher.handle_event(1, IN_MOVED_TO, 'b.tar', now=106)
+        watcher.handle_event(1, IN_MOVED_TO, 'c.tar', now=106)
+        self.assertEqual(watcher.dropped, 1)
+        self.assertEqual(watcher.queued, 3)
+        watcher.promote(now=108)
+        self.assertEqual(watcher.take(), [path])
+        watcher.promote(now=111)
+        self.assertEqual(watcher.take(max_items=1), [os.path.join(self.tmp_dir, 'a.tar')])
+        self.assertEqual(watcher.take(), [os.path.join(self.tmp_dir, 'b.tar')])
+
+        watcher.handle_event(-1, IN_Q_OVERFLOW, '')
+        self.assertEqual(watcher.dropped, 2)
+
+    # -------------------------------------------------------------------------
+    def test_inotify(self):
+
+        LOG.info("Testing watching a directory with inotify ...")
+
+        from ftp_backup.watch import DirectoryWatcher, WatchError
+
+        os.mkdir(os.path.join(self.tmp_dir, 'old'))
+        watcher = DirectoryWatcher(self.tmp_dir, recursive=True, debounce=0.1)
+        try:
+            watcher.start()
+        except WatchError as e:
+            self.skipTest(str(e))
+
+        try:
+            with open(os.path.join(self.tmp_dir, 'old', 'one'), 'wb') as fh:
+                fh.write(b'1')
+            with open(os.path.join(self.tmp_dir, '.two'), 'wb') as fh:
+                fh.write(b'2')
+            os.rename(os.path.join(self.tmp_dir, '.two'), os.path.join(self.tmp_dir, 'two'))
+            new_dir = os.path.join(self.tmp_dir, 'new')
+            os.mkdir(new_dir)
+            with open(os.path.join(new_dir, 'three'), 'wb') as fh:
+                fh.write(b'3')
+
+            found = set()
+            deadline = time.time() + 10
+            while len(found) < 3 and time.time() < deadline:
+                time.sleep(0.1)
+                found.update(os.path.relpath(p, self.tmp_dir) for p in watcher.take())
+        finally:
+            watcher.close()
+
+        self.assertEqual(found, set(['old/one', 'two', 'new/three']))
+
+
+# =============================================================================
+
+if __name__ == '__main__':
+
+    verbose = get_arg_verbose()
+    if verbose is None:
+        verbose = 0
+    init_root_logger(verbose)
+
+    LOG.info("Starting tests ...")
+
+    suite = unittest.TestSuite()
+
+    suite.addTest(TestWatch('test_import', verbose))
+    suite.addTest(TestWatch('test_debounce', verbose))
+    suite.addTest(TestWatch('test_inotify', verbose))
+
+    runner = unittest.TextTestRunner(verbosity=verbose)
+
+    result = runner.run(suite)
+
+# =============================================================================
+
+# vim: tabstop=4 expandtab shiftwidth=4 softtabstop=4